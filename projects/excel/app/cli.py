@@ -0,0 +1,250 @@
+"""Headless batch conversion of CSV/xlsx files with the viewer's parsing and export rules.
+
+Run from the repository root (or ``python -m app.cli ...`` from ``projects/excel``):
+
+    python -m projects.excel.app.cli partners/ -o converted/
+    python -m projects.excel.app.cli partners/ -o converted/ --to csv --format Amount=decimal_2 --format "Ngày=date_dmy"
+    python -m projects.excel.app.cli in/ -o out/ --format-file formats.json --jobs 8 --recursive
+
+Files are parsed like uploads through ``excel_engine`` (no Flask app is
+created), shown cells are coerced like an export from the workspace with the
+given column presets, and every sheet of a workbook is written to one output
+(xlsx workbook, or a zip for the other formats). Files run
+concurrently in a process pool; a manifest of input content hashes in the output
+directory skips inputs that did not change since the last run.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from . import excel_engine as engine
+
+MANIFEST_NAME = ".convert-manifest.json"
+MANIFEST_VERSION = 1
+PRESET_IDS = tuple(preset["id"] for preset in engine.COLUMN_FORMAT_PRESETS)
+
+
+def parse_format_spec(items: list[str], spec_file: str | None = None) -> dict[str, str]:
+    """``["Amount=decimal_2", ...]`` (and/or a JSON ``{"Amount": "decimal_2"}`` file) -> header -> preset."""
+    spec: dict[str, str] = {}
+    if spec_file:
+        loaded = json.loads(Path(spec_file).read_text(encoding="utf-8-sig"))
+        if not isinstance(loaded, dict):
+            raise ValueError(f"{spec_file}: expected a JSON object of column -> preset")
+        spec.update({str(k): str(v) for k, v in loaded.items()})
+    for item in items:
+        column, sep, preset = item.rpartition("=")
+        if not sep or not column.strip():
+            raise ValueError(f"Invalid format spec (expected COLUMN=PRESET): {item}")
+        spec[column.strip()] = preset.strip()
+    # cp1258 CSVs decode to combining tone marks; compare headers in composed form.
+    spec = {unicodedata.normalize("NFC", column): preset for column, preset in spec.items()}
+    for column, preset in spec.items():
+        if preset not in PRESET_IDS:
+            raise ValueError(f"Unknown preset {preset!r} for column {column!r} (choose from {', '.join(PRESET_IDS)})")
+    return spec
+
+
+def _input_sheets(path: Path, sheet: str | None) -> list[str | None]:
+    if path.suffix.lower() == ".csv":
+        return [None]
+    if sheet:
+        return [sheet]
+    return engine.sheet_names(path)
+
+
+def _sheet_item(path: Path, sheet: str | None, spec: dict[str, str]) -> dict:
+    """One sheet in the shape the export builders take (the same as a workspace export)."""
+    df, column_metadata, target_sheet = engine.load_sheet(path, sheet)
+    presets = {str(c): spec[key] for c in df.columns if (key := unicodedata.normalize("NFC", str(c))) in spec}
+    return engine.sheet_item(df, column_metadata, target_sheet or path.stem, presets)
+
+
+def convert_file(src: str, dst: str, fmt: str, spec: dict[str, str], sheet: str | None = None) -> dict:
+    """Convert one input; the output is written next to its target and renamed into place."""
+    start = time.perf_counter()
+    src_path, dst_path = Path(src), Path(dst)
+    items = [_sheet_item(src_path, name, spec) for name in _input_sheets(src_path, sheet)]
+    dst_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst_path.with_name(f".{dst_path.name}.{os.getpid()}.tmp")
+    try:
+        engine.write_sheets(items, tmp, fmt)
+        os.replace(tmp, dst_path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return {
+        "sheets": len(items),
+        "rows": sum(len(item["rows"]) for item in items),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        while chunk := fh.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _is_input(path: Path) -> bool:
+    return path.suffix.lower().lstrip(".") in engine.ALLOWED_EXTENSIONS
+
+
+def _discover_inputs(inputs: list[str], recursive: bool) -> list[tuple[Path, Path]]:
+    """``(path, relative path)`` of every CSV/xlsx input; directories keep their layout in the output."""
+    found = []
+    for raw in inputs:
+        root = Path(raw)
+        if root.is_dir():
+            pattern = "**/*" if recursive else "*"
+            for path in sorted(root.glob(pattern)):
+                if path.is_file() and _is_input(path) and not path.name.startswith((".", "~$")):
+                    found.append((path, path.relative_to(root)))
+        elif root.is_file() and _is_input(root):
+            found.append((root, Path(root.name)))
+        else:
+            raise ValueError(f"Not a CSV/xlsx file or directory: {raw}")
+    return found
+
+
+def _output_path(output_dir: Path, rel: Path, fmt: str, sheet_count_hint: int) -> Path:
+    # Multi-sheet workbooks exported to a flat format come out as a zip, like the web export.
+    suffix = "zip" if fmt != "xlsx" and sheet_count_hint > 1 else fmt
+    return output_dir / rel.with_name(f"{rel.stem}.{suffix}")
+
+
+def _load_manifest(path: Path) -> dict:
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return manifest.get("files", {}) if manifest.get("version") == MANIFEST_VERSION else {}
+
+
+def _save_manifest(path: Path, files: dict) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps({"version": MANIFEST_VERSION, "files": files}, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("inputs", nargs="+", help="CSV/xlsx files or directories")
+    parser.add_argument("-o", "--output-dir", required=True, help="where converted files (and the manifest) go")
+    parser.add_argument("--to", default="xlsx", choices=sorted(engine.EXPORT_FORMATS), help="output format (default: xlsx)")
+    parser.add_argument(
+        "--format",
+        action="append",
+        default=[],
+        metavar="COLUMN=PRESET",
+        help=f"column format preset, repeatable; presets: {', '.join(PRESET_IDS)}",
+    )
+    parser.add_argument("--format-file", help='JSON object {"column": "preset"}; --format entries win')
+    parser.add_argument("--sheet", help="only this sheet of xlsx inputs (default: every sheet)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="parallel processes (default: CPU count)")
+    parser.add_argument("-r", "--recursive", action="store_true", help="descend into subdirectories")
+    parser.add_argument("--force", action="store_true", help="convert every input even if the manifest says it is unchanged")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only print failures and the summary")
+    return parser
+
+
+def run(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        spec = parse_format_spec(args.format, args.format_file)
+        inputs = _discover_inputs(args.inputs, args.recursive)
+    except (OSError, ValueError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / MANIFEST_NAME
+    manifest = {} if args.force else _load_manifest(manifest_path)
+    # Anything that changes the output for the same input bytes invalidates the manifest entry.
+    options = hashlib.sha256(json.dumps([args.to, spec, args.sheet], sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    total = len(inputs)
+    done = skipped = failed = 0
+
+    def report(line: str, always: bool = False) -> None:
+        if always or not args.quiet:
+            print(f"[{done + skipped + failed}/{total}] {line}", file=sys.stderr, flush=True)
+
+    def finish(key: str, dst: Path | None, digest: str | None, result: dict | None, error: Exception | None) -> None:
+        nonlocal done, failed
+        if error is not None:
+            failed += 1
+            # No "output": a failed input is never skipped as unchanged.
+            manifest[key] = {"sha256": digest, "options": options, "error": str(error) or error.__class__.__name__}
+            report(f"FAIL {key}: {error}", always=True)
+        else:
+            done += 1
+            manifest[key] = {
+                "sha256": digest,
+                "options": options,
+                "output": dst.relative_to(output_dir).as_posix(),
+                "rows": result["rows"],
+            }
+            report(f"ok   {key} -> {manifest[key]['output']} ({result['rows']:,} rows, {result['seconds']}s)")
+        _save_manifest(manifest_path, manifest)
+
+    pending = {}
+    for path, rel in inputs:
+        key = rel.as_posix()
+        digest = None
+        try:
+            digest = _file_sha256(path)
+            sheet_hint = 1 if args.sheet or path.suffix.lower() == ".csv" else len(_input_sheets(path, None))
+        except Exception as exc:  # an unreadable workbook fails on its own, like a failed conversion
+            finish(key, None, digest, None, exc)
+            continue
+        entry = manifest.get(key) or {}
+        dst = _output_path(output_dir, rel, args.to, sheet_hint)
+        if entry.get("sha256") == digest and entry.get("options") == options and (output_dir / entry.get("output", "")).is_file():
+            skipped += 1
+            report(f"skip {key} (unchanged)")
+            continue
+        pending[key] = (path, dst, digest)
+
+    started = time.perf_counter()
+    if args.jobs <= 1 or len(pending) <= 1:
+        for key, (path, dst, digest) in pending.items():
+            try:
+                result = convert_file(str(path), str(dst), args.to, spec, args.sheet)
+            except Exception as exc:  # one bad partner file must not stop the batch
+                finish(key, dst, digest, None, exc)
+            else:
+                finish(key, dst, digest, result, None)
+    else:
+        with ProcessPoolExecutor(max_workers=min(args.jobs, len(pending))) as pool:
+            futures = {
+                pool.submit(convert_file, str(path), str(dst), args.to, spec, args.sheet): key
+                for key, (path, dst, _) in pending.items()
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                _, dst, digest = pending[key]
+                try:
+                    result = future.result()
+                except Exception as exc:
+                    finish(key, dst, digest, None, exc)
+                else:
+                    finish(key, dst, digest, result, None)
+    elapsed = time.perf_counter() - started
+    print(
+        f"{done} converted, {skipped} unchanged, {failed} failed in {elapsed:.1f}s -> {output_dir}",
+        file=sys.stderr,
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
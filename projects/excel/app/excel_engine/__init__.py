@@ -0,0 +1,79 @@
+"""Sheet parsing, type inference, cell coercion and export, without the web app.
+
+Importing the package is cheap: it does not touch Flask, the upload root or
+any background thread, and numpy/pandas/openpyxl load on first use.
+
+    from projects.excel.app import excel_engine as engine
+
+    df, columns, sheet = engine.load_sheet("orders.xlsx", "Sheet1")
+    item = engine.sheet_item(df, columns, sheet, {"Amount": "decimal_2"})
+    for headers, rows in engine.iter_rows(item):
+        ...
+    engine.write_sheets([item], "orders.csv", "csv")
+
+The viewer's routes call the same functions, so a sheet converted here comes
+out exactly as the workspace export would write it. ``np``/``pd`` are the
+lazy numpy/pandas stand-ins the engine itself uses.
+"""
+
+from __future__ import annotations
+
+from ._lazy import HEAVY_MODULES, np, pd
+from .coercion import COLUMN_FORMAT_PRESETS, PRESET_NUMBER_FORMATS, cell_coercer, coerce_cell
+from .frames import compact_frame, dedupe_headers, display_text, display_values
+from .inference import infer_columns
+from .readers import (
+    ALLOWED_EXTENSIONS,
+    load_sheet,
+    read_csv_smart,
+    sheet_names,
+    xlsx_number_formats,
+    xlsx_shared_strings,
+    xlsx_sheet_refs,
+    xlsx_sheet_stats,
+    xlsx_workbook_parts,
+)
+from .writers import (
+    EXPORT_FORMATS,
+    STREAM_BUFFER_BYTES,
+    XLSX_MIMETYPE,
+    ExportCancelled,
+    build_workbook,
+    iter_export_bytes,
+    iter_rows,
+    sheet_item,
+    write_sheets,
+)
+
+__all__ = [
+    "ALLOWED_EXTENSIONS",
+    "COLUMN_FORMAT_PRESETS",
+    "EXPORT_FORMATS",
+    "HEAVY_MODULES",
+    "PRESET_NUMBER_FORMATS",
+    "STREAM_BUFFER_BYTES",
+    "XLSX_MIMETYPE",
+    "ExportCancelled",
+    "build_workbook",
+    "cell_coercer",
+    "coerce_cell",
+    "compact_frame",
+    "dedupe_headers",
+    "display_text",
+    "display_values",
+    "infer_columns",
+    "iter_export_bytes",
+    "iter_rows",
+    "load_sheet",
+    "np",
+    "pd",
+    "read_csv_smart",
+    "sheet_item",
+    "sheet_names",
+    "write_sheets",
+    "xlsx_number_formats",
+    "xlsx_shared_strings",
+    "xlsx_sheet_refs",
+    "xlsx_sheet_stats",
+    "xlsx_workbook_parts",
+]
@@ -0,0 +1,34 @@
+"""Lazy stand-ins for pandas/numpy so importing the engine (or the app) stays cheap."""
+
+from __future__ import annotations
+
+import importlib
+
+
+class _LazyModule:
+    """Module stand-in that imports the real module on first attribute access.
+
+    pandas/numpy account for most of the import time, so the app, the bench
+    tools and ``watchmedo`` restarts only pay for them once a sheet is parsed.
+    """
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+np = _LazyModule("numpy")
+pd = _LazyModule("pandas")
+HEAVY_MODULES = ("numpy", "pandas", "openpyxl", "openpyxl.styles", "openpyxl.utils.datetime")
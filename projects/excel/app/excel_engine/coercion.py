@@ -0,0 +1,176 @@
+"""Cell coercion for export: shown text -> typed value plus number format, per column preset."""
+
+from __future__ import annotations
+
+import functools
+from datetime import datetime
+
+from ._lazy import pd
+from .frames import _normalize_cell_text
+
+COLUMN_FORMAT_PRESETS = (
+    {"id": "original", "label_key": "format_original"},
+    {"id": "text", "label_key": "format_text"},
+    {"id": "general", "label_key": "format_general"},
+    {"id": "integer", "label_key": "format_integer"},
+    {"id": "decimal_2", "label_key": "format_decimal_2"},
+    {"id": "percent_2", "label_key": "format_percent_2"},
+    {"id": "date_dmy", "label_key": "format_date_dmy"},
+    {"id": "date_mdy", "label_key": "format_date_mdy"},
+    {"id": "date_ymd", "label_key": "format_date_ymd"},
+    {"id": "datetime_dmy_hm", "label_key": "format_datetime_dmy_hm"},
+)
+PRESET_NUMBER_FORMATS = {
+    "text": "@",
+    "general": "General",
+    "integer": "0",
+    "decimal_2": "0.00",
+    "percent_2": "0.00%",
+    "date_dmy": "dd-mm-yyyy",
+    "date_mdy": "mm-dd-yyyy",
+    "date_ymd": "yyyy-mm-dd",
+    "datetime_dmy_hm": "dd-mm-yyyy hh:mm",
+}
+
+
+def _parse_numeric_value(raw_value, allow_percent: bool = False):
+    text = _normalize_cell_text(raw_value).strip()
+    if not text:
+        return None
+    normalized = text.replace(",", "").replace(" ", "")
+    is_percent = normalized.endswith("%")
+    if is_percent:
+        normalized = normalized[:-1]
+    try:
+        number = float(normalized)
+    except ValueError:
+        return None
+    if allow_percent:
+        if is_percent or abs(number) > 1:
+            return number / 100
+        return number
+    if number.is_integer():
+        return int(number)
+    return number
+
+
+_EXPLICIT_DATE_FORMATS = ["%d-%m-%Y", "%d/%m/%Y", "%Y-%m-%d", "%m-%d-%Y", "%m/%d/%Y"]
+_EXPLICIT_DATETIME_FORMATS = [
+    "%d-%m-%Y %H:%M",
+    "%d/%m/%Y %H:%M",
+    "%Y-%m-%d %H:%M",
+    "%m-%d-%Y %H:%M",
+    "%m/%d/%Y %H:%M",
+    "%d-%m-%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M:%S",
+    "%Y-%m-%d %H:%M:%S",
+    "%m-%d-%Y %H:%M:%S",
+    "%m/%d/%Y %H:%M:%S",
+]
+_DATETIME_FORMAT_ORDER = {
+    True: _EXPLICIT_DATETIME_FORMATS + _EXPLICIT_DATE_FORMATS,
+    False: _EXPLICIT_DATETIME_FORMATS[2:] + _EXPLICIT_DATETIME_FORMATS[:2] + _EXPLICIT_DATE_FORMATS[2:] + _EXPLICIT_DATE_FORMATS[:2],
+}
+
+
+def _parse_datetime_value(raw_value, prefer_dayfirst: bool) -> datetime | None:
+    text = _normalize_cell_text(raw_value).strip()
+    if not text:
+        return None
+    return _parse_datetime_text(text, prefer_dayfirst)
+
+
+@functools.lru_cache(maxsize=65536)
+def _parse_datetime_text(text: str, prefer_dayfirst: bool) -> datetime | None:
+    # Exports repeat the same dates many times; the cache keeps strptime off the hot path.
+    # A format can only match when its separator and colon count are present, so the
+    # others are skipped without changing which format wins.
+    colons = text.count(":")
+    for fmt in _DATETIME_FORMAT_ORDER[prefer_dayfirst]:
+        if fmt[2] not in text or fmt.count(":") != colons:
+            continue
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    parsed = pd.to_datetime(text, errors="coerce", dayfirst=prefer_dayfirst)
+    if pd.isna(parsed):
+        parsed = pd.to_datetime(text, errors="coerce", dayfirst=not prefer_dayfirst)
+    if pd.isna(parsed):
+        return None
+    return parsed.to_pydatetime()
+
+
+def coerce_cell(raw_value, column_meta: dict | None) -> tuple[object, str]:
+    """``(value, number_format)`` for one shown cell under its column's metadata and ``selected_preset``."""
+    text = _normalize_cell_text(raw_value)
+    trimmed = text.strip()
+    preset = (column_meta or {}).get("selected_preset") or "original"
+    source_type = (column_meta or {}).get("source_type") or "text"
+    original_number_format = (column_meta or {}).get("original_number_format") or "General"
+
+    if trimmed == "":
+        return "", PRESET_NUMBER_FORMATS.get(preset, original_number_format)
+
+    if preset == "text":
+        return text, PRESET_NUMBER_FORMATS["text"]
+
+    if preset == "general":
+        parsed_number = _parse_numeric_value(trimmed)
+        return (parsed_number, "General") if parsed_number is not None else (text, "General")
+
+    if preset in {"integer", "decimal_2"}:
+        parsed_number = _parse_numeric_value(trimmed)
+        if parsed_number is None:
+            return text, PRESET_NUMBER_FORMATS[preset]
+        if preset == "integer":
+            parsed_number = int(round(float(parsed_number)))
+        return parsed_number, PRESET_NUMBER_FORMATS[preset]
+
+    if preset == "percent_2":
+        parsed_number = _parse_numeric_value(trimmed, allow_percent=True)
+        return (parsed_number, PRESET_NUMBER_FORMATS[preset]) if parsed_number is not None else (text, PRESET_NUMBER_FORMATS[preset])
+
+    if preset in {"date_dmy", "date_mdy", "date_ymd", "datetime_dmy_hm"}:
+        prefer_dayfirst = preset in {"date_dmy", "datetime_dmy_hm"}
+        parsed_dt = _parse_datetime_value(trimmed, prefer_dayfirst=prefer_dayfirst)
+        if parsed_dt is None:
+            return text, PRESET_NUMBER_FORMATS[preset]
+        if preset == "datetime_dmy_hm":
+            return parsed_dt, PRESET_NUMBER_FORMATS[preset]
+        return parsed_dt.date(), PRESET_NUMBER_FORMATS[preset]
+
+    if source_type in {"integer", "decimal", "currency"}:
+        parsed_number = _parse_numeric_value(trimmed)
+        return (parsed_number, original_number_format) if parsed_number is not None else (text, original_number_format)
+
+    if source_type == "percent":
+        parsed_number = _parse_numeric_value(trimmed, allow_percent=True)
+        return (parsed_number, original_number_format) if parsed_number is not None else (text, original_number_format)
+
+    if source_type in {"date", "datetime"}:
+        parsed_dt = _parse_datetime_value(trimmed, prefer_dayfirst=True)
+        if parsed_dt is None:
+            return text, original_number_format
+        if source_type == "datetime":
+            return parsed_dt, original_number_format
+        return parsed_dt.date(), original_number_format
+
+    if source_type == "boolean":
+        lowered = trimmed.lower()
+        if lowered in {"true", "yes", "1"}:
+            return True, "General"
+        if lowered in {"false", "no", "0"}:
+            return False, "General"
+
+    return text, original_number_format
+
+
+def cell_coercer(column_meta: dict | None):
+    """Per-column ``raw -> value`` function; plain text columns skip ``coerce_cell`` entirely."""
+    column_meta = column_meta or {}
+    preset = column_meta.get("selected_preset") or "original"
+    source_type = column_meta.get("source_type") or "text"
+    if preset == "text" or (preset == "original" and source_type == "text"):
+        return _normalize_cell_text
+    return lambda raw_value: coerce_cell(raw_value, column_meta)[0]
\ No newline at end of file
@@ -0,0 +1,100 @@
+"""Sheet frames: compact dtypes after parsing and the display text shown for cells."""
+
+from __future__ import annotations
+
+from ._lazy import np, pd
+
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+
+def _normalize_cell_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and pd.isna(value):
+        return ""
+    return str(value)
+
+
+def _compact_series(series: pd.Series) -> pd.Series:
+    if series.dtype == object or isinstance(series.dtype, pd.StringDtype):
+        kind = pd.api.types.infer_dtype(series, skipna=True)
+        if kind == "string":
+            non_null = int(series.notna().sum())
+            if non_null and series.nunique(dropna=True) <= non_null * CATEGORY_MAX_UNIQUE_RATIO:
+                return series.astype("category")
+            try:
+                # Arrow strings keep text in one UTF-8 buffer instead of one Python object per cell.
+                return series.astype("string[pyarrow]")
+            except ImportError:
+                return series
+        if kind == "boolean":
+            return series.astype("boolean")
+        if kind in {"integer", "floating", "mixed-integer-float"}:
+            series = pd.to_numeric(series)
+        else:
+            return series
+    if pd.api.types.is_float_dtype(series.dtype):
+        valid = series.dropna()
+        if valid.empty or not (valid == valid.round()).all() or valid.abs().max() >= 2**53:
+            return series
+        series = series.astype("Int64")
+    if pd.api.types.is_integer_dtype(series.dtype):
+        valid = series.dropna()
+        if valid.empty:
+            return series
+        lo, hi = int(valid.min()), int(valid.max())
+        nullable = pd.api.types.is_extension_array_dtype(series.dtype)
+        for candidate in ("int8", "int16", "int32"):
+            info = np.iinfo(candidate)
+            if info.min <= lo and hi <= info.max:
+                return series.astype(candidate.capitalize() if nullable else candidate)
+    return series
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Typed, memory-compact sheet: native dtypes with pandas' null mask instead of ``fillna("")``.
+
+    Integral float columns become nullable integers, repetitive text becomes
+    categorical, other text is Arrow-backed when pyarrow is installed, and
+    blanks stay missing values; display strings are produced only when
+    rendering (``_iter_table_html``).
+    """
+    return pd.DataFrame({i: _compact_series(df.iloc[:, i]) for i in range(df.shape[1])}).set_axis(df.columns, axis=1)
+
+
+def dedupe_headers(values: list) -> list:
+    """Header names the way pandas builds them: blanks become "Unnamed: i", repeats get ".1", ".2"."""
+    names = [f"Unnamed: {i}" if value is None else value for i, value in enumerate(values)]
+    counts: dict = {}
+    for i, name in enumerate(names):
+        count = counts.get(name, 0)
+        while count > 0:
+            counts[name] = count + 1
+            name = f"{name}.{count}"
+            count = counts.get(name, 0)
+        names[i] = name
+        counts[name] = count + 1
+    return names
+
+
+def display_text(value) -> str:
+    """A header or cell value as text; missing values (None, NaN, NaT, NA) become ""."""
+    if value is None or value is pd.NaT or value is pd.NA:
+        return ""
+    if isinstance(value, float) and value != value:
+        return ""
+    return str(value)
+
+
+def display_values(series: pd.Series) -> list[str]:
+    """Cells of a column as the workspace shows them (dates without a midnight time part, blanks as "")."""
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        valid = series.dropna()
+        # Same rule as DataFrame.to_html: drop the time part when every value is midnight.
+        date_only = valid.empty or bool((valid == valid.dt.normalize()).all())
+        text = series.dt.strftime("%Y-%m-%d" if date_only else "%Y-%m-%d %H:%M:%S")
+        return text.where(series.notna(), "").tolist()
+    if pd.api.types.is_integer_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+        # Same text as str() per cell, converted in one pass; nullable columns show <NA> as "".
+        return series.astype("string").fillna("").tolist()
+    return [display_text(value) for value in series.tolist()]
\ No newline at end of file
@@ -0,0 +1,148 @@
+"""Column type inference: ``source_type`` and original number format per column."""
+
+from __future__ import annotations
+
+from collections import Counter
+from datetime import date, datetime
+from pathlib import Path
+
+from ._lazy import pd
+from .frames import _normalize_cell_text
+
+
+def _looks_like_datetime_format(fmt: str) -> bool:
+    fmt_lower = (fmt or "").lower()
+    return any(token in fmt_lower for token in ("h", "s", "am/pm"))
+
+
+def _looks_like_date_format(fmt: str) -> bool:
+    fmt_lower = (fmt or "").lower()
+    return any(token in fmt_lower for token in ("d", "m", "y")) and not any(
+        token in fmt_lower for token in ("0.00%", "#,##0", "@")
+    )
+
+
+def _infer_excel_cell_type(cell) -> str:
+    return _infer_excel_value_type(cell.value, cell.number_format or "", cell.is_date)
+
+
+def _infer_excel_value_type(value, fmt: str, is_date: bool = False) -> str:
+    if value is None:
+        return ""
+    if is_date or isinstance(value, datetime):
+        return "datetime" if _looks_like_datetime_format(fmt) else "date"
+    if isinstance(value, date):
+        return "date"
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        fmt_lower = fmt.lower()
+        if "%" in fmt:
+            return "percent"
+        if "[$" in fmt_lower or any(symbol in fmt for symbol in ("$", "€", "£", "¥", "₫")):
+            return "currency"
+        if isinstance(value, int) or (isinstance(value, float) and float(value).is_integer()):
+            return "integer"
+        return "decimal"
+    return "text"
+
+
+def _infer_series_type(series: pd.Series) -> str:
+    if series.empty:
+        return "text"
+    dtype = str(series.dtype).lower()
+    if "datetime" in dtype:
+        return "datetime"
+    if "int" in dtype:
+        return "integer"
+    if "float" in dtype or "double" in dtype:
+        return "decimal"
+    if "bool" in dtype:
+        return "boolean"
+    return "text"
+
+
+def _default_format_for_type(source_type: str) -> str:
+    return {
+        "date": "dd-mm-yyyy",
+        "datetime": "dd-mm-yyyy hh:mm",
+        "integer": "0",
+        "decimal": "0.00",
+        "percent": "0.00%",
+        "currency": "#,##0.00",
+        "text": "@",
+    }.get(source_type, "General")
+
+
+def _build_csv_column_metadata(df: pd.DataFrame) -> list[dict]:
+    metadata = []
+    for column_name in df.columns:
+        series = df[column_name] if column_name in df else pd.Series(dtype="object")
+        source_type = _infer_series_type(series)
+        metadata.append(
+            {
+                "header": _normalize_cell_text(column_name),
+                "source_type": source_type,
+                "original_number_format": _default_format_for_type(source_type),
+                "selected_preset": "original",
+            }
+        )
+    return metadata
+
+
+def _build_excel_column_metadata(path: Path, sheet_name: str, df: pd.DataFrame) -> list[dict]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, data_only=False, read_only=True)
+    try:
+        sheet = workbook[sheet_name]
+        column_count = len(df.columns)
+        source_type_buckets: list[list[str]] = [[] for _ in range(column_count)]
+        number_format_buckets: list[list[str]] = [[] for _ in range(column_count)]
+
+        # Read-only worksheets are efficient when streamed row-by-row, but very slow
+        # with repeated random-access `sheet.cell(...)` lookups.
+        # Only the rows that were parsed into ``df`` (a preview stops early).
+        for row in sheet.iter_rows(min_row=2, max_row=len(df) + 1, max_col=column_count):
+            for col_idx, cell in enumerate(row):
+                if cell.value is None:
+                    continue
+                cell_type = _infer_excel_cell_type(cell)
+                if cell_type:
+                    source_type_buckets[col_idx].append(cell_type)
+                fmt = cell.number_format or ""
+                if fmt and fmt != "General":
+                    number_format_buckets[col_idx].append(fmt)
+
+        metadata: list[dict] = []
+        for col_idx, column_name in enumerate(df.columns, start=1):
+            source_types = source_type_buckets[col_idx - 1]
+            number_formats = number_format_buckets[col_idx - 1]
+            source_type = Counter(source_types).most_common(1)[0][0] if source_types else _infer_series_type(df.iloc[:, col_idx - 1])
+            original_number_format = (
+                Counter(number_formats).most_common(1)[0][0]
+                if number_formats
+                else _default_format_for_type(source_type)
+            )
+            metadata.append(
+                {
+                    "header": _normalize_cell_text(column_name),
+                    "source_type": source_type,
+                    "original_number_format": original_number_format,
+                    "selected_preset": "original",
+                }
+            )
+        return metadata
+    finally:
+        workbook.close()
+
+
+def infer_columns(df: pd.DataFrame, path: Path | str | None = None, sheet_name: str | None = None) -> list[dict]:
+    """Column metadata (``header``, ``source_type``, ``original_number_format``) of a parsed sheet.
+
+    With an xlsx ``path`` the workbook's cell types and number formats are
+    read; otherwise the types are inferred from the values (CSV).
+    """
+    if path is not None and Path(path).suffix.lower() == ".xlsx":
+        return _build_excel_column_metadata(Path(path), sheet_name, df)
+    return _build_csv_column_metadata(df)
@@ -0,0 +1,506 @@
+"""Sheet readers: CSV with encoding/delimiter detection and a streaming xlsx reader."""
+
+from __future__ import annotations
+
+import codecs
+import csv
+import logging
+import os
+import posixpath
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+from collections import Counter, defaultdict
+from collections.abc import Callable
+from datetime import datetime, time as dt_time, timedelta
+from io import StringIO
+from pathlib import Path
+
+from ._lazy import np, pd
+from .frames import _normalize_cell_text, compact_frame, dedupe_headers
+from .inference import (
+    _build_csv_column_metadata,
+    _build_excel_column_metadata,
+    _default_format_for_type,
+    _infer_excel_value_type,
+    _infer_series_type,
+)
+
+logger = logging.getLogger("excel_viewer.engine")
+
+# xlsx parser: "fast" reads the zip/XML parts directly (falling back to openpyxl
+# for sheets it does not handle), "openpyxl" always goes through pandas/openpyxl.
+XLSX_READER = os.getenv("XLSX_READER", "fast").strip().lower()
+ALLOWED_EXTENSIONS = {"xlsx", "csv"}
+CSV_ENCODINGS = ("utf-8-sig", "utf-8", "cp1258", "cp1252", "latin1")
+CSV_DELIMITERS = [",", ";", "\t", "|"]
+CSV_SNIFF_BYTES = 64 * 1024  # head sample for encoding/delimiter detection
+XLSX_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+XLSX_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+# Parse progress callbacks get ``(stage, rows)``: "parse" every PROGRESS_EVERY_ROWS
+# rows read, then "infer" once the column metadata is being built.
+ProgressCallback = Callable[[str, int], None]
+PROGRESS_EVERY_ROWS = 10_000
+_DIMENSION_RE = re.compile(r'<(?:\w+:)?dimension ref="([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?"')
+
+
+def _sniff_csv_delimiter(text: str) -> str | None:
+    try:
+        dialect = csv.Sniffer().sniff(text, delimiters=CSV_DELIMITERS)
+        return dialect.delimiter
+    except csv.Error:
+        return None
+
+
+def _widest_csv_delimiter(text: str, complete: bool) -> str:
+    """The candidate delimiter that splits the head sample into the most columns."""
+    if not complete:
+        text = text[: text.rfind("\n") + 1] or text  # drop the line cut at the sample boundary
+    best, best_width = CSV_DELIMITERS[0], -1
+    for delimiter in CSV_DELIMITERS:
+        try:
+            width = len(pd.read_csv(StringIO(text), sep=delimiter).columns)
+        except Exception:
+            continue
+        if width > best_width:
+            best, best_width = delimiter, width
+    return best
+
+
+def read_csv_smart(path: Path, nrows: int | None = None, skiprows: int = 0) -> tuple[pd.DataFrame, dict[str, str]]:
+    """Read a CSV, detecting encoding and delimiter from its first ``CSV_SNIFF_BYTES``.
+
+    The file itself is parsed by a single ``read_csv`` call with ``nrows`` /
+    ``skiprows``, so a preview stops reading after its rows. An encoding that
+    decodes the head but fails further into the file falls through to the next
+    candidate.
+    """
+    with open(path, "rb") as fh:
+        head = fh.read(CSV_SNIFF_BYTES)
+        complete = not fh.read(1)
+    skip = range(1, skiprows + 1) if skiprows else None
+    last_error: Exception | None = None
+
+    for encoding in CSV_ENCODINGS:
+        try:
+            # Incremental decoding tolerates a multi-byte character cut at the sample end.
+            text = codecs.getincrementaldecoder(encoding)().decode(head, final=complete)
+        except UnicodeDecodeError as exc:
+            last_error = exc
+            continue
+
+        detected = _sniff_csv_delimiter(text) or _widest_csv_delimiter(text, complete)
+        candidates = [detected] + [d for d in CSV_DELIMITERS if d != detected]
+        for delimiter in candidates:
+            try:
+                df = pd.read_csv(path, sep=delimiter, encoding=encoding, nrows=nrows, skiprows=skip)
+            except UnicodeDecodeError as exc:
+                last_error = exc
+                break
+            except Exception as exc:
+                last_error = exc
+                continue
+            return df, {"encoding": encoding, "delimiter": delimiter}
+
+    raise last_error or ValueError("Could not read CSV file")
+
+
+def xlsx_workbook_parts(zf: zipfile.ZipFile) -> dict:
+    """Worksheet part per sheet name plus the shared-strings/styles parts and the date system."""
+    workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    targets: dict[str, str] = {}
+    parts = {"sheets": {}, "shared_strings": None, "styles": None, "date1904": False}
+    for rel in rels:
+        target = rel.get("Target") or ""
+        target = posixpath.normpath(target.lstrip("/") if target.startswith("/") else f"xl/{target}")
+        targets[rel.get("Id")] = target
+        rel_type = (rel.get("Type") or "").rsplit("/", 1)[-1]
+        if rel_type == "sharedStrings":
+            parts["shared_strings"] = target
+        elif rel_type == "styles":
+            parts["styles"] = target
+    for sheet in workbook.iter(f"{{{XLSX_MAIN_NS}}}sheet"):
+        target = targets.get(sheet.get(f"{{{XLSX_REL_NS}}}id"))
+        if target:
+            parts["sheets"][sheet.get("name")] = target
+    workbook_pr = workbook.find(f"{{{XLSX_MAIN_NS}}}workbookPr")
+    if workbook_pr is not None:
+        parts["date1904"] = workbook_pr.get("date1904", "0").lower() in {"1", "true"}
+    return parts
+
+
+def _xlsx_sheet_members(zf: zipfile.ZipFile) -> dict[str, str]:
+    """Map sheet names to their worksheet part inside an xlsx zip."""
+    return xlsx_workbook_parts(zf)["sheets"]
+
+
+def xlsx_sheet_stats(path: Path | str, sheet_name: str | None = None) -> dict | None:
+    """``member``, ``xml_bytes``, ``zip_bytes``, ``rows`` and ``columns`` of a sheet without parsing it.
+
+    Read from the zip headers and the sheet's ``<dimension>``; ``rows``/``columns``
+    are ``None`` when the sheet has no dimension, and the result is ``None``
+    when the file or sheet cannot be read.
+    """
+    try:
+        with zipfile.ZipFile(path) as zf:
+            members = _xlsx_sheet_members(zf)
+            if not members:
+                return None
+            member = members.get(sheet_name) if sheet_name else next(iter(members.values()))
+            if not member:
+                return None
+            info = zf.getinfo(member)
+            with zf.open(member) as fh:
+                head = fh.read(8192).decode("utf-8", errors="ignore")
+    except (zipfile.BadZipFile, KeyError, ET.ParseError, OSError):
+        return None
+    rows = columns = None
+    match = _DIMENSION_RE.search(head)
+    if match:
+        from openpyxl.utils import column_index_from_string
+
+        last_col, last_row = match.group(3) or match.group(1), match.group(4) or match.group(2)
+        rows = int(last_row)
+        columns = column_index_from_string(last_col)
+    return {"member": member, "xml_bytes": info.file_size, "zip_bytes": info.compress_size, "rows": rows, "columns": columns}
+
+
+class _FastXlsxUnsupported(Exception):
+    """The sheet uses something the fast reader leaves to pandas/openpyxl."""
+
+
+_XLSX_T = f"{{{XLSX_MAIN_NS}}}t"
+_XLSX_R = f"{{{XLSX_MAIN_NS}}}r"
+_XLSX_V = f"{{{XLSX_MAIN_NS}}}v"
+_XLSX_IS = f"{{{XLSX_MAIN_NS}}}is"
+_XLSX_ROW = f"{{{XLSX_MAIN_NS}}}row"
+_XLSX_SHEET_DATA = f"{{{XLSX_MAIN_NS}}}sheetData"
+
+
+def _xlsx_rich_text(node) -> str:
+    # <si>/<is> hold plain <t> or rich-text runs <r><t>; phonetic <rPh> runs are not cell text.
+    parts = []
+    for child in node:
+        if child.tag == _XLSX_T:
+            parts.append(child.text or "")
+        elif child.tag == _XLSX_R:
+            parts.append(child.findtext(_XLSX_T) or "")
+    return "".join(parts)
+
+
+def xlsx_shared_strings(zf: zipfile.ZipFile, member: str | None) -> list[str]:
+    if not member or member not in zf.NameToInfo:
+        return []
+    strings: list[str] = []
+    with zf.open(member) as fh:
+        for _, elem in ET.iterparse(fh):
+            if elem.tag == f"{{{XLSX_MAIN_NS}}}si":
+                strings.append(_xlsx_rich_text(elem).replace("x005F_", ""))
+                elem.clear()
+    return strings
+
+
+def _xlsx_cell_formats(zf: zipfile.ZipFile, member: str | None) -> tuple[list[str], set[int], set[int]]:
+    """Number format code per cell style index, plus the date and duration style indexes."""
+    from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+
+    if not member or member not in zf.NameToInfo:
+        return [], set(), set()
+    styles = ET.fromstring(zf.read(member))
+    custom = {
+        int(fmt.get("numFmtId")): fmt.get("formatCode") or "General"
+        for fmt in styles.iter(f"{{{XLSX_MAIN_NS}}}numFmt")
+    }
+    formats: list[str] = []
+    cell_xfs = styles.find(f"{{{XLSX_MAIN_NS}}}cellXfs")
+    for xf in cell_xfs if cell_xfs is not None else []:
+        fmt_id = int(xf.get("numFmtId", 0))
+        formats.append(custom.get(fmt_id) or BUILTIN_FORMATS.get(fmt_id, "General"))
+    date_styles = {idx for idx, fmt in enumerate(formats) if is_date_format(fmt)}
+    timedelta_styles = {idx for idx, fmt in enumerate(formats) if is_timedelta_format(fmt)}
+    return formats, date_styles, timedelta_styles
+
+
+# One value per Python class the fast reader produces; cell type inference only looks at the class.
+_EXCEL_KIND_SAMPLES = {
+    str: "",
+    int: 0,
+    float: 0.5,
+    bool: False,
+    datetime: datetime(2000, 1, 1),
+    dt_time: dt_time(),
+    timedelta: timedelta(),
+}
+
+
+def _excel_number(text: str):
+    # Same rule as pandas' openpyxl reader: integral numbers come back as int.
+    if "." in text or "e" in text or "E" in text:
+        number = float(text)
+        return int(number) if number.is_integer() else number
+    return int(text)
+
+
+def _read_xlsx_fast(
+    path: Path,
+    sheet_name: str | None = None,
+    nrows: int | None = None,
+    skiprows: int = 0,
+    with_metadata: bool = True,
+    progress: ProgressCallback | None = None,
+) -> tuple[pd.DataFrame, list[dict], str]:
+    """Parse one sheet straight from the xlsx zip into column buffers.
+
+    Streams the worksheet XML with ``iterparse`` and drops each ``<row>`` once
+    read, so memory grows with the parsed values rather than with per-cell
+    objects. Cell values follow ``pd.read_excel`` (header row, blank-row
+    trimming, ``nrows``/``skiprows`` windows) and column metadata is collected
+    in the same pass from the style number formats. Raises
+    ``_FastXlsxUnsupported`` for sheets that should go through openpyxl.
+    """
+    from openpyxl.utils import column_index_from_string
+    from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel
+
+    try:
+        zf = zipfile.ZipFile(path)
+    except zipfile.BadZipFile as exc:
+        raise _FastXlsxUnsupported(str(exc)) from exc
+    with zf:
+        try:
+            parts = xlsx_workbook_parts(zf)
+        except (KeyError, ET.ParseError) as exc:
+            raise _FastXlsxUnsupported(str(exc)) from exc
+        target_sheet = sheet_name or next(iter(parts["sheets"]), None)
+        member = parts["sheets"].get(target_sheet)
+        if member is None or member not in zf.NameToInfo:
+            raise _FastXlsxUnsupported(f"sheet not found: {target_sheet}")
+        shared_strings = xlsx_shared_strings(zf, parts["shared_strings"])
+        formats, date_styles, timedelta_styles = _xlsx_cell_formats(zf, parts["styles"])
+        epoch = CALENDAR_MAC_1904 if parts["date1904"] else CALENDAR_WINDOWS_1900
+
+        first = skiprows
+        stop = skiprows + nrows if nrows is not None else None
+        header: dict[int, object] | None = None
+        columns: list[list] = []
+        # Per column, how many cells share a (value class, style, is date) kind; the
+        # source type and number format only depend on that, so they are resolved once.
+        cell_kinds: defaultdict[int, Counter] = defaultdict(Counter)
+        width = 0
+        used_rows = 0
+        column_cache: dict[str, int] = {}
+        expected_row = 1
+        sheet_data = None
+
+        with zf.open(member) as fh:
+            for event, elem in ET.iterparse(fh, events=("start", "end")):
+                if event == "start":
+                    if elem.tag == _XLSX_SHEET_DATA:
+                        sheet_data = elem
+                    continue
+                if elem.tag != _XLSX_ROW:
+                    continue
+                row_number = int(elem.get("r") or expected_row)
+                expected_row = row_number + 1
+                if header is None and row_number != 1:
+                    raise _FastXlsxUnsupported("sheet does not start on row 1")
+                data_index = row_number - 2
+                if stop is not None and data_index >= stop:
+                    break
+                collect = with_metadata and row_number > 1 and data_index >= first
+
+                col_idx = -1
+                row_values: list[tuple[int, object]] = []
+                for cell in elem:
+                    ref = cell.get("r")
+                    if ref:
+                        letters = ref.rstrip("0123456789")
+                        col_idx = column_cache.get(letters)
+                        if col_idx is None:
+                            col_idx = column_cache[letters] = column_index_from_string(letters) - 1
+                    else:
+                        col_idx += 1
+                    cell_type = cell.get("t", "n")
+                    if cell_type == "inlineStr":
+                        node = cell.find(_XLSX_IS)
+                        value = _xlsx_rich_text(node) if node is not None else None
+                    else:
+                        value = cell.findtext(_XLSX_V)
+                    if not value:
+                        continue
+                    style = int(cell.get("s", 0))
+                    is_date = False
+                    if cell_type == "n":
+                        value = _excel_number(value)
+                        if style in date_styles:
+                            try:
+                                value = from_excel(value, epoch, timedelta=style in timedelta_styles)
+                            except (OverflowError, ValueError) as exc:
+                                raise _FastXlsxUnsupported(str(exc)) from exc
+                            is_date = True
+                    elif cell_type == "s":
+                        value = shared_strings[int(value)]
+                        if not value:
+                            continue
+                    elif cell_type == "b":
+                        value = value not in {"0", "false"}
+                    elif cell_type == "e":
+                        # Error cells (#N/A, #DIV/0!) read as missing values, like pandas.
+                        if collect:
+                            cell_kinds[col_idx][(str, style, False)] += 1
+                        row_values.append((col_idx, np.nan))
+                        continue
+                    elif cell_type not in {"str", "inlineStr"}:
+                        raise _FastXlsxUnsupported(f"cell type {cell_type!r}")
+                    row_values.append((col_idx, value))
+                    if collect:
+                        cell_kinds[col_idx][(value.__class__, style, is_date)] += 1
+                elem.clear()
+                if sheet_data is not None:
+                    # Drop the finished row so the tree never holds more than one.
+                    sheet_data.clear()
+
+                if row_values:
+                    width = max(width, max(idx for idx, _ in row_values) + 1)
+                if header is None:
+                    header = dict(row_values)
+                    continue
+                if data_index < first or not row_values:
+                    continue
+                out_index = data_index - first
+                for idx, value in row_values:
+                    while len(columns) <= idx:
+                        columns.append([])
+                    column = columns[idx]
+                    if len(column) < out_index:
+                        column.extend([None] * (out_index - len(column)))
+                    column.append(value)
+                used_rows = out_index + 1
+                if progress is not None and used_rows % PROGRESS_EVERY_ROWS == 0:
+                    progress("parse", used_rows)
+
+        if header is None:
+            raise _FastXlsxUnsupported("empty sheet")
+
+    data = {}
+    for idx in range(width):
+        values = columns[idx] if idx < len(columns) else []
+        values.extend([None] * (used_rows - len(values)))
+        if any(value is not None for value in values):
+            data[idx] = pd.Series(values)
+        else:
+            data[idx] = pd.Series(np.nan, index=range(used_rows), dtype="float64")
+    headers = dedupe_headers([header.get(idx) for idx in range(width)])
+    df = compact_frame(pd.DataFrame(data, index=range(used_rows)).set_axis(headers, axis=1))
+    if not with_metadata:
+        return df, [], target_sheet
+    if progress is not None:
+        progress("infer", len(df))
+
+    metadata: list[dict] = []
+    for idx, column_name in enumerate(df.columns):
+        types: Counter = Counter()
+        fmts: Counter = Counter()
+        for (value_class, style, is_date), count in cell_kinds.get(idx, Counter()).items():
+            fmt = formats[style] if style < len(formats) else "General"
+            sample = _EXCEL_KIND_SAMPLES.get(value_class, "")
+            types[_infer_excel_value_type(sample, fmt, is_date)] += count
+            if fmt != "General":
+                fmts[fmt] += count
+        source_type = types.most_common(1)[0][0] if types else _infer_series_type(df.iloc[:, idx])
+        metadata.append(
+            {
+                "header": _normalize_cell_text(column_name),
+                "source_type": source_type,
+                "original_number_format": fmts.most_common(1)[0][0] if fmts else _default_format_for_type(source_type),
+                "selected_preset": "original",
+            }
+        )
+    return df, metadata, target_sheet
+
+
+def sheet_names(path: Path | str) -> list[str]:
+    """Sheet names of an xlsx workbook in workbook order; ``[]`` for CSV."""
+    path = Path(path)
+    if path.suffix.lower() == ".csv":
+        return []
+    with zipfile.ZipFile(path) as zf:
+        return list(xlsx_workbook_parts(zf)["sheets"])
+
+
+def load_sheet(
+    path: Path | str,
+    sheet_name: str | None = None,
+    *,
+    nrows: int | None = None,
+    skiprows: int = 0,
+    with_metadata: bool = True,
+    filename: str | None = None,
+    progress: ProgressCallback | None = None,
+) -> tuple[pd.DataFrame, list[dict], str | None]:
+    """Parse one sheet (the first when unnamed) into ``(frame, column_metadata, sheet_name)``.
+
+    ``nrows``/``skiprows`` select a window of data rows below the header.
+    ``filename`` gives the extension when ``path`` has none (e.g. temp files).
+    ``progress(stage, rows)`` is called with ``("parse", rows)`` while reading
+    (per ``PROGRESS_EVERY_ROWS`` rows on the fast xlsx path) and
+    ``("infer", rows)`` before column metadata is built.
+    """
+    path = Path(path)
+    filename = filename or path.name
+    ext = filename.rsplit(".", 1)[1].lower()
+    if progress is not None:
+        progress("parse", 0)
+    if ext == "csv":
+        df, _ = read_csv_smart(path, nrows=nrows, skiprows=skiprows)
+        df = compact_frame(df)
+        if not with_metadata:
+            return df, [], None
+        if progress is not None:
+            progress("infer", len(df))
+        return df, _build_csv_column_metadata(df), None
+
+    if XLSX_READER == "fast":
+        try:
+            return _read_xlsx_fast(
+                path, sheet_name, nrows=nrows, skiprows=skiprows, with_metadata=with_metadata, progress=progress
+            )
+        except _FastXlsxUnsupported as exc:
+            logger.info("Fast xlsx reader fell back to openpyxl for %s: %s", filename, exc)
+
+    xls = pd.ExcelFile(path)
+    target_sheet = sheet_name or (xls.sheet_names[0] if xls.sheet_names else None)
+    if not target_sheet:
+        raise ValueError("No sheets found in the workbook.")
+    skip = range(1, skiprows + 1) if skiprows else None
+    df = compact_frame(xls.parse(target_sheet, nrows=nrows, skiprows=skip))
+    if not with_metadata:
+        return df, [], target_sheet
+    if progress is not None:
+        progress("infer", len(df))
+    column_metadata = _build_excel_column_metadata(path, target_sheet, df)
+    return df, column_metadata, target_sheet
+
+
+def xlsx_number_formats(zf: zipfile.ZipFile, member: str | None) -> list[str]:
+    """Number format code per cell style index."""
+    return _xlsx_cell_formats(zf, member)[0]
+
+
+def xlsx_sheet_refs(zf: zipfile.ZipFile, member: str) -> tuple[set[int], set[int]]:
+    """Shared-string indexes and style indexes a worksheet part refers to."""
+    strings: set[int] = set()
+    styles: set[int] = {0}
+    c_tag = f"{{{XLSX_MAIN_NS}}}c"
+    with zf.open(member) as fh:
+        for _, elem in ET.iterparse(fh):
+            if elem.tag == c_tag:
+                styles.add(int(elem.get("s", 0)))
+                if elem.get("t") == "s":
+                    value = elem.findtext(_XLSX_V)
+                    if value:
+                        strings.add(int(value))
+                elem.clear()
+            elif elem.tag == _XLSX_ROW:
+                elem.clear()
+    return strings, styles
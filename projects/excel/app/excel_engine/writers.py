@@ -0,0 +1,409 @@
+"""Export writers: write-only xlsx workbooks and streamed csv/jsonl/parquet (zip for several sheets)."""
+
+from __future__ import annotations
+
+import csv
+import json
+import pickle
+import re
+import tempfile
+import zipfile
+from datetime import date, datetime
+from io import StringIO
+from typing import TYPE_CHECKING
+
+from .coercion import cell_coercer, coerce_cell
+from .frames import _normalize_cell_text, dedupe_headers, display_text, display_values
+
+if TYPE_CHECKING:  # openpyxl is imported where a workbook is built
+    from openpyxl import Workbook
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+EXPORT_PROGRESS_EVERY_ROWS = 1000
+STREAM_BUFFER_BYTES = 64 * 1024
+
+
+def _sanitize_sheet_name(name: str) -> str:
+    # Remove invalid characters: : \ / ? * [ ]
+    name = re.sub(r"[:\\/\?\*\[\]]", " ", name)
+    name = name.strip() or "Sheet"
+    return name[:31]
+
+
+def _unique_sheet_title(name: str, used_names: set[str]) -> str:
+    sheet_name = _sanitize_sheet_name(name or "Sheet")
+    base = sheet_name
+    i = 1
+    while sheet_name in used_names:
+        suffix = f"_{i}"
+        sheet_name = _sanitize_sheet_name(base[: (31 - len(suffix))] + suffix)
+        i += 1
+    used_names.add(sheet_name)
+    return sheet_name
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+_HEX_COLOR_RE = re.compile(r"^#?([0-9A-Fa-f]{6})$")
+
+
+def _decode_color_runs(encoded, cell_count: int) -> list[tuple[int, int, str]]:
+    """``{"#RRGGBB": [start, length, ...]}`` over row-major cell indexes -> sorted ``(start, end, rgb)`` runs."""
+    runs: list[tuple[int, int, str]] = []
+    if not isinstance(encoded, dict):
+        return runs
+    for color, flat in encoded.items():
+        match = _HEX_COLOR_RE.match(str(color))
+        if not match or not isinstance(flat, list):
+            continue
+        rgb = match.group(1).upper()
+        for i in range(0, len(flat) - 1, 2):
+            try:
+                start, length = int(flat[i]), int(flat[i + 1])
+            except (TypeError, ValueError):
+                continue
+            if length > 0 and 0 <= start < cell_count:
+                runs.append((start, min(start + length, cell_count), rgb))
+    runs.sort()
+    return runs
+
+
+def _iter_row_colors(runs: list[tuple[int, int, str]], columns: int, rows: int):
+    """Yield, per row, ``None`` or a per-column list of colors (``None`` where uncolored)."""
+    pos = 0
+    active: list[tuple[int, int, str]] = []
+    for row_idx in range(rows):
+        row_start, row_end = row_idx * columns, (row_idx + 1) * columns
+        while pos < len(runs) and runs[pos][0] < row_end:
+            active.append(runs[pos])
+            pos += 1
+        active = [run for run in active if run[1] > row_start]
+        if not active:
+            yield None
+            continue
+        colors: list[str | None] = [None] * columns
+        for start, end, rgb in active:
+            for i in range(max(start, row_start), min(end, row_end)):
+                colors[i - row_start] = rgb
+        yield colors
+
+
+class _ExportStyles:
+    """Shared cell styles keyed by (number format, fill, font color).
+
+    Colored combinations are registered once as named styles; every cell with
+    the same key reuses one style array, so coloring costs a dict lookup per
+    cell instead of new Fill/Font objects.
+    """
+
+    def __init__(self, workbook: Workbook) -> None:
+        self.workbook = workbook
+        self._styles: dict[tuple[str, str | None, str | None], object] = {}
+
+    def get(self, worksheet, number_format: str, fill: str | None, font: str | None):
+        key = (number_format or "General", fill, font)
+        style = self._styles.get(key)
+        if style is None:
+            from openpyxl.cell import WriteOnlyCell
+            from openpyxl.styles import Font, NamedStyle, PatternFill
+
+            template = WriteOnlyCell(worksheet)
+            if fill or font:
+                named = NamedStyle(name=f"Export {len(self._styles) + 1}", number_format=key[0])
+                if fill:
+                    named.fill = PatternFill(fill_type="solid", start_color=f"FF{fill}", end_color=f"FF{fill}")
+                if font:
+                    named.font = Font(color=f"FF{font}")
+                self.workbook.add_named_style(named)
+                template.style = named.name
+            else:
+                template.number_format = key[0]
+            style = self._styles[key] = template._style
+        return style
+
+
+def build_workbook(sheets: list[dict], progress=None) -> Workbook:
+    """Build the export workbook; ``progress(sheets_done, rows_written)`` may raise ExportCancelled.
+
+    Sheets may carry ``fills``/``fonts`` color runs (see ``_decode_color_runs``)
+    for workspace colors and Mapping Compare results.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    styles = _ExportStyles(workbook)
+    used_names: set[str] = set()
+    rows_written = 0
+
+    for sheet_idx, item in enumerate(sheets):
+        headers = item.get("headers") or []
+        rows = item.get("rows") or []
+        column_formats = item.get("column_formats") or []
+        sheet_name = _unique_sheet_title(item.get("name") or "Sheet", used_names)
+        columns = len(headers)
+        fill_rows = _iter_row_colors(_decode_color_runs(item.get("fills"), columns * len(rows)), columns, len(rows))
+        font_rows = _iter_row_colors(_decode_color_runs(item.get("fonts"), columns * len(rows)), columns, len(rows))
+
+        worksheet = workbook.create_sheet(title=sheet_name)
+        for col_idx, _ in enumerate(headers, start=1):
+            worksheet.column_dimensions[get_column_letter(col_idx)].width = 18
+        worksheet.append(list(headers))
+
+        for row_values, fills, fonts in zip(rows, fill_rows, font_rows):
+            out_row = []
+            for col_idx, raw_value in enumerate(row_values):
+                column_meta = column_formats[col_idx] if col_idx < len(column_formats) else {}
+                value, number_format = coerce_cell(raw_value, column_meta)
+                fill = fills[col_idx] if fills and col_idx < columns else None
+                font = fonts[col_idx] if fonts and col_idx < columns else None
+                if fill or font or (number_format and number_format != "General"):
+                    cell = WriteOnlyCell(worksheet, value=value)
+                    cell._style = styles.get(worksheet, number_format, fill, font)
+                    out_row.append(cell)
+                else:
+                    out_row.append(value)
+            worksheet.append(out_row)
+            rows_written += 1
+            if progress and rows_written % EXPORT_PROGRESS_EVERY_ROWS == 0:
+                progress(sheet_idx, rows_written)
+
+        if progress:
+            progress(sheet_idx + 1, rows_written)
+
+    return workbook
+
+
+EXPORT_FORMATS = {
+    "xlsx": XLSX_MIMETYPE,
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+EXPORT_CHUNK_ROWS = 5000
+
+
+def _export_headers(item: dict) -> list:
+    """Header names every flat format writes: blanks become "Unnamed: i", repeats get ".1", ".2"."""
+    return dedupe_headers([_normalize_cell_text(h) or None for h in item.get("headers") or []])
+
+
+def iter_rows(item: dict, progress=None, sheet_idx: int = 0, rows_before: int = 0):
+    """Yield ``(headers, rows)`` chunks of coerced values; blanks become ``None``.
+
+    ``progress(sheet_idx, rows)`` is called after each chunk, counting from ``rows_before``.
+    """
+    headers = _export_headers(item)
+    column_formats = item.get("column_formats") or []
+    coercers = [cell_coercer(column_formats[i] if i < len(column_formats) else {}) for i in range(len(headers))]
+    rows = item.get("rows") or []
+    for start in range(0, len(rows), EXPORT_CHUNK_ROWS):
+        chunk = []
+        for row_values in rows[start : start + EXPORT_CHUNK_ROWS]:
+            row_values = list(row_values)[: len(headers)]
+            coerced = [coerce(raw) for coerce, raw in zip(coercers, row_values)]
+            coerced += [None] * (len(headers) - len(coerced))
+            chunk.append([None if value == "" else value for value in coerced])
+        if progress:
+            progress(sheet_idx, rows_before + start + len(chunk))
+        yield headers, chunk
+
+
+def _export_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def _iter_csv_bytes(item: dict, progress=None, sheet_idx: int = 0, rows_before: int = 0):
+    # UTF-8 with BOM so Excel opens Vietnamese text correctly.
+    buf = StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(_export_headers(item))
+    yield ("\ufeff" + buf.getvalue()).encode("utf-8")
+    for _, chunk in iter_rows(item, progress, sheet_idx, rows_before):
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows([_export_text(value) for value in row] for row in chunk)
+        yield buf.getvalue().encode("utf-8")
+
+
+def _iter_jsonl_bytes(item: dict, progress=None, sheet_idx: int = 0, rows_before: int = 0):
+    for headers, chunk in iter_rows(item, progress, sheet_idx, rows_before):
+        lines = [json.dumps(dict(zip(headers, row)), ensure_ascii=False, default=_json_default) for row in chunk]
+        if lines:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _parquet_column_types(chunks, width: int) -> list:
+    """Arrow type per column over all ``chunks`` of coerced rows, one chunk at a time.
+
+    Integers that meet floats become ``float64``; any other mix (or a chunk
+    Arrow cannot type) makes the column text, like a single-table write would.
+    """
+    import pyarrow as pa
+
+    seen: list[set] = [set() for _ in range(width)]
+    for chunk in chunks:
+        for types, values in zip(seen, zip(*chunk)):
+            if pa.string() in types:
+                continue
+            try:
+                kind = pa.array(values).type
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                kind = pa.string()
+            if kind != pa.null():
+                types.add(kind)
+    resolved = []
+    for types in seen:
+        if not types:
+            resolved.append(pa.null())
+        elif len(types) == 1:
+            resolved.append(next(iter(types)))
+        elif types == {pa.int64(), pa.float64()}:
+            resolved.append(pa.float64())
+        else:
+            resolved.append(pa.string())
+    return resolved
+
+
+def _write_parquet(item: dict, fh, progress=None, sheet_idx: int = 0, rows_before: int = 0) -> None:
+    """Write one sheet as Parquet, one row group per ``EXPORT_CHUNK_ROWS`` rows.
+
+    The file has one schema, so the coerced chunks are pickled to a spool
+    while their column types are settled and then written from it: every cell
+    is coerced once and only one chunk is in memory at a time. Columns that do
+    not coerce to one type are stored as text.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    headers = _export_headers(item)
+    with tempfile.SpooledTemporaryFile(max_size=STREAM_BUFFER_BYTES * 64) as spool:
+        chunk_count = 0
+
+        def spooled_chunks():
+            nonlocal chunk_count
+            for _, chunk in iter_rows(item, progress, sheet_idx, rows_before):
+                pickle.dump(chunk, spool, protocol=pickle.HIGHEST_PROTOCOL)
+                chunk_count += 1
+                yield chunk
+
+        types = _parquet_column_types(spooled_chunks(), len(headers))
+        schema = pa.schema([pa.field(str(h), kind) for h, kind in zip(headers, types)])
+        spool.seek(0)
+        with pq.ParquetWriter(fh, schema) as writer:
+            for _ in range(chunk_count):
+                arrays = []
+                for kind, values in zip(types, zip(*pickle.load(spool))):
+                    if kind == pa.string():
+                        values = [None if v is None else _export_text(v) for v in values]
+                    arrays.append(pa.array(values, type=kind))
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            if not chunk_count:
+                writer.write_table(schema.empty_table())
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back in chunks (for streamed zips)."""
+
+    def __init__(self) -> None:
+        self._parts: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _iter_sheet_export_bytes(item: dict, fmt: str, progress=None, sheet_idx: int = 0, rows_before: int = 0):
+    if fmt == "csv":
+        yield from _iter_csv_bytes(item, progress, sheet_idx, rows_before)
+    elif fmt == "jsonl":
+        yield from _iter_jsonl_bytes(item, progress, sheet_idx, rows_before)
+    else:
+        # Parquet needs a seekable target for its footer; spool and then stream it.
+        with tempfile.SpooledTemporaryFile(max_size=STREAM_BUFFER_BYTES * 64) as spool:
+            _write_parquet(item, spool, progress, sheet_idx, rows_before)
+            spool.seek(0)
+            while data := spool.read(STREAM_BUFFER_BYTES):
+                yield data
+
+
+def iter_export_bytes(sheets: list[dict], fmt: str, progress=None):
+    """Yield the csv/jsonl/parquet bytes of ``sheets`` (a zip with one member per sheet when several)."""
+    if len(sheets) == 1:
+        yield from _iter_sheet_export_bytes(sheets[0], fmt, progress)
+        if progress:
+            progress(1, len(sheets[0].get("rows") or []))
+        return
+
+    sink = _ChunkSink()
+    used_names: set[str] = set()
+    rows_written = 0
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for sheet_idx, item in enumerate(sheets):
+            member = f"{_unique_sheet_title(item.get('name') or 'Sheet', used_names)}.{fmt}"
+            with zf.open(member, "w", force_zip64=True) as entry:
+                for data in _iter_sheet_export_bytes(item, fmt, progress, sheet_idx, rows_written):
+                    entry.write(data)
+                    if chunk := sink.drain():
+                        yield chunk
+            rows_written += len(item.get("rows") or [])
+            if progress:
+                progress(sheet_idx + 1, rows_written)
+    yield sink.drain()
+
+
+def sheet_item(df, column_metadata: list[dict], name: str, presets: dict[str, str] | None = None) -> dict:
+    """A parsed sheet in the export shape (the same a workspace export sends).
+
+    ``presets`` maps header text to a ``COLUMN_FORMAT_PRESETS`` id; other
+    columns keep their ``selected_preset`` (``original`` by default).
+    """
+    headers = [display_text(c) for c in df.columns]
+    columns = [display_values(df.iloc[:, i]) for i in range(df.shape[1])]
+    column_formats = []
+    for idx, header in enumerate(headers):
+        meta = dict(column_metadata[idx]) if idx < len(column_metadata) else {}
+        meta["selected_preset"] = (presets or {}).get(header, meta.get("selected_preset") or "original")
+        column_formats.append(meta)
+    return {"name": name, "headers": headers, "rows": list(zip(*columns)), "column_formats": column_formats}
+
+
+def write_sheets(sheets: list[dict], target, fmt: str = "xlsx", progress=None) -> None:
+    """Write ``sheets`` as ``fmt`` to a path or binary file object, streaming the flat formats."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    if fmt == "xlsx":
+        build_workbook(sheets, progress).save(target)
+        return
+    if hasattr(target, "write"):
+        for chunk in iter_export_bytes(sheets, fmt, progress):
+            target.write(chunk)
+        return
+    with open(target, "wb") as fh:
+        for chunk in iter_export_bytes(sheets, fmt, progress):
+            fh.write(chunk)
@@ -0,0 +1,40 @@
+"""Gunicorn settings for the Excel Viewer.
+
+With ``GUNICORN_PRELOAD=1`` (the default) the master imports the app and
+pandas/openpyxl once, freezes the GC and forks workers from that warm image,
+so the library pages are shared copy-on-write instead of re-imported per
+worker. Set ``GUNICORN_PRELOAD=0`` for the ``dev`` service so ``watchmedo``
+restarts only pay for Flask until the first sheet is parsed.
+
+Workers run ``GUNICORN_THREADS`` threads (gthread) so open progress streams
+(Server-Sent Events) and queued-request polls do not each hold a whole
+process; heavy work is still capped host-wide by ``HEAVY_REQUEST_SLOTS``.
+
+The app is imported as the ``app.main`` package module (``gunicorn -c
+app/gunicorn.conf.py app.main:app`` from the directory holding ``app/``), the
+same single import path the tests and scripts use for ``excel_engine``.
+"""
+
+import gc
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "1").strip().lower() in {"1", "true", "yes"}
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from app import main
+
+    main.warm_imports()
+    # Keep the collector from touching (and so copying) the preloaded objects in workers.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from app import main
+
+    main.init_app()
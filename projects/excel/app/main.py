@@ -1,25 +1,66 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, g, send_file
-import pandas as pd
+from __future__ import annotations
+
+from flask import Flask, Response, abort, render_template, request, redirect, url_for, flash, session, g, has_app_context, has_request_context, send_file, send_from_directory, stream_template
 from werkzeug.utils import secure_filename
-from openpyxl import Workbook, load_workbook
-from openpyxl.utils import get_column_letter
 import tempfile
+import zipfile
+import zlib
+import xml.etree.ElementTree as ET
 from pathlib import Path
 import uuid
+import weakref
 import json
-from io import BytesIO
-from io import StringIO
+import mimetypes
+import pickle
 import re
+import functools
+import hashlib
+import html
+import importlib
+import importlib.util
 from urllib.parse import urlparse
 import os
 import logging
 import threading
 import time
-import csv
+import contextlib
 import secrets
-from collections import Counter
+import shutil
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: parse coordination stays per-request
+    fcntl = None
 from datetime import date, datetime, timedelta
 
+from .excel_engine import (
+    ALLOWED_EXTENSIONS,
+    COLUMN_FORMAT_PRESETS,
+    EXPORT_FORMATS,
+    HEAVY_MODULES,
+    STREAM_BUFFER_BYTES,
+    XLSX_MIMETYPE,
+    ExportCancelled,
+    build_workbook,
+    compact_frame,
+    dedupe_headers,
+    display_text,
+    display_values,
+    iter_export_bytes,
+    load_sheet,
+    np,
+    pd,
+    read_csv_smart,
+    sheet_names,
+    xlsx_number_formats,
+    xlsx_shared_strings,
+    xlsx_sheet_refs,
+    xlsx_sheet_stats,
+    xlsx_workbook_parts,
+)
+
 app = Flask(__name__)
 
 # ----------
@@ -42,42 +83,35 @@ _configure_app(app)
 
 # Temp upload root (system temp dir by default)
 UPLOAD_ROOT = Path(os.getenv("UPLOAD_ROOT", str(Path(tempfile.gettempdir()) / "excel_viewer_uploads")))
-UPLOAD_ROOT.mkdir(parents=True, exist_ok=True)
 
 # TTL for uploaded sessions (hours)
 UPLOAD_TTL_HOURS = _get_env_int("UPLOAD_TTL_HOURS", 24)
 
+# Large sheets open as a preview of the first PREVIEW_ROWS rows; the rest loads on demand.
+DEFAULT_PREVIEW_ROWS = 5000
+PREVIEW_ROWS = _get_env_int("PREVIEW_ROWS", DEFAULT_PREVIEW_ROWS)
+PREVIEW_ROW_THRESHOLD = _get_env_int("PREVIEW_ROW_THRESHOLD", 50000)
+PREVIEW_BYTES_THRESHOLD = _get_env_int("PREVIEW_BYTES_THRESHOLD_MB", 32) * 1024 * 1024
+
+# Memory one request may commit to full sheet loads (0 disables the check). Peak
+# parse memory is estimated up front: about 90 bytes per xlsx cell of the
+# <dimension> (or 2x the worksheet XML) and 16x the size of a CSV file.
+REQUEST_MEMORY_BUDGET_MB = _get_env_int("REQUEST_MEMORY_BUDGET_MB", 1024)
+MEMORY_BYTES_PER_CELL = 96
+XLSX_XML_MEMORY_FACTOR = 2
+CSV_MEMORY_FACTOR = 16
+# xlsx downloads are assembled in memory up to this size, then in a temp file.
+EXPORT_SPOOL_MAX_MB = _get_env_int("EXPORT_SPOOL_MAX_MB", 32)
+
+
 # Logger
 logger = logging.getLogger("excel_viewer")
 if not logger.handlers:
     logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
 
-ALLOWED_EXTENSIONS = {"xlsx", "csv"}
-CSV_ENCODINGS = ("utf-8-sig", "utf-8", "cp1258", "cp1252", "latin1")
-CSV_DELIMITERS = [",", ";", "\t", "|"]
-COLUMN_FORMAT_PRESETS = (
-    {"id": "original", "label_key": "format_original"},
-    {"id": "text", "label_key": "format_text"},
-    {"id": "general", "label_key": "format_general"},
-    {"id": "integer", "label_key": "format_integer"},
-    {"id": "decimal_2", "label_key": "format_decimal_2"},
-    {"id": "percent_2", "label_key": "format_percent_2"},
-    {"id": "date_dmy", "label_key": "format_date_dmy"},
-    {"id": "date_mdy", "label_key": "format_date_mdy"},
-    {"id": "date_ymd", "label_key": "format_date_ymd"},
-    {"id": "datetime_dmy_hm", "label_key": "format_datetime_dmy_hm"},
-)
-PRESET_NUMBER_FORMATS = {
-    "text": "@",
-    "general": "General",
-    "integer": "0",
-    "decimal_2": "0.00",
-    "percent_2": "0.00%",
-    "date_dmy": "dd-mm-yyyy",
-    "date_mdy": "mm-dd-yyyy",
-    "date_ymd": "yyyy-mm-dd",
-    "datetime_dmy_hm": "dd-mm-yyyy hh:mm",
-}
+TABLE_CLASSES = "dataframe table table-striped table-sm"
+TABLE_STREAM_CHUNK_ROWS = 500
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
 
 
 def allowed_file(filename: str) -> bool:
@@ -117,308 +151,662 @@ def get_token_dir(token: str) -> Path:
     return d
 
 
-def _sniff_csv_delimiter(text: str) -> str | None:
-    sample = text[:65536]
-    try:
-        dialect = csv.Sniffer().sniff(sample, delimiters=CSV_DELIMITERS)
-        return dialect.delimiter
-    except csv.Error:
+def _existing_token_dir(token: str) -> Path | None:
+    if not token or not _ID_RE.match(token):
         return None
+    d = UPLOAD_ROOT / token
+    return d if d.is_dir() else None
 
 
-def read_csv_smart(path: Path) -> tuple[pd.DataFrame, dict[str, str]]:
-    raw = path.read_bytes()
-    last_error: Exception | None = None
+def _preview_plan(path: Path, filename: str, sheet_name: str | None) -> dict | None:
+    """Return ``{"nrows", "total_rows"}`` when the sheet is big enough to open as a preview.
 
-    for encoding in CSV_ENCODINGS:
-        try:
-            text = raw.decode(encoding)
-        except UnicodeDecodeError as exc:
-            last_error = exc
-            continue
+    Sheets whose full parse would not fit the request memory budget always
+    open as a preview, even with ``PREVIEW_ROWS=0``.
+    """
+    over_budget = not _memory_budget_allows(_estimate_sheet_bytes(path, filename, sheet_name))
+    if PREVIEW_ROWS <= 0 and not over_budget:
+        return None
+    nrows = PREVIEW_ROWS if PREVIEW_ROWS > 0 else DEFAULT_PREVIEW_ROWS
+    ext = filename.rsplit(".", 1)[1].lower()
+    if ext == "csv":
+        if over_budget or path.stat().st_size > PREVIEW_BYTES_THRESHOLD:
+            return {"nrows": nrows, "total_rows": None}
+        return None
+    stats = xlsx_sheet_stats(path, sheet_name)
+    if not stats:
+        return None
+    data_rows = stats["rows"] - 1 if stats["rows"] else None
+    if over_budget or (data_rows is not None and data_rows > PREVIEW_ROW_THRESHOLD) or stats["xml_bytes"] > PREVIEW_BYTES_THRESHOLD:
+        return {"nrows": nrows, "total_rows": data_rows}
+    return None
 
-        detected = _sniff_csv_delimiter(text)
-        candidates = [detected] if detected else []
-        candidates.extend(d for d in CSV_DELIMITERS if d not in candidates)
-        parsed: list[tuple[pd.DataFrame, dict[str, str]]] = []
 
-        for delimiter in candidates:
-            try:
-                df = pd.read_csv(StringIO(text), sep=delimiter)
-                parsed.append((df, {"encoding": encoding, "delimiter": delimiter}))
-            except Exception as exc:
-                last_error = exc
+def _estimate_sheet_bytes(path: Path, filename: str, sheet_name: str | None) -> int:
+    """Rough peak memory of parsing the whole sheet, from the file size (CSV) or the zip headers and ``<dimension>`` (xlsx).
+
+    A ``<dimension>`` can claim far more cells than the sheet holds (formatted
+    empty ranges), so the XML size caps the cell-count estimate.
+    """
+    if filename.rsplit(".", 1)[1].lower() == "csv":
+        return path.stat().st_size * CSV_MEMORY_FACTOR
+    stats = xlsx_sheet_stats(path, sheet_name)
+    if not stats:
+        return 0
+    estimate = stats["xml_bytes"] * XLSX_XML_MEMORY_FACTOR
+    if stats["rows"] and stats["columns"]:
+        estimate = min(estimate, stats["rows"] * stats["columns"] * MEMORY_BYTES_PER_CELL)
+    return estimate
+
+
+def _memory_budget_allows(estimate: int) -> bool:
+    if REQUEST_MEMORY_BUDGET_MB <= 0:
+        return True
+    used = g.get("memory_reserved", 0) if has_request_context() else 0
+    return used + estimate <= REQUEST_MEMORY_BUDGET_MB * 1024 * 1024
+
+
+def _reserve_memory(estimate: int) -> None:
+    """Count a full load against the request's memory budget; raise ``MemoryBudgetExceeded`` past it.
+
+    Reservations add up over the request (a merge loads two sheets) and end
+    with it; outside a request every load is checked on its own.
+    """
+    if not _memory_budget_allows(estimate):
+        used = g.get("memory_reserved", 0) if has_request_context() else 0
+        raise MemoryBudgetExceeded(
+            "memory_budget_exceeded", max(1, round((used + estimate) / (1024 * 1024))), REQUEST_MEMORY_BUDGET_MB
+        )
+    if has_request_context():
+        g.memory_reserved = g.get("memory_reserved", 0) + estimate
 
-        if parsed:
-            if detected:
-                return parsed[0]
-            return max(parsed, key=lambda item: len(item[0].columns))
 
-    raise last_error or ValueError("Could not read CSV file")
+@contextlib.contextmanager
+def _memory_reservations_released():
+    """Give back the reservations made inside the block once it ends.
 
+    For loops that load, use and drop frames one item at a time (``/diff``
+    over every sheet), so the budget bounds the largest item, not their sum.
+    """
+    used = g.get("memory_reserved", 0) if has_request_context() else 0
+    try:
+        yield
+    finally:
+        if has_request_context():
+            g.memory_reserved = used
 
-def _normalize_cell_text(value) -> str:
-    if value is None:
-        return ""
-    if isinstance(value, float) and pd.isna(value):
-        return ""
-    return str(value)
 
+SHEET_CACHE_DIR = ".cache"
+PARSE_LOCK_TIMEOUT_SECONDS = _get_env_int("PARSE_LOCK_TIMEOUT_SECONDS", 120)
+SHEET_CACHE_MAX_MB = _get_env_int("SHEET_CACHE_MAX_MB", 1024)
+SHEET_CACHE_INDEX = ".sheet_cache_index.json"
+_ARROW_COLUMNS_KEY = b"excel_viewer.columns"
 
-def _looks_like_datetime_format(fmt: str) -> bool:
-    fmt_lower = (fmt or "").lower()
-    return any(token in fmt_lower for token in ("h", "s", "am/pm"))
 
+def _file_crc32(path: Path) -> int:
+    crc = 0
+    with open(path, "rb") as fh:
+        while chunk := fh.read(1 << 20):
+            crc = zlib.crc32(chunk, crc)
+    return crc
 
-def _looks_like_date_format(fmt: str) -> bool:
-    fmt_lower = (fmt or "").lower()
-    return any(token in fmt_lower for token in ("d", "m", "y")) and not any(
-        token in fmt_lower for token in ("0.00%", "#,##0", "@")
-    )
 
+def _sheet_fingerprints(path: Path, filename: str) -> dict[str, dict]:
+    """Per-sheet identity of a file's parse inputs, from the zip headers (xlsx) or the bytes (csv).
 
-def _infer_excel_cell_type(cell) -> str:
-    value = cell.value
-    fmt = cell.number_format or ""
-    if value is None:
-        return ""
-    if cell.is_date or isinstance(value, datetime):
-        return "datetime" if _looks_like_datetime_format(fmt) else "date"
-    if isinstance(value, date):
-        return "date"
-    if isinstance(value, bool):
-        return "boolean"
-    if isinstance(value, (int, float)) and not isinstance(value, bool):
-        fmt_lower = fmt.lower()
-        if "%" in fmt:
-            return "percent"
-        if "[$" in fmt_lower or any(symbol in fmt for symbol in ("$", "€", "£", "¥", "₫")):
-            return "currency"
-        if isinstance(value, int) or (isinstance(value, float) and float(value).is_integer()):
-            return "integer"
-        return "decimal"
-    return "text"
-
-
-def _infer_series_type(series: pd.Series) -> str:
-    if series.empty:
-        return "text"
-    dtype = str(series.dtype).lower()
-    if "datetime" in dtype:
-        return "datetime"
-    if "int" in dtype:
-        return "integer"
-    if "float" in dtype or "double" in dtype:
-        return "decimal"
-    if "bool" in dtype:
-        return "boolean"
-    return "text"
-
-
-def _default_format_for_type(source_type: str) -> str:
-    return {
-        "date": "dd-mm-yyyy",
-        "datetime": "dd-mm-yyyy hh:mm",
-        "integer": "0",
-        "decimal": "0.00",
-        "percent": "0.00%",
-        "currency": "#,##0.00",
-        "text": "@",
-    }.get(source_type, "General")
-
-
-def _build_csv_column_metadata(df: pd.DataFrame) -> list[dict]:
-    metadata = []
-    for column_name in df.columns:
-        series = df[column_name] if column_name in df else pd.Series(dtype="object")
-        source_type = _infer_series_type(series)
-        metadata.append(
-            {
-                "header": _normalize_cell_text(column_name),
-                "source_type": source_type,
-                "original_number_format": _default_format_for_type(source_type),
-                "selected_preset": "original",
+    An xlsx sheet is identified by its worksheet part plus the shared parts it
+    reads (shared strings, styles, date system); nothing is decompressed.
+    """
+    ext = filename.rsplit(".", 1)[1].lower()
+    if ext == "csv":
+        return {"CSV": {"crc": _file_crc32(path), "size": path.stat().st_size}}
+    with zipfile.ZipFile(path) as zf:
+        parts = xlsx_workbook_parts(zf)
+
+        def crc_of(member: str | None) -> int | None:
+            info = zf.NameToInfo.get(member) if member else None
+            return info.CRC if info else None
+
+        fingerprints = {}
+        for sheet, member in parts["sheets"].items():
+            info = zf.NameToInfo.get(member)
+            fingerprints[sheet] = {
+                "member": member,
+                "crc": info.CRC if info else None,
+                "size": info.file_size if info else None,
+                "strings_crc": crc_of(parts["shared_strings"]),
+                "styles_crc": crc_of(parts["styles"]),
+                "date1904": parts["date1904"],
             }
+    return fingerprints
+
+
+def _sheet_fingerprint(path: Path, filename: str, sheet_name: str | None) -> tuple[str | None, dict | None]:
+    """``(sheet, fingerprint)`` for one sheet (the first sheet when unnamed); ``None`` when unreadable."""
+    try:
+        fingerprints = _sheet_fingerprints(path, filename)
+    except (OSError, zipfile.BadZipFile, KeyError, ET.ParseError):
+        fingerprints = {}
+    sheet = sheet_name or next(iter(fingerprints), None)
+    return sheet, fingerprints.get(sheet) if sheet else None
+
+
+def _sheet_cache_paths(token_dir: Path, filename: str, sheet: str, nrows: int | None) -> tuple[Path, Path]:
+    key = hashlib.sha1(f"{filename}\0{sheet}\0{nrows}".encode("utf-8")).hexdigest()
+    cache_dir = token_dir / SHEET_CACHE_DIR
+    return cache_dir / f"{key}.arrow", cache_dir / f"{key}.json"
+
+
+def _arrow_types_mapper(arrow_type):
+    # Text columns were Arrow-backed before caching; keep them that way.
+    import pyarrow as pa
+
+    if arrow_type in (pa.string(), pa.large_string()):
+        return pd.StringDtype("pyarrow")
+    return None
+
+
+def _write_sheet_frame(df: pd.DataFrame, data_path: Path, suffix: str) -> Path:
+    """Write the frame as an Arrow IPC file (pickle when Arrow cannot hold it); returns the path written."""
+    try:
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(df.set_axis([str(i) for i in range(df.shape[1])], axis=1), preserve_index=False)
+        table = table.replace_schema_metadata(
+            {**(table.schema.metadata or {}), _ARROW_COLUMNS_KEY: pickle.dumps(list(df.columns))}
         )
-    return metadata
+        tmp = data_path.with_suffix(suffix)
+        with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    except (ImportError, ValueError, TypeError, NotImplementedError):
+        data_path = data_path.with_suffix(".pkl")
+        tmp = data_path.with_suffix(suffix)
+        df.to_pickle(tmp)
+    os.replace(tmp, data_path)
+    return data_path
+
+
+def _read_sheet_frame(data_path: Path) -> pd.DataFrame:
+    if data_path.suffix == ".pkl":
+        return pd.read_pickle(data_path)
+    import pyarrow as pa
+
+    # Memory-mapped: the page cache holds one copy per host, shared by every worker.
+    with pa.memory_map(str(data_path)) as source:
+        table = pa.ipc.open_file(source).read_all()
+        df = table.to_pandas(types_mapper=_arrow_types_mapper)
+    df.columns = pickle.loads(table.schema.metadata[_ARROW_COLUMNS_KEY])
+    return df
+
+
+def _read_sheet_cache(token_dir: Path, filename: str, sheet: str, nrows: int | None, fingerprint: dict):
+    _, meta_path = _sheet_cache_paths(token_dir, filename, sheet, nrows)
+    try:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if meta.get("fingerprint") != fingerprint:
+            return None
+        data_path = meta_path.with_name(meta["data_file"])
+        df = _read_sheet_frame(data_path)
+    except (OSError, ValueError, KeyError, EOFError, ImportError, pickle.UnpicklingError):
+        return None
+    _acquire_sheet_cache(data_path)
+    weakref.finalize(df, _release_sheet_cache, data_path)
+    return df, meta
 
 
-def _build_excel_column_metadata(path: Path, sheet_name: str, df: pd.DataFrame) -> list[dict]:
-    workbook = load_workbook(path, data_only=False, read_only=True)
+def _write_sheet_cache(token_dir: Path, filename: str, sheet: str, nrows: int | None, fingerprint: dict, df: pd.DataFrame, meta: dict) -> None:
+    data_path, meta_path = _sheet_cache_paths(token_dir, filename, sheet, nrows)
     try:
-        sheet = workbook[sheet_name]
-        column_count = len(df.columns)
-        source_type_buckets: list[list[str]] = [[] for _ in range(column_count)]
-        number_format_buckets: list[list[str]] = [[] for _ in range(column_count)]
-
-        # Read-only worksheets are efficient when streamed row-by-row, but very slow
-        # with repeated random-access `sheet.cell(...)` lookups.
-        for row in sheet.iter_rows(min_row=2, max_col=column_count):
-            for col_idx, cell in enumerate(row):
-                if cell.value is None:
-                    continue
-                cell_type = _infer_excel_cell_type(cell)
-                if cell_type:
-                    source_type_buckets[col_idx].append(cell_type)
-                fmt = cell.number_format or ""
-                if fmt and fmt != "General":
-                    number_format_buckets[col_idx].append(fmt)
-
-        metadata: list[dict] = []
-        for col_idx, column_name in enumerate(df.columns, start=1):
-            source_types = source_type_buckets[col_idx - 1]
-            number_formats = number_format_buckets[col_idx - 1]
-            source_type = Counter(source_types).most_common(1)[0][0] if source_types else _infer_series_type(df.iloc[:, col_idx - 1])
-            original_number_format = (
-                Counter(number_formats).most_common(1)[0][0]
-                if number_formats
-                else _default_format_for_type(source_type)
-            )
-            metadata.append(
+        data_path.parent.mkdir(exist_ok=True)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        data_path = _write_sheet_frame(df, data_path, suffix)
+        meta_tmp = meta_path.with_suffix(suffix)
+        meta_tmp.write_text(
+            json.dumps(
                 {
-                    "header": _normalize_cell_text(column_name),
-                    "source_type": source_type,
-                    "original_number_format": original_number_format,
-                    "selected_preset": "original",
+                    **meta,
+                    "filename": filename,
+                    "sheet": sheet,
+                    "nrows": nrows,
+                    "fingerprint": fingerprint,
+                    "data_file": data_path.name,
                 }
-            )
-        return metadata
-    finally:
-        workbook.close()
+            ),
+            encoding="utf-8",
+        )
+        os.replace(meta_tmp, meta_path)
+        _register_sheet_cache(data_path, meta_path)
+    except OSError as exc:
+        logger.warning("failed writing sheet cache for %s/%s: %s", filename, sheet, exc)
+
+
+# Host-wide index of cached sheet files: size, last use and per-process reference
+# counts. It bounds the total cache size (SHEET_CACHE_MAX_MB) by evicting the least
+# recently used entries that no live process is currently reading.
+def _update_sheet_cache_index(update) -> None:
+    index_path = UPLOAD_ROOT / SHEET_CACHE_INDEX
+    with _single_flight(index_path.with_suffix(".lock"), timeout=10) as locked:
+        if not locked:
+            return
+        try:
+            entries = json.loads(index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            entries = {}
+        update(entries)
+        tmp = index_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(entries), encoding="utf-8")
+        os.replace(tmp, index_path)
 
 
-def _load_sheet_dataframe(path: Path, filename: str, sheet_name: str | None = None) -> tuple[pd.DataFrame, list[dict], str | None]:
-    ext = filename.rsplit(".", 1)[1].lower()
-    if ext == "csv":
-        df, _ = read_csv_smart(path)
-        df = df.fillna("")
-        return df, _build_csv_column_metadata(df), None
-
-    xls = pd.ExcelFile(path)
-    target_sheet = sheet_name or (xls.sheet_names[0] if xls.sheet_names else None)
-    if not target_sheet:
-        raise ValueError("No sheets found in the workbook.")
-    df = xls.parse(target_sheet).fillna("")
-    column_metadata = _build_excel_column_metadata(path, target_sheet, df)
-    return df, column_metadata, target_sheet
-
-
-def _parse_numeric_value(raw_value, allow_percent: bool = False):
-    text = _normalize_cell_text(raw_value).strip()
-    if not text:
-        return None
-    normalized = text.replace(",", "").replace(" ", "")
-    is_percent = normalized.endswith("%")
-    if is_percent:
-        normalized = normalized[:-1]
+def _pid_alive(pid: int) -> bool:
     try:
-        number = float(normalized)
-    except ValueError:
-        return None
-    if allow_percent:
-        if is_percent or abs(number) > 1:
-            return number / 100
-        return number
-    if number.is_integer():
-        return int(number)
-    return number
-
-
-def _parse_datetime_value(raw_value, prefer_dayfirst: bool) -> datetime | None:
-    text = _normalize_cell_text(raw_value).strip()
-    if not text:
-        return None
-    explicit_formats = ["%d-%m-%Y", "%d/%m/%Y", "%Y-%m-%d", "%m-%d-%Y", "%m/%d/%Y"]
-    explicit_datetimes = [
-        "%d-%m-%Y %H:%M",
-        "%d/%m/%Y %H:%M",
-        "%Y-%m-%d %H:%M",
-        "%m-%d-%Y %H:%M",
-        "%m/%d/%Y %H:%M",
-        "%d-%m-%Y %H:%M:%S",
-        "%d/%m/%Y %H:%M:%S",
-        "%Y-%m-%d %H:%M:%S",
-        "%m-%d-%Y %H:%M:%S",
-        "%m/%d/%Y %H:%M:%S",
-    ]
-    ordered_formats = (explicit_datetimes + explicit_formats) if prefer_dayfirst else (
-        explicit_datetimes[2:] + explicit_datetimes[:2] + explicit_formats[2:] + explicit_formats[:2]
-    )
-    for fmt in ordered_formats:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _drop_sheet_cache_files(data_path: Path, meta_path: Path | None = None) -> None:
+    meta_path = meta_path or data_path.with_suffix(".json")
+    data_path.unlink(missing_ok=True)
+    meta_path.unlink(missing_ok=True)
+    meta_path.with_suffix(".profile.json").unlink(missing_ok=True)
+    for index_path in meta_path.parent.glob(f"{meta_path.stem}.keys.*.npz"):
+        index_path.unlink(missing_ok=True)
+
+
+def _register_sheet_cache(data_path: Path, meta_path: Path) -> None:
+    key = str(data_path)
+    size = data_path.stat().st_size + meta_path.stat().st_size
+    limit = SHEET_CACHE_MAX_MB * 1024 * 1024
+
+    def update(entries: dict) -> None:
+        entries[key] = {**entries.get(key, {}), "bytes": size, "last_used": time.time()}
+        for path in [p for p in entries if not Path(p).exists()]:
+            del entries[path]
+        total = sum(entry["bytes"] for entry in entries.values())
+        for path, entry in sorted(entries.items(), key=lambda item: item[1].get("last_used", 0)):
+            if total <= limit:
+                break
+            refs = {pid: n for pid, n in (entry.get("refs") or {}).items() if n > 0 and _pid_alive(int(pid))}
+            if refs or path == key:
+                continue
+            _drop_sheet_cache_files(Path(path))
+            total -= entry["bytes"]
+            del entries[path]
+
+    _update_sheet_cache_index(update)
+
+
+def _acquire_sheet_cache(data_path: Path) -> None:
+    pid = str(os.getpid())
+
+    def update(entries: dict) -> None:
+        entry = entries.get(str(data_path))
+        if entry is None:
+            return
+        refs = entry.setdefault("refs", {})
+        refs[pid] = refs.get(pid, 0) + 1
+        entry["last_used"] = time.time()
+
+    _update_sheet_cache_index(update)
+
+
+def _release_sheet_cache(data_path: Path) -> None:
+    pid = str(os.getpid())
+
+    def update(entries: dict) -> None:
+        refs = (entries.get(str(data_path)) or {}).get("refs") or {}
+        if refs.get(pid, 0) > 1:
+            refs[pid] -= 1
+        else:
+            refs.pop(pid, None)
+
+    try:
+        _update_sheet_cache_index(update)
+    except OSError:
+        pass
+
+
+def _iter_sheet_cache_meta(token_dir: Path, filename: str):
+    """Yield ``(meta_path, meta)`` for every cached parse of ``filename``."""
+    cache_dir = token_dir / SHEET_CACHE_DIR
+    if not cache_dir.is_dir():
+        return
+    for meta_path in cache_dir.glob("*.json"):
         try:
-            return datetime.strptime(text, fmt)
-        except ValueError:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
             continue
-    parsed = pd.to_datetime(text, errors="coerce", dayfirst=prefer_dayfirst)
-    if pd.isna(parsed):
-        parsed = pd.to_datetime(text, errors="coerce", dayfirst=not prefer_dayfirst)
-    if pd.isna(parsed):
-        return None
-    return parsed.to_pydatetime()
-
-
-def _coerce_export_cell(raw_value, column_meta: dict) -> tuple[object, str]:
-    text = _normalize_cell_text(raw_value)
-    trimmed = text.strip()
-    preset = (column_meta or {}).get("selected_preset") or "original"
-    source_type = (column_meta or {}).get("source_type") or "text"
-    original_number_format = (column_meta or {}).get("original_number_format") or "General"
-
-    if trimmed == "":
-        return "", PRESET_NUMBER_FORMATS.get(preset, original_number_format)
-
-    if preset == "text":
-        return text, PRESET_NUMBER_FORMATS["text"]
-
-    if preset == "general":
-        parsed_number = _parse_numeric_value(trimmed)
-        return (parsed_number, "General") if parsed_number is not None else (text, "General")
-
-    if preset in {"integer", "decimal_2"}:
-        parsed_number = _parse_numeric_value(trimmed)
-        if parsed_number is None:
-            return text, PRESET_NUMBER_FORMATS[preset]
-        if preset == "integer":
-            parsed_number = int(round(float(parsed_number)))
-        return parsed_number, PRESET_NUMBER_FORMATS[preset]
-
-    if preset == "percent_2":
-        parsed_number = _parse_numeric_value(trimmed, allow_percent=True)
-        return (parsed_number, PRESET_NUMBER_FORMATS[preset]) if parsed_number is not None else (text, PRESET_NUMBER_FORMATS[preset])
-
-    if preset in {"date_dmy", "date_mdy", "date_ymd", "datetime_dmy_hm"}:
-        prefer_dayfirst = preset in {"date_dmy", "datetime_dmy_hm"}
-        parsed_dt = _parse_datetime_value(trimmed, prefer_dayfirst=prefer_dayfirst)
-        if parsed_dt is None:
-            return text, PRESET_NUMBER_FORMATS[preset]
-        if preset == "datetime_dmy_hm":
-            return parsed_dt, PRESET_NUMBER_FORMATS[preset]
-        return parsed_dt.date(), PRESET_NUMBER_FORMATS[preset]
-
-    if source_type in {"integer", "decimal", "currency"}:
-        parsed_number = _parse_numeric_value(trimmed)
-        return (parsed_number, original_number_format) if parsed_number is not None else (text, original_number_format)
-
-    if source_type == "percent":
-        parsed_number = _parse_numeric_value(trimmed, allow_percent=True)
-        return (parsed_number, original_number_format) if parsed_number is not None else (text, original_number_format)
-
-    if source_type in {"date", "datetime"}:
-        parsed_dt = _parse_datetime_value(trimmed, prefer_dayfirst=True)
-        if parsed_dt is None:
-            return text, original_number_format
-        if source_type == "datetime":
-            return parsed_dt, original_number_format
-        return parsed_dt.date(), original_number_format
-
-    if source_type == "boolean":
-        lowered = trimmed.lower()
-        if lowered in {"true", "yes", "1"}:
-            return True, "General"
-        if lowered in {"false", "no", "0"}:
-            return False, "General"
-
-    return text, original_number_format
+        if meta.get("filename") == filename:
+            yield meta_path, meta
+
+
+def _load_sheet_view(
+    path: Path, filename: str, sheet_name: str | None, full: bool = False, progress: Callable[[str, int], None] | None = None
+) -> tuple[pd.DataFrame, list[dict], str | None, dict]:
+    """Load a sheet for display, as a preview when it is above the size thresholds.
+
+    Parses are cached next to the upload (``<token>/.cache``) and reused while
+    the sheet's fingerprint is unchanged, so re-rendering or re-uploading a
+    workbook only reparses the sheets that changed. ``full=True`` skips the
+    preview and loads (and caches) every row; it is counted against the
+    request memory budget (``MemoryBudgetExceeded`` when it does not fit).
+    ``progress(stage, rows)`` gets the parser's stages, or ``"cache"`` on a hit.
+    """
+    if full:
+        _reserve_memory(_estimate_sheet_bytes(path, filename, sheet_name))
+    plan = None if full else _preview_plan(path, filename, sheet_name)
+    nrows = plan["nrows"] if plan else None
+    cache_sheet, fingerprint = _sheet_fingerprint(path, filename, sheet_name)
+    if not fingerprint:
+        return _parse_sheet_view(path, filename, sheet_name, plan, progress)[:4]
+
+    token_dir = path.parent
+    cached = _read_sheet_cache(token_dir, filename, cache_sheet, nrows, fingerprint)
+    if cached is None:
+        # Concurrent requests for the same sheet (double submit, other tabs, other
+        # workers) wait here while the first one parses, then read its cache entry.
+        lock_path = _sheet_cache_paths(token_dir, filename, cache_sheet, nrows)[1].with_suffix(".lock")
+        with _single_flight(lock_path):
+            cached = _read_sheet_cache(token_dir, filename, cache_sheet, nrows, fingerprint)
+            if cached is None:
+                df, column_metadata, target_sheet, preview, meta = _parse_sheet_view(path, filename, sheet_name, plan, progress)
+                _write_sheet_cache(token_dir, filename, cache_sheet, nrows, fingerprint, df, meta)
+                return df, column_metadata, target_sheet, preview
+    df, meta = cached
+    if progress is not None:
+        progress("cache", len(df))
+    return df, meta["column_metadata"], meta["target_sheet"], meta["preview"]
+
+
+def _parse_sheet_view(path: Path, filename: str, sheet_name: str | None, plan: dict | None, progress=None):
+    df, column_metadata, target_sheet = load_sheet(
+        path, sheet_name, nrows=plan["nrows"] if plan else None, filename=filename, progress=progress
+    )
+    partial = bool(plan) and len(df) >= plan["nrows"]
+    preview = {
+        "partial": partial,
+        "loaded_rows": len(df),
+        "total_rows": plan["total_rows"] if partial else len(df),
+    }
+    meta = {"column_metadata": column_metadata, "target_sheet": target_sheet, "preview": preview}
+    return df, column_metadata, target_sheet, preview, meta
+
+
+@contextlib.contextmanager
+def _single_flight(lock_path: Path, timeout: float | None = None):
+    """Exclusive ``flock`` on ``lock_path``, shared by threads and gunicorn workers on this host.
+
+    Yields ``True`` once the lock is held, or ``False`` if it could not be taken
+    within ``timeout`` seconds (the caller then does the work itself).
+    """
+    if fcntl is None:
+        yield True
+        return
+    timeout = PARSE_LOCK_TIMEOUT_SECONDS if timeout is None else timeout
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a+b") as fh:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    logger.warning("gave up waiting for %s after %ss", lock_path.name, timeout)
+                    yield False
+                    return
+                time.sleep(0.05)
+        try:
+            yield True
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _diff_uploaded_sheets(old_path: Path | None, new_path: Path, filename: str) -> dict[str, list[str]]:
+    """Classify the sheets of a re-uploaded file against the previous version.
+
+    A sheet whose worksheet part is byte-identical still counts as unchanged when
+    only the shared strings or styles parts differ, as long as every string and
+    number format it refers to is the same in both versions.
+    """
+    new_prints = _sheet_fingerprints(new_path, filename)
+    try:
+        old_prints = _sheet_fingerprints(old_path, filename) if old_path and old_path.exists() else {}
+    except (OSError, zipfile.BadZipFile, KeyError, ET.ParseError):
+        old_prints = {}
+    diff: dict[str, list[str]] = {"changed": [], "unchanged": [], "added": [], "removed": []}
+    diff["removed"] = [sheet for sheet in old_prints if sheet not in new_prints]
+    shared = {}
+    for sheet, new_print in new_prints.items():
+        old_print = old_prints.get(sheet)
+        if old_print is None:
+            diff["added"].append(sheet)
+        elif old_print == new_print:
+            diff["unchanged"].append(sheet)
+        elif any(old_print.get(k) != new_print.get(k) for k in ("member", "crc", "size", "date1904")):
+            diff["changed"].append(sheet)
+        else:
+            if not shared:
+                with zipfile.ZipFile(old_path) as old_zf, zipfile.ZipFile(new_path) as new_zf:
+                    for label, zf in (("old", old_zf), ("new", new_zf)):
+                        parts = xlsx_workbook_parts(zf)
+                        shared[label] = (
+                            xlsx_shared_strings(zf, parts["shared_strings"]),
+                            xlsx_number_formats(zf, parts["styles"]),
+                        )
+            with zipfile.ZipFile(new_path) as new_zf:
+                string_refs, style_refs = xlsx_sheet_refs(new_zf, new_print["member"])
+            same = all(
+                _list_get(shared["old"][0], i) == _list_get(shared["new"][0], i) for i in string_refs
+            ) and all(_list_get(shared["old"][1], i) == _list_get(shared["new"][1], i) for i in style_refs)
+            diff["unchanged" if same else "changed"].append(sheet)
+    return diff
+
+
+def _list_get(values: list, index: int):
+    return values[index] if 0 <= index < len(values) else None
+
+
+def _refresh_sheet_cache(token_dir: Path, path: Path, filename: str, diff: dict[str, list[str]]) -> None:
+    """After a re-upload: re-key cached parses of unchanged sheets, drop the rest."""
+    try:
+        fingerprints = _sheet_fingerprints(path, filename)
+    except (OSError, zipfile.BadZipFile, KeyError, ET.ParseError):
+        fingerprints = {}
+    unchanged = set(diff.get("unchanged") or [])
+    for meta_path, meta in _iter_sheet_cache_meta(token_dir, filename):
+        sheet = meta.get("sheet")
+        if sheet in unchanged and sheet in fingerprints:
+            meta["fingerprint"] = fingerprints[sheet]
+            tmp = meta_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps(meta), encoding="utf-8")
+            os.replace(tmp, meta_path)
+        else:
+            _drop_sheet_cache_files(meta_path.with_name(meta.get("data_file") or f"{meta_path.stem}.arrow"), meta_path)
+
+
+def _iter_table_html(df: pd.DataFrame, chunk_rows: int = TABLE_STREAM_CHUNK_ROWS):
+    """Yield the sheet as an HTML table (same structure as ``df.to_html``) in row chunks."""
+    escape = html.escape
+    header_cells = "".join(f"<th>{escape(display_text(c), quote=False)}</th>" for c in df.columns)
+    yield (
+        f'<table border="0" class="{TABLE_CLASSES}"><thead><tr style="text-align: right;">'
+        f"{header_cells}</tr></thead><tbody>"
+    )
+    yield from _iter_table_rows_html(df, chunk_rows)
+    yield "</tbody></table>"
+
+
+def _iter_table_rows_html(df: pd.DataFrame, chunk_rows: int = TABLE_STREAM_CHUNK_ROWS):
+    escape = html.escape
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start : start + chunk_rows]
+        columns = [display_values(chunk.iloc[:, i]) for i in range(chunk.shape[1])]
+        parts = []
+        for row in zip(*columns):
+            parts.append("<tr>")
+            parts.extend(f"<td>{escape(text, quote=False)}</td>" for text in row)
+            parts.append("</tr>")
+        yield "".join(parts)
+
+
+HTTP_CACHE_DIR = "http"
+HTTP_GZIP_LEVEL = _get_env_int("HTTP_GZIP_LEVEL", 6)
+HTTP_BROTLI_QUALITY = _get_env_int("HTTP_BROTLI_QUALITY", 5)
+HTTP_COMPRESS_MIN_BYTES = 1024
+HTTP_COMPRESS_MIMETYPES = {"text/html", "application/json"}
+
+
+def _coalesce_chunks(chunks, size: int = STREAM_BUFFER_BYTES):
+    """Group many small template pieces into socket-sized writes."""
+    buf: list[str] = []
+    pending = 0
+    for chunk in chunks:
+        buf.append(chunk)
+        pending += len(chunk)
+        if pending >= size:
+            yield "".join(buf)
+            buf = []
+            pending = 0
+    if buf:
+        yield "".join(buf)
+
+
+def _stream_page(template_name: str, **context) -> Response:
+    # Create the CSRF token before the first byte: the session cookie cannot change mid-stream.
+    get_csrf_token()
+    return Response(_coalesce_chunks(stream_template(template_name, **context)), mimetype="text/html")
+
+
+def _response_encoding() -> str | None:
+    """Best content coding the client accepts: ``br`` (when brotli is installed), ``gzip`` or none."""
+    offered = ("br", "gzip") if _brotli_available() else ("gzip",)
+    return request.accept_encodings.best_match(offered)
+
+
+@functools.lru_cache(maxsize=1)
+def _brotli_available() -> bool:
+    return importlib.util.find_spec("brotli") is not None
+
+
+def _compressor(encoding: str | None):
+    """``(compress, finish)`` callables for a content coding; ``compress`` flushes so streams stay incremental."""
+    if encoding == "br":
+        import brotli
+
+        br = brotli.Compressor(quality=HTTP_BROTLI_QUALITY)
+        return (lambda data: br.process(data) + br.flush()), br.finish
+    if encoding == "gzip":
+        gz = zlib.compressobj(HTTP_GZIP_LEVEL, zlib.DEFLATED, 31)
+        return (lambda data: gz.compress(data) + gz.flush(zlib.Z_SYNC_FLUSH)), gz.flush
+    return (lambda data: data), (lambda: b"")
+
+
+def _compress_chunks(chunks, encoding: str | None, sink=None):
+    compress, finish = _compressor(encoding)
+    for chunk in chunks:
+        data = compress(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+        if data:
+            if sink is not None:
+                sink.write(data)
+            yield data
+    data = finish()
+    if sink is not None:
+        sink.write(data)
+    yield data
+
+
+@functools.lru_cache(maxsize=1)
+def _render_version() -> str:
+    """Changes whenever the code, templates or translations that shape a page change."""
+    app_dir = Path(__file__).parent
+    sources = [Path(__file__), *sorted((app_dir / "templates").glob("*.html")), *sorted(I18N_DIR.glob("*.json"))]
+    stamp = "".join(f"{p.name}:{p.stat().st_mtime_ns};" for p in sources if p.exists())
+    return hashlib.sha1(stamp.encode("utf-8")).hexdigest()[:12]
+
+
+def _cached_html_response(token_dir: Path, key_parts: tuple, produce) -> Response:
+    """Conditional, compressed HTML response whose bytes are cached on disk per ETag.
+
+    ``key_parts`` must identify the output completely (sheet fingerprint,
+    selection, language, ...). A matching ``If-None-Match`` gets a 304; a cache
+    hit is a ``sendfile`` of the stored (pre-compressed) bytes. On a miss
+    ``produce()`` returns ``(chunks, headers)`` and the body streams to the
+    client while it is written to the cache.
+    """
+    encoding = _response_encoding()
+    digest = hashlib.sha256(json.dumps([_render_version(), *key_parts], default=str).encode("utf-8")).hexdigest()[:32]
+    etag = f"{digest}-{encoding}" if encoding else digest
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        cache_dir = token_dir / SHEET_CACHE_DIR / HTTP_CACHE_DIR
+        body_path = cache_dir / f"{etag}.html"
+        headers_path = cache_dir / f"{etag}.headers.json"
+        try:
+            headers = json.loads(headers_path.read_text(encoding="utf-8")) if body_path.is_file() else None
+        except (OSError, ValueError):
+            headers = None
+        if headers is not None:
+            response = send_file(body_path, mimetype="text/html", etag=False, conditional=False, max_age=None)
+        else:
+            chunks, headers = produce()
+            response = Response(_cache_body(_compress_chunks(chunks, encoding), body_path, headers_path, headers), mimetype="text/html")
+        response.headers.update(headers)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def _cache_body(chunks, body_path: Path, headers_path: Path, headers: dict):
+    """Yield ``chunks`` while writing them to ``body_path``; publish only a complete body."""
+    body_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = body_path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+    done = False
+    try:
+        with open(tmp, "wb") as fh:
+            for chunk in chunks:
+                fh.write(chunk)
+                yield chunk
+        headers_path.write_text(json.dumps(headers), encoding="utf-8")
+        os.replace(tmp, body_path)
+        done = True
+    finally:
+        if not done:
+            tmp.unlink(missing_ok=True)
+
+
+@app.after_request
+def _compress_response(response: Response) -> Response:
+    """gzip/brotli for HTML and JSON responses that did not choose an encoding themselves."""
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in HTTP_COMPRESS_MIMETYPES
+    ):
+        return response
+    encoding = _response_encoding()
+    if not encoding:
+        return response
+    if response.is_streamed:
+        response.response = _compress_chunks(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < HTTP_COMPRESS_MIN_BYTES:
+            return response
+        response.set_data(b"".join(_compress_chunks([data], encoding)))
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
 
 
 def _cleanup_old_tokens_loop():
@@ -435,16 +823,10 @@ def _cleanup_old_tokens_loop():
                             continue
                         mtime = datetime.utcfromtimestamp(p.stat().st_mtime)
                         if now - mtime > ttl:
-                            for sub in p.glob("**/*"):
-                                try:
-                                    if sub.is_file():
-                                        sub.unlink(missing_ok=True)
-                                except Exception:
-                                    pass
-                            try:
-                                p.rmdir()
-                            except Exception:
-                                pass
+                            # Token dirs may hold subfolders (export jobs), so remove the whole tree.
+                            shutil.rmtree(p, ignore_errors=True)
+                        else:
+                            _cleanup_export_jobs(p)
                     except Exception:
                         continue
         except Exception as e:
@@ -452,12 +834,44 @@ def _cleanup_old_tokens_loop():
         time.sleep(interval_seconds)
 
 
-# Start cleanup thread (daemon)
-try:
-    t = threading.Thread(target=_cleanup_old_tokens_loop, name="uploads-cleaner", daemon=True)
-    t.start()
-except Exception as e:
-    logger.warning("failed starting cleanup thread: %s", e)
+_init_lock = threading.Lock()
+_initialized_pid: int | None = None
+
+
+def init_app() -> None:
+    """Per-process side effects: create UPLOAD_ROOT and start the cleanup thread.
+
+    Importing this module has no side effects. This runs before the first
+    request of each process (gunicorn's ``post_fork`` hook calls it earlier);
+    it keys on the pid because threads do not survive a fork, so a worker
+    forked from an initialized master still starts its own cleaner.
+    """
+    global _initialized_pid
+    if _initialized_pid == os.getpid():
+        return
+    with _init_lock:
+        if _initialized_pid == os.getpid():
+            return
+        UPLOAD_ROOT.mkdir(parents=True, exist_ok=True)
+        try:
+            t = threading.Thread(target=_cleanup_old_tokens_loop, name="uploads-cleaner", daemon=True)
+            t.start()
+        except Exception as e:
+            logger.warning("failed starting cleanup thread: %s", e)
+        _initialized_pid = os.getpid()
+
+
+def warm_imports() -> None:
+    """Import pandas/openpyxl now, e.g. in a ``preload_app`` master before forking."""
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
+    pd._load()
+    np._load()
+
+
+@app.before_request
+def _ensure_initialized():
+    init_app()
 
 
 # -----------------
@@ -510,8 +924,9 @@ def get_lang() -> str:
     return lang
 
 
-def tr(key: str) -> str:
-    lang = getattr(g, "lang", None) or session.get("lang") or "en"
+def tr(key: str, lang: str | None = None) -> str:
+    """``key`` in ``lang``, by default the request's language; pass ``lang`` outside a request context."""
+    lang = lang or getattr(g, "lang", None) or session.get("lang") or "en"
     locale = _get_locale(lang)
     if key in locale:
         return locale[key]
@@ -526,7 +941,551 @@ def _bind_lang():
 
 @app.context_processor
 def _inject_t():
-    return {"t": tr, "current_lang": getattr(g, "lang", "en"), "csrf_token": get_csrf_token}
+    return {
+        "t": tr,
+        "current_lang": getattr(g, "lang", "en"),
+        "csrf_token": get_csrf_token,
+        "static_asset": static_asset,
+    }
+
+
+# -------------
+# Static assets
+# -------------
+STATIC_DIR = Path(__file__).parent / "static"
+STATIC_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+_ASSET_NAME_RE = re.compile(r"^(?P<stem>[\w-]+)\.(?P<digest>[0-9a-f]{12})(?P<suffix>\.\w+)$")
+# Strings the workspace script reads from the #workspace-config blob.
+WORKSPACE_I18N_KEYS = (
+    "mapping_need_two_sheets",
+    "mapping_remove_row",
+    "mapping_choose_different_sheets",
+    "mapping_read_failed",
+    "mapping_need_row",
+    "mapping_need_key",
+    "mapping_done",
+    "color_automatic",
+    "color_theme",
+    "color_standard",
+    "mapping_left_missing",
+    "mapping_right_missing",
+    "mapping_done_duplicates",
+    "loading_rows",
+    "alert_network_error",
+    "search_not_found",
+    "search_need_term",
+    "replace_done",
+    "replace_all_done",
+    "flash_uploaded_unreadable",
+    "alert_select_at_least_one_sheet",
+    "preview_export_confirm",
+    "export_failed",
+    "export_cancelled",
+    "export_progress",
+    "filter",
+    "filter_search",
+    "filter_apply",
+    "filter_clear",
+    "filter_select_all",
+    "filter_blank",
+    "profile_select_column",
+    "profile_loading",
+    "profile_unavailable",
+    "profile_nulls",
+    "profile_blanks",
+    "profile_distinct",
+    "profile_min",
+    "profile_max",
+    "profile_mean",
+    "profile_top_values",
+    "profile_source_note",
+    "pivot_agg_sum",
+    "pivot_agg_count",
+    "pivot_agg_mean",
+    "pivot_agg_min",
+    "pivot_agg_max",
+    "pivot_agg_distinct",
+    "pivot_running",
+    "pivot_need_values",
+    "derived_sheet_reload_confirm",
+    "sheet_op_failed",
+    "merge_running",
+    "merge_need_key",
+    "dedupe_running",
+    "dedupe_need_keys",
+    "dedupe_summary",
+    "dedupe_none",
+    "dedupe_rows",
+    "dedupe_removed",
+    "diff_previous_version",
+    "diff_running",
+    "diff_counts",
+    "diff_status_changed",
+    "diff_status_unchanged",
+    "diff_status_added",
+    "diff_status_removed",
+    "queue_position",
+)
+
+
+@functools.lru_cache(maxsize=64)
+def _asset_bytes(name: str, mtime_ns: int) -> tuple[bytes, str]:
+    data = (STATIC_DIR / name).read_bytes()
+    return data, hashlib.sha256(data).hexdigest()[:12]
+
+
+def _asset(name: str) -> tuple[bytes, str] | None:
+    """``(bytes, content digest)`` of a file in ``static/``; re-read when its mtime changes."""
+    path = STATIC_DIR / name
+    try:
+        return _asset_bytes(name, path.stat().st_mtime_ns)
+    except OSError:
+        return None
+
+
+def static_asset(name: str) -> str:
+    """URL of a static file with its content hash in the name (``workspace.<hash>.js``)."""
+    asset = _asset(name)
+    if asset is None:
+        return url_for("static", filename=name)
+    stem, _, suffix = name.rpartition(".")
+    return url_for("static", filename=f"{stem}.{asset[1]}.{suffix}")
+
+
+@functools.lru_cache(maxsize=64)
+def _compressed_asset(data: bytes, encoding: str) -> bytes:
+    return b"".join(_compress_chunks([data], encoding))
+
+
+def _serve_static(filename: str):
+    """``/static`` view: hashed names are immutable for a year, and compressed once per encoding.
+
+    A hash that no longer matches (a page rendered before a deploy) gets the
+    current file without long-lived caching.
+    """
+    match = _ASSET_NAME_RE.match(filename)
+    if not match:
+        return send_from_directory(STATIC_DIR, filename, max_age=0)
+    name = match["stem"] + match["suffix"]
+    asset = _asset(name)
+    if asset is None:
+        abort(404)
+    data, digest = asset
+    mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    encoding = _response_encoding()
+    response = Response(_compressed_asset(data, encoding) if encoding else data, mimetype=mimetype)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    if digest == match["digest"]:
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+app.view_functions["static"] = _serve_static
+
+
+def _workspace_config(token: str) -> dict:
+    """Per-render values for ``static/workspace.js`` (everything else in the script is static)."""
+    return {
+        "token": token,
+        "csrfToken": get_csrf_token(),
+        "urls": {
+            "reupload": url_for("reupload_files", token=token),
+            "renderMulti": url_for("render_multi"),
+            "createExportJob": url_for("create_export_job"),
+            "profile": url_for("sheet_profile", token=token),
+            "pivot": url_for("pivot_sheet"),
+            "merge": url_for("merge_sheets"),
+            "dedupe": url_for("dedupe_sheet"),
+            "diff": url_for("diff_versions"),
+            "progress": url_for("progress_events", token=token, progress_id="PROGRESS_ID"),
+        },
+        "i18n": {key: tr(key) for key in WORKSPACE_I18N_KEYS},
+    }
+
+
+# ------------------------------------
+# Admission control for heavy requests
+# ------------------------------------
+# Parsing, sheet operations and exports run in at most HEAVY_REQUEST_SLOTS
+# requests at a time on this host (0 disables the limit). The work is CPU-bound,
+# so the default is one slot per CPU, capped by the request threads gunicorn
+# runs (WEB_CONCURRENCY x GUNICORN_THREADS); cheap pages are served by the other
+# threads. A request over capacity is answered at once with a queue ticket
+# instead of holding a thread; waiting tickets are served round-robin across
+# browser sessions.
+HEAVY_REQUEST_SLOTS = _get_env_int(
+    "HEAVY_REQUEST_SLOTS",
+    max(1, min(os.cpu_count() or 1, _get_env_int("WEB_CONCURRENCY", 2) * _get_env_int("GUNICORN_THREADS", 8))),
+)
+HEAVY_QUEUE_LIMIT = _get_env_int("HEAVY_QUEUE_LIMIT", 64)
+QUEUE_TICKET_TTL_SECONDS = 15  # tickets nobody polled for this long are dropped
+QUEUE_POLL_SECONDS = 1
+ADMISSION_DIR = ".admission"
+ADMISSION_LOCK_TIMEOUT_SECONDS = 5
+HEAVY_SLOT_WAIT_SECONDS = _get_env_int("HEAVY_SLOT_WAIT_SECONDS", 600)  # longest wait of a background export
+
+
+class _AdmissionUnavailable(Exception):
+    """The queue lock was not taken in time; the request is refused (503), never let through unqueued."""
+
+
+class _HeavySlot:
+    """A held slot: an exclusive ``flock`` on ``UPLOAD_ROOT/.admission/slot-<n>.lock``.
+
+    Closing the file releases it, so a crashed worker cannot leak its slot.
+    """
+
+    def __init__(self, fh=None):
+        self._fh = fh
+
+    def release(self) -> None:
+        fh, self._fh = self._fh, None
+        if fh is not None:
+            fh.close()
+
+
+def _admission_enabled() -> bool:
+    return HEAVY_REQUEST_SLOTS > 0 and fcntl is not None
+
+
+def _try_take_slot() -> _HeavySlot | None:
+    directory = UPLOAD_ROOT / ADMISSION_DIR
+    directory.mkdir(parents=True, exist_ok=True)
+    for n in range(HEAVY_REQUEST_SLOTS):
+        fh = open(directory / f"slot-{n}.lock", "a+b")
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            fh.close()
+            continue
+        return _HeavySlot(fh)
+    return None
+
+
+@contextlib.contextmanager
+def _admission_queue():
+    """The host-wide ticket queue ``{ticket: {"session", "created", "seen"}}``, read and written under a ``flock``.
+
+    Raises ``_AdmissionUnavailable`` when the lock is not free within
+    ``ADMISSION_LOCK_TIMEOUT_SECONDS``.
+    """
+    directory = UPLOAD_ROOT / ADMISSION_DIR
+    path = directory / "queue.json"
+    with _single_flight(directory / "queue.lock", timeout=ADMISSION_LOCK_TIMEOUT_SECONDS) as locked:
+        if not locked:
+            raise _AdmissionUnavailable()
+        try:
+            tickets = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            tickets = {}
+        now = time.time()
+        tickets = {k: v for k, v in tickets.items() if now - v.get("seen", 0) < QUEUE_TICKET_TTL_SECONDS}
+        yield tickets
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(tickets), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+def _fair_order(tickets: dict) -> list[str]:
+    """Ticket ids in service order: each session's oldest ticket first, then their second ones, and so on."""
+    turns: dict[str, int] = {}
+    ranked = []
+    for ticket, entry in sorted(tickets.items(), key=lambda item: item[1]["created"]):
+        turn = turns.get(entry["session"], 0)
+        turns[entry["session"]] = turn + 1
+        ranked.append((turn, entry["created"], ticket))
+    return [ticket for _, _, ticket in sorted(ranked)]
+
+
+def _admit(ticket: str | None, session_key: str) -> tuple[_HeavySlot | None, str | None, int]:
+    """Take a slot for a heavy request or keep it queued: ``(slot, ticket, position)``.
+
+    A request runs when a slot is free and no ticket is ahead of it in the fair
+    order. Otherwise it gets (or refreshes) a ticket at 1-based ``position``;
+    the ticket is ``None`` when the queue is full or its lock is stuck.
+    """
+    if not _admission_enabled():
+        return _HeavySlot(), None, 0
+    try:
+        return _admit_queued(ticket, session_key)
+    except _AdmissionUnavailable:
+        return None, None, 0
+
+
+def _admit_queued(ticket: str | None, session_key: str) -> tuple[_HeavySlot | None, str | None, int]:
+    with _admission_queue() as tickets:
+        now = time.time()
+        if ticket in tickets:
+            tickets[ticket]["seen"] = now
+        else:
+            if not tickets:
+                slot = _try_take_slot()
+                if slot is not None:
+                    return slot, None, 0
+            if len(tickets) >= HEAVY_QUEUE_LIMIT:
+                return None, None, 0
+            ticket = uuid.uuid4().hex
+            tickets[ticket] = {"session": session_key, "created": now, "seen": now}
+        position = _fair_order(tickets).index(ticket)
+        if position < HEAVY_REQUEST_SLOTS:
+            slot = _try_take_slot()
+            if slot is not None:
+                del tickets[ticket]
+                return slot, ticket, 0
+        return None, ticket, position + 1
+
+
+def _session_queue_key() -> str:
+    # The CSRF token already identifies the browser session; no new cookie state.
+    return hashlib.sha256(get_csrf_token().encode("utf-8")).hexdigest()[:16]
+
+
+def _wait_for_heavy_slot(session_key: str, on_wait=None) -> _HeavySlot:
+    """Block (in a background thread) until a slot is free, keeping a ticket in the fair queue.
+
+    Raises ``_AdmissionUnavailable`` after ``HEAVY_SLOT_WAIT_SECONDS`` (a full
+    queue issues no ticket, so nothing else ends the wait).
+    """
+    ticket = None
+    deadline = time.monotonic() + HEAVY_SLOT_WAIT_SECONDS
+    while True:
+        if time.monotonic() >= deadline:
+            raise _AdmissionUnavailable(f"no free heavy request slot within {HEAVY_SLOT_WAIT_SECONDS}s")
+        slot, admitted, position = _admit(ticket, session_key)
+        if slot is not None:
+            return slot
+        ticket = admitted or ticket  # a stuck queue lock keeps the ticket for the next try
+        if on_wait is not None:
+            on_wait(position)
+        time.sleep(QUEUE_POLL_SECONDS / 2)
+
+
+def _queued_response(ticket: str | None, position: int, page: bool) -> Response:
+    progress_url = url_for("queue_status", ticket=ticket) if ticket else None
+    message = tr("queue_position").replace("%s", str(position)) if ticket else tr("queue_full")
+    if page:
+        fields = [(k, v) for k, v in request.values.items(multi=True) if k != "queue_ticket"]
+        response = app.make_response((render_template(
+            "queued.html",
+            message=message,
+            ticket=ticket,
+            progress_url=progress_url,
+            method=request.method,
+            action=request.path,
+            fields=fields,
+            poll_ms=QUEUE_POLL_SECONDS * 1000,
+        ), 202 if ticket else 503))
+    elif ticket:
+        response = app.make_response(({
+            "queued": True, "ticket": ticket, "position": position, "progress_url": progress_url, "message": message,
+        }, 202))
+    else:
+        response = app.make_response(({"error": message}, 503))
+    # Drain the unread body (export payloads run to megabytes): closing the socket
+    # on it resets the connection before the client has read the answer.
+    while request.stream.read(STREAM_BUFFER_BYTES):
+        pass
+    response.headers["Retry-After"] = str(QUEUE_POLL_SECONDS)
+    return response
+
+
+def _heavy_request(page: bool = False):
+    """Run the view in a heavy slot; over capacity, answer at once with a queue ticket.
+
+    JSON callers get ``202 {"queued", "ticket", "position", "progress_url"}``
+    and repeat the request with an ``X-Queue-Ticket`` header once
+    ``/queue/<ticket>`` says ``ready``. ``page`` views (form posts and page
+    loads) get ``queued.html``, which waits and resubmits the same fields.
+    The slot is held until a streamed body has been sent; a body built in
+    memory gives it back at once.
+    """
+    def decorate(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            ticket = request.headers.get("X-Queue-Ticket") or request.values.get("queue_ticket")
+            slot, ticket, position = _admit(ticket, _session_queue_key())
+            if slot is None:
+                return _queued_response(ticket, position, page)
+            try:
+                response = app.make_response(view(*args, **kwargs))
+            except BaseException:
+                slot.release()
+                raise
+            if not response.is_streamed:
+                slot.release()
+            else:
+                # Ahead of the view's own close hooks: Response.close stops at the first
+                # hook that raises, and a slot must never outlive its response.
+                response._on_close.insert(0, slot.release)
+            return response
+        return wrapper
+    return decorate
+
+
+@app.route("/queue/<ticket>", methods=["GET"])
+def queue_status(ticket: str):
+    """Position of a queued heavy request; polling keeps the ticket alive."""
+    if not _ID_RE.match(ticket) or not _admission_enabled():
+        return {"error": tr("queue_ticket_expired"), "status": "expired"}, 404
+    try:
+        with _admission_queue() as tickets:
+            entry = tickets.get(ticket)
+            if entry is None:
+                return {"error": tr("queue_ticket_expired"), "status": "expired"}, 404
+            entry["seen"] = time.time()
+            position = _fair_order(tickets).index(ticket) + 1
+    except _AdmissionUnavailable:
+        return {"error": tr("queue_full"), "status": "busy"}, 503, {"Retry-After": str(QUEUE_POLL_SECONDS)}
+    ready = False
+    if position <= HEAVY_REQUEST_SLOTS:
+        slot = _try_take_slot()
+        ready = slot is not None
+        if slot is not None:
+            slot.release()
+    return {"ticket": ticket, "status": "ready" if ready else "queued", "position": position}
+
+
+# ------------------------------------
+# Progress events (Server-Sent Events)
+# ------------------------------------
+# Long requests (opening sheets, version diff) write their stage and row count to
+# <token>/.progress/<id>.json; /progress/<token>/<id> streams it as SSE, export
+# jobs stream their job state the same way. Streams hold a connection for their
+# whole length, which is why gunicorn runs threaded workers.
+PROGRESS_DIR = ".progress"
+PROGRESS_WRITE_SECONDS = 0.25  # row-count updates are throttled; stage changes are written at once
+PROGRESS_POLL_SECONDS = 0.25
+PROGRESS_KEEPALIVE_SECONDS = 15
+PROGRESS_STREAM_MAX_SECONDS = _get_env_int("PROGRESS_STREAM_MAX_SECONDS", 600)
+PROGRESS_FINISHED = {"done", "failed"}
+
+
+class _ProgressReporter:
+    """Stage and row progress of one request, for progress streams and timing metrics.
+
+    With a valid ``progress_id`` (sent by the page that started the request)
+    the state, including a translated ``message``, is written for
+    ``/progress`` streams. Stage durations are always collected; they go out
+    in the ``Server-Timing`` header and the log. The language is taken when
+    the reporter is created, so it can finish from a response close hook,
+    after the request context is gone.
+    """
+
+    def __init__(self, token_dir: Path, progress_id: str | None, name: str, items_total: int = 0):
+        self.name = name
+        self.lang = (g.get("lang") if has_app_context() else None) or "en"
+        self.path = token_dir / PROGRESS_DIR / f"{progress_id}.json" if _ID_RE.match(progress_id or "") else None
+        self.state = {"status": "running", "stage": "start", "item": "", "items_done": 0, "items_total": items_total, "rows": 0}
+        self.timings: dict[str, float] = {}
+        self._stage_started = time.perf_counter()
+        self._last_write = 0.0
+        self._write()
+
+    def stage(self, stage: str, **fields) -> None:
+        if stage != self.state["stage"]:
+            self._close_stage()
+        self.state.update(stage=stage, **fields)
+        self._write()
+
+    def rows(self, stage: str, rows: int) -> None:
+        """``(stage, rows)`` callback for the sheet readers."""
+        if stage != self.state["stage"]:
+            self.stage(stage, rows=rows)
+            return
+        self.state["rows"] = rows
+        if time.monotonic() - self._last_write >= PROGRESS_WRITE_SECONDS:
+            self._write()
+
+    def finish(self, status: str = "done") -> None:
+        """Write the final state and log the timings; never raises (it runs as a close hook too)."""
+        try:
+            self._close_stage()
+            self.state["status"] = status
+            self.state["timings"] = {stage: round(seconds * 1000, 1) for stage, seconds in self.timings.items()}
+            self._write()
+            logger.info("%s %s in %.0f ms (%s)", self.name, status, sum(self.timings.values()) * 1000, self.server_timing())
+        except Exception:
+            logger.exception("failed finishing %s progress", self.name)
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.timings.items())
+
+    def _close_stage(self) -> None:
+        now = time.perf_counter()
+        stage = self.state["stage"]
+        self.timings[stage] = self.timings.get(stage, 0.0) + now - self._stage_started
+        self._stage_started = now
+
+    def _write(self) -> None:
+        self._last_write = time.monotonic()
+        if self.path is None:
+            return
+        state = self.state
+        message = tr(f"progress_stage_{state['stage']}", self.lang) % {"item": state["item"], "rows": f"{state['rows']:,}"}
+        if state["items_total"] > 1:
+            done, total = min(state["items_done"] + 1, state["items_total"]), state["items_total"]
+            message = f"{tr('progress_item_of', self.lang) % (done, total)}: {message}"
+        try:
+            self.path.parent.mkdir(exist_ok=True)
+            tmp = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps({**state, "message": message}), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as exc:
+            logger.warning("failed writing progress state: %s", exc)
+
+
+def _iter_progress_events(read_state: Callable[[], dict | None], finished: set[str]) -> Iterator[str]:
+    """``text/event-stream`` chunks: a ``progress`` event each time the state changes, until it finishes.
+
+    States are files, so any worker can serve the stream; one that does not
+    exist yet (the page subscribes before its request starts) is waited for.
+    """
+    last = None
+    started = last_sent = time.monotonic()
+    while time.monotonic() - started < PROGRESS_STREAM_MAX_SECONDS:
+        state = read_state()
+        if state is not None:
+            data = json.dumps(state)
+            if data != last:
+                last, last_sent = data, time.monotonic()
+                yield f"event: progress\ndata: {data}\n\n"
+            if state.get("status") in finished:
+                return
+        if time.monotonic() - last_sent >= PROGRESS_KEEPALIVE_SECONDS:
+            last_sent = time.monotonic()
+            yield ": keep-alive\n\n"
+        time.sleep(PROGRESS_POLL_SECONDS)
+    yield "event: timeout\ndata: {}\n\n"
+
+
+def _event_stream_response(events: Iterator[str]) -> Response:
+    response = Response(events, mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # nginx: pass events through unbuffered
+    return response
+
+
+@app.route("/progress/<token>/<progress_id>", methods=["GET"])
+def progress_events(token: str, progress_id: str):
+    """SSE stream of the progress a request started with ``progress=<progress_id>`` reports."""
+    token_dir = _existing_token_dir(token)
+    if token_dir is None or not _ID_RE.match(progress_id):
+        return {"error": tr("progress_not_found")}, 404
+    path = token_dir / PROGRESS_DIR / f"{progress_id}.json"
+
+    def read_state() -> dict | None:
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    return _event_stream_response(_iter_progress_events(read_state, PROGRESS_FINISHED))
 
 
 @app.route("/set-lang/<lang>")
@@ -580,6 +1539,42 @@ def upload_files():
     return redirect(url_for("select", token=token))
 
 
+@app.route("/reupload/<token>", methods=["POST"])
+def reupload_files(token: str):
+    """Replace files of an existing upload; cached parses of unchanged sheets are kept.
+
+    The replaced version stays in ``<token>/.versions`` so ``/diff`` can compare against it.
+    """
+    token_dir = _existing_token_dir(token)
+    if token_dir is None:
+        return {"error": tr("flash_selected_file_not_found")}, 404
+
+    results = {}
+    for f in request.files.getlist("files"):
+        if not f or not f.filename or not allowed_file(f.filename):
+            continue
+        filename = secure_filename(f.filename)
+        path = token_dir / filename
+        incoming = token_dir / f".{uuid.uuid4().hex}.upload"
+        f.save(incoming)
+        try:
+            diff = _diff_uploaded_sheets(path, incoming, filename)
+        except (zipfile.BadZipFile, KeyError, ET.ParseError, OSError):
+            incoming.unlink(missing_ok=True)
+            return {"error": tr("flash_uploaded_unreadable")}, 400
+        if path.is_file():
+            _keep_previous_version(token_dir, path)  # for /diff against the last version
+        os.replace(incoming, path)
+        _refresh_sheet_cache(token_dir, path, filename, diff)
+        is_csv = filename.rsplit(".", 1)[1].lower() == "csv"
+        diff["selections"] = [f"{filename}::{'' if is_csv else sheet}" for sheet in diff["changed"] + diff["added"]]
+        results[filename] = diff
+
+    if not results:
+        return {"error": tr("flash_no_valid_files")}, 400
+    return {"files": results}
+
+
 @app.route("/select/<token>", methods=["GET"])
 def select(token: str):
     dest_dir = get_token_dir(token)
@@ -600,8 +1595,7 @@ def select(token: str):
         else:
             csv_meta = {}
             try:
-                xls = pd.ExcelFile(p)
-                sheets = list(xls.sheet_names)
+                sheets = sheet_names(p)
             except Exception:
                 sheets = []
         files.append({"filename": filename, "ext": ext, "sheets": sheets, "csv_meta": csv_meta})
@@ -613,10 +1607,13 @@ def select(token: str):
     return render_template("select.html", token=token, files=files)
 
 
-@app.route("/render", methods=["POST"])
+@app.route("/render", methods=["GET", "POST"])
+@_heavy_request(page=True)
 def render_view():
-    token = request.form.get("token")
-    selection = request.form.get("selection")
+    # GET is the cacheable form (ETag / 304, pre-compressed body on disk).
+    values = request.args if request.method == "GET" else request.form
+    token = values.get("token")
+    selection = values.get("selection")
     if not token or not selection:
         flash(tr("flash_invalid_selection"))
         return redirect(url_for("index"))
@@ -632,16 +1629,31 @@ def render_view():
         flash(tr("flash_selected_file_not_found"))
         return redirect(url_for("index"))
 
+    def produce():
+        df, _, target_sheet, preview = _load_sheet_view(path, filename, sheet_name or None)
+        return _stream_page(
+            "view.html",
+            filename=filename,
+            sheet_name=target_sheet,
+            table_chunks=_iter_table_html(df),
+            token=token,
+            preview=preview,
+        )
+
     try:
-        df, _, target_sheet = _load_sheet_dataframe(path, filename, sheet_name or None)
-        table_html = df.to_html(classes="table table-striped table-sm", index=False, border=0, na_rep="")
-        return render_template("view.html", filename=filename, sheet_name=target_sheet, table_html=table_html, token=token)
+        if request.method == "GET" and filename == secure_filename(filename):
+            cache_sheet, fingerprint = _sheet_fingerprint(path, filename, sheet_name or None)
+            if fingerprint:
+                key = ("render", filename, cache_sheet, fingerprint, g.lang)
+                return _cached_html_response(dest_dir, key, lambda: (produce().response, {}))
+        return produce()
     except Exception as e:
         flash(f"{tr('flash_failed_open_file')}: {e}")
         return redirect(url_for("select", token=token))
 
 
 @app.route("/render_multi", methods=["POST"])
+@_heavy_request(page=True)
 def render_multi():
     token = request.form.get("token")
     selections = request.form.getlist("selection")
@@ -650,9 +1662,12 @@ def render_multi():
         return redirect(url_for("index"))
 
     dest_dir = get_token_dir(token)
+    changed = set(request.form.getlist("changed"))
+    active = request.form.get("active")
+    reporter = _ProgressReporter(dest_dir, request.form.get("progress"), "render_multi", items_total=len(selections))
 
     views = []
-    for sel in selections:
+    for number, sel in enumerate(selections):
         if "::" in sel:
             filename, sheet_name = sel.split("::", 1)
         else:
@@ -662,88 +1677,1339 @@ def render_multi():
         if not path.exists():
             continue
 
+        reporter.stage("parse", item=f"{filename} {sheet_name}".strip(), items_done=number, rows=0)
         try:
-            df, column_metadata, target_sheet = _load_sheet_dataframe(path, filename, sheet_name or None)
+            df, column_metadata, target_sheet, preview = _load_sheet_view(
+                path, filename, sheet_name or None, progress=reporter.rows
+            )
             label = f"{filename}" if not target_sheet else f"{filename} - {target_sheet}"
-            table_html = df.to_html(classes="table table-striped table-sm", index=False, border=0, na_rep="")
             views.append({
                 "id": f"v_{len(views)}",
                 "label": label,
                 "filename": filename,
                 "sheet_name": target_sheet,
-                "table_html": table_html,
+                "table_chunks": _iter_table_html(df),
                 "column_metadata": column_metadata,
+                "selection": f"{filename}::{target_sheet or ''}",
+                "changed": sel in changed,
+                "active": sel == active,
+                **preview,
             })
         except Exception:
             continue
 
     if not views:
+        reporter.finish("failed")
         flash(tr("flash_selected_sheets_could_not_be_opened"))
         return redirect(url_for("select", token=token))
+    if not any(view["active"] for view in views):
+        views[0]["active"] = True
+
+    # Rows are rendered while the page streams; "render" covers the page shell.
+    reporter.stage("render", items_done=len(selections))
+    response = _stream_page(
+        "multi_view.html",
+        token=token,
+        views=views,
+        column_format_presets=COLUMN_FORMAT_PRESETS,
+        workspace_config=_workspace_config(token),
+    )
+    # Headers go out before the rows stream, so Server-Timing carries the stages
+    # done by then; the progress state and log line are finished once the
+    # streamed body has been sent, "render" included.
+    response.headers["Server-Timing"] = reporter.server_timing()
+    response.call_on_close(reporter.finish)
+    return response
+
+
+def _selection_arg(token: str):
+    """``(token_dir, path, filename, sheet_name)`` for the ``selection`` query arg, or an error response."""
+    return _resolve_selection(token, request.args.get("selection") or "")
+
+
+def _resolve_selection(token: str, selection: str):
+    token_dir = _existing_token_dir(token)
+    filename, _, sheet_name = str(selection).partition("::")
+    if token_dir is None or not filename or filename != secure_filename(filename) or not allowed_file(filename):
+        return {"error": tr("flash_invalid_selection")}, 400
+    path = token_dir / filename
+    if not path.is_file():
+        return {"error": tr("flash_selected_file_not_found")}, 404
+    return token_dir, path, filename, sheet_name
+
+
+@app.route("/rows/<token>", methods=["GET"])
+@_heavy_request()
+def sheet_rows(token: str):
+    """Stream ``<tr>`` rows of a sheet after ``offset`` (completes a preview)."""
+    resolved = _selection_arg(token)
+    if isinstance(resolved[0], dict):
+        return resolved
+    token_dir, path, filename, sheet_name = resolved
+    offset = max(0, request.args.get("offset", 0, type=int))
+
+    def produce():
+        _reserve_memory(_estimate_sheet_bytes(path, filename, sheet_name or None))
+        df, _, _ = load_sheet(path, sheet_name or None, skiprows=offset, with_metadata=False, filename=filename)
+        headers = {"X-Row-Offset": str(offset), "X-Row-Count": str(len(df))}
+        return _coalesce_chunks(_iter_table_rows_html(df)), headers
+
+    try:
+        cache_sheet, fingerprint = _sheet_fingerprint(path, filename, sheet_name or None)
+        if fingerprint:
+            return _cached_html_response(token_dir, ("rows", filename, cache_sheet, fingerprint, offset), produce)
+        chunks, headers = produce()
+    except SheetOperationError as e:
+        return {"error": e.message()}, e.status
+    except Exception as e:
+        return {"error": f"{tr('flash_failed_open_file')}: {e}"}, 400
+    response = Response(chunks, mimetype="text/html")
+    response.headers.update(headers)
+    return response
+
+
+PROFILE_TOP_K = 5
+PROFILE_HISTOGRAM_BINS = 10
+PROFILE_EXACT_DISTINCT_ROWS = _get_env_int("PROFILE_EXACT_DISTINCT_ROWS", 200_000)
+PROFILE_VERSION = 1
+_HLL_PRECISION = 14
+
+
+def _estimate_distinct(series: pd.Series) -> int:
+    """HyperLogLog estimate of the distinct non-null values (~0.8% standard error at 2**14 registers)."""
+    hashes = pd.util.hash_pandas_object(series.dropna(), index=False).to_numpy(dtype=np.uint64)
+    if not len(hashes):
+        return 0
+    p = _HLL_PRECISION
+    m = 1 << p
+    buckets = (hashes >> np.uint64(64 - p)).astype(np.intp)
+    rest = (hashes & np.uint64((1 << (64 - p)) - 1)).astype(np.float64)
+    # Position of the first set bit in the remaining 64 - p bits: frexp's exponent
+    # is the bit length (exact, 50 bits fit the float mantissa; 0 gives 0).
+    rank = ((64 - p) + 1 - np.frexp(rest)[1]).astype(np.uint8)
+    registers = np.zeros(m, dtype=np.uint8)
+    maxima = pd.Series(rank).groupby(buckets).max()
+    registers[maxima.index.to_numpy()] = maxima.to_numpy()
+    estimate = (0.7213 / (1 + 1.079 / m)) * m * m / float(np.exp2(-registers.astype(np.float64)).sum())
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * np.log(m / zeros)  # small-range correction (linear counting)
+    return int(round(estimate))
+
+
+def _profile_value(value):
+    if value is None or value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and (value != value or value in (float("inf"), float("-inf"))):
+        return None
+    return value if isinstance(value, (bool, int, float, str)) else str(value)
+
+
+def _profile_column(name: str, series: pd.Series) -> dict:
+    """Vectorized statistics of one parsed column (blank = empty or whitespace-only text)."""
+    valid = series.dropna()
+    dtype = series.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        kind = "boolean"
+    elif pd.api.types.is_numeric_dtype(dtype):
+        kind = "number"
+    elif pd.api.types.is_datetime64_any_dtype(dtype):
+        kind = "date"
+    else:
+        kind = "text"
+
+    blanks = 0
+    if kind == "text" and len(valid):
+        if isinstance(dtype, pd.CategoricalDtype):
+            blank_codes = np.flatnonzero(dtype.categories.astype(str).str.strip() == "")
+            blanks = int(np.isin(valid.cat.codes.to_numpy(), blank_codes).sum())
+        else:
+            text = valid if isinstance(dtype, pd.StringDtype) else valid.astype("string")
+            blanks = int(text.str.strip().eq("").sum())
+
+    # Categoricals count their (few) categories exactly; anything else that is large is estimated.
+    estimated = len(valid) > PROFILE_EXACT_DISTINCT_ROWS and not isinstance(dtype, pd.CategoricalDtype)
+    profile = {
+        "name": name,
+        "kind": kind,
+        "count": int(len(series)),
+        "nulls": int(len(series) - len(valid)),
+        "blanks": blanks,
+        "distinct": _estimate_distinct(valid) if estimated else int(valid.nunique()),
+        "distinct_estimated": estimated,
+        "top": [
+            [_profile_value(value), int(count)]
+            for value, count in valid.value_counts().head(PROFILE_TOP_K).items()
+            if count
+        ],
+        "min": None,
+        "max": None,
+        "mean": None,
+        "histogram": None,
+    }
+    if kind in {"number", "date"} and len(valid):
+        if kind == "date":
+            values = valid.to_numpy(dtype="datetime64[ns]").astype(np.int64)
+            to_value = lambda v: pd.Timestamp(int(v)).isoformat()
+        else:
+            values = valid.to_numpy(dtype=np.float64)
+            to_value = _profile_value
+        counts, edges = np.histogram(values, bins=PROFILE_HISTOGRAM_BINS)
+        profile.update(
+            min=to_value(values.min()),
+            max=to_value(values.max()),
+            mean=to_value(values.mean()),
+            histogram={"edges": [to_value(edge) for edge in edges], "counts": counts.tolist()},
+        )
+    return profile
+
+
+def _sheet_profile(path: Path, filename: str, sheet_name: str | None, fingerprint: dict | None, cache_sheet: str | None) -> dict:
+    """Column profiles of the whole sheet, cached next to the parsed sheet (``<key>.profile.json``)."""
+    profile_path = None
+    if fingerprint:
+        profile_path = _sheet_cache_paths(path.parent, filename, cache_sheet, None)[1].with_suffix(".profile.json")
+        try:
+            cached = json.loads(profile_path.read_text(encoding="utf-8"))
+            if cached.get("version") == PROFILE_VERSION and cached.get("fingerprint") == fingerprint:
+                return cached["profile"]
+        except (OSError, ValueError):
+            pass
+    df, _, target_sheet, _ = _load_sheet_view(path, filename, sheet_name, full=True)
+    profile = {
+        "sheet": target_sheet,
+        "rows": int(len(df)),
+        "columns": [_profile_column(display_text(label), df.iloc[:, i]) for i, label in enumerate(df.columns)],
+    }
+    if profile_path is not None:
+        profile_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = profile_path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        tmp.write_text(json.dumps({"version": PROFILE_VERSION, "fingerprint": fingerprint, "profile": profile}), encoding="utf-8")
+        os.replace(tmp, profile_path)
+    return profile
+
+
+@app.route("/profile/<token>", methods=["GET"])
+@_heavy_request()
+def sheet_profile(token: str):
+    """Per-column statistics of a sheet (nulls, blanks, distinct, min/max/mean, top values, histogram)."""
+    resolved = _selection_arg(token)
+    if isinstance(resolved[0], dict):
+        return resolved
+    _, path, filename, sheet_name = resolved
+    cache_sheet, fingerprint = _sheet_fingerprint(path, filename, sheet_name or None)
+    etag = None
+    if fingerprint:
+        key = json.dumps([PROFILE_VERSION, filename, cache_sheet, fingerprint], sort_keys=True)
+        etag = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+    try:
+        profile = _sheet_profile(path, filename, sheet_name or None, fingerprint, cache_sheet)
+    except Exception as e:
+        return {"error": f"{tr('flash_failed_open_file')}: {e}"}, 400
+    response = app.make_response(profile)
+    if etag:
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+class SheetOperationError(ValueError):
+    """User-facing failure of a sheet operation (pivot, merge, ...): an i18n key plus ``%`` arguments."""
+
+    def __init__(self, key: str, *args) -> None:
+        super().__init__(key, *args)
+        self.key = key
+        self.args_ = args
+
+    status = 400
+
+    def message(self) -> str:
+        text = tr(self.key)
+        return text % self.args_ if self.args_ else text
+
+
+class MemoryBudgetExceeded(SheetOperationError):
+    """A full load would take the request past ``REQUEST_MEMORY_BUDGET_MB``."""
+
+    status = 413
+
+
+NUMERIC_SOURCE_TYPES = {"integer", "decimal", "percent", "currency"}
+DATE_SOURCE_TYPES = {"date", "datetime"}
+DERIVED_PREVIEW_ROWS = 200
+DERIVED_CHUNK_ROWS = 100_000
+
+
+def _sheet_column_index(df: pd.DataFrame, name) -> int:
+    """Position of the column whose header text (as shown in the workspace) is ``name``."""
+    target = str(name).strip()
+    for idx, label in enumerate(df.columns):
+        if display_text(label).strip() == target:
+            return idx
+    raise SheetOperationError("sheet_op_unknown_column", target)
+
+
+def _typed_column(series: pd.Series, source_type: str | None) -> pd.Series:
+    """Column as its inferred ``source_type``: text that holds numbers/dates (CSV) is converted, unparsable cells become missing.
+
+    Conversion runs over the distinct values only (``factorize``), so repeated
+    text costs one parse per value rather than per cell.
+    """
+    to_number = source_type in NUMERIC_SOURCE_TYPES and not pd.api.types.is_numeric_dtype(series.dtype)
+    to_date = source_type in DATE_SOURCE_TYPES and not pd.api.types.is_datetime64_any_dtype(series.dtype)
+    if not (to_number or to_date):
+        return series
+    codes, uniques = pd.factorize(series)
+    text = pd.Series(np.asarray(uniques, dtype=object)).astype("string")
+    if to_number:
+        text = text.str.replace(r"[\s,]", "", regex=True)
+        scale = np.where(text.str.endswith("%").fillna(False), 0.01, 1.0)
+        values = np.append(pd.to_numeric(text.str.rstrip("%"), errors="coerce").to_numpy(dtype=np.float64) * scale, np.nan)
+    else:
+        parsed = pd.to_datetime(text, errors="coerce", dayfirst=True, format="mixed")
+        values = np.append(parsed.to_numpy(dtype="datetime64[ns]"), np.datetime64("NaT", "ns"))
+    # Missing cells have code -1, which picks the trailing NaN/NaT.
+    return pd.Series(values[codes], index=series.index)
+
+
+def _derived_sheet_name(token_dir: Path, prefix: str, filename: str, sheet: str | None) -> str:
+    stem = secure_filename(f"{prefix}_{filename.rsplit('.', 1)[0]}_{sheet or ''}".strip("_")) or prefix
+    name = f"{stem}.csv"
+    counter = 2
+    while (token_dir / name).exists():
+        name = f"{stem}_{counter}.csv"
+        counter += 1
+    return name
+
+
+class _DerivedSheetWriter:
+    """A derived sheet written to its CSV one chunk (DataFrame) at a time.
+
+    Results produced in chunks (merge, diff) spill to the token directory as
+    they are built rather than being concatenated in memory first; the file
+    appears under its name only on ``close()``.
+    """
+
+    def __init__(self, token_dir: Path, filename: str) -> None:
+        self.token_dir = token_dir
+        self.filename = filename
+        self.tmp = token_dir / f".{filename}.{uuid.uuid4().hex}.tmp"
+        self.row_count = 0
+        self.headers: list[str] = []
+        self.head: list[list[str]] = []
+        self._fh = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        df = compact_frame(df)  # integral floats (from unstacked gaps) print as integers
+        first = self._fh is None
+        if first:
+            self._fh = open(self.tmp, "w", encoding="utf-8-sig", newline="")
+            self.headers = [display_text(c) for c in df.columns]
+        df.to_csv(self._fh, index=False, header=first, date_format="%Y-%m-%d %H:%M:%S")
+        if len(self.head) < DERIVED_PREVIEW_ROWS:
+            head = df.head(DERIVED_PREVIEW_ROWS - len(self.head))
+            columns = [display_values(head.iloc[:, i]) for i in range(head.shape[1])]
+            self.head.extend(list(row) for row in zip(*columns))
+        self.row_count += len(df)
+
+    def close(self) -> dict:
+        """Publish the sheet; returns the compact result: ``selection``, headers and the first ``DERIVED_PREVIEW_ROWS`` rows."""
+        self._fh.close()
+        os.replace(self.tmp, self.token_dir / self.filename)
+        return {
+            "filename": self.filename,
+            "selection": f"{self.filename}::CSV",
+            "row_count": int(self.row_count),
+            "headers": self.headers,
+            "rows": self.head,
+        }
+
+    def discard(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+        self.tmp.unlink(missing_ok=True)
+
+
+def _save_derived_sheet(token_dir: Path, filename: str, chunks) -> dict:
+    """Write an operation result (a DataFrame, or DataFrame chunks with the same columns) next to the uploads.
+
+    It opens as a tab (and exports) like any CSV. Returns the compact result:
+    the new ``selection``, headers and the first ``DERIVED_PREVIEW_ROWS`` rows
+    as display text.
+    """
+    writer = _DerivedSheetWriter(token_dir, filename)
+    try:
+        for chunk in [chunks] if isinstance(chunks, pd.DataFrame) else chunks:
+            writer.write(chunk)
+        return writer.close()
+    except BaseException:
+        writer.discard()
+        raise
+
+
+# -----------
+# Pivot table
+# -----------
+PIVOT_AGGREGATIONS = {"sum": "sum", "count": "count", "mean": "mean", "min": "min", "max": "max", "distinct": "nunique"}
+PIVOT_MAX_COLUMNS = _get_env_int("PIVOT_MAX_COLUMNS", 500)
+
+
+def _pivot_sheet(df: pd.DataFrame, column_metadata: list[dict], rows: list, columns: list, values: list[dict]) -> pd.DataFrame:
+    """Group-by/pivot of a parsed sheet as a flat table.
+
+    ``rows``/``columns`` are header names used as row and column keys;
+    ``values`` are ``{"column", "agg"}`` pairs. One hash aggregation over all
+    keys, then the column keys are unstacked into ``"<key> / ... | <column> (<agg>)"``
+    headers. Missing keys form their own (blank) group.
+    """
+    if not values:
+        raise SheetOperationError("pivot_need_values")
+    types = {idx: (meta or {}).get("source_type") for idx, meta in enumerate(column_metadata or [])}
+    work = {}
+    key_names = []
+    for i, name in enumerate([*rows, *columns]):
+        key_names.append(f"k{i}")
+        work[f"k{i}"] = df.iloc[:, _sheet_column_index(df, name)]
+    if not rows:
+        # A constant row key keeps the shape uniform: one row of grand totals per column key.
+        key_names.insert(0, "_all")
+        work["_all"] = np.zeros(len(df), dtype=np.int8)
+    spec = {}
+    for j, item in enumerate(values):
+        agg = str((item or {}).get("agg") or "sum").lower()
+        if agg not in PIVOT_AGGREGATIONS:
+            raise SheetOperationError("pivot_invalid_aggregation", agg, item.get("column"))
+        idx = _sheet_column_index(df, item.get("column"))
+        series = _typed_column(df.iloc[:, idx], types.get(idx))
+        numeric = pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype)
+        dated = pd.api.types.is_datetime64_any_dtype(series.dtype)
+        if (agg in {"sum", "mean"} and not numeric) or (agg in {"min", "max"} and not (numeric or dated)):
+            raise SheetOperationError("pivot_invalid_aggregation", agg, item.get("column"))
+        work[f"v{j}"] = series
+        spec[f"a{j}"] = (f"v{j}", PIVOT_AGGREGATIONS[agg])
+    labels = {f"a{j}": f"{display_text(item.get('column'))} ({str(item.get('agg') or 'sum').lower()})" for j, item in enumerate(values)}
+
+    frame = pd.DataFrame(work)
+    result = frame.groupby(key_names, sort=True, observed=True, dropna=False).agg(**spec)
+    row_levels = len(key_names) - len(columns)
+    if columns:
+        result = result.unstack(list(range(row_levels, len(key_names))))
+        if result.shape[1] > PIVOT_MAX_COLUMNS:
+            raise SheetOperationError("pivot_too_many_columns", PIVOT_MAX_COLUMNS)
+        # (agg, key1, key2, ...) -> "key1 / key2 | Amount (sum)", column keys first like Excel.
+        result.columns = [
+            f"{' / '.join(display_text(k) for k in keys)} | {labels[agg]}" for agg, *keys in result.columns
+        ]
+    else:
+        result.columns = [labels[c] for c in result.columns]
+    result = result.reset_index()
+    if not rows:
+        result = result.drop(columns="_all")
+    result = result.rename(columns={f"k{i}": display_text(name) for i, name in enumerate(rows)})
+    return result
+
+
+@app.route("/pivot", methods=["POST"])
+@_heavy_request()
+def pivot_sheet():
+    """Aggregate a cached sheet into a new derived sheet (JSON: token, selection, rows, columns, values)."""
+    payload = request.get_json(silent=True) or {}
+    resolved = _resolve_selection(payload.get("token") or "", payload.get("selection") or "")
+    if isinstance(resolved[0], dict):
+        return resolved
+    token_dir, path, filename, sheet_name = resolved
+    rows, columns, values = payload.get("rows") or [], payload.get("columns") or [], payload.get("values") or []
+    if not all(isinstance(v, list) for v in (rows, columns, values)):
+        return {"error": tr("flash_invalid_selection")}, 400
+    try:
+        df, column_metadata, target_sheet, _ = _load_sheet_view(path, filename, sheet_name or None, full=True)
+        result = _pivot_sheet(df, column_metadata, rows, columns, values)
+    except SheetOperationError as e:
+        return {"error": e.message()}, e.status
+    except Exception as e:
+        return {"error": f"{tr('flash_failed_open_file')}: {e}"}, 400
+    name = _derived_sheet_name(token_dir, "pivot", filename, target_sheet)
+    return _save_derived_sheet(token_dir, name, result)
+
+
+# ---------------------
+# Merge (lookup) sheets
+# ---------------------
+MERGE_JOINS = ("left", "inner", "anti")
+MERGE_DUPLICATES = ("first", "last", "all")
+MERGE_MAX_ROWS = _get_env_int("MERGE_MAX_ROWS", 5_000_000)
+KEY_INDEX_VERSION = 1
+
+
+def _key_text(df: pd.DataFrame, positions: list[int]) -> tuple[pd.Series, np.ndarray]:
+    """Join key of every row as compared by Mapping Compare: display text without line breaks, trimmed."""
+    parts = []
+    for idx in positions:
+        series = df.iloc[:, idx]
+        if isinstance(series.dtype, pd.StringDtype):
+            text = series.fillna("")  # already display text; skip the per-cell conversion
+        else:
+            text = pd.Series(display_values(series), index=series.index, dtype=object)
+        parts.append(text.str.replace(r"[\r\n]", "", regex=True).str.strip())
+    key = parts[0]
+    for part in parts[1:]:
+        key = key + "\x1f" + part
+    blank = np.logical_and.reduce([(part == "").to_numpy() for part in parts])
+    return key, blank
+
+
+def _build_key_index(df: pd.DataFrame, positions: list[int]) -> dict[str, np.ndarray]:
+    """Hash index over the key columns: 64-bit key hashes plus row positions sorted by hash.
+
+    Rows with every key part blank never match. Rows sharing a key stay in
+    sheet order inside their run, so "first"/"last" are run ends.
+    """
+    key, blank = _key_text(df, positions)
+    hashes = pd.util.hash_array(key.to_numpy(dtype=object))
+    order = np.flatnonzero(~blank)
+    order = order[np.argsort(hashes[order], kind="stable")]
+    return {"hashes": hashes, "blank": blank, "order": order, "sorted": hashes[order]}
+
+
+def _sheet_key_index(path: Path, filename: str, sheet_name: str | None, df: pd.DataFrame, positions: list[int]) -> dict[str, np.ndarray]:
+    """Key index of a sheet, cached next to its parse (``<key>.keys.<columns>.npz``) while the fingerprint holds."""
+    cache_sheet, fingerprint = _sheet_fingerprint(path, filename, sheet_name)
+    if not fingerprint:
+        return _build_key_index(df, positions)
+    digest = hashlib.sha1(json.dumps([KEY_INDEX_VERSION, positions]).encode("utf-8")).hexdigest()[:16]
+    index_path = _sheet_cache_paths(path.parent, filename, cache_sheet, None)[1].with_suffix(f".keys.{digest}.npz")
+    stamp = json.dumps(fingerprint, sort_keys=True)
+    try:
+        with np.load(index_path) as data:
+            if str(data["fingerprint"]) == stamp and len(data["hashes"]) == len(df):
+                return {name: data[name] for name in ("hashes", "blank", "order", "sorted")}
+    except (OSError, ValueError, KeyError):
+        pass
+    index = _build_key_index(df, positions)
+    try:
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = index_path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        with open(tmp, "wb") as fh:
+            np.savez(fh, fingerprint=np.array(stamp), **index)
+        os.replace(tmp, index_path)
+    except OSError as exc:
+        logger.warning("failed writing key index for %s/%s: %s", filename, cache_sheet, exc)
+    return index
+
+
+def _merge_sheets(
+    left: pd.DataFrame,
+    right: pd.DataFrame,
+    left_index: dict,
+    right_index: dict,
+    take: list[int],
+    join: str,
+    duplicates: str,
+    right_label: str,
+) -> Iterator[pd.DataFrame]:
+    """VLOOKUP-style merge: left rows (in order) with the ``take`` columns of their matching right rows.
+
+    ``join`` is ``left`` (unmatched rows kept, blank lookups), ``inner``
+    (matched rows only) or ``anti`` (unmatched rows only, no lookup columns).
+    ``duplicates`` picks the ``first``/``last`` right row per key, or ``all``
+    of them (one output row each). The result comes in ``DERIVED_CHUNK_ROWS``
+    chunks (at least one), so it never has to exist as one frame.
+    """
+    sorted_hashes, order = right_index["sorted"], right_index["order"]
+    probe = left_index["hashes"]
+    lo = np.searchsorted(sorted_hashes, probe, side="left")
+    hi = np.searchsorted(sorted_hashes, probe, side="right")
+    counts = np.where(left_index["blank"], 0, hi - lo)
+    matched = counts > 0
+    if join == "anti":
+        rows = np.flatnonzero(~matched)
+        for start in range(0, max(len(rows), 1), DERIVED_CHUNK_ROWS):
+            yield left.iloc[rows[start:start + DERIVED_CHUNK_ROWS]].reset_index(drop=True)
+        return
+
+    if duplicates == "all":
+        runs = counts if join == "inner" else np.maximum(counts, 1)
+        total = int(runs.sum())
+        if total > MERGE_MAX_ROWS:
+            raise SheetOperationError("merge_too_many_rows", MERGE_MAX_ROWS)
+        left_pos = np.repeat(np.arange(len(left)), runs)
+        step = np.arange(total) - np.repeat(np.cumsum(runs) - runs, runs)
+        slots, hit = np.repeat(lo, runs) + step, np.repeat(matched, runs)
+    else:
+        left_pos = np.arange(len(left)) if join == "left" else np.flatnonzero(matched)
+        slots, hit = (lo if duplicates == "first" else hi - 1)[left_pos], matched[left_pos]
+    right_pos = np.full(len(left_pos), -1, dtype=np.int64)
+    right_pos[hit] = order[slots[hit]]
+
+    headers = [display_text(c) for c in left.columns]
+    used = set(headers)
+    for idx in take:
+        name = display_text(right.columns[idx])
+        headers.append(f"{name} ({right_label})" if name in used else name)
+        used.add(headers[-1])
+    headers = dedupe_headers(headers)
+    lookup = right.iloc[:, take].reset_index(drop=True)
+    for start in range(0, max(len(left_pos), 1), DERIVED_CHUNK_ROWS):
+        stop = start + DERIVED_CHUNK_ROWS
+        # Missing lookups (-1) are not in the index, so reindex leaves them blank.
+        looked_up = lookup.reindex(right_pos[start:stop])
+        chunk = pd.concat(
+            [left.iloc[left_pos[start:stop]].reset_index(drop=True), looked_up.reset_index(drop=True)],
+            axis=1,
+            ignore_index=True,
+        )
+        chunk.columns = headers
+        yield chunk
 
-    return render_template("multi_view.html", token=token, views=views, column_format_presets=COLUMN_FORMAT_PRESETS)
 
+@app.route("/merge", methods=["POST"])
+@_heavy_request()
+def merge_sheets():
+    """Pull columns of a lookup sheet into a sheet by key (JSON: token, selection, lookup, keys, columns, join, duplicates)."""
+    payload = request.get_json(silent=True) or {}
+    token = payload.get("token") or ""
+    resolved = _resolve_selection(token, payload.get("selection") or "")
+    if isinstance(resolved[0], dict):
+        return resolved
+    lookup = _resolve_selection(token, payload.get("lookup") or "")
+    if isinstance(lookup[0], dict):
+        return lookup
+    token_dir, path, filename, sheet_name = resolved
+    _, lookup_path, lookup_filename, lookup_sheet = lookup
+    keys, columns = payload.get("keys") or [], payload.get("columns") or []
+    join = str(payload.get("join") or "left").lower()
+    duplicates = str(payload.get("duplicates") or "first").lower()
+    if not isinstance(keys, list) or not isinstance(columns, list) or join not in MERGE_JOINS or duplicates not in MERGE_DUPLICATES:
+        return {"error": tr("flash_invalid_selection")}, 400
+    if not keys:
+        return {"error": tr("merge_need_key")}, 400
+    try:
+        left, _, target_sheet, _ = _load_sheet_view(path, filename, sheet_name or None, full=True)
+        right, _, lookup_target, _ = _load_sheet_view(lookup_path, lookup_filename, lookup_sheet or None, full=True)
+        pairs = [(item or {}) for item in keys]
+        left_keys = [_sheet_column_index(left, item.get("left")) for item in pairs]
+        right_keys = [_sheet_column_index(right, item.get("right")) for item in pairs]
+        if columns:
+            take = [_sheet_column_index(right, name) for name in columns]
+        else:
+            take = [i for i in range(right.shape[1]) if i not in right_keys]
+        left_index = _sheet_key_index(path, filename, sheet_name or None, left, left_keys)
+        right_index = _sheet_key_index(lookup_path, lookup_filename, lookup_sheet or None, right, right_keys)
+        label = lookup_target or lookup_filename.rsplit(".", 1)[0]
+        chunks = _merge_sheets(left, right, left_index, right_index, take, join, duplicates, label)
+        name = _derived_sheet_name(token_dir, "merge", filename, target_sheet)
+        return _save_derived_sheet(token_dir, name, chunks)
+    except SheetOperationError as e:
+        return {"error": e.message()}, e.status
+    except Exception as e:
+        return {"error": f"{tr('flash_failed_open_file')}: {e}"}, 400
+
+
+# --------------
+# Duplicate keys
+# --------------
+DEDUPE_KEEP = ("first", "last", "complete")
+DEDUPE_APPLY = ("rows", "sheet")
+DEDUPE_SAMPLE_GROUPS = 20
+DEDUPE_SAMPLE_ROWS = 10
+
+
+def _row_completeness(df: pd.DataFrame) -> np.ndarray:
+    """Non-blank cells per row (missing values and empty text count as blank)."""
+    score = np.zeros(len(df), dtype=np.int32)
+    for i in range(df.shape[1]):
+        series = df.iloc[:, i]
+        filled = series.notna()
+        if series.dtype == object:
+            series = series.astype("string")
+        if isinstance(series.dtype, pd.StringDtype):
+            filled &= series.str.strip().ne("").fillna(False)
+        score += filled.to_numpy(dtype=np.int32)
+    return score
+
+
+def _dedupe_plan(df: pd.DataFrame, positions: list[int], index: dict, keep: str) -> dict:
+    """Duplicate-key groups of a sheet and the rows to drop under ``keep``, in linear time.
+
+    Rows are grouped by their hashed key (``factorize`` over the key index
+    hashes); one row per group is kept: the ``first``, the ``last`` or the
+    most ``complete`` (most non-blank cells, earliest on ties). Rows whose key
+    parts are all blank are never treated as duplicates.
+    """
+    valid = np.flatnonzero(~index["blank"])
+    codes, _ = pd.factorize(index["hashes"][valid])
+    sizes = np.bincount(codes) if len(codes) else np.zeros(0, dtype=np.int64)
+    frame = pd.DataFrame({"row": valid})
+    groups = frame.groupby(codes, sort=False)["row"]
+    if keep == "first":
+        kept = groups.min().to_numpy()
+    elif keep == "last":
+        kept = groups.max().to_numpy()
+    else:
+        frame["score"] = _row_completeness(df)[valid]
+        kept = frame["row"].to_numpy()[frame.groupby(codes, sort=False)["score"].idxmax().to_numpy()]
+    drop = np.zeros(len(df), dtype=bool)
+    drop[valid] = True
+    drop[kept] = False
+
+    repeated = np.flatnonzero(sizes > 1)
+    top = repeated[np.argsort(-sizes[repeated], kind="stable")[:DEDUPE_SAMPLE_GROUPS]]
+    sample = []
+    for code in top:
+        rows = valid[codes == code]
+        sample.append({
+            "key": [display_values(df.iloc[rows[:1], idx])[0] for idx in positions],
+            "count": int(sizes[code]),
+            "rows": [int(r) + 1 for r in rows[:DEDUPE_SAMPLE_ROWS]],
+        })
+    return {
+        "rows": int(len(df)),
+        "groups": int(len(repeated)),
+        "duplicates": int(drop.sum()),
+        "sample": sample,
+        "drop": np.flatnonzero(drop),
+    }
+
+
+@app.route("/dedupe", methods=["POST"])
+@_heavy_request()
+def dedupe_sheet():
+    """Report duplicate keys of a cached sheet; optionally drop them (JSON: token, selection, keys, keep, apply).
+
+    ``apply="rows"`` also returns the 0-based positions to drop, so the
+    workspace removes them from the loaded table as one undoable change;
+    ``apply="sheet"`` saves the deduplicated sheet as a derived tab instead.
+    """
+    payload = request.get_json(silent=True) or {}
+    resolved = _resolve_selection(payload.get("token") or "", payload.get("selection") or "")
+    if isinstance(resolved[0], dict):
+        return resolved
+    token_dir, path, filename, sheet_name = resolved
+    keys = payload.get("keys") or []
+    keep = str(payload.get("keep") or "first").lower()
+    apply = payload.get("apply") or None
+    if not isinstance(keys, list) or keep not in DEDUPE_KEEP or (apply and apply not in DEDUPE_APPLY):
+        return {"error": tr("flash_invalid_selection")}, 400
+    if not keys:
+        return {"error": tr("dedupe_need_keys")}, 400
+    try:
+        df, _, target_sheet, _ = _load_sheet_view(path, filename, sheet_name or None, full=True)
+        positions = [_sheet_column_index(df, name) for name in keys]
+        index = _sheet_key_index(path, filename, sheet_name or None, df, positions)
+        plan = _dedupe_plan(df, positions, index, keep)
+    except SheetOperationError as e:
+        return {"error": e.message()}, e.status
+    except Exception as e:
+        return {"error": f"{tr('flash_failed_open_file')}: {e}"}, 400
+    drop = plan.pop("drop")
+    if apply == "rows":
+        plan["drop"] = drop.tolist()
+    elif apply == "sheet":
+        kept = np.ones(len(df), dtype=bool)
+        kept[drop] = False
+        name = _derived_sheet_name(token_dir, "dedupe", filename, target_sheet)
+        plan.update(_save_derived_sheet(token_dir, name, df.iloc[np.flatnonzero(kept)].reset_index(drop=True)))
+    return plan
+
+
+# ---------------------
+# Workbook version diff
+# ---------------------
+VERSIONS_DIR = ".versions"
+DIFF_CHUNK_ROWS = 50_000
+DIFF_BYTES_PER_ROW = 64  # row hashes, sort orders and match masks of both sides
+DIFF_SAMPLE_CHANGES = 50
+DIFF_ARROW = " → "
+
+
+def _previous_version_path(token_dir: Path, filename: str) -> Path:
+    """Where ``/reupload`` keeps the version of ``filename`` it replaced."""
+    return token_dir / VERSIONS_DIR / filename
+
+
+def _keep_previous_version(token_dir: Path, path: Path) -> None:
+    """Hard-link (or copy) the current upload aside before a re-upload replaces it."""
+    previous = _previous_version_path(token_dir, path.name)
+    previous.parent.mkdir(exist_ok=True)
+    tmp = previous.with_name(f".{previous.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        os.link(path, tmp)
+    except OSError:
+        shutil.copy2(path, tmp)
+    os.replace(tmp, previous)
+
+
+def _cell_text(series: pd.Series) -> np.ndarray:
+    """Cells as display text (object array, blanks as "")."""
+    if isinstance(series.dtype, pd.StringDtype):
+        return series.fillna("").to_numpy(dtype=object)
+    return np.asarray(display_values(series), dtype=object)
+
+
+def _row_hashes(df: pd.DataFrame, positions: list[int]) -> np.ndarray:
+    """64-bit hash of each row's display text over the columns at ``positions`` (in that order).
+
+    Rows are hashed ``DIFF_CHUNK_ROWS`` at a time, so only one chunk of cell
+    text exists at once however long the sheet is.
+    """
+    hashes = np.empty(len(df), dtype=np.uint64)
+    for start in range(0, len(df), DIFF_CHUNK_ROWS):
+        chunk = df.iloc[start:start + DIFF_CHUNK_ROWS]
+        combined = np.zeros(len(chunk), dtype=np.uint64)
+        for idx in positions:
+            combined = combined * np.uint64(1_000_003) ^ pd.util.hash_array(_cell_text(chunk.iloc[:, idx]))
+        hashes[start:start + len(chunk)] = combined
+    return hashes
+
+
+def _match_hashes(
+    old_hashes: np.ndarray, new_hashes: np.ndarray, old_rows: np.ndarray, new_rows: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Pair rows with equal hashes; the k-th new row of a hash takes the k-th old row of it.
+
+    Both sides are walked as hash-sorted runs (stable sorts, so sheet order
+    holds inside a run). Returns the matched ``(old rows, new rows)``.
+    """
+    old_rows = old_rows[np.argsort(old_hashes[old_rows], kind="stable")]
+    new_rows = new_rows[np.argsort(new_hashes[new_rows], kind="stable")]
+    old_sorted, new_sorted = old_hashes[old_rows], new_hashes[new_rows]
+    rank = np.arange(len(new_sorted)) - np.searchsorted(new_sorted, new_sorted, side="left")
+    lo = np.searchsorted(old_sorted, new_sorted, side="left")
+    hi = np.searchsorted(old_sorted, new_sorted, side="right")
+    hit = rank < hi - lo
+    return old_rows[(lo + rank)[hit]], new_rows[hit]
+
+
+def _pair_unmatched_in_gaps(
+    old_pos: np.ndarray, new_pos: np.ndarray, old_len: int, new_len: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Pair the rows content matching left over that sit between the same matched rows.
+
+    A row's gap is the old row matched just before it (for a new row: the old
+    partner of the new row matched just before it, -1 above the first match).
+    Inside a gap the k-th unmatched old row pairs with the k-th unmatched new
+    row, as a line diff would; surplus rows stay removed or added.
+    """
+    matched_old, matched_new = np.zeros(old_len, dtype=bool), np.zeros(new_len, dtype=bool)
+    matched_old[old_pos] = True
+    matched_new[new_pos] = True
+    removed, added = np.flatnonzero(~matched_old), np.flatnonzero(~matched_new)
+    by_new = np.argsort(new_pos, kind="stable")
+    old_anchors = np.concatenate([[-1], np.sort(old_pos)])
+    new_anchors = np.concatenate([[-1], old_pos[by_new]])
+    old_gap = (old_anchors[np.searchsorted(old_anchors[1:], removed)] + 1).astype(np.uint64)
+    new_gap = (new_anchors[np.searchsorted(new_pos[by_new], added)] + 1).astype(np.uint64)
+    old_rows, new_rows = _match_hashes(old_gap, new_gap, np.arange(len(removed)), np.arange(len(added)))
+    return removed[old_rows], added[new_rows]
+
+
+def _diff_sheet_versions(
+    old: pd.DataFrame,
+    new: pd.DataFrame,
+    sink,
+    old_index: dict | None = None,
+    new_index: dict | None = None,
+) -> dict:
+    """Row- and cell-level changes from ``old`` to ``new``; the diff sheet goes to ``sink`` chunk by chunk.
+
+    Columns pair up by header. Rows pair up by key (``*_index``, the sheets'
+    key indexes) when given, otherwise by the content of the shared columns,
+    where the rows left over pair up by position between the same unchanged
+    rows (``_pair_unmatched_in_gaps``) to read as modified. The diff sheet
+    holds changed rows only: modified and added rows in new-sheet order, then
+    removed rows; a changed cell reads ``old → new``. Returns the report.
+    """
+    old_headers = [display_text(c) for c in old.columns]
+    new_headers = [display_text(c) for c in new.columns]
+    old_at = {name: i for i, name in enumerate(old_headers)}
+    common = [(old_at[name], j) for j, name in enumerate(new_headers) if name in old_at]
+    shared = {j: i for i, j in common}
+    old_only = [i for i in range(len(old_headers)) if i not in set(shared.values())]
+    old_content = _row_hashes(old, [i for i, _ in common])
+    new_content = _row_hashes(new, [j for _, j in common])
+
+    if old_index is not None:
+        old_pos, new_pos = _match_hashes(
+            old_index["hashes"], new_index["hashes"],
+            np.flatnonzero(~old_index["blank"]), np.flatnonzero(~new_index["blank"]),
+        )
+    else:
+        old_pos, new_pos = _match_hashes(old_content, new_content, np.arange(len(old)), np.arange(len(new)))
+        old_gap, new_gap = _pair_unmatched_in_gaps(old_pos, new_pos, len(old), len(new))
+        old_pos, new_pos = np.concatenate([old_pos, old_gap]), np.concatenate([new_pos, new_gap])
+    matched_old, matched_new = np.zeros(len(old), dtype=bool), np.zeros(len(new), dtype=bool)
+    matched_old[old_pos] = True
+    matched_new[new_pos] = True
+    added, removed = np.flatnonzero(~matched_new), np.flatnonzero(~matched_old)
+    modified = old_content[old_pos] != new_content[new_pos]
+    order = np.argsort(new_pos[modified], kind="stable")
+    old_pos, new_pos = old_pos[modified][order], new_pos[modified][order]
+
+    labels = [tr("diff_col_change"), tr("diff_col_old_row"), tr("diff_col_new_row")]
+    headers = dedupe_headers(labels + new_headers + [old_headers[i] for i in old_only])
+    sample = []
+    cells = np.zeros(len(common), dtype=np.int64)
+
+    def block(kind: str, old_rows: np.ndarray | None, new_rows: np.ndarray | None, columns: list) -> pd.DataFrame:
+        count = len(new_rows if new_rows is not None else old_rows)
+        frame = {0: np.full(count, tr(f"diff_{kind}"), dtype=object)}
+        for pos, rows in ((1, old_rows), (2, new_rows)):
+            frame[pos] = pd.array(rows + 1 if rows is not None else [None] * count, dtype="Int64")
+        frame.update({3 + k: values for k, values in enumerate(columns)})
+        return pd.DataFrame(frame).set_axis(headers, axis=1)
+
+    for start in range(0, len(new_pos), DIFF_CHUNK_ROWS):
+        old_rows, new_rows = old_pos[start:start + DIFF_CHUNK_ROWS], new_pos[start:start + DIFF_CHUNK_ROWS]
+        old_chunk, new_chunk = old.iloc[old_rows], new.iloc[new_rows]
+        columns = [_cell_text(new_chunk.iloc[:, j]) for j in range(new.shape[1])]
+        differs = np.zeros((len(new_rows), len(common)), dtype=bool)
+        befores, afters = {}, {}
+        for c, (i, j) in enumerate(common):
+            before, after = _cell_text(old_chunk.iloc[:, i]), columns[j]
+            differs[:, c] = before != after
+            if differs[:, c].any():
+                befores[c], afters[c] = before, after
+                columns[j] = np.where(differs[:, c], before + DIFF_ARROW + after, after)
+        cells += differs.sum(axis=0)
+        for r, c in np.argwhere(differs)[:max(DIFF_SAMPLE_CHANGES - len(sample), 0)]:
+            sample.append({
+                "old_row": int(old_rows[r]) + 1,
+                "new_row": int(new_rows[r]) + 1,
+                "column": new_headers[common[c][1]],
+                "old": befores[c][r],
+                "new": afters[c][r],
+            })
+        columns += [_cell_text(old_chunk.iloc[:, i]) for i in old_only]
+        sink(block("modified", old_rows, new_rows, columns))
+    for start in range(0, len(added), DIFF_CHUNK_ROWS):
+        rows = added[start:start + DIFF_CHUNK_ROWS]
+        chunk = new.iloc[rows]
+        columns = [_cell_text(chunk.iloc[:, j]) for j in range(new.shape[1])]
+        columns += [np.full(len(rows), "", dtype=object) for _ in old_only]
+        sink(block("added", None, rows, columns))
+    for start in range(0, len(removed), DIFF_CHUNK_ROWS):
+        rows = removed[start:start + DIFF_CHUNK_ROWS]
+        chunk = old.iloc[rows]
+        columns = [
+            _cell_text(chunk.iloc[:, shared[j]]) if j in shared else np.full(len(rows), "", dtype=object)
+            for j in range(new.shape[1])
+        ]
+        columns += [_cell_text(chunk.iloc[:, i]) for i in old_only]
+        sink(block("removed", rows, None, columns))
 
-def _sanitize_sheet_name(name: str) -> str:
-    # Remove invalid characters: : \ / ? * [ ]
-    name = re.sub(r"[:\\/\?\*\[\]]", " ", name)
-    name = name.strip() or "Sheet"
-    return name[:31]
+    return {
+        "match": "key" if old_index is not None else "content",
+        "old_rows": int(len(old)),
+        "new_rows": int(len(new)),
+        "added": int(len(added)),
+        "removed": int(len(removed)),
+        "modified": int(len(new_pos)),
+        "unchanged": int(len(modified) - len(new_pos)),
+        "cells": int(cells.sum()),
+        "columns_added": [name for name in new_headers if name not in old_at],
+        "columns_removed": [old_headers[i] for i in old_only],
+        "column_changes": {new_headers[j]: int(n) for (_, j), n in zip(common, cells) if n},
+        "changes": sample,
+    }
+
+
+@app.route("/diff", methods=["POST"])
+@_heavy_request()
+def diff_versions():
+    """Compare a file with an earlier version of it (JSON: token, selection, base, keys, all_sheets).
+
+    ``base`` is another uploaded file of the same type, or empty for the
+    version the last ``/reupload`` replaced. Sheets align by name (sheets
+    whose parts did not change are skipped unparsed); ``keys`` are the header
+    names rows align by, in sheets that have them in both versions. Every
+    sheet with changed rows gets a ``diff_<file>_<sheet>.csv`` derived tab.
+    """
+    payload = request.get_json(silent=True) or {}
+    token = payload.get("token") or ""
+    resolved = _resolve_selection(token, payload.get("selection") or "")
+    if isinstance(resolved[0], dict):
+        return resolved
+    token_dir, path, filename, sheet_name = resolved
+    keys = payload.get("keys") or []
+    if not isinstance(keys, list):
+        return {"error": tr("flash_invalid_selection")}, 400
+    base = str(payload.get("base") or "")
+    if base:
+        based = _resolve_selection(token, f"{base}::")
+        if isinstance(based[0], dict):
+            return based
+        base_path, base_filename = based[1], based[2]
+    else:
+        base_path, base_filename = _previous_version_path(token_dir, filename), filename
+        if not base_path.is_file():
+            return {"error": tr("diff_no_previous")}, 404
+    ext = filename.rsplit(".", 1)[1].lower()
+    if base_filename.rsplit(".", 1)[1].lower() != ext:
+        return {"error": tr("diff_type_mismatch")}, 400
+
+    try:
+        status = _diff_uploaded_sheets(base_path, path, filename)
+    except (zipfile.BadZipFile, KeyError, ET.ParseError, OSError):
+        return {"error": tr("flash_uploaded_unreadable")}, 400
+    kinds = {sheet: kind for kind, sheets in status.items() for sheet in sheets}
+    order = [s for s in _sheet_fingerprints(path, filename) if s in kinds] + status["removed"]
+    if not payload.get("all_sheets"):
+        only = sheet_name or (order[0] if order else None)
+        order = [s for s in order if s == only]
+
+    reporter = _ProgressReporter(token_dir, payload.get("progress"), "diff", items_total=len(order))
+    sheets, selections = [], []
+    for number, sheet in enumerate(order):
+        entry = {"sheet": None if ext == "csv" else sheet, "status": kinds[sheet]}
+        sheets.append(entry)
+        if kinds[sheet] != "changed":
+            continue
+        load_as = None if ext == "csv" else sheet
+        reporter.stage("parse", item=f"{filename} {load_as or ''}".strip(), items_done=number, rows=0)
+        # Both versions are loaded in full and the pair is charged against the request
+        # memory budget with the alignment arrays; it is given back before the next sheet.
+        try:
+            with _memory_reservations_released():
+                old, _, _, _ = _load_sheet_view(base_path, base_filename, load_as, full=True, progress=reporter.rows)
+                new, _, target_sheet, _ = _load_sheet_view(path, filename, load_as, full=True, progress=reporter.rows)
+                _reserve_memory((len(old) + len(new)) * DIFF_BYTES_PER_ROW)
+                new_headers = {display_text(c).strip() for c in new.columns}
+                old_headers = {display_text(c).strip() for c in old.columns}
+                indexes = {}
+                if keys and all(str(k).strip() in new_headers and str(k).strip() in old_headers for k in keys):
+                    old_keys = [_sheet_column_index(old, k) for k in keys]
+                    new_keys = [_sheet_column_index(new, k) for k in keys]
+                    indexes = {
+                        "old_index": _sheet_key_index(base_path, base_filename, load_as, old, old_keys),
+                        "new_index": _sheet_key_index(path, filename, load_as, new, new_keys),
+                    }
+                writer = _DerivedSheetWriter(token_dir, _derived_sheet_name(token_dir, "diff", filename, target_sheet))
+                reporter.stage("compare", rows=len(new))
+                try:
+                    report = _diff_sheet_versions(old, new, writer.write, **indexes)
+                except BaseException:
+                    writer.discard()
+                    raise
+                del old, new, indexes
+        except SheetOperationError as e:
+            reporter.finish("failed")
+            return {"error": e.message()}, e.status
+        except Exception as e:
+            reporter.finish("failed")
+            return {"error": f"{tr('flash_failed_open_file')}: {e}"}, 400
+        entry.update(report)
+        if writer.row_count:
+            entry["selection"] = writer.close()["selection"]
+            selections.append(entry["selection"])
+            continue
+        writer.discard()
+        if not (report["columns_added"] or report["columns_removed"]):
+            entry["status"] = "unchanged"  # only formatting or shared parts differed
+
+    changed = [e for e in sheets if e["status"] != "unchanged"]
+    message = tr("diff_summary") % (
+        len(changed),
+        sum(e.get("added", 0) for e in sheets),
+        sum(e.get("removed", 0) for e in sheets),
+        sum(e.get("modified", 0) for e in sheets),
+    ) if changed else tr("diff_no_changes")
+    reporter.finish()
+    return {
+        "base": base or f"{filename} ({tr('diff_previous_version')})",
+        "sheets": sheets,
+        "selections": selections,
+        "selection": selections[0] if selections else None,
+        "message": message,
+    }, {"Server-Timing": reporter.server_timing()}
+
+
+def _export_download_name(filename: str, fmt: str, sheet_count: int) -> str:
+    """Swap the extension to the export format; several non-xlsx sheets come as one zip."""
+    stem = Path(secure_filename(filename or "") or "export.xlsx").stem or "export"
+    if fmt != "xlsx" and sheet_count > 1:
+        return f"{stem}.zip"
+    return f"{stem}.{fmt}"
+
+
+def _export_format_error(fmt: str):
+    if fmt not in EXPORT_FORMATS:
+        return {"error": tr("export_format_unsupported")}, 400
+    if fmt == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        return {"error": tr("export_format_unavailable")}, 400
+    return None
 
 
 @app.route("/export", methods=["POST"])
+@_heavy_request()
 def export_excel():
     payload = request.get_json(silent=True) or {}
     sheets = payload.get("sheets")
     out_name = payload.get("filename") or "export.xlsx"
+    fmt = (payload.get("format") or "xlsx").lower()
     if not sheets or not isinstance(sheets, list):
         return {"error": tr("flash_select_at_least_one_sheet")}, 400
-
-    workbook = Workbook()
-    default_sheet = workbook.active
-    workbook.remove(default_sheet)
-    used_names = set()
-
-    for item in sheets:
-        headers = item.get("headers") or []
-        rows = item.get("rows") or []
-        column_formats = item.get("column_formats") or []
-        sheet_name = item.get("name") or "Sheet"
-        sheet_name = _sanitize_sheet_name(sheet_name)
-        base = sheet_name
-        i = 1
-        while sheet_name in used_names:
-            suffix = f"_{i}"
-            sheet_name = _sanitize_sheet_name(base[: (31 - len(suffix))] + suffix)
-            i += 1
-        used_names.add(sheet_name)
-
-        worksheet = workbook.create_sheet(title=sheet_name)
-        for col_idx, header in enumerate(headers, start=1):
-            worksheet.cell(row=1, column=col_idx, value=header)
-
-        for row_idx, row_values in enumerate(rows, start=2):
-            for col_idx, raw_value in enumerate(row_values, start=1):
-                column_meta = column_formats[col_idx - 1] if col_idx - 1 < len(column_formats) else {}
-                value, number_format = _coerce_export_cell(raw_value, column_meta)
-                cell = worksheet.cell(row=row_idx, column=col_idx, value=value)
-                if number_format:
-                    cell.number_format = number_format
-
-        for col_idx, _ in enumerate(headers, start=1):
-            worksheet.column_dimensions[get_column_letter(col_idx)].width = 18
-
-    buf = BytesIO()
+    format_error = _export_format_error(fmt)
+    if format_error:
+        return format_error
+
+    if fmt != "xlsx":
+        download_name = _export_download_name(out_name, fmt, len(sheets))
+        mimetype = "application/zip" if download_name.endswith(".zip") else EXPORT_FORMATS[fmt]
+        response = Response(iter_export_bytes(sheets, fmt), mimetype=mimetype)
+        response.headers["Content-Disposition"] = f'attachment; filename="{download_name}"'
+        return response
+
+    workbook = build_workbook(sheets)
+    # Large workbooks spill to disk instead of staying in the worker's memory.
+    buf = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_MB * 1024 * 1024)
     workbook.save(buf)
     buf.seek(0)
-    return send_file(buf, as_attachment=True, download_name=out_name, mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    return send_file(buf, as_attachment=True, download_name=out_name, mimetype=XLSX_MIMETYPE)
 
 
-if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8000)
+# -----------------
+# Async export jobs
+# -----------------
+# Jobs run on a bounded per-process thread pool; their state lives in the token
+# directory so any gunicorn worker can answer progress, cancel and download.
+EXPORT_JOB_WORKERS = max(1, _get_env_int("EXPORT_JOB_WORKERS", 2))
+EXPORT_JOB_QUEUE_LIMIT = max(0, _get_env_int("EXPORT_JOB_QUEUE_LIMIT", 8))
+EXPORT_JOB_TTL_MINUTES = _get_env_int("EXPORT_JOB_TTL_MINUTES", 60)
+EXPORT_JOB_FINISHED = {"done", "failed", "cancelled"}
+_export_executor: ThreadPoolExecutor | None = None
+_export_lock = threading.Lock()
+_export_inflight = 0
+
+
+def _export_job_paths(token_dir: Path, job_id: str) -> dict[str, Path]:
+    jobs_dir = token_dir / "exports"
+    return {
+        "state": jobs_dir / f"{job_id}.json",
+        "result": jobs_dir / f"{job_id}.result",
+        "cancel": jobs_dir / f"{job_id}.cancel",
+    }
 
 
+def _read_export_job(token_dir: Path, job_id: str) -> dict | None:
+    if not _ID_RE.match(job_id or ""):
+        return None
+    try:
+        return json.loads(_export_job_paths(token_dir, job_id)["state"].read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
 
+def _write_export_job(token_dir: Path, state: dict) -> None:
+    path = _export_job_paths(token_dir, state["job_id"])["state"]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(state), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _get_export_executor() -> ThreadPoolExecutor:
+    global _export_executor
+    with _export_lock:
+        if _export_executor is None:
+            _export_executor = ThreadPoolExecutor(max_workers=EXPORT_JOB_WORKERS, thread_name_prefix="export-job")
+        return _export_executor
+
+
+def _run_export_job(token_dir: Path, state: dict, sheets: list[dict], session_key: str = "") -> None:
+    global _export_inflight
+    paths = _export_job_paths(token_dir, state["job_id"])
+    last_write = 0.0
+    slot = None
+
+    def waiting(position: int) -> None:
+        if paths["cancel"].exists():
+            raise ExportCancelled()
+        if state.get("queue_position") != position:
+            state["queue_position"] = position
+            _write_export_job(token_dir, state)
+
+    def progress(sheets_done: int, rows_written: int) -> None:
+        nonlocal last_write
+        if paths["cancel"].exists():
+            raise ExportCancelled()
+        state["sheets_done"] = sheets_done
+        state["rows_written"] = rows_written
+        now = time.monotonic()
+        if now - last_write >= 0.5:
+            last_write = now
+            _write_export_job(token_dir, state)
 
+    try:
+        if paths["cancel"].exists():
+            raise ExportCancelled()
+        # Builds share the host's heavy request slots (and their fair queue).
+        slot = _wait_for_heavy_slot(session_key, waiting)
+        state.pop("queue_position", None)
+        state["status"] = "running"
+        state["started_at"] = time.time()
+        state["timings"] = {"queue": round((state["started_at"] - state["created_at"]) * 1000, 1)}
+        _write_export_job(token_dir, state)
+        tmp = paths["result"].with_suffix(".tmp")
+        if state.get("format", "xlsx") == "xlsx":
+            workbook = build_workbook(sheets, progress=progress)
+            workbook.save(tmp)
+        else:
+            with open(tmp, "wb") as fh:
+                for data in iter_export_bytes(sheets, state["format"], progress=progress):
+                    fh.write(data)
+        os.replace(tmp, paths["result"])
+        state["status"] = "done"
+    except ExportCancelled:
+        state["status"] = "cancelled"
+    except Exception as exc:
+        logger.exception("export job %s failed", state["job_id"])
+        state["status"] = "failed"
+        state["error"] = str(exc)
+    finally:
+        if slot is not None:
+            slot.release()
+        state["finished_at"] = time.time()
+        if state.get("started_at"):
+            state.setdefault("timings", {})["build"] = round((state["finished_at"] - state["started_at"]) * 1000, 1)
+        logger.info("export job %s %s (%s)", state["job_id"], state["status"], state.get("timings", {}))
+        try:
+            _write_export_job(token_dir, state)
+        except OSError as exc:
+            logger.warning("failed writing export job state: %s", exc)
+        with _export_lock:
+            _export_inflight -= 1
+
+
+def _cleanup_export_jobs(token_dir: Path, now: float | None = None) -> None:
+    jobs_dir = token_dir / "exports"
+    if not jobs_dir.is_dir():
+        return
+    now = now or time.time()
+    ttl_seconds = EXPORT_JOB_TTL_MINUTES * 60
+    for state_path in jobs_dir.glob("*.json"):
+        try:
+            state = json.loads(state_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        finished_at = state.get("finished_at")
+        if state.get("status") not in EXPORT_JOB_FINISHED or not finished_at or now - finished_at < ttl_seconds:
+            continue
+        for path in _export_job_paths(token_dir, state_path.stem).values():
+            path.unlink(missing_ok=True)
+
+
+def _export_job_urls(token: str, job_id: str) -> dict[str, str]:
+    return {
+        "progress_url": url_for("export_job_status", token=token, job_id=job_id),
+        "events_url": url_for("export_job_events", token=token, job_id=job_id),
+        "download_url": url_for("export_job_download", token=token, job_id=job_id),
+        "cancel_url": url_for("export_job_cancel", token=token, job_id=job_id),
+    }
+
+
+@app.route("/export/jobs", methods=["POST"])
+def create_export_job():
+    global _export_inflight
+    payload = request.get_json(silent=True) or {}
+    sheets = payload.get("sheets")
+    token = payload.get("token") or ""
+    fmt = (payload.get("format") or "xlsx").lower()
+    if not sheets or not isinstance(sheets, list):
+        return {"error": tr("flash_select_at_least_one_sheet")}, 400
+    format_error = _export_format_error(fmt)
+    if format_error:
+        return format_error
+    token_dir = _existing_token_dir(token)
+    if token_dir is None:
+        return {"error": tr("flash_selected_file_not_found")}, 404
+
+    _cleanup_export_jobs(token_dir)
+    with _export_lock:
+        if _export_inflight >= EXPORT_JOB_WORKERS + EXPORT_JOB_QUEUE_LIMIT:
+            return {"error": tr("export_queue_full")}, 429
+        _export_inflight += 1
+
+    job_id = uuid.uuid4().hex
+    state = {
+        "job_id": job_id,
+        "status": "queued",
+        "filename": _export_download_name(payload.get("filename") or "export.xlsx", fmt, len(sheets)),
+        "format": fmt,
+        "sheets_total": len(sheets),
+        "sheets_done": 0,
+        "rows_total": sum(len(item.get("rows") or []) for item in sheets),
+        "rows_written": 0,
+        "created_at": time.time(),
+    }
+    try:
+        _write_export_job(token_dir, state)
+        _get_export_executor().submit(_run_export_job, token_dir, state, sheets, _session_queue_key())
+    except Exception:
+        with _export_lock:
+            _export_inflight -= 1
+        raise
+    return {"job_id": job_id, "status": "queued", **_export_job_urls(token, job_id)}, 202
+
+
+@app.route("/export/jobs/<token>/<job_id>", methods=["GET"])
+def export_job_status(token: str, job_id: str):
+    token_dir = _existing_token_dir(token)
+    state = _read_export_job(token_dir, job_id) if token_dir else None
+    if state is None:
+        return {"error": tr("export_job_not_found")}, 404
+    return {**state, **_export_job_urls(token, job_id)}
+
+
+@app.route("/export/jobs/<token>/<job_id>/events", methods=["GET"])
+def export_job_events(token: str, job_id: str):
+    """SSE stream of the job state (same fields as the progress URL) until the job finishes."""
+    token_dir = _existing_token_dir(token)
+    if token_dir is None or _read_export_job(token_dir, job_id) is None:
+        return {"error": tr("export_job_not_found")}, 404
+    urls = _export_job_urls(token, job_id)
+
+    def read_state() -> dict | None:
+        state = _read_export_job(token_dir, job_id)
+        return {**state, **urls} if state else None
+
+    return _event_stream_response(_iter_progress_events(read_state, EXPORT_JOB_FINISHED))
+
+
+@app.route("/export/jobs/<token>/<job_id>/download", methods=["GET"])
+def export_job_download(token: str, job_id: str):
+    token_dir = _existing_token_dir(token)
+    state = _read_export_job(token_dir, job_id) if token_dir else None
+    if state is None:
+        return {"error": tr("export_job_not_found")}, 404
+    result = _export_job_paths(token_dir, job_id)["result"]
+    if state.get("status") != "done" or not result.exists():
+        return {"error": tr("export_job_not_ready"), "status": state.get("status")}, 409
+    download_name = state.get("filename") or "export.xlsx"
+    mimetype = "application/zip" if download_name.endswith(".zip") else EXPORT_FORMATS.get(state.get("format"), XLSX_MIMETYPE)
+    return send_file(result, as_attachment=True, download_name=download_name, mimetype=mimetype)
+
+
+@app.route("/export/jobs/<token>/<job_id>/cancel", methods=["POST"])
+def export_job_cancel(token: str, job_id: str):
+    token_dir = _existing_token_dir(token)
+    state = _read_export_job(token_dir, job_id) if token_dir else None
+    if state is None:
+        return {"error": tr("export_job_not_found")}, 404
+    if state.get("status") not in EXPORT_JOB_FINISHED:
+        _export_job_paths(token_dir, job_id)["cancel"].touch()
+        state["status"] = "cancelling"
+    return {**state, **_export_job_urls(token, job_id)}
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=8000)
 
 
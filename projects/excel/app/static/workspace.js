@@ -0,0 +1,3028 @@
+// Workspace script for multi_view.html. Per-render data (URLs, CSRF token,
+// translated strings) comes from the #workspace-config JSON blob.
+const CONFIG = JSON.parse(document.getElementById('workspace-config').textContent);
+const T = CONFIG.i18n;
+
+const tabs = document.querySelectorAll('.tab');
+const panels = document.querySelectorAll('.panel');
+const sheetSelection = new Set(Array.from(panels).map(panel => panel.id));
+let activePanel = document.querySelector('.panel.active');
+
+const layoutEl = document.querySelector('.layout');
+const sidebarEl = document.querySelector('.sidebar');
+const collapseToggle = document.querySelector('[data-role="collapse-toggle"]');
+const filterTagsGlobal = document.querySelector('[data-role="filter-tags-global"]');
+const rowInputGlobal = document.querySelector('[data-role="row-input-global"]');
+const colInputGlobal = document.querySelector('[data-role="col-input-global"]');
+const columnProfileEl = document.querySelector('[data-role="column-profile"]');
+const deleteRowsGlobalBtn = document.querySelector('[data-action="delete-rows-global"]');
+const deleteColsGlobalBtn = document.querySelector('[data-action="delete-cols-global"]');
+const deleteBlanksGlobalBtn = document.querySelector('[data-action="delete-blanks-global"]');
+const colorInputGlobal = document.querySelector('[data-role="color-input-global"]');
+const textColorInputGlobal = document.querySelector('[data-role="text-color-input-global"]');
+const fillColorPreview = document.querySelector('[data-role="fill-color-preview"]');
+const textColorPreview = document.querySelector('[data-role="text-color-preview"]');
+const colorPickerWraps = document.querySelectorAll('[data-role="excel-color-picker"]');
+const exportModal = document.querySelector('[data-role="export-modal"]');
+const exportSheetList = document.querySelector('[data-role="export-sheet-list"]');
+const exportCount = document.querySelector('[data-role="export-count"]');
+const searchTermGlobal = document.querySelector('[data-role="search-term-global"]');
+const replaceTermGlobal = document.querySelector('[data-role="replace-term-global"]');
+const searchStatusGlobal = document.querySelector('[data-role="search-status-global"]');
+const searchResultsGlobal = document.querySelector('[data-role="search-results"]');
+const findPanel = document.querySelector('[data-role="find-panel"]');
+const findPanelDrag = document.querySelector('[data-role="find-panel-drag"]');
+const undoTableBtn = document.querySelector('[data-action="undo-table-change"]');
+const findNextGlobalBtn = document.querySelector('[data-action="find-next-global"]');
+const replaceGlobalBtn = document.querySelector('[data-action="replace-global"]');
+const replaceAllGlobalBtn = document.querySelector('[data-action="replace-all-global"]');
+const mappingModal = document.querySelector('[data-role="mapping-modal"]');
+const mappingLeftSheet = document.querySelector('[data-role="mapping-left-sheet"]');
+const mappingRightSheet = document.querySelector('[data-role="mapping-right-sheet"]');
+const mappingRows = document.querySelector('[data-role="mapping-rows"]');
+const mappingStatus = document.querySelector('[data-role="mapping-status"]');
+const pivotModal = document.querySelector('[data-role="pivot-modal"]');
+const pivotRows = document.querySelector('[data-role="pivot-rows"]');
+const pivotColumns = document.querySelector('[data-role="pivot-columns"]');
+const pivotValues = document.querySelector('[data-role="pivot-values"]');
+const pivotStatus = document.querySelector('[data-role="pivot-status"]');
+const mergeModal = document.querySelector('[data-role="merge-modal"]');
+const mergeLookup = document.querySelector('[data-role="merge-lookup"]');
+const mergeColumns = document.querySelector('[data-role="merge-columns"]');
+const mergeKeys = document.querySelector('[data-role="merge-keys"]');
+const mergeStatus = document.querySelector('[data-role="merge-status"]');
+const dedupeModal = document.querySelector('[data-role="dedupe-modal"]');
+const dedupeKeys = document.querySelector('[data-role="dedupe-keys"]');
+const dedupeReport = document.querySelector('[data-role="dedupe-report"]');
+const dedupeStatus = document.querySelector('[data-role="dedupe-status"]');
+const diffModal = document.querySelector('[data-role="diff-modal"]');
+const diffBase = document.querySelector('[data-role="diff-base"]');
+const diffKeys = document.querySelector('[data-role="diff-keys"]');
+const diffReport = document.querySelector('[data-role="diff-report"]');
+const diffStatus = document.querySelector('[data-role="diff-status"]');
+const diffOpenTabs = document.querySelector('[data-action="open-diff-tabs"]');
+const PIVOT_AGGREGATIONS = ['sum', 'count', 'mean', 'min', 'max', 'distinct'];
+const DUP_KEY_COLOR = '#7030a0';
+const KEY_MATCH_COLOR = 'rgb(0, 112, 192)';
+const MATCH_COLOR = 'rgb(146, 208, 80)';
+const DIFF_COLOR = 'rgb(255, 0, 0)';
+const MISSING_COLOR = 'rgb(255, 192, 0)';
+
+collapseToggle?.addEventListener('click',()=>{
+  if(!sidebarEl) return;
+  const collapsed = sidebarEl.classList.toggle('collapsed');
+  if(layoutEl){
+    layoutEl.classList.toggle('sidebar-collapsed', collapsed);
+  }
+  collapseToggle.setAttribute('aria-expanded', (!collapsed).toString());
+});
+
+document.querySelectorAll('[data-action="export-selected"]').forEach(btn=>{
+  btn.addEventListener('click', exportSelected);
+});
+document.querySelectorAll('[data-action="cancel-export-job"]').forEach(btn=>{
+  btn.addEventListener('click', cancelExportJob);
+});
+document.querySelectorAll('[data-action="open-export-modal"]').forEach(btn=>{
+  btn.addEventListener('click', openExportModal);
+});
+document.querySelectorAll('[data-action="close-export-modal"]').forEach(btn=>{
+  btn.addEventListener('click', closeExportModal);
+});
+exportModal?.addEventListener('click', ev=>{
+  if(ev.target === exportModal) closeExportModal();
+});
+document.addEventListener('keydown', ev=>{
+  if(ev.key === 'Escape' && exportModal?.classList.contains('open')) closeExportModal();
+  if(ev.key === 'Escape' && findPanel?.classList.contains('open')) closeFindPanel();
+  if(ev.key === 'Escape' && mappingModal?.classList.contains('open')) closeMappingModal();
+  if(ev.key === 'Escape' && pivotModal?.classList.contains('open')) closePivotModal();
+  if(ev.key === 'Escape' && mergeModal?.classList.contains('open')) closeMergeModal();
+  if(ev.key === 'Escape' && dedupeModal?.classList.contains('open')) closeDedupeModal();
+  if(ev.key === 'Escape' && diffModal?.classList.contains('open')) closeDiffModal();
+  if((ev.ctrlKey || ev.metaKey) && (ev.key === 'z' || ev.key === 'Z')){
+    const target = ev.target;
+    const isTyping = target && (
+      target.tagName === 'INPUT' ||
+      target.tagName === 'TEXTAREA' ||
+      target.isContentEditable
+    );
+    if(!isTyping && undoTableChange(activePanel)){
+      ev.preventDefault();
+    }
+  }
+});
+document.querySelectorAll('[data-action="open-find-panel"]').forEach(btn=>{
+  btn.addEventListener('click', openFindPanel);
+});
+document.querySelectorAll('[data-action="close-find-panel"]').forEach(btn=>{
+  btn.addEventListener('click', closeFindPanel);
+});
+document.querySelectorAll('[data-action="open-mapping-compare"]').forEach(btn=>{
+  btn.addEventListener('click', openMappingModal);
+});
+document.querySelectorAll('[data-action="close-mapping-modal"]').forEach(btn=>{
+  btn.addEventListener('click', closeMappingModal);
+});
+document.querySelectorAll('[data-action="add-mapping-row"]').forEach(btn=>{
+  btn.addEventListener('click', ()=>appendMappingRow('', '', false));
+});
+document.querySelectorAll('[data-action="run-mapping-compare"]').forEach(btn=>{
+  btn.addEventListener('click', runMappingCompare);
+});
+document.querySelectorAll('[data-role="filter-toggle"]').forEach(box=>{
+  box.addEventListener('change',()=>setFiltersVisible(box.checked));
+});
+document.querySelectorAll('[data-action="open-pivot-modal"]').forEach(btn=>{
+  btn.addEventListener('click', openPivotModal);
+});
+document.querySelectorAll('[data-action="close-pivot-modal"]').forEach(btn=>{
+  btn.addEventListener('click', closePivotModal);
+});
+document.querySelectorAll('[data-action="add-pivot-value"]').forEach(btn=>{
+  btn.addEventListener('click', ()=>appendPivotValueRow('', 'sum'));
+});
+document.querySelectorAll('[data-action="run-pivot"]').forEach(btn=>{
+  btn.addEventListener('click', runPivot);
+});
+pivotModal?.addEventListener('click', ev=>{
+  if(ev.target === pivotModal) closePivotModal();
+});
+document.querySelectorAll('[data-action="open-merge-modal"]').forEach(btn=>{
+  btn.addEventListener('click', openMergeModal);
+});
+document.querySelectorAll('[data-action="close-merge-modal"]').forEach(btn=>{
+  btn.addEventListener('click', closeMergeModal);
+});
+document.querySelectorAll('[data-action="add-merge-key"]').forEach(btn=>{
+  btn.addEventListener('click', ()=>appendMergeKeyRow('', ''));
+});
+document.querySelectorAll('[data-action="run-merge"]').forEach(btn=>{
+  btn.addEventListener('click', runMerge);
+});
+mergeModal?.addEventListener('click', ev=>{
+  if(ev.target === mergeModal) closeMergeModal();
+});
+mergeLookup?.addEventListener('change', populateMergeLookupColumns);
+document.querySelectorAll('[data-action="open-dedupe-modal"]').forEach(btn=>{
+  btn.addEventListener('click', openDedupeModal);
+});
+document.querySelectorAll('[data-action="close-dedupe-modal"]').forEach(btn=>{
+  btn.addEventListener('click', closeDedupeModal);
+});
+document.querySelectorAll('[data-action="run-dedupe-report"]').forEach(btn=>{
+  btn.addEventListener('click', runDedupeReport);
+});
+document.querySelectorAll('[data-action="run-dedupe-remove"]').forEach(btn=>{
+  btn.addEventListener('click', runDedupeRemove);
+});
+dedupeModal?.addEventListener('click', ev=>{
+  if(ev.target === dedupeModal) closeDedupeModal();
+});
+document.querySelectorAll('[data-action="open-diff-modal"]').forEach(btn=>{
+  btn.addEventListener('click', openDiffModal);
+});
+document.querySelectorAll('[data-action="close-diff-modal"]').forEach(btn=>{
+  btn.addEventListener('click', closeDiffModal);
+});
+document.querySelectorAll('[data-action="run-diff"]').forEach(btn=>{
+  btn.addEventListener('click', runDiff);
+});
+diffOpenTabs?.addEventListener('click', openDiffTabs);
+diffModal?.addEventListener('click', ev=>{
+  if(ev.target === diffModal) closeDiffModal();
+});
+mappingLeftSheet?.addEventListener('change', handleMappingSheetChange);
+mappingRightSheet?.addEventListener('change', handleMappingSheetChange);
+mappingModal?.addEventListener('click', ev=>{
+  if(ev.target === mappingModal){
+    closeMappingModal();
+  }
+});
+undoTableBtn?.addEventListener('click',()=>undoTableChange(activePanel));
+setupDraggableFindPanel();
+
+tabs.forEach(tab => {
+  tab.addEventListener('click', () => {
+    if(tab.dataset.renaming === '1'){
+      return;
+    }
+    const target = tab.getAttribute('data-target');
+    tabs.forEach(t => t.classList.remove('active'));
+    panels.forEach(p => {
+      if(p.classList.contains('active')) resetSearchState(p, true);
+      p.classList.remove('active');
+    });
+    tab.classList.add('active');
+    const panel = document.getElementById(target);
+    panel.classList.add('active');
+    activePanel = panel;
+    syncGlobalControls();
+  });
+  tab.addEventListener('dblclick', ev => {
+    const panel = document.getElementById(tab.getAttribute('data-target'));
+    if(panel){
+      beginTabRename(tab, panel, ev);
+    }
+  });
+});
+
+function bindTableEditing(tbl){
+  tbl._undoStack = [];
+  tbl.classList.add('nav-mode');
+  tbl.querySelectorAll('tbody td').forEach(td => bindCellEditing(tbl, td));
+  tbl.addEventListener('keydown', handleCellKeyNavigation);
+}
+
+function bindCellEditing(tbl, td){
+  td.contentEditable = 'true';
+  td.tabIndex = 0;
+  td.addEventListener('focus', handleCellFocus);
+  td.addEventListener('input', clearPendingEntry);
+  td.addEventListener('click', (ev)=>handleCellClick(ev, tbl));
+  td.addEventListener('dblclick', (ev)=>handleCellDoubleClick(ev, tbl));
+}
+
+// Heavy routes answer 202 {queued, ticket, progress_url} while the server is
+// busy: wait until the ticket is ready, then repeat the request with it.
+async function fetchAdmitted(url, options = {}, onQueued = null){
+  let ticket = '';
+  while(true){
+    const headers = { ...(options.headers || {}) };
+    if(ticket) headers['X-Queue-Ticket'] = ticket;
+    const resp = await fetch(url, { ...options, headers });
+    if(resp.status !== 202) return resp;
+    const data = await resp.clone().json().catch(() => null);
+    if(!data || !data.queued) return resp;
+    ticket = data.ticket;
+    if(onQueued) onQueued(data.position);
+    while(true){
+      await new Promise(resolve => setTimeout(resolve, 1000));
+      const poll = await fetch(data.progress_url, { headers: { 'Accept': 'application/json' } }).catch(() => null);
+      if(!poll || !poll.ok) break;  // expired ticket: the retry queues again
+      const state = await poll.json();
+      if(state.status === 'ready') break;
+      if(onQueued) onQueued(state.position);
+    }
+  }
+}
+
+// Subscribes to /progress events for a request that is sent with `progress: id`.
+function followProgress(setStatus){
+  if(!window.EventSource || !window.crypto) return { id: '', close(){} };
+  const id = Array.from(crypto.getRandomValues(new Uint8Array(16)), b => b.toString(16).padStart(2, '0')).join('');
+  const source = new EventSource(CONFIG.urls.progress.replace('PROGRESS_ID', id));
+  source.addEventListener('progress', ev => {
+    const state = JSON.parse(ev.data);
+    if(state.status === 'running' && state.message) setStatus(state.message);
+  });
+  source.addEventListener('timeout', () => source.close());
+  return { id, close: () => source.close() };
+}
+
+function queuedStatus(setStatus){
+  return position => setStatus(T.queue_position.replace('%s', position));
+}
+
+async function loadRemainingRows(panel){
+  const table = getPanelTable(panel);
+  const body = table?.tBodies[0];
+  if(!table || !body || panel.dataset.partial !== '1' || panel.dataset.loadingRows === '1') return;
+  panel.dataset.loadingRows = '1';
+  const button = panel.querySelector('[data-action="load-remaining-rows"]');
+  const status = panel.querySelector('[data-role="preview-status"]');
+  if(button) button.disabled = true;
+  const firstNewRow = body.rows.length;
+  const url = `${panel.dataset.rowsUrl}&offset=${encodeURIComponent(panel.dataset.loadedRows || '0')}`;
+  try {
+    const resp = await fetchAdmitted(url, {}, position => {
+      if(status) status.textContent = T.queue_position.replace('%s', position);
+    });
+    if(!resp.ok){
+      // e.g. 413 when the rest of the sheet does not fit the server's memory budget
+      const data = await resp.json().catch(() => ({}));
+      throw new Error(data.error || T.alert_network_error);
+    }
+    if(!resp.body) throw new Error(T.alert_network_error);
+    const reader = resp.body.getReader();
+    const decoder = new TextDecoder();
+    let pending = '';
+    while(true){
+      const { done, value } = await reader.read();
+      if(done) break;
+      pending += decoder.decode(value, { stream: true });
+      const cut = pending.lastIndexOf('</tr>');
+      if(cut < 0) continue;
+      body.insertAdjacentHTML('beforeend', pending.slice(0, cut + 5));
+      pending = pending.slice(cut + 5);
+      if(status) status.textContent = T.loading_rows.replace('%s', body.rows.length.toLocaleString());
+    }
+    pending += decoder.decode();
+    if(pending.trim()) body.insertAdjacentHTML('beforeend', pending);
+    Array.from(body.rows).slice(firstNewRow).forEach(row => {
+      Array.from(row.cells).forEach(td => bindCellEditing(table, td));
+    });
+    panel.dataset.partial = '0';
+    panel.querySelector('[data-role="preview-banner"]')?.remove();
+    initializePanel(panel, table);
+  } catch (err) {
+    if(button) button.disabled = false;
+    alert(err.message || T.alert_network_error);
+  } finally {
+    delete panel.dataset.loadingRows;
+  }
+}
+
+document.querySelectorAll('.panel table').forEach(bindTableEditing);
+
+deleteRowsGlobalBtn?.addEventListener('click',()=>{
+  activePanel?.querySelector('[data-action="delete-rows"]')?.click();
+});
+deleteColsGlobalBtn?.addEventListener('click',()=>{
+  activePanel?.querySelector('[data-action="delete-cols"]')?.click();
+});
+deleteBlanksGlobalBtn?.addEventListener('click',()=>{
+  activePanel?.querySelector('[data-action="delete-blanks"]')?.click();
+});
+colorInputGlobal?.addEventListener('input',()=>{
+  const local = activePanel?.querySelector('[data-role="color-input"]');
+  if(local) local.value = colorInputGlobal.value;
+  setGlobalColorPreview('fill', colorInputGlobal.value);
+});
+textColorInputGlobal?.addEventListener('input',()=>{
+  setGlobalColorPreview('text', textColorInputGlobal.value);
+});
+applyColumnFormatGlobalBtn?.addEventListener('click',()=>{
+  const table = getPanelTable(activePanel);
+  if(table) applySelectedColumnFormat(activePanel, table);
+});
+findNextGlobalBtn?.addEventListener('click', handleFindNext);
+replaceGlobalBtn?.addEventListener('click', handleReplace);
+replaceAllGlobalBtn?.addEventListener('click', handleReplaceAll);
+searchTermGlobal?.addEventListener('input',()=>{
+  resetSearchState(activePanel);
+  updateSearchResults();
+});
+
+initPanels();
+setupMenuTabs();
+populateExportSheetList();
+syncGlobalControls();
+
+function openFindPanel(){
+  findPanel?.classList.add('open');
+  findPanel?.setAttribute('aria-hidden','false');
+  searchTermGlobal?.focus();
+  updateSearchResults();
+}
+
+function closeFindPanel(){
+  findPanel?.classList.remove('open');
+  findPanel?.setAttribute('aria-hidden','true');
+}
+
+function setMappingStatus(message, isError=false){
+  if(!mappingStatus) return;
+  mappingStatus.textContent = message || '';
+  mappingStatus.style.color = isError ? '#b91c1c' : '#475569';
+}
+
+function openMappingModal(){
+  if(!mappingModal || !mappingLeftSheet || !mappingRightSheet || panels.length < 2){
+    alert(T.mapping_need_two_sheets);
+    return;
+  }
+  mappingModal.classList.add('open');
+  mappingModal.setAttribute('aria-hidden','false');
+  populateMappingSheetSelectors();
+  populateDefaultMappingRows();
+  setMappingStatus('');
+}
+
+function closeMappingModal(){
+  mappingModal?.classList.remove('open');
+  mappingModal?.setAttribute('aria-hidden','true');
+}
+
+function populateMappingSheetSelectors(){
+  if(!mappingLeftSheet || !mappingRightSheet) return;
+  const panelOptions = Array.from(panels).map(panel=>({
+    id: panel.id,
+    label: panel.dataset.label || panel.id
+  }));
+  const leftPrev = mappingLeftSheet.value;
+  const rightPrev = mappingRightSheet.value;
+  mappingLeftSheet.innerHTML = '';
+  mappingRightSheet.innerHTML = '';
+  panelOptions.forEach(opt=>{
+    const leftOpt = document.createElement('option');
+    leftOpt.value = opt.id;
+    leftOpt.textContent = opt.label;
+    mappingLeftSheet.appendChild(leftOpt);
+    const rightOpt = document.createElement('option');
+    rightOpt.value = opt.id;
+    rightOpt.textContent = opt.label;
+    mappingRightSheet.appendChild(rightOpt);
+  });
+  if(leftPrev && panelOptions.some(o=>o.id===leftPrev)){
+    mappingLeftSheet.value = leftPrev;
+  }else{
+    mappingLeftSheet.selectedIndex = 0;
+  }
+  if(rightPrev && panelOptions.some(o=>o.id===rightPrev) && rightPrev !== mappingLeftSheet.value){
+    mappingRightSheet.value = rightPrev;
+  }else{
+    mappingRightSheet.selectedIndex = panelOptions.length > 1 ? 1 : 0;
+  }
+}
+
+function getPanelHeaders(panel){
+  const table = panel?.querySelector('table');
+  if(!table || !table.tHead) return [];
+  const offset = parseInt(table.dataset.markerOffset || '0', 10);
+  const header = table.tHead.querySelector('tr[data-role="data-header"]');
+  if(!header) return [];
+  const headers = [];
+  for(let i=offset; i<header.cells.length; i++){
+    const clone = header.cells[i].cloneNode(true);
+    clone.querySelectorAll('button, .filter-btn, .col-resizer').forEach(el=>el.remove());
+    headers.push((clone.textContent || '').trim());
+  }
+  return headers.filter(Boolean);
+}
+
+function appendMappingRow(leftCol='', rightCol='', isKey=false){
+  if(!mappingRows) return;
+  const leftPanel = document.getElementById(mappingLeftSheet?.value || '');
+  const rightPanel = document.getElementById(mappingRightSheet?.value || '');
+  const leftHeaders = getPanelHeaders(leftPanel);
+  const rightHeaders = getPanelHeaders(rightPanel);
+  const row = document.createElement('tr');
+  const leftCell = document.createElement('td');
+  const rightCell = document.createElement('td');
+  const keyCell = document.createElement('td');
+  keyCell.className = 'key-cell';
+  const removeCell = document.createElement('td');
+  removeCell.className = 'remove-cell';
+
+  const leftSelect = document.createElement('select');
+  leftSelect.setAttribute('data-role', 'mapping-left-col');
+  leftHeaders.forEach(h=>{
+    const opt = document.createElement('option');
+    opt.value = h;
+    opt.textContent = h;
+    leftSelect.appendChild(opt);
+  });
+  if(leftCol && leftHeaders.includes(leftCol)){
+    leftSelect.value = leftCol;
+  }
+
+  const rightSelect = document.createElement('select');
+  rightSelect.setAttribute('data-role', 'mapping-right-col');
+  rightHeaders.forEach(h=>{
+    const opt = document.createElement('option');
+    opt.value = h;
+    opt.textContent = h;
+    rightSelect.appendChild(opt);
+  });
+  if(rightCol && rightHeaders.includes(rightCol)){
+    rightSelect.value = rightCol;
+  }
+
+  const keyBox = document.createElement('input');
+  keyBox.type = 'checkbox';
+  keyBox.setAttribute('data-role', 'mapping-is-key');
+  keyBox.checked = !!isKey;
+
+  const removeBtn = document.createElement('button');
+  removeBtn.type = 'button';
+  removeBtn.className = 'icon-btn';
+  removeBtn.textContent = '×';
+  removeBtn.title = T.mapping_remove_row;
+  removeBtn.addEventListener('click', ()=>{
+    row.remove();
+    if(!mappingRows.querySelector('tr')){
+      appendMappingRow('', '', false);
+    }
+  });
+
+  leftCell.appendChild(leftSelect);
+  rightCell.appendChild(rightSelect);
+  keyCell.appendChild(keyBox);
+  removeCell.appendChild(removeBtn);
+  row.appendChild(leftCell);
+  row.appendChild(rightCell);
+  row.appendChild(keyCell);
+  row.appendChild(removeCell);
+  mappingRows.appendChild(row);
+}
+
+function populateDefaultMappingRows(){
+  if(!mappingRows) return;
+  mappingRows.innerHTML = '';
+  const leftPanel = document.getElementById(mappingLeftSheet?.value || '');
+  const rightPanel = document.getElementById(mappingRightSheet?.value || '');
+  const leftHeaders = getPanelHeaders(leftPanel);
+  const rightHeaders = getPanelHeaders(rightPanel);
+  const rightSet = new Set(rightHeaders);
+  const sameName = leftHeaders.filter(h=>rightSet.has(h));
+  if(sameName.length){
+    sameName.forEach((h, idx)=>appendMappingRow(h, h, idx===0));
+    return;
+  }
+  const limit = Math.min(leftHeaders.length, rightHeaders.length);
+  if(limit === 0){
+    appendMappingRow('', '', true);
+    return;
+  }
+  for(let i=0;i<limit;i++){
+    appendMappingRow(leftHeaders[i], rightHeaders[i], i===0);
+  }
+}
+
+function handleMappingSheetChange(){
+  if(!mappingLeftSheet || !mappingRightSheet) return;
+  if(mappingLeftSheet.value === mappingRightSheet.value){
+    const next = Array.from(mappingRightSheet.options).find(opt=>opt.value !== mappingLeftSheet.value);
+    if(next){
+      mappingRightSheet.value = next.value;
+    }
+  }
+  const previous = Array.from(mappingRows?.querySelectorAll('tr') || []).map(row=>({
+    left: row.querySelector('[data-role="mapping-left-col"]')?.value || '',
+    right: row.querySelector('[data-role="mapping-right-col"]')?.value || '',
+    key: !!row.querySelector('[data-role="mapping-is-key"]')?.checked
+  }));
+  mappingRows.innerHTML = '';
+  if(previous.length){
+    previous.forEach(item=>appendMappingRow(item.left, item.right, item.key));
+  }else{
+    populateDefaultMappingRows();
+  }
+}
+
+function collectMappingConfig(){
+  const rows = Array.from(mappingRows?.querySelectorAll('tr') || []);
+  const mappings = rows.map(row=>({
+    left: row.querySelector('[data-role="mapping-left-col"]')?.value || '',
+    right: row.querySelector('[data-role="mapping-right-col"]')?.value || '',
+    isKey: !!row.querySelector('[data-role="mapping-is-key"]')?.checked
+  })).filter(item=>item.left && item.right);
+  return mappings;
+}
+
+function normalizeCompareValue(value){
+  if(value === null || value === undefined) return '';
+  return String(value).replace(/\r/g, '').replace(/\n/g, '').trim();
+}
+
+function clearTableInterior(table){
+  const offset = parseInt(table.dataset.markerOffset || '0', 10);
+  const rows = table.tBodies[0] ? Array.from(table.tBodies[0].rows) : [];
+  rows.forEach(row=>{
+    for(let c=offset; c<row.cells.length; c++){
+      row.cells[c].style.backgroundColor = '';
+    }
+  });
+}
+
+function getHeaderIndexMap(table){
+  const map = new Map();
+  const offset = parseInt(table.dataset.markerOffset || '0', 10);
+  const header = table.tHead?.querySelector('tr[data-role="data-header"]');
+  if(!header) return map;
+  for(let c=offset; c<header.cells.length; c++){
+    const clone = header.cells[c].cloneNode(true);
+    clone.querySelectorAll('button, .filter-btn, .col-resizer').forEach(el=>el.remove());
+    const text = (clone.textContent || '').trim();
+    if(text && !map.has(text)){
+      map.set(text, c - offset);
+    }
+  }
+  return map;
+}
+
+function getRowCellValue(row, colIdx, offset){
+  const cell = row?.cells[colIdx + offset];
+  if(!cell) return '';
+  return normalizeCompareValue(cell.innerText);
+}
+
+function colorRow(row, color){
+  if(!row) return;
+  const offset = parseInt(row.closest('table')?.dataset.markerOffset || '0', 10);
+  for(let c=offset; c<row.cells.length; c++){
+    row.cells[c].style.backgroundColor = color;
+  }
+}
+
+function colorCell(row, colIdx, color){
+  if(!row) return;
+  const offset = parseInt(row.closest('table')?.dataset.markerOffset || '0', 10);
+  const cell = row.cells[colIdx + offset];
+  if(cell){
+    cell.style.backgroundColor = color;
+  }
+}
+
+function buildKeyBuckets(table, compareMappings, side){
+  const buckets = new Map();
+  const duplicateRows = new Set();
+  const offset = parseInt(table.dataset.markerOffset || '0', 10);
+  const rows = table.tBodies[0] ? Array.from(table.tBodies[0].rows) : [];
+  rows.forEach(row=>{
+    const keyParts = [];
+    compareMappings.forEach(m=>{
+      if(!m.isKey) return;
+      const idx = side === 'left' ? m.leftIdx : m.rightIdx;
+      keyParts.push(getRowCellValue(row, idx, offset));
+    });
+    const key = keyParts.join('|');
+    if(!key){
+      return;
+    }
+    if(!buckets.has(key)){
+      buckets.set(key, []);
+    }
+    const arr = buckets.get(key);
+    arr.push(row);
+    if(arr.length > 1){
+      arr.forEach(r=>duplicateRows.add(r));
+    }
+  });
+  return { buckets, duplicateRows };
+}
+
+function removeRowsWithNullKeys(table, compareMappings, side){
+  const offset = parseInt(table.dataset.markerOffset || '0', 10);
+  const body = table.tBodies[0];
+  if(!body) return;
+  for(let i=body.rows.length - 1; i>=0; i--){
+    const row = body.rows[i];
+    let hasNull = false;
+    for(const m of compareMappings){
+      if(!m.isKey) continue;
+      const idx = side === 'left' ? m.leftIdx : m.rightIdx;
+      const value = getRowCellValue(row, idx, offset);
+      if(!value){
+        hasNull = true;
+        break;
+      }
+    }
+    if(hasNull){
+      row.remove();
+    }
+  }
+}
+
+function compareRowPair(leftRow, rightRow, compareMappings){
+  compareMappings.forEach(m=>{
+    if(m.isKey){
+      colorCell(leftRow, m.leftIdx, KEY_MATCH_COLOR);
+      colorCell(rightRow, m.rightIdx, KEY_MATCH_COLOR);
+      return;
+    }
+    const offsetLeft = parseInt(leftRow.closest('table')?.dataset.markerOffset || '0', 10);
+    const offsetRight = parseInt(rightRow.closest('table')?.dataset.markerOffset || '0', 10);
+    const v1 = getRowCellValue(leftRow, m.leftIdx, offsetLeft);
+    const v2 = getRowCellValue(rightRow, m.rightIdx, offsetRight);
+    const color = v1 === v2 ? MATCH_COLOR : DIFF_COLOR;
+    colorCell(leftRow, m.leftIdx, color);
+    colorCell(rightRow, m.rightIdx, color);
+  });
+}
+
+function runMappingCompare(){
+  setMappingStatus('');
+  const leftId = mappingLeftSheet?.value || '';
+  const rightId = mappingRightSheet?.value || '';
+  if(!leftId || !rightId || leftId === rightId){
+    setMappingStatus(T.mapping_choose_different_sheets, true);
+    return;
+  }
+  const leftPanel = document.getElementById(leftId);
+  const rightPanel = document.getElementById(rightId);
+  const leftTable = getPanelTable(leftPanel);
+  const rightTable = getPanelTable(rightPanel);
+  if(!leftPanel || !rightPanel || !leftTable || !rightTable){
+    setMappingStatus(T.mapping_read_failed, true);
+    return;
+  }
+
+  const mappings = collectMappingConfig();
+  if(!mappings.length){
+    setMappingStatus(T.mapping_need_row, true);
+    return;
+  }
+  if(!mappings.some(m=>m.isKey)){
+    setMappingStatus(T.mapping_need_key, true);
+    return;
+  }
+
+  const leftHeaderMap = getHeaderIndexMap(leftTable);
+  const rightHeaderMap = getHeaderIndexMap(rightTable);
+  const compareMappings = [];
+  for(const m of mappings){
+    if(!leftHeaderMap.has(m.left)){
+      setMappingStatus(`${T.mapping_left_missing} ${m.left}`, true);
+      return;
+    }
+    if(!rightHeaderMap.has(m.right)){
+      setMappingStatus(`${T.mapping_right_missing} ${m.right}`, true);
+      return;
+    }
+    compareMappings.push({
+      left: m.left,
+      right: m.right,
+      isKey: m.isKey,
+      leftIdx: leftHeaderMap.get(m.left),
+      rightIdx: rightHeaderMap.get(m.right)
+    });
+  }
+
+  pushTableUndoSnapshot(leftPanel, leftTable);
+  pushTableUndoSnapshot(rightPanel, rightTable);
+
+  removeRowsWithNullKeys(leftTable, compareMappings, 'left');
+  removeRowsWithNullKeys(rightTable, compareMappings, 'right');
+  clearTableInterior(leftTable);
+  clearTableInterior(rightTable);
+
+  const leftBucketsInfo = buildKeyBuckets(leftTable, compareMappings, 'left');
+  const rightBucketsInfo = buildKeyBuckets(rightTable, compareMappings, 'right');
+  const allKeys = new Set([...leftBucketsInfo.buckets.keys(), ...rightBucketsInfo.buckets.keys()]);
+
+  allKeys.forEach(key=>{
+    const leftRows = leftBucketsInfo.buckets.get(key) || [];
+    const rightRows = rightBucketsInfo.buckets.get(key) || [];
+    if(leftRows.length && rightRows.length){
+      const pairs = Math.min(leftRows.length, rightRows.length);
+      for(let i=0; i<pairs; i++){
+        compareRowPair(leftRows[i], rightRows[i], compareMappings);
+      }
+      for(let i=pairs; i<leftRows.length; i++){
+        colorRow(leftRows[i], MISSING_COLOR);
+      }
+      for(let i=pairs; i<rightRows.length; i++){
+        colorRow(rightRows[i], MISSING_COLOR);
+      }
+      return;
+    }
+    leftRows.forEach(row=>colorRow(row, MISSING_COLOR));
+    rightRows.forEach(row=>colorRow(row, MISSING_COLOR));
+  });
+
+  compareMappings.filter(m=>m.isKey).forEach(m=>{
+    leftBucketsInfo.duplicateRows.forEach(row=>colorCell(row, m.leftIdx, DUP_KEY_COLOR));
+    rightBucketsInfo.duplicateRows.forEach(row=>colorCell(row, m.rightIdx, DUP_KEY_COLOR));
+  });
+
+  initializePanel(leftPanel, leftTable);
+  initializePanel(rightPanel, rightTable);
+  syncGlobalControls();
+
+  const duplicateCount = leftBucketsInfo.duplicateRows.size + rightBucketsInfo.duplicateRows.size;
+  const msg = duplicateCount > 0
+    ? `${T.mapping_done_duplicates} ${duplicateCount}`
+    : T.mapping_done;
+  setMappingStatus(msg, false);
+}
+
+const colorUiText = {
+  automatic: T.color_automatic,
+  theme: T.color_theme,
+  standard: T.color_standard
+};
+const excelThemeRows = [
+  ['#ffffff','#000000','#e7e6e6','#44546a','#5b9bd5','#ed7d31','#a5a5a5','#ffc000','#4472c4','#70ad47'],
+  ['#f2f2f2','#7f7f7f','#d0cece','#d6dce4','#ddebf7','#fbe5d6','#ededed','#fff2cc','#d9e1f2','#e2f0d9'],
+  ['#d9d9d9','#595959','#aeaaaa','#adb9ca','#bdd7ee','#f8cbad','#dbdbdb','#ffe699','#b4c6e7','#c6e0b4'],
+  ['#bfbfbf','#3f3f3f','#7f7f7f','#8497b0','#9dc3e6','#f4b183','#c9c9c9','#ffd966','#8eaadb','#a9d18e'],
+  ['#a6a6a6','#262626','#595959','#323f4f','#2e75b6','#c55a11','#7b7b7b','#bf9000','#2f5597','#548235']
+];
+const excelStandardColors = ['#c00000','#ff0000','#ffc000','#ffff00','#92d050','#00b050','#00b0f0','#0070c0','#002060','#7030a0'];
+
+function setupGlobalColorMenus(){
+  document.querySelectorAll('[data-role="color-auto-label"]').forEach(el=>{
+    el.textContent = colorUiText.automatic;
+  });
+  document.querySelectorAll('[data-role="color-theme-label"]').forEach(el=>{
+    el.textContent = colorUiText.theme;
+  });
+  document.querySelectorAll('[data-role="color-standard-label"]').forEach(el=>{
+    el.textContent = colorUiText.standard;
+  });
+  renderColorGrid(document.querySelector('[data-role="fill-theme-grid"]'), 'fill', excelThemeRows.flat());
+  renderColorGrid(document.querySelector('[data-role="fill-standard-grid"]'), 'fill', excelStandardColors);
+  renderColorGrid(document.querySelector('[data-role="text-theme-grid"]'), 'text', excelThemeRows.flat());
+  renderColorGrid(document.querySelector('[data-role="text-standard-grid"]'), 'text', excelStandardColors);
+
+  document.addEventListener('click', ev=>{
+    const toggle = ev.target.closest('[data-action="toggle-color-menu"]');
+    if(toggle){
+      ev.preventDefault();
+      const wrap = toggle.closest('[data-role="excel-color-picker"]');
+      if(!wrap) return;
+      const willOpen = !wrap.classList.contains('open');
+      closeAllColorMenus();
+      if(willOpen){
+        wrap.classList.add('open');
+        toggle.setAttribute('aria-expanded', 'true');
+      }
+      return;
+    }
+
+    const pick = ev.target.closest('[data-action="pick-global-color"]');
+    if(pick){
+      ev.preventDefault();
+      const kind = pick.getAttribute('data-kind');
+      const color = pick.getAttribute('data-color');
+      if(kind && color){
+        applyGlobalColor(kind, color);
+      }
+      closeAllColorMenus();
+      return;
+    }
+
+    const advanced = ev.target.closest('[data-action="open-global-color-advanced"]');
+    if(advanced){
+      ev.preventDefault();
+      const kind = advanced.getAttribute('data-kind');
+      if(kind === 'fill'){
+        colorInputGlobal?.click();
+      } else if(kind === 'text'){
+        textColorInputGlobal?.click();
+      }
+      return;
+    }
+
+    if(!ev.target.closest('[data-role="excel-color-picker"]')){
+      closeAllColorMenus();
+    }
+  });
+
+  colorInputGlobal?.addEventListener('change', ()=>{
+    applyGlobalColor('fill', colorInputGlobal.value);
+    closeAllColorMenus();
+  });
+  textColorInputGlobal?.addEventListener('change', ()=>{
+    applyGlobalColor('text', textColorInputGlobal.value);
+    closeAllColorMenus();
+  });
+}
+
+function renderColorGrid(container, kind, colors){
+  if(!container) return;
+  container.innerHTML = '';
+  colors.forEach(color=>{
+    const btn = document.createElement('button');
+    btn.type = 'button';
+    btn.className = 'excel-color-chip';
+    btn.setAttribute('data-action', 'pick-global-color');
+    btn.setAttribute('data-kind', kind);
+    btn.setAttribute('data-color', color);
+    btn.style.background = color;
+    container.appendChild(btn);
+  });
+}
+
+function closeAllColorMenus(){
+  colorPickerWraps.forEach(wrap=>{
+    wrap.classList.remove('open');
+    const toggle = wrap.querySelector('[data-action="toggle-color-menu"]');
+    if(toggle){
+      toggle.setAttribute('aria-expanded', 'false');
+    }
+  });
+}
+
+function setGlobalColorPreview(kind, color){
+  if(kind === 'fill' && fillColorPreview){
+    fillColorPreview.classList.toggle('clear', color === '__CLEAR__');
+    fillColorPreview.style.background = color === '__CLEAR__' ? '#ffffff' : color;
+    return;
+  }
+  if(kind === 'text' && textColorPreview){
+    const applied = color === '__AUTO__' ? '#111827' : color;
+    textColorPreview.style.color = applied;
+  }
+}
+
+function applyGlobalColor(kind, color){
+  const tbl = getPanelTable(activePanel);
+  if(!tbl) return;
+  if(kind === 'fill'){
+    if(colorInputGlobal){
+      colorInputGlobal.value = color === '__CLEAR__' ? '#ffffff' : color;
+      colorInputGlobal.dispatchEvent(new Event('input'));
+    }
+    applyColorToSelection(activePanel, tbl, 'fill', color);
+    setGlobalColorPreview('fill', color);
+    return;
+  }
+  if(kind === 'text'){
+    if(textColorInputGlobal && color !== '__AUTO__'){
+      textColorInputGlobal.value = color;
+    }
+    applyColorToSelection(activePanel, tbl, 'text', color);
+    setGlobalColorPreview('text', color);
+  }
+}
+
+function setupDraggableFindPanel(){
+  if(!findPanel || !findPanelDrag) return;
+  findPanelDrag.addEventListener('mousedown', ev=>{
+    if(ev.target.closest('button')) return;
+    ev.preventDefault();
+    const rect=findPanel.getBoundingClientRect();
+    const startX=ev.clientX;
+    const startY=ev.clientY;
+    const startLeft=rect.left;
+    const startTop=rect.top;
+    findPanel.style.right='auto';
+    function onMove(moveEv){
+      const nextLeft=Math.max(8, Math.min(window.innerWidth - rect.width - 8, startLeft + moveEv.clientX - startX));
+      const nextTop=Math.max(8, Math.min(window.innerHeight - 80, startTop + moveEv.clientY - startY));
+      findPanel.style.left=`${nextLeft}px`;
+      findPanel.style.top=`${nextTop}px`;
+    }
+    function onEnd(){
+      document.removeEventListener('mousemove', onMove);
+      document.removeEventListener('mouseup', onEnd);
+    }
+    document.addEventListener('mousemove', onMove);
+    document.addEventListener('mouseup', onEnd);
+  });
+}
+
+function setFiltersVisible(visible){
+  document.querySelectorAll('[data-role="filter-toggle"]').forEach(box=>{ box.checked=visible; });
+  if(!visible){
+    document.querySelectorAll('.panel').forEach(panel=>{
+      const table=panel.querySelector('table');
+      const summary=panel.querySelector('[data-role="filter-tags"]');
+      if(table) clearAllFilters(table, summary);
+    });
+  }
+  document.querySelectorAll('.filter-btn').forEach(btn=>{
+    btn.style.display=visible ? '' : 'none';
+  });
+  closeFilterPanel();
+  syncGlobalFilters();
+}
+
+function syncGlobalControls(){
+  if(!activePanel) return;
+  const colorLocal = activePanel.querySelector('[data-role="color-input"]');
+  if(colorInputGlobal && colorLocal){
+    colorInputGlobal.value = colorLocal.value || '#fff8b1';
+  }
+  setGlobalColorPreview('fill', colorInputGlobal ? colorInputGlobal.value : '#fff8b1');
+  setGlobalColorPreview('text', textColorInputGlobal ? textColorInputGlobal.value : '#111827');
+  syncGlobalFilters();
+  syncGlobalSelection();
+  updateGlobalActionButtons();
+  resetSearchState(activePanel, true);
+  updateSearchResults();
+}
+
+function syncGlobalFilters(){
+  if(!filterTagsGlobal) return;
+  const local = activePanel?.querySelector('[data-role="filter-tags"]');
+  filterTagsGlobal.innerHTML = local ? local.innerHTML : '';
+}
+
+function syncGlobalSelection(){
+  if(!activePanel) return;
+  const rowInput = activePanel.querySelector('[data-role="row-input"]');
+  const colInput = activePanel.querySelector('[data-role="col-input"]');
+  if(rowInputGlobal) rowInputGlobal.value = rowInput ? rowInput.value : '';
+  if(colInputGlobal) colInputGlobal.value = colInput ? colInput.value : '';
+  updateColumnProfile(activePanel);
+}
+
+// Column statistics come from /profile (computed once per parsed sheet on the
+// server) and are fetched once per panel.
+function loadPanelProfile(panel){
+  if(!panel._profile){
+    const url = `${CONFIG.urls.profile}?selection=${encodeURIComponent(panel.dataset.selection || '')}`;
+    panel._profile = fetchAdmitted(url, { headers: { 'Accept': 'application/json' } })
+      .then(resp => resp.ok ? resp.json() : null)
+      .catch(() => null);
+  }
+  return panel._profile;
+}
+
+function updateColumnProfile(panel){
+  if(!columnProfileEl) return;
+  const table = panel ? getPanelTable(panel) : null;
+  const cols = table ? Array.from(table._selectedCols || []) : [];
+  if(cols.length !== 1){
+    columnProfileEl.textContent = T.profile_select_column;
+    delete columnProfileEl.dataset.pending;
+    return;
+  }
+  const name = (getPanelHeaders(panel)[cols[0]] || '').trim();
+  const pending = `${panel.id}\u0000${name}`;
+  if(columnProfileEl.dataset.pending === pending) return;
+  columnProfileEl.dataset.pending = pending;
+  columnProfileEl.textContent = T.profile_loading;
+  loadPanelProfile(panel).then(profile => {
+    if(columnProfileEl.dataset.pending !== pending) return;
+    const column = profile ? profile.columns.find(c => String(c.name).trim() === name) : null;
+    renderColumnProfile(column);
+  });
+}
+
+function formatProfileValue(value){
+  if(value === null || value === undefined) return '';
+  if(typeof value === 'number') return value.toLocaleString(undefined, { maximumFractionDigits: 4 });
+  return String(value);
+}
+
+function renderColumnProfile(column){
+  columnProfileEl.innerHTML = '';
+  if(!column){
+    columnProfileEl.textContent = T.profile_unavailable;
+    return;
+  }
+  const stats = document.createElement('dl');
+  const add = (label, value) => {
+    if(value === null || value === undefined || value === '') return;
+    const dt = document.createElement('dt'); dt.textContent = label;
+    const dd = document.createElement('dd'); dd.textContent = value;
+    stats.append(dt, dd);
+  };
+  add(T.profile_nulls, formatProfileValue(column.nulls));
+  if(column.kind === 'text') add(T.profile_blanks, formatProfileValue(column.blanks));
+  add(T.profile_distinct, (column.distinct_estimated ? '\u2248 ' : '') + formatProfileValue(column.distinct));
+  add(T.profile_min, formatProfileValue(column.min));
+  add(T.profile_max, formatProfileValue(column.max));
+  add(T.profile_mean, formatProfileValue(column.mean));
+  columnProfileEl.appendChild(stats);
+
+  if(column.histogram && column.histogram.counts.length){
+    const peak = Math.max(...column.histogram.counts, 1);
+    const bars = document.createElement('div');
+    bars.className = 'profile-histogram';
+    column.histogram.counts.forEach((count, i) => {
+      const bar = document.createElement('span');
+      bar.style.height = `${Math.max(2, Math.round(count / peak * 100))}%`;
+      bar.title = `${formatProfileValue(column.histogram.edges[i])} \u2013 ${formatProfileValue(column.histogram.edges[i + 1])}: ${count.toLocaleString()}`;
+      bars.appendChild(bar);
+    });
+    columnProfileEl.appendChild(bars);
+  }
+
+  if(column.top.length){
+    const heading = document.createElement('div');
+    heading.className = 'profile-heading';
+    heading.textContent = T.profile_top_values;
+    const list = document.createElement('ol');
+    list.className = 'profile-top';
+    column.top.forEach(([value, count]) => {
+      const item = document.createElement('li');
+      item.textContent = `${value === '' ? T.filter_blank : formatProfileValue(value)} (${count.toLocaleString()})`;
+      list.appendChild(item);
+    });
+    columnProfileEl.append(heading, list);
+  }
+
+  const note = document.createElement('div');
+  note.className = 'profile-note';
+  note.textContent = T.profile_source_note;
+  columnProfileEl.appendChild(note);
+}
+
+function updateGlobalActionButtons(){
+  if(!activePanel) {
+    deleteRowsGlobalBtn?.setAttribute('disabled','disabled');
+    deleteColsGlobalBtn?.setAttribute('disabled','disabled');
+    deleteBlanksGlobalBtn?.setAttribute('disabled','disabled');
+    if(formatSelectGlobal) formatSelectGlobal.disabled = true;
+    if(applyColumnFormatGlobalBtn) applyColumnFormatGlobalBtn.disabled = true;
+    if(undoTableBtn) undoTableBtn.disabled = true;
+    return;
+  }
+  const rowsBtn = activePanel.querySelector('[data-action="delete-rows"]');
+  const colsBtn = activePanel.querySelector('[data-action="delete-cols"]');
+  const blanksBtn = activePanel.querySelector('[data-action="delete-blanks"]');
+  if(deleteRowsGlobalBtn) deleteRowsGlobalBtn.disabled = rowsBtn ? rowsBtn.disabled : true;
+  if(deleteColsGlobalBtn) deleteColsGlobalBtn.disabled = colsBtn ? colsBtn.disabled : true;
+  if(deleteBlanksGlobalBtn) deleteBlanksGlobalBtn.disabled = blanksBtn ? blanksBtn.disabled : true;
+  updateColumnFormatControls(activePanel);
+  updateUndoButton(activePanel);
+}
+
+function updateUndoButton(panel){
+  if(!undoTableBtn){
+    return;
+  }
+  const hasUndo = !!(panel && panel._tableUndoStack && panel._tableUndoStack.length);
+  undoTableBtn.disabled = !hasUndo;
+}
+
+function pushTableUndoSnapshot(panel, table){
+  if(!panel || !table){
+    return;
+  }
+  panel._tableUndoStack = panel._tableUndoStack || [];
+  panel._tableUndoStack.push({
+    html: table.outerHTML,
+    columnFormats: cloneColumnFormats(panel._columnFormatMeta || []),
+  });
+  if(panel._tableUndoStack.length > 20){
+    panel._tableUndoStack.shift();
+  }
+  updateUndoButton(panel);
+}
+
+function getPanelTable(panel){
+  return panel ? panel.querySelector('table') : null;
+}
+
+function undoTableChange(panel){
+  if(!panel || !panel._tableUndoStack || !panel._tableUndoStack.length){
+    return false;
+  }
+  const wrap = panel.querySelector('.table-wrap');
+  if(!wrap){
+    return false;
+  }
+  const snapshot = panel._tableUndoStack.pop();
+  const html = typeof snapshot === 'string' ? snapshot : snapshot?.html;
+  wrap.innerHTML = html || '';
+  panel._columnFormatMeta = cloneColumnFormats(snapshot?.columnFormats || []);
+  const restored = getPanelTable(panel);
+  if(restored){
+    bindTableEditing(restored);
+    initializePanel(panel, restored);
+    syncGlobalControls();
+  }
+  updateUndoButton(panel);
+  return true;
+}
+
+function updateSearchStatus(message){
+  if(searchStatusGlobal) searchStatusGlobal.textContent = message || '';
+}
+
+function updateSearchResults(){
+  if(!searchResultsGlobal || !activePanel) return;
+  const term = (searchTermGlobal?.value || '').trim().toLowerCase();
+  searchResultsGlobal.innerHTML='';
+  if(!term) return;
+  const matches = collectSearchCells(activePanel)
+    .filter(({cell})=>cellMatches(cell, term))
+    .slice(0, 100);
+  if(!matches.length){
+    const empty=document.createElement('div');
+    empty.className='search-result-item';
+    empty.textContent=T.search_not_found;
+    searchResultsGlobal.appendChild(empty);
+    return;
+  }
+  matches.forEach(({cell,row,col}, idx)=>{
+    const item=document.createElement('button');
+    item.type='button';
+    item.className='search-result-item';
+    const ref=document.createElement('span');
+    ref.className='search-result-ref';
+    ref.textContent=`${columnLabel(col)}${row+1}`;
+    const text=document.createElement('span');
+    text.className='search-result-text';
+    text.textContent=cell.innerText;
+    item.appendChild(ref);
+    item.appendChild(text);
+    item.addEventListener('click',()=>{
+      if(!activePanel._searchState) activePanel._searchState={};
+      activePanel._searchState.term=term;
+      activePanel._searchState.cells=collectSearchCells(activePanel);
+      activePanel._searchState.index=activePanel._searchState.cells.findIndex(entry=>entry.cell===cell);
+      highlightSearchCell(activePanel, cell);
+      cell.scrollIntoView({block:'center', inline:'center'});
+      cell.focus();
+      updateSearchStatus(`(${idx+1}/${matches.length})`);
+    });
+    searchResultsGlobal.appendChild(item);
+  });
+}
+
+function resetSearchState(panel, silent){
+  if(panel && panel._searchState){
+    if(panel._searchState.highlight){
+      panel._searchState.highlight.classList.remove('search-hit');
+    }
+    panel._searchState = null;
+  }
+  if(!silent) updateSearchStatus('');
+}
+
+function handleFindNext(){
+  if(!activePanel) return;
+  const term = (searchTermGlobal?.value || '').trim();
+  if(!term){ updateSearchStatus(T.search_need_term); return; }
+  const state = prepareSearchState(activePanel, term);
+  if(!state) return;
+  const idx = findNextMatch(state, term);
+  if(idx === -1){
+    updateSearchStatus(T.search_not_found);
+    highlightSearchCell(activePanel, null);
+  }else{
+    updateSearchStatus(`(${idx+1}/${state.cells.length})`);
+  }
+  updateSearchResults();
+}
+
+function handleReplace(){
+  if(!activePanel) return;
+  const term = (searchTermGlobal?.value || '').trim();
+  if(!term){ updateSearchStatus(T.search_need_term); return; }
+  const replacement = replaceTermGlobal?.value || '';
+  let state = prepareSearchState(activePanel, term);
+  if(!state) return;
+  if(state.index === undefined || state.index < 0){
+    if(findNextMatch(state, term) === -1){
+      updateSearchStatus(T.search_not_found);
+      return;
+    }
+  }
+  const cell = state.cells[state.index]?.cell;
+  if(!cell || !cellMatches(cell, term)){
+    if(findNextMatch(state, term) === -1){
+      updateSearchStatus(T.search_not_found);
+      return;
+    }
+  }
+  const regex = new RegExp(escapeRegExp(term), 'i');
+  cell.innerText = cell.innerText.replace(regex, replacement);
+  updateSearchStatus(T.replace_done);
+  state.cells = null;
+  updateSearchResults();
+}
+
+function handleReplaceAll(){
+  if(!activePanel) return;
+  const term = (searchTermGlobal?.value || '').trim();
+  if(!term){ updateSearchStatus(T.search_need_term); return; }
+  const replacement = replaceTermGlobal?.value || '';
+  const cells = collectSearchCells(activePanel);
+  if(!cells || !cells.length){ updateSearchStatus(T.search_not_found); return; }
+  const regex = new RegExp(escapeRegExp(term), 'gi');
+  let count=0;
+  cells.forEach(({cell})=>{
+    if(regex.test(cell.innerText)){
+      cell.innerText = cell.innerText.replace(regex, replacement);
+      regex.lastIndex = 0;
+      count++;
+    }
+  });
+  updateSearchStatus(count ? T.replace_all_done.replace('%d', count) : T.search_not_found);
+  resetSearchState(activePanel, true);
+  updateSearchResults();
+}
+
+function handleCellFocus(ev){
+  const cell = ev.target;
+  cell.dataset.pendingEntry = '1';
+  cell.dataset.editing = '0';
+  const table = cell.closest('table');
+  if(table){
+    table._activeCell = cell;
+    table._readyForEdit = false;
+    setTableNavMode(table, true);
+  }
+}
+
+function clearPendingEntry(ev){
+  delete ev.target.dataset.pendingEntry;
+}
+
+function handleCellClick(ev, table){
+  const cell = ev.currentTarget;
+  if(cell.dataset.editing === '1') return;
+  if(table._activeCell !== cell){
+    table._activeCell = cell;
+    table._readyForEdit = false;
+    return;
+  }
+  if(table._readyForEdit){
+    startCellEditing(cell, false, ev);
+    table._readyForEdit = false;
+  } else {
+    table._readyForEdit = true;
+  }
+}
+
+function handleCellDoubleClick(ev, table){
+  const cell = ev.currentTarget;
+  startCellEditing(cell, false, ev);
+  if(table) table._readyForEdit = false;
+}
+
+function handleCellKeyNavigation(ev){
+  const cell = ev.target.closest('td');
+  if(!cell) return;
+  const table = cell.closest('table');
+  if(!table) return;
+  const key = ev.key;
+  const editing = cell.dataset.editing === '1';
+  if(ev.ctrlKey && (key === 'z' || key === 'Z')){
+    if(editing) return;
+    if(undoLastNavigationEdit(table)){
+      ev.preventDefault();
+    } else if(undoTableChange(table.closest('.panel'))){
+      ev.preventDefault();
+    }
+    return;
+  }
+  if(key === 'F2'){
+    ev.preventDefault();
+    if(editing){
+      stopCellEditing(cell);
+    }else{
+      startCellEditing(cell);
+    }
+    return;
+  }
+  if(key === 'Enter'){
+    if(ev.ctrlKey){
+      ev.preventDefault();
+      if(!editing){
+        startCellEditing(cell);
+      }
+      insertLineBreak(cell);
+      return;
+    }
+    ev.preventDefault();
+    stopCellEditing(cell);
+    moveCellFocus(table, cell, ev.shiftKey ? 'ArrowUp' : 'ArrowDown');
+    return;
+  }
+  if(key && key.startsWith('Arrow')){
+    if(editing) return;
+    ev.preventDefault();
+    moveCellFocus(table, cell, key);
+    return;
+  }
+  if(!editing && cell.dataset.pendingEntry === '1'){
+    if(isCharacterKey(ev)){
+      recordNavigationUndo(table, cell);
+      cell.innerText = '';
+      startCellEditing(cell);
+    } else if(key === 'Backspace' || key === 'Delete'){
+      recordNavigationUndo(table, cell);
+      cell.innerText = '';
+      stopCellEditing(cell);
+      ev.preventDefault();
+    }
+  }
+}
+
+function moveCellFocus(table, currentCell, direction){
+  const pos = getCellIndices(table, currentCell);
+  if(pos.rowIdx === undefined || pos.colIdx === undefined) return;
+  let targetRow = pos.rowIdx;
+  let targetCol = pos.colIdx;
+  if(direction === 'ArrowUp') targetRow--;
+  if(direction === 'ArrowDown') targetRow++;
+  if(direction === 'ArrowLeft') targetCol--;
+  if(direction === 'ArrowRight') targetCol++;
+  const nextCell = getCellAt(table, targetRow, targetCol);
+  if(nextCell){
+    nextCell.focus();
+    nextCell.dataset.pendingEntry = '1';
+    table._selectedCells = table._selectedCells || new Set();
+    table._selectedCells.clear();
+    table._selectedCells.add(`${targetRow}:${targetCol}`);
+    refreshCellHighlights(table);
+  }
+}
+
+function prepareSearchState(panel, term){
+  if(!panel) return null;
+  if(!panel._searchState) panel._searchState = {index:-1};
+  const state = panel._searchState;
+  if(state.term !== term){
+    highlightSearchCell(panel, null);
+    state.term = term;
+    state.index = -1;
+    state.cells = null;
+  }
+  if(!state.term) return null;
+  if(!state.cells){
+    const cells = collectSearchCells(panel);
+    if(!cells || !cells.length){
+      updateSearchStatus(T.search_not_found);
+      return null;
+    }
+    state.cells = cells;
+  }
+  return state;
+}
+
+function collectSearchCells(panel){
+  const table = panel.querySelector('table');
+  if(!table || !table.tBodies.length) return [];
+  const offset=parseInt(table.dataset.markerOffset || '0',10);
+  const rows=table.tBodies[0]?Array.from(table.tBodies[0].rows):[];
+  const rowIdxs = (table._selectedRows && table._selectedRows.size>0)
+    ? Array.from(table._selectedRows)
+    : rows.map((_,i)=>i);
+  const header=table.tHead.querySelector('tr[data-role="data-header"]');
+  const colCount = header ? header.cells.length - offset : 0;
+  const colIdxs = (table._selectedCols && table._selectedCols.size>0)
+    ? Array.from(table._selectedCols)
+    : Array.from({length: colCount}, (_,i)=>i);
+  const cells=[];
+  rowIdxs.forEach(rIdx=>{
+    const row = rows[rIdx];
+    if(!row) return;
+    colIdxs.forEach(cIdx=>{
+      const cell=row.cells[cIdx+offset];
+      if(cell) cells.push({cell, row:rIdx, col:cIdx});
+    });
+  });
+  return cells;
+}
+
+function getCellIndices(table, cell){
+  const row = cell.closest('tr');
+  if(!row) return {};
+  const rows = table.tBodies[0]?Array.from(table.tBodies[0].rows):[];
+  const rowIdx = rows.indexOf(row);
+  if(rowIdx < 0) return {};
+  const offset = parseInt(table.dataset.markerOffset || '0',10);
+  const colIdx = Array.from(row.cells).indexOf(cell) - offset;
+  if(colIdx < 0) return {};
+  return { rowIdx, colIdx };
+}
+
+function getCellAt(table, rowIdx, colIdx){
+  if(rowIdx < 0 || colIdx < 0) return null;
+  const rows = table.tBodies[0]?Array.from(table.tBodies[0].rows):[];
+  const row = rows[rowIdx];
+  if(!row) return null;
+  const offset = parseInt(table.dataset.markerOffset || '0',10);
+  return row.cells[colIdx + offset] || null;
+}
+
+function placeCaretAtEnd(cell){
+  const range = document.createRange();
+  range.selectNodeContents(cell);
+  range.collapse(false);
+  const selection = window.getSelection();
+  selection.removeAllRanges();
+  selection.addRange(range);
+}
+
+function placeCaretAtPoint(cell, x, y){
+  let range = null;
+  if(document.caretRangeFromPoint){
+    range = document.caretRangeFromPoint(x, y);
+  } else if(document.caretPositionFromPoint){
+    const pos = document.caretPositionFromPoint(x, y);
+    if(pos){
+      range = document.createRange();
+      range.setStart(pos.offsetNode, pos.offset);
+    }
+  }
+  if(range && cell.contains(range.startContainer)){
+    const selection = window.getSelection();
+    selection.removeAllRanges();
+    selection.addRange(range);
+  } else {
+    placeCaretAtEnd(cell);
+  }
+}
+
+function insertLineBreak(cell){
+  let sel = window.getSelection();
+  if(!sel || sel.rangeCount === 0 || !cell.contains(sel.anchorNode)){
+    placeCaretAtEnd(cell);
+    sel = window.getSelection();
+    if(!sel || sel.rangeCount === 0) return;
+  }
+  const range = sel.getRangeAt(0);
+  range.deleteContents();
+  const br = document.createElement('br');
+  range.insertNode(br);
+  range.setStartAfter(br);
+  range.collapse(true);
+  sel.removeAllRanges();
+  sel.addRange(range);
+}
+
+function startCellEditing(cell, moveCaret=true, pointerEvent=null){
+  const table = cell.closest('table');
+  if(table){
+    table._readyForEdit = false;
+    setTableNavMode(table, false);
+  }
+  cell.dataset.editing = '1';
+  delete cell.dataset.pendingEntry;
+  cell.focus({preventScroll:true});
+  if(pointerEvent){
+    placeCaretAtPoint(cell, pointerEvent.clientX, pointerEvent.clientY);
+  } else if(moveCaret){
+    placeCaretAtEnd(cell);
+  }
+}
+
+function stopCellEditing(cell){
+  cell.dataset.editing = '0';
+  cell.dataset.pendingEntry = '1';
+  const table = cell.closest('table');
+  if(table){
+    table._readyForEdit = false;
+    setTableNavMode(table, true);
+  }
+}
+
+function isCharacterKey(ev){
+  if(ev.ctrlKey || ev.metaKey || ev.altKey) return false;
+  const key = ev.key || '';
+  return key.length === 1;
+}
+
+function setTableNavMode(table, isNav){
+  if(!table) return;
+  if(isNav) table.classList.add('nav-mode'); else table.classList.remove('nav-mode');
+}
+
+function recordNavigationUndo(table, cell){
+  if(!table || !cell) return;
+  table._undoStack = table._undoStack || [];
+  table._undoStack.push({cell, value: cell.innerHTML});
+  if(table._undoStack.length > 50){
+    table._undoStack.shift();
+  }
+}
+
+function undoLastNavigationEdit(table){
+  if(!table || !table._undoStack || !table._undoStack.length) return false;
+  const entry = table._undoStack.pop();
+  if(!entry || !entry.cell) return false;
+  entry.cell.innerHTML = entry.value;
+  stopCellEditing(entry.cell);
+  entry.cell.focus();
+  return true;
+}
+
+function findNextMatch(state, term){
+  if(!state || !state.cells || !state.cells.length) return -1;
+  const termLower = term.toLowerCase();
+  const length = state.cells.length;
+  for(let i=1;i<=length;i++){
+    const idx = (state.index + i) % length;
+    if(cellMatches(state.cells[idx].cell, termLower)){
+      state.index = idx;
+      highlightSearchCell(activePanel, state.cells[idx].cell);
+      return idx;
+    }
+  }
+  return -1;
+}
+
+function highlightSearchCell(panel, cell){
+  if(panel && panel._searchState && panel._searchState.highlight){
+    panel._searchState.highlight.classList.remove('search-hit');
+  }
+  if(panel){
+    if(!panel._searchState) panel._searchState = {};
+    panel._searchState.highlight = cell || null;
+  }
+  if(cell) cell.classList.add('search-hit');
+}
+
+function cellMatches(cell, termLower){
+  if(!cell) return false;
+  return cell.innerText.toLowerCase().includes(termLower);
+}
+
+function escapeRegExp(string){
+  return string.replace(/[.*+?^${}()|[\]\\]/g, '\\$&');
+}
+
+const reuploadInput = document.querySelector('[data-role="reupload-input"]');
+document.querySelectorAll('[data-action="reupload-files"]').forEach(btn=>{
+  btn.addEventListener('click', ()=> reuploadInput?.click());
+});
+reuploadInput?.addEventListener('change', reuploadFiles);
+
+// Replace the uploaded files in place, then re-render the same tabs; the
+// server reuses cached parses for sheets that did not change.
+function reuploadFiles(){
+  if (!reuploadInput.files.length) return;
+  const body = new FormData();
+  Array.from(reuploadInput.files).forEach(file => body.append('files', file));
+  fetch(CONFIG.urls.reupload, {
+    method: 'POST',
+    headers: { 'X-CSRFToken': CONFIG.csrfToken },
+    body
+  }).then(resp => resp.json().then(data => {
+    if (!resp.ok) throw new Error(data.error || T.flash_uploaded_unreadable);
+    const changed = [];
+    Object.values(data.files || {}).forEach(diff => changed.push(...(diff.selections || [])));
+    reloadWorkspace({ changed });
+  })).catch(err => {
+    alert(err.message || T.flash_uploaded_unreadable);
+  }).finally(() => {
+    reuploadInput.value = '';
+  });
+}
+
+// Re-render the workspace from the uploads (render_multi), optionally adding
+// sheets (e.g. a pivot result) and choosing the tab that opens first.
+function reloadWorkspace({ extra = [], changed = [], active = '' } = {}){
+  const form = document.createElement('form');
+  form.method = 'POST';
+  form.action = CONFIG.urls.renderMulti;
+  const addField = (name, value) => {
+    const input = document.createElement('input');
+    input.type = 'hidden';
+    input.name = name;
+    input.value = value;
+    form.appendChild(input);
+  };
+  addField('csrf_token', CONFIG.csrfToken);
+  addField('token', CONFIG.token);
+  document.querySelectorAll('.panel').forEach(panel => addField('selection', panel.dataset.selection));
+  extra.forEach(sel => addField('selection', sel));
+  changed.forEach(sel => addField('changed', sel));
+  if(active) addField('active', active);
+  document.body.appendChild(form);
+  form.submit();
+}
+
+function panelHasEdits(panel){
+  return (getPanelTable(panel)?._undoStack || []).length > 0 || (panel?._tableUndoStack || []).length > 0;
+}
+
+function workspaceHasEdits(){
+  return Array.from(panels).some(panelHasEdits);
+}
+
+// Server-side sheet operations (pivot, merge, ...) answer with a derived
+// sheet saved next to the uploads; it opens as a new, active tab.
+function runSheetOperation(url, payload, statusEl, runningText){
+  const setStatus = (message, isError=false) => {
+    if(!statusEl) return;
+    statusEl.textContent = message || '';
+    statusEl.style.color = isError ? '#b91c1c' : '#475569';
+  };
+  setStatus(runningText);
+  return fetchAdmitted(url, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', 'X-CSRFToken': CONFIG.csrfToken },
+    body: JSON.stringify({ token: CONFIG.token, ...payload })
+  }, queuedStatus(setStatus)).then(resp => resp.json().then(data => {
+    if(!resp.ok) throw new Error(data.error || T.sheet_op_failed);
+    if(workspaceHasEdits() && !confirm(T.derived_sheet_reload_confirm)){
+      setStatus('');
+      return;
+    }
+    reloadWorkspace({ extra: [data.selection], active: data.selection });
+  })).catch(err => {
+    setStatus(err.message || T.sheet_op_failed, true);
+  });
+}
+
+function openPivotModal(){
+  if(!pivotModal || !activePanel) return;
+  const headers = getPanelHeaders(activePanel);
+  [pivotRows, pivotColumns].forEach(select => {
+    if(!select) return;
+    select.innerHTML = '';
+    headers.forEach(name => select.appendChild(new Option(name, name)));
+  });
+  if(pivotValues) pivotValues.innerHTML = '';
+  appendPivotValueRow(headers[headers.length - 1] || '', 'sum');
+  const sheetLabel = pivotModal.querySelector('[data-role="pivot-sheet"]');
+  if(sheetLabel) sheetLabel.textContent = `\u2013 ${activePanel.dataset.label || ''}`;
+  if(pivotStatus) pivotStatus.textContent = '';
+  pivotModal.classList.add('open');
+  pivotModal.setAttribute('aria-hidden','false');
+}
+
+function closePivotModal(){
+  pivotModal?.classList.remove('open');
+  pivotModal?.setAttribute('aria-hidden','true');
+}
+
+function appendPivotValueRow(column, agg){
+  if(!pivotValues || !activePanel) return;
+  const row = document.createElement('tr');
+  const columnSelect = document.createElement('select');
+  columnSelect.dataset.role = 'pivot-value-column';
+  getPanelHeaders(activePanel).forEach(name => columnSelect.appendChild(new Option(name, name)));
+  columnSelect.value = column;
+  const aggSelect = document.createElement('select');
+  aggSelect.dataset.role = 'pivot-value-agg';
+  PIVOT_AGGREGATIONS.forEach(code => aggSelect.appendChild(new Option(T[`pivot_agg_${code}`], code)));
+  aggSelect.value = agg;
+  const removeBtn = document.createElement('button');
+  removeBtn.type = 'button';
+  removeBtn.className = 'btn secondary';
+  removeBtn.textContent = '\u00d7';
+  removeBtn.addEventListener('click', () => row.remove());
+  [columnSelect, aggSelect, removeBtn].forEach((el, i) => {
+    const td = document.createElement('td');
+    if(i === 2) td.className = 'remove-cell';
+    td.appendChild(el);
+    row.appendChild(td);
+  });
+  pivotValues.appendChild(row);
+}
+
+function runPivot(){
+  if(!activePanel) return;
+  const selected = select => select ? Array.from(select.selectedOptions).map(opt => opt.value) : [];
+  const values = Array.from(pivotValues?.rows || []).map(row => ({
+    column: row.querySelector('[data-role="pivot-value-column"]').value,
+    agg: row.querySelector('[data-role="pivot-value-agg"]').value
+  })).filter(item => item.column);
+  if(!values.length){
+    if(pivotStatus){ pivotStatus.textContent = T.pivot_need_values; pivotStatus.style.color = '#b91c1c'; }
+    return;
+  }
+  runSheetOperation(CONFIG.urls.pivot, {
+    selection: activePanel.dataset.selection,
+    rows: selected(pivotRows),
+    columns: selected(pivotColumns),
+    values
+  }, pivotStatus, T.pivot_running);
+}
+
+function openMergeModal(){
+  if(!mergeModal || !mergeLookup || !activePanel) return;
+  const others = Array.from(panels).filter(panel => panel !== activePanel);
+  if(!others.length){
+    alert(T.mapping_need_two_sheets);
+    return;
+  }
+  const previous = mergeLookup.value;
+  mergeLookup.innerHTML = '';
+  others.forEach(panel => mergeLookup.appendChild(new Option(panel.dataset.label || panel.id, panel.id)));
+  if(others.some(panel => panel.id === previous)) mergeLookup.value = previous;
+  const sheetLabel = mergeModal.querySelector('[data-role="merge-sheet"]');
+  if(sheetLabel) sheetLabel.textContent = `\u2013 ${activePanel.dataset.label || ''}`;
+  if(mergeStatus) mergeStatus.textContent = '';
+  populateMergeLookupColumns();
+  mergeModal.classList.add('open');
+  mergeModal.setAttribute('aria-hidden','false');
+}
+
+function closeMergeModal(){
+  mergeModal?.classList.remove('open');
+  mergeModal?.setAttribute('aria-hidden','true');
+}
+
+// Lookup sheet changed: refill the columns to bring and guess the key from the
+// first header both sheets share.
+function populateMergeLookupColumns(){
+  const lookupPanel = document.getElementById(mergeLookup?.value || '');
+  const lookupHeaders = getPanelHeaders(lookupPanel);
+  if(mergeColumns){
+    mergeColumns.innerHTML = '';
+    lookupHeaders.forEach(name => mergeColumns.appendChild(new Option(name, name)));
+  }
+  if(mergeKeys) mergeKeys.innerHTML = '';
+  const leftHeaders = getPanelHeaders(activePanel);
+  const shared = leftHeaders.find(name => lookupHeaders.includes(name));
+  appendMergeKeyRow(shared || leftHeaders[0] || '', shared || lookupHeaders[0] || '');
+}
+
+function appendMergeKeyRow(leftCol, rightCol){
+  if(!mergeKeys || !activePanel) return;
+  const row = document.createElement('tr');
+  const leftSelect = document.createElement('select');
+  leftSelect.dataset.role = 'merge-key-left';
+  getPanelHeaders(activePanel).forEach(name => leftSelect.appendChild(new Option(name, name)));
+  leftSelect.value = leftCol;
+  const rightSelect = document.createElement('select');
+  rightSelect.dataset.role = 'merge-key-right';
+  getPanelHeaders(document.getElementById(mergeLookup?.value || '')).forEach(name => rightSelect.appendChild(new Option(name, name)));
+  rightSelect.value = rightCol;
+  const removeBtn = document.createElement('button');
+  removeBtn.type = 'button';
+  removeBtn.className = 'btn secondary';
+  removeBtn.textContent = '\u00d7';
+  removeBtn.addEventListener('click', () => row.remove());
+  [leftSelect, rightSelect, removeBtn].forEach((el, i) => {
+    const td = document.createElement('td');
+    if(i === 2) td.className = 'remove-cell';
+    td.appendChild(el);
+    row.appendChild(td);
+  });
+  mergeKeys.appendChild(row);
+}
+
+function runMerge(){
+  const lookupPanel = document.getElementById(mergeLookup?.value || '');
+  if(!activePanel || !lookupPanel) return;
+  const keys = Array.from(mergeKeys?.rows || []).map(row => ({
+    left: row.querySelector('[data-role="merge-key-left"]').value,
+    right: row.querySelector('[data-role="merge-key-right"]').value
+  })).filter(item => item.left && item.right);
+  if(!keys.length){
+    if(mergeStatus){ mergeStatus.textContent = T.merge_need_key; mergeStatus.style.color = '#b91c1c'; }
+    return;
+  }
+  runSheetOperation(CONFIG.urls.merge, {
+    selection: activePanel.dataset.selection,
+    lookup: lookupPanel.dataset.selection,
+    keys,
+    columns: mergeColumns ? Array.from(mergeColumns.selectedOptions).map(opt => opt.value) : [],
+    join: mergeModal.querySelector('[data-role="merge-join"]')?.value || 'left',
+    duplicates: mergeModal.querySelector('[data-role="merge-duplicates"]')?.value || 'first'
+  }, mergeStatus, T.merge_running);
+}
+
+function openDedupeModal(){
+  if(!dedupeModal || !activePanel) return;
+  if(dedupeKeys){
+    dedupeKeys.innerHTML = '';
+    getPanelHeaders(activePanel).forEach(name => dedupeKeys.appendChild(new Option(name, name)));
+    if(dedupeKeys.options.length) dedupeKeys.options[0].selected = true;
+  }
+  const sheetLabel = dedupeModal.querySelector('[data-role="dedupe-sheet"]');
+  if(sheetLabel) sheetLabel.textContent = `\u2013 ${activePanel.dataset.label || ''}`;
+  if(dedupeReport) dedupeReport.innerHTML = '';
+  setDedupeStatus('');
+  dedupeModal.classList.add('open');
+  dedupeModal.setAttribute('aria-hidden','false');
+}
+
+function closeDedupeModal(){
+  dedupeModal?.classList.remove('open');
+  dedupeModal?.setAttribute('aria-hidden','true');
+}
+
+function setDedupeStatus(message, isError=false){
+  if(!dedupeStatus) return;
+  dedupeStatus.textContent = message || '';
+  dedupeStatus.style.color = isError ? '#b91c1c' : '#475569';
+}
+
+function dedupePayload(){
+  return {
+    token: CONFIG.token,
+    selection: activePanel?.dataset.selection || '',
+    keys: dedupeKeys ? Array.from(dedupeKeys.selectedOptions).map(opt => opt.value) : [],
+    keep: dedupeModal?.querySelector('[data-role="dedupe-keep"]')?.value || 'first'
+  };
+}
+
+function requestDedupe(payload){
+  setDedupeStatus(T.dedupe_running);
+  return fetchAdmitted(CONFIG.urls.dedupe, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', 'X-CSRFToken': CONFIG.csrfToken },
+    body: JSON.stringify(payload)
+  }, queuedStatus(setDedupeStatus)).then(resp => resp.json().then(data => {
+    if(!resp.ok) throw new Error(data.error || T.sheet_op_failed);
+    return data;
+  }));
+}
+
+function renderDedupeReport(data){
+  if(!dedupeReport) return;
+  dedupeReport.innerHTML = '';
+  (data.sample || []).forEach(group => {
+    const row = document.createElement('tr');
+    [group.key.join(' | '), `${group.count.toLocaleString()} ${T.dedupe_rows}`, group.rows.join(', ') + (group.count > group.rows.length ? ', \u2026' : '')]
+      .forEach(text => {
+        const td = document.createElement('td');
+        td.textContent = text;
+        row.appendChild(td);
+      });
+    dedupeReport.appendChild(row);
+  });
+  if(!data.groups){
+    setDedupeStatus(T.dedupe_none);
+    return;
+  }
+  let text = T.dedupe_summary;
+  [data.duplicates, data.groups, data.rows].forEach(v => { text = text.replace('%s', v.toLocaleString()); });
+  setDedupeStatus(text);
+}
+
+function runDedupeReport(){
+  const payload = dedupePayload();
+  if(!payload.keys.length){
+    setDedupeStatus(T.dedupe_need_keys, true);
+    return;
+  }
+  requestDedupe(payload).then(renderDedupeReport).catch(err => setDedupeStatus(err.message || T.sheet_op_failed, true));
+}
+
+// Duplicates found on the server are dropped from the loaded table as one
+// undoable change when its rows still line up with the sheet (fully loaded,
+// unedited); otherwise the deduplicated sheet opens as a new tab.
+function runDedupeRemove(){
+  const payload = dedupePayload();
+  if(!payload.keys.length){
+    setDedupeStatus(T.dedupe_need_keys, true);
+    return;
+  }
+  const panel = activePanel;
+  const table = getPanelTable(panel);
+  const body = table?.tBodies[0];
+  if(!body || panel.dataset.partial === '1' || panelHasEdits(panel)){
+    runSheetOperation(CONFIG.urls.dedupe, { ...payload, apply: 'sheet' }, dedupeStatus, T.dedupe_running);
+    return;
+  }
+  requestDedupe({ ...payload, apply: 'rows' }).then(data => {
+    renderDedupeReport(data);
+    if(!data.drop.length) return;
+    if(data.rows !== body.rows.length){
+      runSheetOperation(CONFIG.urls.dedupe, { ...payload, apply: 'sheet' }, dedupeStatus, T.dedupe_running);
+      return;
+    }
+    pushTableUndoSnapshot(panel, table);
+    const rows = Array.from(body.rows);
+    data.drop.forEach(idx => rows[idx]?.remove());
+    initializePanel(panel, table);
+    setDedupeStatus(T.dedupe_removed.replace('%s', data.drop.length.toLocaleString()));
+  }).catch(err => setDedupeStatus(err.message || T.sheet_op_failed, true));
+}
+
+// Version diff: the active file against the version its last re-upload
+// replaced, or another uploaded file of the same type. The server saves one
+// diff tab per changed sheet; they open on request.
+let diffSelections = [];
+
+function openDiffModal(){
+  if(!diffModal || !activePanel) return;
+  const filename = (activePanel.dataset.selection || '').split('::')[0];
+  const ext = filename.split('.').pop().toLowerCase();
+  if(diffBase){
+    diffBase.innerHTML = '';
+    diffBase.appendChild(new Option(T.diff_previous_version, ''));
+    const others = new Set();
+    panels.forEach(panel => {
+      const name = (panel.dataset.selection || '').split('::')[0];
+      if(name && name !== filename && name.split('.').pop().toLowerCase() === ext) others.add(name);
+    });
+    others.forEach(name => diffBase.appendChild(new Option(name, name)));
+  }
+  if(diffKeys){
+    diffKeys.innerHTML = '';
+    getPanelHeaders(activePanel).forEach(name => diffKeys.appendChild(new Option(name, name)));
+  }
+  const sheetLabel = diffModal.querySelector('[data-role="diff-sheet"]');
+  if(sheetLabel) sheetLabel.textContent = `\u2013 ${filename}`;
+  if(diffReport) diffReport.innerHTML = '';
+  diffSelections = [];
+  if(diffOpenTabs) diffOpenTabs.disabled = true;
+  setDiffStatus('');
+  diffModal.classList.add('open');
+  diffModal.setAttribute('aria-hidden','false');
+}
+
+function closeDiffModal(){
+  diffModal?.classList.remove('open');
+  diffModal?.setAttribute('aria-hidden','true');
+}
+
+function setDiffStatus(message, isError=false){
+  if(!diffStatus) return;
+  diffStatus.textContent = message || '';
+  diffStatus.style.color = isError ? '#b91c1c' : '#475569';
+}
+
+function runDiff(){
+  if(!activePanel) return;
+  setDiffStatus(T.diff_running);
+  const progress = followProgress(setDiffStatus);
+  fetchAdmitted(CONFIG.urls.diff, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', 'X-CSRFToken': CONFIG.csrfToken },
+    body: JSON.stringify({
+      token: CONFIG.token,
+      selection: activePanel.dataset.selection,
+      base: diffBase?.value || '',
+      keys: diffKeys ? Array.from(diffKeys.selectedOptions).map(opt => opt.value) : [],
+      all_sheets: !!diffModal.querySelector('[data-role="diff-all-sheets"]')?.checked,
+      progress: progress.id
+    })
+  }, queuedStatus(setDiffStatus)).then(resp => resp.json().then(data => {
+    progress.close();
+    if(!resp.ok) throw new Error(data.error || T.sheet_op_failed);
+    renderDiffReport(data);
+  })).catch(err => {
+    progress.close();
+    setDiffStatus(err.message || T.sheet_op_failed, true);
+  });
+}
+
+function renderDiffReport(data){
+  if(diffReport){
+    diffReport.innerHTML = '';
+    (data.sheets || []).forEach(entry => {
+      let counts = '';
+      if(entry.added !== undefined){
+        counts = T.diff_counts;
+        [entry.added, entry.removed, entry.modified].forEach(v => { counts = counts.replace('%s', v.toLocaleString()); });
+      }
+      const row = document.createElement('tr');
+      [entry.sheet || 'CSV', T[`diff_status_${entry.status}`] || entry.status, counts].forEach(text => {
+        const td = document.createElement('td');
+        td.textContent = text;
+        row.appendChild(td);
+      });
+      diffReport.appendChild(row);
+    });
+  }
+  diffSelections = data.selections || [];
+  if(diffOpenTabs) diffOpenTabs.disabled = !diffSelections.length;
+  setDiffStatus(data.message);
+}
+
+function openDiffTabs(){
+  if(!diffSelections.length) return;
+  if(workspaceHasEdits() && !confirm(T.derived_sheet_reload_confirm)) return;
+  reloadWorkspace({ extra: diffSelections, active: diffSelections[0] });
+}
+
+let activeExportJob = null;
+
+function exportSelected() {
+  if (activeExportJob) return;
+  const selected = [];
+  document.querySelectorAll('.panel').forEach(panel => {
+    if (!sheetSelection.has(panel.id)) return;
+    const t = extractTable(panel);
+    if (t) selected.push(t);
+  });
+  if (selected.length === 0) {
+    alert(T.alert_select_at_least_one_sheet);
+    return;
+  }
+  const hasPreview = Array.from(panels).some(panel => sheetSelection.has(panel.id) && panel.dataset.partial === '1');
+  if (hasPreview && !confirm(T.preview_export_confirm)) return;
+  const format = document.querySelector('[data-role="export-format"]')?.value || 'xlsx';
+  const payload = { filename: 'export.xlsx', format, token: CONFIG.token, sheets: selected };
+  setExportBusy(true);
+  fetch(CONFIG.urls.createExportJob, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      'X-CSRFToken': CONFIG.csrfToken
+    },
+    body: JSON.stringify(payload)
+  }).then(resp => resp.json().then(data => {
+    if (!resp.ok) throw new Error(data.error || T.export_failed);
+    return data;
+  })).then(job => {
+    activeExportJob = job;
+    followExportJob(job);
+  }).catch(err => {
+    finishExportJob();
+    alert(err.message || T.export_failed);
+  });
+}
+
+// Job state arrives as server-sent events; polling the progress URL is the
+// fallback when EventSource is missing or the stream breaks.
+function followExportJob(job){
+  if (!window.EventSource || !job.events_url) {
+    pollExportJob(job);
+    return;
+  }
+  const source = new EventSource(job.events_url);
+  source.addEventListener('progress', ev => {
+    if (activeExportJob !== job) {
+      source.close();
+      return;
+    }
+    try {
+      if (applyExportJobState(JSON.parse(ev.data))) source.close();
+    } catch (err) {
+      source.close();
+      finishExportJob();
+      alert(err.message || T.export_failed);
+    }
+  });
+  const fallback = () => {
+    source.close();
+    if (activeExportJob === job) pollExportJob(job);
+  };
+  source.addEventListener('timeout', fallback);
+  source.onerror = fallback;
+}
+
+function pollExportJob(job){
+  fetch(job.progress_url, { headers: { 'Accept': 'application/json' } })
+    .then(resp => resp.json().then(data => {
+      if (!resp.ok) throw new Error(data.error || T.export_failed);
+      return data;
+    }))
+    .then(state => {
+      if (activeExportJob !== job) return;
+      if (!applyExportJobState(state)) setTimeout(() => pollExportJob(job), 700);
+    })
+    .catch(err => {
+      finishExportJob();
+      alert(err.message || T.export_failed);
+    });
+}
+
+// Returns true once the job is over (downloaded, cancelled); throws when it failed.
+function applyExportJobState(state){
+  if (state.status === 'done') {
+    finishExportJob();
+    const a = document.createElement('a');
+    a.href = state.download_url;
+    a.download = state.filename || 'export.xlsx';
+    document.body.appendChild(a);
+    a.click();
+    a.remove();
+    return true;
+  }
+  if (state.status === 'failed') throw new Error(state.error || T.export_failed);
+  if (state.status === 'cancelled') {
+    finishExportJob();
+    if (exportCount) exportCount.textContent = T.export_cancelled;
+    return true;
+  }
+  renderExportProgress(state);
+  return false;
+}
+
+function cancelExportJob(){
+  const job = activeExportJob;
+  if (!job) return;
+  fetch(job.cancel_url, {
+    method: 'POST',
+    headers: { 'X-CSRFToken': CONFIG.csrfToken }
+  }).catch(() => {});
+}
+
+function renderExportProgress(state){
+  if (!exportCount) return;
+  if (state.queue_position) {
+    exportCount.textContent = T.queue_position.replace('%s', state.queue_position);
+    return;
+  }
+  const values = [
+    Math.min((state.sheets_done || 0) + 1, state.sheets_total || 0),
+    state.sheets_total || 0,
+    (state.rows_written || 0).toLocaleString(),
+    (state.rows_total || 0).toLocaleString()
+  ];
+  let text = T.export_progress;
+  values.forEach(v => { text = text.replace('%s', v); });
+  exportCount.textContent = text;
+}
+
+function setExportBusy(busy){
+  document.querySelectorAll('[data-action="export-selected"]').forEach(btn => { btn.disabled = busy; });
+  document.querySelectorAll('[data-action="cancel-export-job"]').forEach(btn => { btn.hidden = !busy; });
+}
+
+function finishExportJob(){
+  activeExportJob = null;
+  setExportBusy(false);
+  updateExportCount();
+}
+
+function openExportModal(){
+  populateExportSheetList();
+  exportModal?.classList.add('open');
+  exportModal?.setAttribute('aria-hidden','false');
+}
+
+function closeExportModal(){
+  exportModal?.classList.remove('open');
+  exportModal?.setAttribute('aria-hidden','true');
+}
+
+function populateExportSheetList(){
+  if(!exportSheetList) return;
+  exportSheetList.innerHTML='';
+  panels.forEach(panel=>{
+    const label=document.createElement('label');
+    const box=document.createElement('input');
+    box.type='checkbox';
+    box.className='export-sheet';
+    box.dataset.sheet=panel.id;
+    box.checked=sheetSelection.has(panel.id);
+    box.addEventListener('change',()=>{
+      if(box.checked) sheetSelection.add(panel.id); else sheetSelection.delete(panel.id);
+      updateExportCount();
+    });
+    const text=document.createElement('span');
+    text.textContent=panel.dataset.label || panel.id;
+    label.appendChild(box);
+    label.appendChild(text);
+    exportSheetList.appendChild(label);
+  });
+  updateExportCount();
+}
+
+function updateExportCount(){
+  if(exportCount) exportCount.textContent = `${sheetSelection.size}/${panels.length} sheet`;
+}
+
+function extractTable(panel) {
+  const tbl = panel.querySelector('table');
+  if (!tbl) return null;
+  const dataHeader = tbl.tHead ? tbl.tHead.querySelector('tr[data-role=\"data-header\"]') : null;
+  const headers = dataHeader ? Array.from(dataHeader.querySelectorAll('th:not(.corner-marker)')).map(th => th.innerText.trim()) : [];
+  const cellRows = Array.from(tbl.querySelectorAll('tbody tr')).map(tr => Array.from(tr.querySelectorAll('td')));
+  const rows = cellRows.map(cells => cells.map(td => td.innerText));
+  const fills = encodeColorRuns(cellRows, headers.length, td => td.style.backgroundColor);
+  const fonts = encodeColorRuns(cellRows, headers.length, td => td.style.color);
+  const fname = panel.getAttribute('data-filename') || '';
+  const sheet = panel.getAttribute('data-sheet') || '';
+  const nameInput = panel.querySelector('[data-role="sheet-name"]');
+  const custom = nameInput ? nameInput.value.trim() : '';
+  const label = panel.getAttribute('data-label') || '';
+  const base = (custom || sheet || label || fname.replace(/\.[^/.]+$/, '') || 'Sheet').trim();
+  const columnFormats = headers.map((header, idx) => {
+    const meta = normalizeColumnFormatMeta((panel._columnFormatMeta || [])[idx] || {});
+    meta.header = header;
+    return meta;
+  });
+  return { headers, rows, name: base, column_formats: columnFormats, fills, fonts };
+}
+
+const cssColorHexCache = new Map();
+function cssColorToHex(value){
+  if(!value) return '';
+  if(cssColorHexCache.has(value)) return cssColorHexCache.get(value);
+  let hex = '';
+  const rgb = value.match(/^rgba?\((\d+),\s*(\d+),\s*(\d+)(?:,\s*([\d.]+))?\)$/);
+  if(rgb){
+    if(rgb[4] === undefined || parseFloat(rgb[4]) > 0){
+      hex = '#' + rgb.slice(1, 4).map(n => Number(n).toString(16).padStart(2, '0')).join('').toUpperCase();
+    }
+  } else if(/^#[0-9a-f]{6}$/i.test(value)){
+    hex = value.toUpperCase();
+  }
+  cssColorHexCache.set(value, hex);
+  return hex;
+}
+
+// Run-length encode cell colors as {color: [start, length, ...]} over row-major
+// cell indexes, so a fully colored sheet costs a few numbers per row.
+function encodeColorRuns(cellRows, columnCount, pickColor){
+  const runs = {};
+  let current = '';
+  let start = 0;
+  let length = 0;
+  const flush = () => {
+    if(!current) return;
+    if(!runs[current]) runs[current] = [];
+    runs[current].push(start, length);
+  };
+  cellRows.forEach((cells, r) => {
+    for(let c = 0; c < columnCount; c++){
+      const color = cells[c] ? cssColorToHex(pickColor(cells[c])) : '';
+      const idx = r * columnCount + c;
+      if(color && color === current && start + length === idx){
+        length++;
+        continue;
+      }
+      flush();
+      current = color;
+      start = idx;
+      length = 1;
+    }
+  });
+  flush();
+  return runs;
+}
+
+function initPanels(){
+  document.querySelectorAll('.panel').forEach(panel => {
+    const table = panel.querySelector('table');
+    if(!table || !table.tHead) return;
+    initializePanel(panel, table);
+    const deleteRowsBtn = panel.querySelector('[data-action="delete-rows"]');
+    const deleteColsBtn = panel.querySelector('[data-action="delete-cols"]');
+    const deleteBlankBtn = panel.querySelector('[data-action="delete-blanks"]');
+    const applyColorBtn = panel.querySelector('[data-action="apply-color"]');
+    panel.querySelector('[data-action="load-remaining-rows"]')?.addEventListener('click',()=>loadRemainingRows(panel));
+    deleteRowsBtn?.addEventListener('click',()=>{
+      const tbl = getPanelTable(panel);
+      if(tbl) handleDeleteRows(panel, tbl);
+    });
+    deleteColsBtn?.addEventListener('click',()=>{
+      const tbl = getPanelTable(panel);
+      if(tbl) handleDeleteCols(panel, tbl);
+    });
+    deleteBlankBtn?.addEventListener('click',()=>{
+      const tbl = getPanelTable(panel);
+      if(tbl) handleDeleteBlankRows(panel, tbl);
+    });
+    applyColorBtn?.addEventListener('click',()=>{
+      const tbl = getPanelTable(panel);
+      if(tbl) applyColorToSelection(panel, tbl);
+    });
+    setupSheetNameBinding(panel);
+    const menuToggle = panel.querySelector('[data-role="menu-toggle"]');
+    menuToggle?.addEventListener('click',()=>{
+      panel.classList.toggle('menu-hidden');
+    });
+  });
+}
+
+function setupMenuTabs(){
+  const menu=document.querySelector('.sidebar');
+  if(!menu) return;
+  const tabs=menu.querySelectorAll('.menu-tab');
+  const panes=menu.querySelectorAll('.menu-pane');
+  tabs.forEach(tab=>{
+    tab.addEventListener('click', ()=>{
+      tabs.forEach(t=>t.classList.remove('active'));
+      tab.classList.add('active');
+      panes.forEach(p=>p.classList.remove('active'));
+      const paneClass = tab.dataset.pane ? `.${tab.dataset.pane}-pane` : null;
+      if(paneClass){
+        menu.querySelector(paneClass)?.classList.add('active');
+      }
+    });
+  });
+}
+
+function setupSheetNameBinding(panel){
+  const input=panel.querySelector('[data-role="sheet-name"]');
+  const title=panel.querySelector('.panel-title');
+  if(!input) return;
+  input.addEventListener('input',()=>{
+    if(title){
+      const value=input.value.trim();
+      title.textContent = value || panel.getAttribute('data-label') || title.textContent;
+    }
+  });
+}
+
+function beginTabRename(tab, panel, ev){
+  if(tab.dataset.renaming === '1'){
+    return;
+  }
+  ev.preventDefault();
+  ev.stopPropagation();
+  tab.dataset.renaming = '1';
+  const original = (panel.getAttribute('data-label') || tab.textContent || '').trim();
+  const input = document.createElement('input');
+  input.type = 'text';
+  input.value = original;
+  input.className = 'sheet-name-input';
+  input.style.width = '100%';
+  input.style.padding = '2px 6px';
+  input.style.height = '28px';
+  tab.textContent = '';
+  tab.appendChild(input);
+  input.focus();
+  input.select();
+
+  let done = false;
+  const finish = (accept) => {
+    if(done){
+      return;
+    }
+    done = true;
+    const next = accept ? (input.value || '').trim() : original;
+    const finalName = next || original || 'Sheet';
+    tab.textContent = finalName;
+    panel.setAttribute('data-label', finalName);
+    const title = panel.querySelector('.panel-title');
+    if(title){
+      title.textContent = finalName;
+    }
+    const localInput = panel.querySelector('[data-role="sheet-name"]');
+    if(localInput){
+      localInput.value = finalName;
+    }
+    delete tab.dataset.renaming;
+  };
+
+  input.addEventListener('keydown', keyEv => {
+    if(keyEv.key === 'Enter'){
+      keyEv.preventDefault();
+      finish(true);
+    } else if(keyEv.key === 'Escape'){
+      keyEv.preventDefault();
+      finish(false);
+    }
+  });
+  input.addEventListener('blur', () => finish(true));
+}
+
+
+function initializePanel(panel, table){
+  const summary = panel.querySelector('[data-role="filter-tags"]');
+  const rowInput = panel.querySelector('[data-role="row-input"]');
+  const colInput = panel.querySelector('[data-role="col-input"]');
+  const deleteRowsBtn = panel.querySelector('[data-action="delete-rows"]');
+  const deleteColsBtn = panel.querySelector('[data-action="delete-cols"]');
+  const deleteBlankBtn = panel.querySelector('[data-action="delete-blanks"]');
+  stripEnhancements(table);
+  addRowColMarkers(table);
+  ensurePanelColumnFormats(panel, table);
+  attachColumnResizers(table);
+  setupFilters(table, summary);
+  setFiltersVisible(document.querySelector('[data-role="filter-toggle"]')?.checked !== false);
+  attachSelectionHandlers(table, rowInput, colInput, deleteRowsBtn, deleteColsBtn, deleteBlankBtn);
+  attachCellSelection(table);
+  const clearBtn = panel.querySelector('[data-action="clear-filters"]');
+  if(clearBtn && !clearBtn.dataset.bound){
+    clearBtn.addEventListener('click',()=>clearAllFilters(table, summary));
+    clearBtn.dataset.bound='1';
+  }
+  updateSelectionInputs(table, rowInput, colInput, deleteRowsBtn, deleteColsBtn, deleteBlankBtn);
+  refreshRowHighlights(table);
+  refreshColHighlights(table);
+  refreshCellHighlights(table);
+}
+
+function handleDeleteRows(panel, table){
+  if(!table._selectedRows || table._selectedRows.size===0) return;
+  pushTableUndoSnapshot(panel, table);
+  const rows=table.tBodies[0]?Array.from(table.tBodies[0].rows):[];
+  Array.from(table._selectedRows).sort((a,b)=>b-a).forEach(idx=>{
+    rows[idx]?.remove();
+  });
+  initializePanel(panel, table);
+}
+
+function handleDeleteCols(panel, table){
+  if(!table._selectedCols || table._selectedCols.size===0) return;
+  pushTableUndoSnapshot(panel, table);
+  const offset=parseInt(table.dataset.markerOffset || '0',10);
+  const header=table.tHead.querySelector('tr[data-role="data-header"]');
+  const rows=table.tBodies[0]?Array.from(table.tBodies[0].rows):[];
+  const nextFormats = Array.isArray(panel._columnFormatMeta) ? panel._columnFormatMeta.slice() : [];
+  Array.from(table._selectedCols).sort((a,b)=>b-a).forEach(colIdx=>{
+    header?.cells[colIdx+offset]?.remove();
+    rows.forEach(row=>row.cells[colIdx+offset]?.remove());
+    nextFormats.splice(colIdx, 1);
+  });
+  panel._columnFormatMeta = nextFormats;
+  initializePanel(panel, table);
+}
+
+function cloneColumnFormats(list){
+  return Array.isArray(list) ? list.map(item => ({...item})) : [];
+}
+
+function normalizeColumnFormatMeta(meta){
+  const item = meta && typeof meta === 'object' ? meta : {};
+  return {
+    header: item.header || '',
+    source_type: item.source_type || 'text',
+    original_number_format: item.original_number_format || 'General',
+    selected_preset: item.selected_preset || 'original',
+  };
+}
+
+function ensurePanelColumnFormats(panel, table){
+  if(!panel || !table) return [];
+  const header = table.tHead?.querySelector('tr[data-role="data-header"]');
+  const offset = parseInt(table.dataset.markerOffset || '0', 10);
+  const count = header ? Math.max(0, header.cells.length - offset) : 0;
+  let base = Array.isArray(panel._columnFormatMeta) ? panel._columnFormatMeta.map(normalizeColumnFormatMeta) : null;
+  if(!base){
+    try {
+      base = JSON.parse(panel.dataset.columnMeta || '[]').map(normalizeColumnFormatMeta);
+    } catch (err) {
+      base = [];
+    }
+  }
+  while(base.length < count){
+    base.push(normalizeColumnFormatMeta({}));
+  }
+  panel._columnFormatMeta = base.slice(0, count);
+  return panel._columnFormatMeta;
+}
+
+function updateColumnFormatControls(panel){
+  const table = getPanelTable(panel);
+  const selectedCols = table? Array.from(table._selectedCols || []).sort((a,b)=>a-b) : [];
+  const hasSelection = selectedCols.length > 0;
+  if(formatSelectGlobal){
+    formatSelectGlobal.disabled = !hasSelection;
+  }
+  if(applyColumnFormatGlobalBtn){
+    applyColumnFormatGlobalBtn.disabled = !hasSelection;
+  }
+  if(!formatSelectGlobal){
+    return;
+  }
+  if(!hasSelection){
+    formatSelectGlobal.value = 'original';
+    return;
+  }
+  const formats = ensurePanelColumnFormats(panel, table);
+  const presets = selectedCols.map(idx => (formats[idx] || {}).selected_preset || 'original');
+  const first = presets[0];
+  formatSelectGlobal.value = presets.every(value => value === first) ? first : '__mixed__';
+}
+
+function applySelectedColumnFormat(panel, table){
+  if(!panel || !table || !formatSelectGlobal) return;
+  const preset = formatSelectGlobal.value;
+  if(!preset || preset === '__mixed__' || !table._selectedCols || table._selectedCols.size===0) return;
+  pushTableUndoSnapshot(panel, table);
+  const formats = ensurePanelColumnFormats(panel, table).slice();
+  Array.from(table._selectedCols).forEach(idx => {
+    const meta = normalizeColumnFormatMeta(formats[idx] || {});
+    meta.selected_preset = preset;
+    formats[idx] = meta;
+  });
+  panel._columnFormatMeta = formats;
+  updateColumnFormatControls(panel);
+  updateUndoButton(panel);
+}
+
+function handleDeleteBlankRows(panel, table){
+  if(!table._selectedCols || table._selectedCols.size===0) return;
+  pushTableUndoSnapshot(panel, table);
+  const offset=parseInt(table.dataset.markerOffset || '0',10);
+  const rows=table.tBodies[0]?Array.from(table.tBodies[0].rows):[];
+  const targets=Array.from(table._selectedCols);
+  let removed=false;
+  rows.forEach(row=>{
+    const shouldRemove=targets.every(colIdx=>{
+      const cell=row.cells[colIdx+offset];
+      const text=(cell?cell.innerText:'').trim().toLowerCase();
+      return text==='' || text==='null' || text==='na' || text==='nan';
+    });
+    if(shouldRemove){
+      row.remove();
+      removed=true;
+    }
+  });
+  if(removed) initializePanel(panel, table);
+}
+
+function applyColorToSelection(panel, table, mode='fill', overrideColor=null){
+  let color = overrideColor;
+  if(!color){
+    const colorInput=panel.querySelector('[data-role=\"color-input\"]');
+    if(!colorInput) return;
+    color=colorInput.value;
+  }
+  if(!color) return;
+  const offset=parseInt(table.dataset.markerOffset || '0',10);
+  const rows=table.tBodies[0]?Array.from(table.tBodies[0].rows):[];
+  const colorRows = table._selectedRows && table._selectedRows.size>0;
+  const colorCols = table._selectedCols && table._selectedCols.size>0;
+  const colorCells = table._selectedCells && table._selectedCells.size>0;
+  if(!colorRows && !colorCols && !colorCells) return;
+  const applyCellStyle = (cell) => {
+    if(!cell) return;
+    if(mode === 'text'){
+      if(color === '__AUTO__'){
+        cell.style.color = '';
+      } else {
+        cell.style.color = color;
+      }
+    } else {
+      if(color === '__CLEAR__'){
+        cell.style.backgroundColor = '';
+      } else {
+        cell.style.backgroundColor = color;
+      }
+    }
+  };
+  if(colorRows){
+    table._selectedRows.forEach(idx=>{
+      const row=rows[idx];
+      if(!row) return;
+      for(let c=offset;c<row.cells.length;c++){
+        const cell=row.cells[c];
+        applyCellStyle(cell);
+      }
+    });
+  }
+  if(colorCols){
+    table._selectedCols.forEach(colIdx=>{
+      rows.forEach(row=>{
+        const cell=row.cells[colIdx+offset];
+        applyCellStyle(cell);
+      });
+    });
+  }
+  if(colorCells){
+    table._selectedCells.forEach(key=>{
+      const cell=getCellByKey(table, key);
+      applyCellStyle(cell);
+    });
+  }
+}
+
+// Shared helper functions (same as single view)
+function columnLabel(idx){ let label=''; while(idx>=0){ label = String.fromCharCode(65 + (idx % 26)) + label; idx = Math.floor(idx / 26) - 1; } return label; }
+function addRowColMarkers(table){
+  const dataHeader=table.tHead.rows[0];
+  dataHeader.dataset.role='data-header';
+  const markerRow=table.tHead.insertRow(0);
+  markerRow.dataset.role='marker-row';
+  const corner=document.createElement('th'); corner.className='corner-marker select-all'; markerRow.appendChild(corner);
+  const headerCorner=document.createElement('th'); headerCorner.className='corner-marker'; dataHeader.insertBefore(headerCorner, dataHeader.firstChild);
+  const colCount=dataHeader.cells.length-1;
+  for(let c=0;c<colCount;c++){
+    const th=document.createElement('th'); th.className='col-marker'; th.dataset.colIndex=c; th.textContent=columnLabel(c);
+    const resizer=document.createElement('span');
+    resizer.className='col-resizer';
+    resizer.dataset.colIndex=c;
+    th.appendChild(resizer);
+    markerRow.appendChild(th);
+  }
+  Array.from(table.tBodies[0].rows).forEach((row, idx)=>{
+    const marker=document.createElement('th'); marker.className='row-marker'; marker.dataset.rowIndex=idx; marker.textContent=idx+1; row.insertBefore(marker, row.firstChild);
+  });
+  table.dataset.markerOffset='1';
+}
+function stripEnhancements(table){
+  if(!table.tHead) return;
+  const thead=table.tHead;
+  const markerRow=Array.from(thead.rows).find(r=>r.dataset.role==='marker-row');
+  if(markerRow) markerRow.remove();
+  const header=thead.querySelector('tr[data-role="data-header"]') || thead.rows[0];
+  if(header && !header.dataset.role) header.dataset.role='data-header';
+  if(header){
+    header.querySelectorAll('.filter-btn').forEach(btn=>btn.remove());
+    header.querySelectorAll('.col-resizer').forEach(handle=>handle.remove());
+    const firstCell=header.cells[0];
+    if(firstCell && firstCell.classList.contains('corner-marker')) header.deleteCell(0);
+  }
+  const bodyRows=table.tBodies[0]?Array.from(table.tBodies[0].rows):[];
+  bodyRows.forEach(row=>{
+    row.classList.remove('selected-row');
+    row.querySelectorAll('td').forEach(cell=>cell.classList.remove('cell-selected'));
+    const first=row.cells[0];
+    if(first && first.classList.contains('row-marker')) row.deleteCell(0);
+  });
+  delete table.dataset.markerOffset;
+  table._selectedRows=new Set();
+  table._selectedCols=new Set();
+  table._selectedCells=new Set();
+  delete table.dataset.cellSelectionBound;
+}
+function attachColumnResizers(table){
+  const markerRow=table.tHead?.querySelector('tr[data-role="marker-row"]');
+  if(!markerRow) return;
+  markerRow.querySelectorAll('.col-resizer').forEach(handle=>{
+    handle.addEventListener('click', ev=>ev.stopPropagation());
+    handle.addEventListener('mousedown', ev=>startColumnResize(ev, table));
+    handle.addEventListener('touchstart', ev=>startColumnResize(ev, table), {passive:false});
+  });
+}
+function startColumnResize(ev, table){
+  ev.preventDefault();
+  ev.stopPropagation();
+  const handle=ev.currentTarget;
+  const colIdx=parseInt(handle.dataset.colIndex,10);
+  if(Number.isNaN(colIdx)) return;
+  const startX=getPointerX(ev);
+  const startWidth=getColumnWidth(table, colIdx);
+  const wrap=table.closest('.table-wrap');
+  handle.classList.add('resizing');
+  wrap?.classList.add('resizing-columns');
+  function onMove(moveEv){
+    moveEv.preventDefault();
+    const width=Math.max(48, startWidth + getPointerX(moveEv) - startX);
+    setColumnWidth(table, colIdx, width);
+  }
+  function onEnd(){
+    handle.classList.remove('resizing');
+    wrap?.classList.remove('resizing-columns');
+    document.removeEventListener('mousemove', onMove);
+    document.removeEventListener('mouseup', onEnd);
+    document.removeEventListener('touchmove', onMove);
+    document.removeEventListener('touchend', onEnd);
+    document.removeEventListener('touchcancel', onEnd);
+  }
+  document.addEventListener('mousemove', onMove);
+  document.addEventListener('mouseup', onEnd);
+  document.addEventListener('touchmove', onMove, {passive:false});
+  document.addEventListener('touchend', onEnd);
+  document.addEventListener('touchcancel', onEnd);
+}
+function getPointerX(ev){
+  const touch=ev.touches && ev.touches[0] ? ev.touches[0] : null;
+  const changed=ev.changedTouches && ev.changedTouches[0] ? ev.changedTouches[0] : null;
+  return (touch || changed || ev).clientX;
+}
+function getColumnWidth(table, colIdx){
+  const offset=parseInt(table.dataset.markerOffset || '0',10);
+  const header=table.tHead?.querySelector('tr[data-role="data-header"]');
+  const cell=header?.cells[colIdx+offset];
+  return cell ? cell.getBoundingClientRect().width : 96;
+}
+function setColumnWidth(table, colIdx, width){
+  const offset=parseInt(table.dataset.markerOffset || '0',10);
+  const px=`${Math.round(width)}px`;
+  const marker=table.tHead?.querySelector(`.col-marker[data-col-index="${colIdx}"]`);
+  if(marker) applyCellWidth(marker, px);
+  const header=table.tHead?.querySelector('tr[data-role="data-header"]');
+  if(header?.cells[colIdx+offset]) applyCellWidth(header.cells[colIdx+offset], px);
+  const rows=table.tBodies[0]?Array.from(table.tBodies[0].rows):[];
+  rows.forEach(row=>{
+    const cell=row.cells[colIdx+offset];
+    if(cell) applyCellWidth(cell, px);
+  });
+}
+function applyCellWidth(cell, width){
+  cell.style.width=width;
+  cell.style.minWidth=width;
+  cell.style.maxWidth=width;
+}
+function collectUnique(table){
+  const offset=parseInt(table.dataset.markerOffset || '0',10);
+  const header=table.tHead.querySelector('tr[data-role="data-header"]');
+  const colCount=header? header.cells.length - offset : 0;
+  const rows=table.tBodies[0]?Array.from(table.tBodies[0].rows):[];
+  const sets=Array.from({length:colCount},()=>new Set());
+  rows.forEach(r=>{ for(let c=0;c<colCount;c++){ const cell=r.cells[c+offset]; const text=(cell?cell.innerText:''); sets[c].add(text); } });
+  return sets.map(s=>Array.from(s).sort((a,b)=>a.localeCompare(b)));
+}
+function setupFilters(table, summaryEl){
+  const header=table.tHead.querySelector('tr[data-role="data-header"]');
+  if(!header) return;
+  const offset=parseInt(table.dataset.markerOffset || '0',10);
+  const unique=collectUnique(table);
+  const state=unique.map(()=>[]);
+  table._filters=state;
+  for(let c=offset;c<header.cells.length;c++){
+    const th=header.cells[c];
+    const btn=document.createElement('button'); btn.type='button'; btn.className='filter-btn'; btn.title=T.filter; btn.textContent='\u25BE';
+    btn.dataset.colIndex=c-offset;
+    btn.addEventListener('click',(e)=>openFilterPanel(e.currentTarget, table, parseInt(e.currentTarget.dataset.colIndex,10), summaryEl));
+    th.appendChild(btn);
+  }
+  renderFilterTags(summaryEl, state);
+}
+function renderFilterTags(summaryEl, filters){
+  summaryEl.innerHTML='';
+  filters.forEach((vals, idx)=>{
+    if(vals && vals.length){
+      const pill=document.createElement('span'); pill.className='filter-tag'; pill.textContent=`${columnLabel(idx)} (${vals.length})`;
+      summaryEl.appendChild(pill);
+    }
+  });
+  if(filterTagsGlobal && activePanel && summaryEl.closest('.panel') === activePanel){
+    filterTagsGlobal.innerHTML = summaryEl.innerHTML;
+  }
+}
+function openFilterPanel(anchor, table, col, summaryEl){
+  closeFilterPanel();
+  const panel=document.createElement('div'); panel.className='filter-panel'; panel.id='filterPanel';
+  const rect=anchor.getBoundingClientRect();
+  panel.style.left=(window.scrollX+rect.left)+'px'; panel.style.top=(window.scrollY+rect.bottom+4)+'px';
+  const values=collectUnique(table)[col];
+  const search=document.createElement('input'); search.className='search'; search.placeholder=T.filter_search;
+  const list=document.createElement('div'); list.className='list';
+  const controls=document.createElement('div'); controls.className='actions';
+  const applyBtn=document.createElement('button'); applyBtn.className='btn primary'; applyBtn.textContent=T.filter_apply;
+  const clearBtn=document.createElement('button'); clearBtn.className='btn secondary'; clearBtn.textContent=T.filter_clear;
+  const selected=new Set(table._filters[col]||[]);
+  function renderList(){
+    list.innerHTML='';
+    const selectVisibleLabel=document.createElement('label'); selectVisibleLabel.className='select-visible-option';
+    const selectVisibleBox=document.createElement('input'); selectVisibleBox.type='checkbox';
+    const q=(search.value||'').toLowerCase();
+    const visibleValues=values.filter(v=>v.toLowerCase().includes(q));
+    selectVisibleBox.checked = visibleValues.length > 0 && visibleValues.every(v=>selected.has(v));
+    selectVisibleBox.indeterminate = visibleValues.some(v=>selected.has(v)) && !selectVisibleBox.checked;
+    selectVisibleLabel.appendChild(selectVisibleBox);
+    const selectText=document.createElement('span'); selectText.textContent=T.filter_select_all;
+    selectVisibleLabel.appendChild(selectText);
+    selectVisibleBox.addEventListener('change',()=>{
+      if(selectVisibleBox.checked){
+        visibleValues.forEach(v=>selected.add(v));
+      }else{
+        visibleValues.forEach(v=>selected.delete(v));
+      }
+      renderList();
+    });
+    list.appendChild(selectVisibleLabel);
+    visibleValues.forEach(v=>{
+      const label=document.createElement('label'); label.dataset.filterValue='1';
+      const cb=document.createElement('input'); cb.type='checkbox'; cb.value=v; cb.checked=selected.has(v);
+      label.appendChild(cb); label.appendChild(document.createTextNode(' '+(v===''?T.filter_blank:v)));
+      cb.addEventListener('change',()=>{ if(cb.checked) selected.add(v); else selected.delete(v); renderList(); });
+      list.appendChild(label);
+    });
+  }
+  renderList();
+  search.addEventListener('input',renderList);
+  applyBtn.addEventListener('click',()=>{ table._filters[col]=Array.from(selected); applyFilters(table); renderFilterTags(summaryEl, table._filters); closeFilterPanel(); });
+  clearBtn.addEventListener('click',()=>{ selected.clear(); table._filters[col]=[]; applyFilters(table); renderFilterTags(summaryEl, table._filters); closeFilterPanel(); });
+  panel.appendChild(search); panel.appendChild(list); controls.appendChild(clearBtn); controls.appendChild(applyBtn); panel.appendChild(controls);
+  document.body.appendChild(panel); panel.style.display='block';
+  setTimeout(()=>{ document.addEventListener('click',outsideClose,{ once:true }); },0);
+  function outsideClose(ev){ if(!panel.contains(ev.target) && ev.target!==anchor){ closeFilterPanel(); } }
+}
+function closeFilterPanel(){ const p=document.getElementById('filterPanel'); if(p) p.remove(); }
+function clearAllFilters(table, summaryEl){ if(!table._filters) return; table._filters=table._filters.map(()=>[]); applyFilters(table); renderFilterTags(summaryEl, table._filters); }
+function applyFilters(table){
+  const rows=table.tBodies[0]?Array.from(table.tBodies[0].rows):[];
+  const filters=table._filters || [];
+  const offset=parseInt(table.dataset.markerOffset || '0',10);
+  rows.forEach(row=>{
+    let show=true;
+    for(let c=0;c<filters.length;c++){
+      const chosen=filters[c]; if(!chosen || chosen.length===0) continue;
+      const text=(row.cells[c+offset]?row.cells[c+offset].innerText:'');
+      if(!chosen.includes(text)){ show=false; break; }
+    }
+    row.style.display=show?'':'none';
+  });
+}
+function attachSelectionHandlers(table, rowInput, colInput, deleteRowsBtn, deleteColsBtn, deleteBlankBtn){
+  table._selectedRows = new Set();
+  table._selectedCols = new Set();
+  const offset=parseInt(table.dataset.markerOffset || '0',10);
+  const rows=table.tBodies[0]?Array.from(table.tBodies[0].rows):[];
+  const headerRow=table.tHead.querySelector('tr[data-role="data-header"]');
+  const totalCols=headerRow ? Math.max(0, headerRow.cells.length - offset) : 0;
+  rows.forEach((row, idx)=>{
+    const marker=row.querySelector('.row-marker');
+    marker?.addEventListener('click',(ev)=>{
+      handleToggle(ev, table._selectedRows, idx);
+      refreshRowHighlights(table);
+      updateSelectionInputs(table, rowInput, colInput, deleteRowsBtn, deleteColsBtn, deleteBlankBtn);
+    });
+  });
+  table.querySelectorAll('.col-marker').forEach(marker=>{
+    const colIdx=parseInt(marker.dataset.colIndex,10);
+    marker.addEventListener('click',(ev)=>{
+      handleToggle(ev, table._selectedCols, colIdx);
+      refreshColHighlights(table);
+      updateSelectionInputs(table, rowInput, colInput, deleteRowsBtn, deleteColsBtn, deleteBlankBtn);
+    });
+  });
+  const cornerMarker=table.querySelector('tr[data-role="marker-row"] .corner-marker.select-all');
+  cornerMarker?.addEventListener('click',()=>{
+    if(!table._selectedRows || !table._selectedCols) return;
+    const totalRows=rows.length;
+    const isAllSelected = table._selectedRows.size===totalRows && table._selectedCols.size===totalCols && totalRows>0 && totalCols>0;
+    table._selectedRows.clear();
+    table._selectedCols.clear();
+    if(!isAllSelected){
+      for(let r=0;r<totalRows;r++){ table._selectedRows.add(r); }
+      for(let c=0;c<totalCols;c++){ table._selectedCols.add(c); }
+    }
+    refreshRowHighlights(table);
+    refreshColHighlights(table);
+    updateSelectionInputs(table, rowInput, colInput, deleteRowsBtn, deleteColsBtn, deleteBlankBtn);
+  });
+  function handleToggle(ev, set, value){
+    const additive = ev.ctrlKey || ev.metaKey;
+    if(set.has(value)){
+      set.delete(value);
+      return;
+    }
+    if(!additive){
+      set.clear();
+    }
+    set.add(value);
+  }
+}
+function refreshRowHighlights(table){
+  const rows=table.tBodies[0]?Array.from(table.tBodies[0].rows):[];
+  rows.forEach((row, idx)=>{
+    if(table._selectedRows && table._selectedRows.has(idx)) row.classList.add('selected-row'); else row.classList.remove('selected-row');
+  });
+}
+function refreshColHighlights(table){
+  const offset=parseInt(table.dataset.markerOffset || '0',10);
+  const rows=table.tBodies[0]?Array.from(table.tBodies[0].rows):[];
+  const markers=table.querySelectorAll('.col-marker');
+  markers.forEach(marker=>{
+    const idx=parseInt(marker.dataset.colIndex,10);
+    if(table._selectedCols && table._selectedCols.has(idx)) marker.classList.add('col-selected'); else marker.classList.remove('col-selected');
+  });
+  rows.forEach(row=>{
+    for(let c=offset;c<row.cells.length;c++){
+      row.cells[c].classList.remove('col-selected');
+    }
+  });
+  if(table._selectedCols){
+    table._selectedCols.forEach(colIdx=>{
+      rows.forEach(row=>{
+        const cell=row.cells[colIdx+offset]; if(cell) cell.classList.add('col-selected');
+      });
+    });
+  }
+}
+function attachCellSelection(table){
+  table._selectedCells = new Set();
+  if(table.dataset.cellSelectionBound==='1') return;
+  table.addEventListener('mousedown',(ev)=>{
+    if(ev.button !== 0) return;
+    const cell=ev.target.closest('td');
+    if(!cell || !table.contains(cell)) return;
+    const row=cell.closest('tr');
+    if(!row || row.parentElement?.tagName !== 'TBODY') return;
+    const anchor = getCellIndices(table, cell);
+    if(anchor.rowIdx === undefined || anchor.colIdx === undefined) return;
+
+    const additive = ev.ctrlKey || ev.metaKey;
+    const base = additive ? new Set(table._selectedCells || []) : new Set();
+    table._dragCells = {
+      anchor,
+      current: anchor,
+      additive,
+      base,
+      moved: false,
+    };
+    document.body.style.userSelect = 'none';
+    applyCellDragSelection(table, anchor, anchor, base);
+  });
+
+  table.addEventListener('mouseover',(ev)=>{
+    if(!table._dragCells) return;
+    const cell=ev.target.closest('td');
+    if(!cell || !table.contains(cell)) return;
+    const row=cell.closest('tr');
+    if(!row || row.parentElement?.tagName !== 'TBODY') return;
+    const current = getCellIndices(table, cell);
+    if(current.rowIdx === undefined || current.colIdx === undefined) return;
+    const drag = table._dragCells;
+    if(drag.current.rowIdx !== current.rowIdx || drag.current.colIdx !== current.colIdx){
+      drag.moved = true;
+      drag.current = current;
+    }
+    applyCellDragSelection(table, drag.anchor, current, drag.base);
+  });
+
+  document.addEventListener('mouseup',()=>{
+    if(!table._dragCells) return;
+    const drag = table._dragCells;
+    if(!drag.moved && drag.additive){
+      const key = `${drag.anchor.rowIdx}:${drag.anchor.colIdx}`;
+      const finalSet = new Set(drag.base);
+      if(finalSet.has(key)) finalSet.delete(key); else finalSet.add(key);
+      table._selectedCells = finalSet;
+      refreshCellHighlights(table);
+    }
+    table._dragCells = null;
+    document.body.style.userSelect = '';
+  });
+  table.dataset.cellSelectionBound='1';
+}
+
+function applyCellDragSelection(table, anchor, current, base){
+  const rMin = Math.min(anchor.rowIdx, current.rowIdx);
+  const rMax = Math.max(anchor.rowIdx, current.rowIdx);
+  const cMin = Math.min(anchor.colIdx, current.colIdx);
+  const cMax = Math.max(anchor.colIdx, current.colIdx);
+  const next = new Set(base || []);
+  for(let r=rMin; r<=rMax; r++){
+    for(let c=cMin; c<=cMax; c++){
+      next.add(`${r}:${c}`);
+    }
+  }
+  table._selectedCells = next;
+  refreshCellHighlights(table);
+}
+function refreshCellHighlights(table){
+  const rows=table.tBodies[0]?Array.from(table.tBodies[0].rows):[];
+  rows.forEach(row=>{
+    row.querySelectorAll('td').forEach(cell=>cell.classList.remove('cell-selected'));
+  });
+  if(!table._selectedCells) return;
+  table._selectedCells.forEach(key=>{
+    const cell=getCellByKey(table, key);
+    if(cell) cell.classList.add('cell-selected');
+  });
+}
+function getCellByKey(table, key){
+  const [rowIdx, colIdx]=key.split(':').map(Number);
+  if(Number.isNaN(rowIdx) || Number.isNaN(colIdx)) return null;
+  const offset=parseInt(table.dataset.markerOffset || '0',10);
+  const rows=table.tBodies[0]?Array.from(table.tBodies[0].rows):[];
+  const row=rows[rowIdx];
+  if(!row) return null;
+  return row.cells[colIdx+offset] || null;
+}
+function updateSelectionInputs(table, rowInput, colInput, deleteRowsBtn, deleteColsBtn, deleteBlankBtn){
+  const rows = table._selectedRows ? Array.from(table._selectedRows).map(i=>i+1).sort((a,b)=>a-b) : [];
+  const cols = table._selectedCols ? Array.from(table._selectedCols).map(columnLabel).sort((a,b)=>a.localeCompare(b)) : [];
+  rowInput.value = rows.join(', ');
+  colInput.value = cols.join(', ');
+  if(deleteRowsBtn) deleteRowsBtn.disabled = rows.length===0;
+  if(deleteColsBtn) deleteColsBtn.disabled = cols.length===0;
+  if(deleteBlankBtn) deleteBlankBtn.disabled = cols.length===0;
+  if(activePanel && table.closest('.panel') === activePanel){
+    if(rowInputGlobal) rowInputGlobal.value = rowInput.value;
+    if(colInputGlobal) colInputGlobal.value = colInput.value;
+    if(deleteRowsGlobalBtn) deleteRowsGlobalBtn.disabled = rows.length===0;
+    if(deleteColsGlobalBtn) deleteColsGlobalBtn.disabled = cols.length===0;
+    if(deleteBlanksGlobalBtn) deleteBlanksGlobalBtn.disabled = cols.length===0;
+    updateColumnFormatControls(activePanel);
+    updateUndoButton(activePanel);
+    resetSearchState(activePanel, true);
+    updateColumnProfile(activePanel);
+  }
+}
+
+setupGlobalColorMenus();
@@ -0,0 +1,510 @@
+"""End-to-end load driver for the upload -> select -> render -> export flow.
+
+Starts the app under gunicorn (or targets ``--url``), runs N concurrent
+virtual users through the CSRF-protected flow with generated workbooks and
+reports throughput, p50/p95/p99 latency per step, error rates and peak RSS
+per gunicorn worker. Heavy steps answered with a ``202`` queue ticket wait
+their turn like a browser (poll ``progress_url``, resend with the ticket);
+that wait is reported per step as queue time, not as latency or an error.
+
+    python -m projects.excel.bench.loadtest --users 8 --iterations 5 --profile medium
+    python -m projects.excel.bench.loadtest --workers 4 --scenario browse --json-out load.json
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import re
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from pathlib import Path
+
+from projects.excel.bench import workbook_factory
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+
+# File-size profiles: rows x columns per sheet, sheets per workbook.
+PROFILES = {
+    "small": {"rows": 200, "columns": 10, "sheets": 1},
+    "medium": {"rows": 5_000, "columns": 30, "sheets": 2},
+    "large": {"rows": 50_000, "columns": 60, "sheets": 1},
+}
+# Ordered steps each virtual user runs per iteration.
+SCENARIOS = {
+    "full": ["index", "upload", "select", "render_multi", "export"],
+    "browse": ["index", "upload", "select", "render_multi"],
+    "export": ["index", "upload", "select", "export"],
+}
+STEP_ORDER = ("index", "upload", "select", "render_multi", "export")
+_CSRF_RE = re.compile(r"""(?:name="csrf_token" value="|'csrf_token', '|'X-CSRFToken': ')([A-Za-z0-9_\-]+)""")
+_SELECTION_RE = re.compile(r'name="selection" value="([^"]+::[^"]+)"')
+_QUEUE_TICKET_RE = re.compile(r'name="queue_ticket" value="([0-9a-f]+)"')
+_PROGRESS_URL_RE = re.compile(r'const progressUrl = "([^"]+)"')
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class StepError(Exception):
+    pass
+
+
+class VirtualUser:
+    def __init__(
+        self,
+        base_url: str,
+        workbook_path: Path,
+        export_sheets: list[dict],
+        timeout: float,
+        queue_timeout: float = 600.0,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.workbook_path = workbook_path
+        self.export_sheets = export_sheets
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.queue_wait: float | None = None  # seconds the current step spent queued, None when admitted at once
+        self.jar = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.jar), _NoRedirect())
+        self.csrf_token = ""
+        self.token = ""
+        self.selections: list[str] = []
+
+    def _request(self, method: str, path: str, body: bytes | None = None, headers: dict | None = None):
+        req = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers or {})
+        try:
+            resp = self.opener.open(req, timeout=self.timeout)
+        except urllib.error.HTTPError as exc:
+            if exc.code in {301, 302, 303}:
+                return exc.code, exc.headers, b""
+            raise StepError(f"{method} {path} -> HTTP {exc.code}") from exc
+        with resp:
+            return resp.status, resp.headers, resp.read()
+
+    def _admitted_request(self, method: str, path: str, body: bytes, headers: dict, page: bool = False):
+        """``_request`` for heavy routes: a ``202`` queue ticket is waited out and the request sent again.
+
+        JSON routes resend with ``X-Queue-Ticket`` (like ``fetchAdmitted``),
+        page routes with a ``queue_ticket`` field (like ``queued.html``).
+        """
+        ticket = ""
+        while True:
+            send_body, send_headers = body, dict(headers)
+            if ticket and page:
+                send_body = body + b"&" + urllib.parse.urlencode([("queue_ticket", ticket)]).encode()
+            elif ticket:
+                send_headers["X-Queue-Ticket"] = ticket
+            status, resp_headers, resp_body = self._request(method, path, send_body, send_headers)
+            if status != 202:
+                return status, resp_headers, resp_body
+            if page:
+                text = resp_body.decode("utf-8", errors="replace")
+                ticket_match, url_match = _QUEUE_TICKET_RE.search(text), _PROGRESS_URL_RE.search(text)
+                ticket = ticket_match.group(1) if ticket_match and url_match else ""
+                progress_url = url_match.group(1) if url_match else ""
+            else:
+                queued = json.loads(resp_body)
+                ticket, progress_url = queued.get("ticket") or "", queued.get("progress_url") or ""
+            if not ticket:
+                raise StepError(f"{method} {path} -> 202 without a queue ticket")
+            start = time.perf_counter()
+            self._wait_for_turn(progress_url, float(resp_headers.get("Retry-After") or 1))
+            self.queue_wait = (self.queue_wait or 0.0) + time.perf_counter() - start
+
+    def _wait_for_turn(self, progress_url: str, interval: float) -> None:
+        deadline = time.monotonic() + self.queue_timeout
+        while time.monotonic() < deadline:
+            time.sleep(interval)
+            try:
+                _, _, body = self._request("GET", progress_url, headers={"Accept": "application/json"})
+            except StepError:
+                return  # expired ticket or busy queue: the retry queues again
+            if json.loads(body).get("status") == "ready":
+                return
+        raise StepError(f"still queued after {self.queue_timeout:.0f}s")
+
+    def _remember_csrf(self, html: bytes) -> None:
+        match = _CSRF_RE.search(html.decode("utf-8", errors="replace"))
+        if match:
+            self.csrf_token = match.group(1)
+
+    def step_index(self) -> None:
+        _, _, body = self._request("GET", "/")
+        self._remember_csrf(body)
+        if not self.csrf_token:
+            raise StepError("no CSRF token on /")
+
+    def step_upload(self) -> None:
+        boundary = uuid.uuid4().hex
+        parts = [
+            f'--{boundary}\r\nContent-Disposition: form-data; name="csrf_token"\r\n\r\n{self.csrf_token}\r\n'.encode(),
+            (
+                f'--{boundary}\r\nContent-Disposition: form-data; name="files"; filename="{self.workbook_path.name}"\r\n'
+                "Content-Type: application/vnd.openxmlformats-officedocument.spreadsheetml.sheet\r\n\r\n"
+            ).encode(),
+            self.workbook_path.read_bytes(),
+            f"\r\n--{boundary}--\r\n".encode(),
+        ]
+        status, headers, _ = self._request(
+            "POST", "/upload", b"".join(parts), {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+        )
+        location = headers.get("Location", "")
+        if status not in {302, 303} or "/select/" not in location:
+            raise StepError(f"upload did not redirect to /select (status {status})")
+        self.token = location.rstrip("/").rsplit("/", 1)[-1]
+
+    def step_select(self) -> None:
+        _, _, body = self._request("GET", f"/select/{self.token}")
+        self._remember_csrf(body)
+        self.selections = _SELECTION_RE.findall(body.decode("utf-8", errors="replace"))
+        if not self.selections:
+            raise StepError("no sheets listed on /select")
+
+    def step_render_multi(self) -> None:
+        fields = [("csrf_token", self.csrf_token), ("token", self.token)]
+        fields += [("selection", sel) for sel in self.selections]
+        status, _, body = self._admitted_request(
+            "POST",
+            "/render_multi",
+            urllib.parse.urlencode(fields).encode(),
+            {"Content-Type": "application/x-www-form-urlencoded"},
+            page=True,
+        )
+        if status != 200 or b'class="panel' not in body:
+            raise StepError(f"render_multi returned no workspace (status {status})")
+        self._remember_csrf(body)
+
+    def step_export(self) -> None:
+        payload = json.dumps({"filename": "load.xlsx", "sheets": self.export_sheets}).encode()
+        status, _, body = self._admitted_request(
+            "POST",
+            "/export",
+            payload,
+            {"Content-Type": "application/json", "X-CSRFToken": self.csrf_token},
+        )
+        if status != 200 or not body.startswith(b"PK"):
+            raise StepError(f"export did not return an xlsx (status {status})")
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = {step: [] for step in STEP_ORDER}
+        self.errors: dict[str, int] = {step: 0 for step in STEP_ORDER}
+        self.queue_waits: dict[str, list[float]] = {step: [] for step in STEP_ORDER}
+        self.error_samples: list[str] = []
+        self.flows_completed = 0
+
+    def record(self, step: str, seconds: float, error: str | None, queue_wait: float | None = None) -> None:
+        """``seconds`` excludes ``queue_wait``, the time spent holding a queue ticket (``None``: not queued)."""
+        with self.lock:
+            if queue_wait is not None:
+                self.queue_waits[step].append(queue_wait)
+            if error:
+                self.errors[step] += 1
+                if len(self.error_samples) < 20:
+                    self.error_samples.append(f"{step}: {error}")
+            else:
+                self.latencies[step].append(seconds)
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def _run_user(user: VirtualUser, steps: list[str], iterations: int, recorder: Recorder, think_time: float) -> None:
+    for _ in range(iterations):
+        for step in steps:
+            start = time.perf_counter()
+            error = None
+            user.queue_wait = None
+            try:
+                getattr(user, f"step_{step}")()
+            except Exception as exc:
+                error = str(exc) or exc.__class__.__name__
+            queue_wait = user.queue_wait
+            recorder.record(step, time.perf_counter() - start - (queue_wait or 0.0), error, queue_wait)
+            if error:
+                break  # later steps depend on this one
+            if think_time:
+                time.sleep(think_time)
+        else:
+            with recorder.lock:
+                recorder.flows_completed += 1
+
+
+# ---------------------------
+# gunicorn process management
+# ---------------------------
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _read_status_kb(pid: int, field: str) -> int:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def _child_pids(pid: int) -> list[int]:
+    children = []
+    for task in Path(f"/proc/{pid}/task").glob("*/children"):
+        try:
+            children.extend(int(p) for p in task.read_text().split())
+        except OSError:
+            continue
+    return children
+
+
+class RssSampler(threading.Thread):
+    """Tracks the peak RSS (VmHWM) of every gunicorn worker seen during the run."""
+
+    def __init__(self, master_pid: int, interval: float = 0.5) -> None:
+        super().__init__(name="rss-sampler", daemon=True)
+        self.master_pid = master_pid
+        self.interval = interval
+        self.peaks_kb: dict[int, int] = {}
+        self._stop_event = threading.Event()
+
+    def sample(self) -> None:
+        for pid in _child_pids(self.master_pid):
+            hwm = max(_read_status_kb(pid, "VmHWM"), _read_status_kb(pid, "VmRSS"))
+            if hwm:
+                self.peaks_kb[pid] = max(self.peaks_kb.get(pid, 0), hwm)
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def stop(self) -> None:
+        self.sample()
+        self._stop_event.set()
+
+
+def _start_gunicorn(args: argparse.Namespace, upload_root: Path) -> tuple[subprocess.Popen, str]:
+    if not shutil.which("gunicorn"):
+        raise SystemExit("gunicorn is not installed; install app/requirements.txt or pass --url")
+    port = args.port or _free_port()
+    env = dict(os.environ, UPLOAD_ROOT=str(upload_root), MAX_UPLOAD_MB=str(args.max_upload_mb))
+    cmd = ["gunicorn", "-w", str(args.workers), "-b", f"127.0.0.1:{port}", "--timeout", str(int(args.timeout))]
+    cmd += args.gunicorn_arg or []
+    cmd.append("app.main:app")
+    proc = subprocess.Popen(cmd, cwd=APP_DIR.parent, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"gunicorn exited early: {proc.stderr.read().decode(errors='replace')}")
+        try:
+            with urllib.request.urlopen(base_url + "/", timeout=2):
+                return proc, base_url
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit("gunicorn did not start within 30s")
+
+
+def _stop_gunicorn(proc: subprocess.Popen) -> None:
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+# ---------
+# Reporting
+# ---------
+def build_report(args: argparse.Namespace, recorder: Recorder, elapsed: float, rss: RssSampler | None) -> dict:
+    steps = {}
+    total_requests = 0
+    for step in STEP_ORDER:
+        ok = recorder.latencies[step]
+        errors = recorder.errors[step]
+        queued = recorder.queue_waits[step]
+        attempts = len(ok) + errors
+        if not attempts:
+            continue
+        total_requests += attempts
+        steps[step] = {
+            "requests": attempts,
+            "errors": errors,
+            "error_rate": round(errors / attempts, 4),
+            "p50_ms": round(_percentile(ok, 50) * 1000, 1),
+            "p95_ms": round(_percentile(ok, 95) * 1000, 1),
+            "p99_ms": round(_percentile(ok, 99) * 1000, 1),
+            "mean_ms": round(statistics.fmean(ok) * 1000, 1) if ok else 0.0,
+            "queued": len(queued),
+            "queue_p50_ms": round(_percentile(queued, 50) * 1000, 1),
+            "queue_p95_ms": round(_percentile(queued, 95) * 1000, 1),
+        }
+    return {
+        "scenario": args.scenario,
+        "profile": args.profile,
+        "users": args.users,
+        "iterations": args.iterations,
+        "workers": args.workers if not args.url else None,
+        "elapsed_s": round(elapsed, 3),
+        "flows_completed": recorder.flows_completed,
+        "flows_per_s": round(recorder.flows_completed / elapsed, 3) if elapsed else 0.0,
+        "requests_per_s": round(total_requests / elapsed, 3) if elapsed else 0.0,
+        "steps": steps,
+        "worker_peak_rss_mb": {str(pid): round(kb / 1024, 1) for pid, kb in sorted(rss.peaks_kb.items())} if rss else {},
+        "error_samples": recorder.error_samples,
+    }
+
+
+def print_report(report: dict) -> None:
+    print(
+        f"\nscenario={report['scenario']} profile={report['profile']} users={report['users']} "
+        f"iterations={report['iterations']} workers={report['workers']}"
+    )
+    print(
+        f"elapsed {report['elapsed_s']}s, {report['flows_completed']} flows "
+        f"({report['flows_per_s']}/s), {report['requests_per_s']} req/s"
+    )
+    print(f"{'step':<14}{'reqs':>7}{'err%':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queued':>8}{'queue p95':>11}")
+    for step, row in report["steps"].items():
+        print(
+            f"{step:<14}{row['requests']:>7}{row['error_rate'] * 100:>7.1f}%"
+            f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['queued']:>8}{row['queue_p95_ms']:>11}"
+        )
+    for pid, mb in report["worker_peak_rss_mb"].items():
+        print(f"worker {pid}: peak RSS {mb} MB")
+    for sample in report["error_samples"][:5]:
+        print(f"error: {sample}")
+
+
+def _export_sheets(rows: int, columns: int, sheets: int, type_mix: dict[str, int]) -> list[dict]:
+    plan = workbook_factory.plan_columns(columns, type_mix)
+    formats = [
+        {
+            "header": header,
+            "source_type": "text" if column_type == "vn_text" else column_type,
+            "original_number_format": workbook_factory.NUMBER_FORMATS.get(column_type, "@"),
+            "selected_preset": "original",
+        }
+        for header, column_type in plan
+    ]
+    payload = []
+    for sheet_idx in range(sheets):
+        data = [
+            [workbook_factory.display_text(value, column_type) for value, (_, column_type) in zip(row, plan)]
+            for row in workbook_factory.generate_rows(rows, plan, seed=sheet_idx)
+        ]
+        payload.append({"name": f"Sheet{sheet_idx + 1}", "headers": [h for h, _ in plan], "rows": data, "column_formats": formats})
+    return payload
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=4, help="concurrent virtual users")
+    parser.add_argument("--iterations", type=int, default=3, help="flows per virtual user")
+    parser.add_argument("--scenario", default="full", help=f"one of {sorted(SCENARIOS)} or a comma list of steps")
+    parser.add_argument("--profile", default="small", choices=sorted(PROFILES))
+    parser.add_argument("--rows", type=int, help="override profile rows per sheet")
+    parser.add_argument("--columns", type=int, help="override profile columns")
+    parser.add_argument("--sheets", type=int, help="override profile sheets per workbook")
+    parser.add_argument("--type-mix", default="")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds between steps")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--gunicorn-arg", action="append", help="extra gunicorn argument (repeatable)")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--url", default="", help="target a running server instead of starting gunicorn")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--queue-timeout", type=float, default=600.0, help="longest wait for a queue ticket's turn")
+    parser.add_argument("--max-upload-mb", type=int, default=256)
+    parser.add_argument("--json-out", type=Path, help="write the report as JSON")
+    args = parser.parse_args(argv)
+    if args.scenario in SCENARIOS:
+        args.steps = SCENARIOS[args.scenario]
+    else:
+        args.steps = [s.strip() for s in args.scenario.split(",") if s.strip()]
+        unknown = [s for s in args.steps if s not in STEP_ORDER]
+        if unknown:
+            parser.error(f"unknown steps: {unknown}")
+    return args
+
+
+def main_cli(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    profile = dict(PROFILES[args.profile])
+    for key in ("rows", "columns", "sheets"):
+        if getattr(args, key):
+            profile[key] = getattr(args, key)
+    type_mix = workbook_factory.parse_type_mix(args.type_mix)
+
+    with tempfile.TemporaryDirectory(prefix="excel_load_") as tmp:
+        tmp_dir = Path(tmp)
+        print(f"[load] generating {profile} workbook ...", file=sys.stderr, flush=True)
+        workbook_path = workbook_factory.write_xlsx(
+            tmp_dir / "load.xlsx", profile["rows"], profile["columns"], type_mix, sheets=profile["sheets"]
+        )
+        export_sheets = _export_sheets(profile["rows"], profile["columns"], profile["sheets"], type_mix)
+
+        proc = None
+        rss = None
+        base_url = args.url
+        if not base_url:
+            proc, base_url = _start_gunicorn(args, tmp_dir / "uploads")
+            rss = RssSampler(proc.pid)
+            rss.start()
+        try:
+            recorder = Recorder()
+            users = [
+                VirtualUser(base_url, workbook_path, export_sheets, args.timeout, args.queue_timeout)
+                for _ in range(args.users)
+            ]
+            threads = [
+                threading.Thread(target=_run_user, args=(u, args.steps, args.iterations, recorder, args.think_time))
+                for u in users
+            ]
+            print(f"[load] {args.users} users x {args.iterations} iterations against {base_url}", file=sys.stderr)
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            if rss:
+                rss.stop()
+            if proc:
+                _stop_gunicorn(proc)
+
+    report = build_report(args, recorder, elapsed, rss)
+    print_report(report)
+    if args.json_out:
+        args.json_out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    total_errors = sum(row["errors"] for row in report["steps"].values())
+    return 1 if total_errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,386 @@
+"""Parse/export micro-benchmarks for the Excel Viewer.
+
+Run from the repository root:
+
+    python -m projects.excel.bench.run_bench --rows 20000 --columns 30
+    python -m projects.excel.bench.run_bench --only read_csv_smart --compare
+
+Every run appends one JSON object to the history file (JSON Lines) so runs
+before and after a change can be compared with ``--compare``.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+from projects.excel.app import main
+from projects.excel.app.excel_engine import coercion, frames, inference, readers
+from projects.excel.bench import workbook_factory
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCH_DIR.parents[2]
+DEFAULT_HISTORY = BENCH_DIR / "results" / "history.jsonl"
+
+
+def _timeit(fn, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return {
+        "min_s": round(min(timings), 6),
+        "median_s": round(statistics.median(timings), 6),
+        "mean_s": round(statistics.fmean(timings), 6),
+        "repeat": repeat,
+    }
+
+
+def _with_throughput(result: dict, rows: int) -> dict:
+    if result["min_s"] > 0:
+        result["rows_per_s"] = round(rows / result["min_s"], 1)
+    return result
+
+
+class BenchContext:
+    def __init__(self, args: argparse.Namespace, work_dir: Path) -> None:
+        self.args = args
+        self.work_dir = work_dir
+        self.type_mix = workbook_factory.parse_type_mix(args.type_mix)
+        self._xlsx_path: Path | None = None
+        self._csv_paths: dict[tuple[str, str], Path] = {}
+        self._export_sheet: dict | None = None
+
+    @property
+    def xlsx_path(self) -> Path:
+        if self._xlsx_path is None:
+            self._xlsx_path = workbook_factory.write_xlsx(
+                self.work_dir / "bench.xlsx",
+                self.args.rows,
+                self.args.columns,
+                self.type_mix,
+                blank_ratio=self.args.blank_ratio,
+                seed=self.args.seed,
+            )
+        return self._xlsx_path
+
+    def csv_path(self, encoding: str, delimiter: str) -> Path:
+        key = (encoding, delimiter)
+        if key not in self._csv_paths:
+            name = f"bench_{encoding.replace('-', '')}_{ord(delimiter)}.csv"
+            self._csv_paths[key] = workbook_factory.write_csv(
+                self.work_dir / name,
+                self.args.rows,
+                self.args.columns,
+                self.type_mix,
+                blank_ratio=self.args.blank_ratio,
+                encoding=encoding,
+                delimiter=delimiter,
+                seed=self.args.seed,
+            )
+        return self._csv_paths[key]
+
+    @property
+    def export_sheet(self) -> dict:
+        """Rows as the browser would send them: display strings plus column formats."""
+        if self._export_sheet is None:
+            df, metadata, _ = readers.load_sheet(self.xlsx_path)
+            columns = [frames.display_values(df.iloc[:, i]) for i in range(df.shape[1])]
+            rows = [list(row) for row in zip(*columns)]
+            self._export_sheet = {
+                "name": "Bench",
+                "headers": [frames._normalize_cell_text(c) for c in df.columns],
+                "rows": rows,
+                "column_formats": metadata,
+            }
+        return self._export_sheet
+
+
+def bench_read_csv_smart(ctx: BenchContext) -> dict:
+    results = {}
+    for encoding in ctx.args.encodings:
+        for delimiter in ctx.args.delimiters:
+            path = ctx.csv_path(encoding, delimiter)
+            label = f"{encoding}/{'tab' if delimiter == chr(9) else delimiter}"
+            results[label] = _with_throughput(
+                _timeit(lambda: readers.read_csv_smart(path), ctx.args.repeat), ctx.args.rows
+            )
+    return results
+
+
+def bench_load_sheet_dataframe(ctx: BenchContext) -> dict:
+    xlsx = ctx.xlsx_path
+    csv_path = ctx.csv_path("utf-8-sig", ",")
+    return {
+        "xlsx": _with_throughput(
+            _timeit(lambda: readers.load_sheet(xlsx), ctx.args.repeat), ctx.args.rows
+        ),
+        "csv": _with_throughput(
+            _timeit(lambda: readers.load_sheet(csv_path), ctx.args.repeat), ctx.args.rows
+        ),
+    }
+
+
+def bench_build_excel_column_metadata(ctx: BenchContext) -> dict:
+    xlsx = ctx.xlsx_path
+    df = pd.read_excel(xlsx, sheet_name="Sheet1").fillna("")
+    return _with_throughput(
+        _timeit(lambda: inference._build_excel_column_metadata(xlsx, "Sheet1", df), ctx.args.repeat), ctx.args.rows
+    )
+
+
+def bench_coerce_export_cell(ctx: BenchContext) -> dict:
+    sheet = ctx.export_sheet
+    formats = sheet["column_formats"]
+    rows = sheet["rows"]
+
+    def run() -> None:
+        coerce = coercion.coerce_cell
+        for row in rows:
+            for idx, value in enumerate(row):
+                coerce(value, formats[idx] if idx < len(formats) else {})
+
+    result = _timeit(run, ctx.args.repeat)
+    cells = len(rows) * len(sheet["headers"])
+    if result["min_s"] > 0:
+        result["cells_per_s"] = round(cells / result["min_s"], 1)
+    return result
+
+
+def bench_export_route(ctx: BenchContext) -> dict:
+    sheet = ctx.export_sheet
+    main.app.config["TESTING"] = True
+    main.UPLOAD_ROOT = ctx.work_dir / "uploads"
+    main.UPLOAD_ROOT.mkdir(parents=True, exist_ok=True)
+    with main.app.test_client() as client:
+        client.get("/")
+        with client.session_transaction() as session:
+            csrf_token = session["_csrf_token"]
+        payload = {"filename": "bench.xlsx", "sheets": [sheet]}
+
+        def run() -> None:
+            response = client.post("/export", headers={"X-CSRFToken": csrf_token}, json=payload)
+            if response.status_code != 200:
+                raise RuntimeError(f"/export returned {response.status_code}")
+            response.close()
+
+        return _with_throughput(_timeit(run, ctx.args.repeat), ctx.args.rows)
+
+
+def bench_sheet_memory(ctx: BenchContext) -> dict:
+    """Resident size of the parsed sheet: legacy ``fillna("")`` frame vs the compact typed frame."""
+    raw = pd.read_excel(ctx.xlsx_path, sheet_name="Sheet1")
+    legacy = int(raw.fillna("").memory_usage(deep=True).sum())
+    compact_result = _timeit(lambda: frames.compact_frame(raw), ctx.args.repeat)
+    compact = int(frames.compact_frame(raw).memory_usage(deep=True).sum())
+    return {
+        "legacy_bytes": legacy,
+        "compact_bytes": compact,
+        "reduction_x": round(legacy / compact, 2) if compact else None,
+        "compact": compact_result,
+    }
+
+
+def bench_xlsx_reader(ctx: BenchContext) -> dict:
+    """Sheet + metadata parse through the fast zip/XML reader vs pandas/openpyxl."""
+    xlsx = ctx.xlsx_path
+    results = {}
+    previous = readers.XLSX_READER
+    try:
+        for engine in ("fast", "openpyxl"):
+            readers.XLSX_READER = engine
+            results[engine] = _with_throughput(
+                _timeit(lambda: readers.load_sheet(xlsx), ctx.args.repeat), ctx.args.rows
+            )
+    finally:
+        readers.XLSX_READER = previous
+    if results["fast"]["min_s"] > 0:
+        results["speedup_x"] = round(results["openpyxl"]["min_s"] / results["fast"]["min_s"], 2)
+    return results
+
+
+_STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from projects.excel.app import main
+timings = {"import_s": time.perf_counter() - start}
+if sys.argv[2] == "preload":
+    start = time.perf_counter()
+    main.warm_imports()
+    timings["warm_imports_s"] = time.perf_counter() - start
+client = main.app.test_client()
+start = time.perf_counter()
+client.get("/")
+timings["first_request_s"] = time.perf_counter() - start
+start = time.perf_counter()
+main.load_sheet(sys.argv[1], filename="bench.xlsx")
+timings["first_parse_s"] = time.perf_counter() - start
+print(json.dumps(timings))
+"""
+
+
+def bench_startup(ctx: BenchContext) -> dict:
+    """Fresh-interpreter import, first request and first sheet parse, lazy vs preloaded imports."""
+    xlsx = ctx.xlsx_path
+    env = {**os.environ, "UPLOAD_ROOT": str(ctx.work_dir / "uploads")}
+    results = {}
+    for mode in ("lazy", "preload"):
+        runs = []
+        for _ in range(ctx.args.repeat):
+            out = subprocess.run(
+                [sys.executable, "-c", _STARTUP_PROBE, str(xlsx), mode],
+                cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True,
+            ).stdout
+            runs.append(json.loads(out))
+        results[mode] = {key: round(min(run[key] for run in runs), 6) for key in runs[0]}
+    return results
+
+
+BENCHMARKS = {
+    "read_csv_smart": bench_read_csv_smart,
+    "load_sheet_dataframe": bench_load_sheet_dataframe,
+    "build_excel_column_metadata": bench_build_excel_column_metadata,
+    "coerce_export_cell": bench_coerce_export_cell,
+    "export_route": bench_export_route,
+    "sheet_memory": bench_sheet_memory,
+    "xlsx_reader": bench_xlsx_reader,
+    "startup": bench_startup,
+}
+
+
+def _git_revision() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BENCH_DIR,
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+    except Exception:
+        return None
+    return out.stdout.strip() or None
+
+
+def _params(args: argparse.Namespace) -> dict:
+    return {
+        "rows": args.rows,
+        "columns": args.columns,
+        "type_mix": args.type_mix or "default",
+        "blank_ratio": args.blank_ratio,
+        "seed": args.seed,
+    }
+
+
+def _load_history(path: Path) -> list[dict]:
+    if not path.exists():
+        return []
+    entries = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entries.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    return entries
+
+
+def _flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    flat: dict[str, float] = {}
+    for name, value in results.items():
+        key = f"{prefix}{name}"
+        if isinstance(value, dict) and "min_s" in value:
+            flat[key] = value["min_s"]
+        elif isinstance(value, dict):
+            flat.update(_flatten(value, f"{key}."))
+    return flat
+
+
+def _print_comparison(previous: dict, current: dict) -> None:
+    before = _flatten(previous.get("results", {}))
+    after = _flatten(current.get("results", {}))
+    print(f"\nCompared with {previous.get('revision') or '?'} @ {previous.get('timestamp')}")
+    print(f"{'benchmark':<48}{'before (s)':>12}{'after (s)':>12}{'change':>10}")
+    for key in sorted(after):
+        if key not in before:
+            continue
+        old, new = before[key], after[key]
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        print(f"{key:<48}{old:>12.4f}{new:>12.4f}{change:>10}")
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--columns", type=int, default=20)
+    parser.add_argument("--type-mix", default="", help="weights, e.g. 'date=2,vn_text=2,currency=1'")
+    parser.add_argument("--blank-ratio", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--encodings", nargs="+", default=list(workbook_factory.CSV_ENCODINGS))
+    parser.add_argument("--delimiters", nargs="+", default=list(workbook_factory.CSV_DELIMITERS))
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="run a subset of benchmarks")
+    parser.add_argument("--history", type=Path, default=DEFAULT_HISTORY)
+    parser.add_argument("--label", default="", help="free-form note stored with the run")
+    parser.add_argument("--compare", action="store_true", help="compare with the previous run of the same params")
+    parser.add_argument("--no-save", action="store_true", help="do not append to the history file")
+    args = parser.parse_args(argv)
+    args.delimiters = ["\t" if d in {"tab", "\\t"} else d for d in args.delimiters]
+    return args
+
+
+def run(args: argparse.Namespace) -> dict:
+    selected = args.only or list(BENCHMARKS)
+    results: dict[str, dict] = {}
+    with tempfile.TemporaryDirectory(prefix="excel_bench_") as tmp:
+        ctx = BenchContext(args, Path(tmp))
+        for name in selected:
+            print(f"[bench] {name} ...", file=sys.stderr, flush=True)
+            results[name] = BENCHMARKS[name](ctx)
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "label": args.label,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "params": _params(args),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "results": results,
+    }
+
+
+def main_cli(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    entry = run(args)
+    print(json.dumps(entry, indent=2, ensure_ascii=False))
+
+    if args.compare:
+        same_params = [e for e in _load_history(args.history) if e.get("params") == entry["params"]]
+        if same_params:
+            _print_comparison(same_params[-1], entry)
+        else:
+            print("\nNo previous run with the same params to compare against.")
+
+    if not args.no_save:
+        args.history.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.history, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,215 @@
+"""Synthetic workbook generator used by the benchmark and load-test tools.
+
+Produces deterministic xlsx/CSV files of configurable rows x columns with a
+weighted mix of column types that mirrors our operational exports: dates,
+percents, currency, Vietnamese text and blanks.
+"""
+
+import codecs
+import csv
+import random
+import unicodedata
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+
+COLUMN_TYPES = ("text", "vn_text", "integer", "decimal", "percent", "currency", "date", "datetime")
+DEFAULT_TYPE_MIX = {
+    "text": 2,
+    "vn_text": 2,
+    "integer": 1,
+    "decimal": 1,
+    "percent": 1,
+    "currency": 1,
+    "date": 1,
+    "datetime": 1,
+}
+NUMBER_FORMATS = {
+    "integer": "0",
+    "decimal": "0.00",
+    "percent": "0.00%",
+    "currency": "#,##0.00 [$₫-42A]",
+    "date": "dd/mm/yyyy",
+    "datetime": "dd/mm/yyyy hh:mm",
+}
+VN_WORDS = (
+    "Hà Nội", "Thành phố Hồ Chí Minh", "Đà Nẵng", "Cần Thơ", "Hải Phòng",
+    "khách hàng", "đơn hàng", "thanh toán", "giao hàng", "hoàn tất",
+    "đang xử lý", "chờ duyệt", "Nguyễn Văn Ánh", "Trần Thị Bích", "Lê Hoàng Yến",
+)
+TEXT_WORDS = ("alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliet")
+CSV_ENCODINGS = ("utf-8-sig", "utf-8", "cp1258", "cp1252")
+CSV_DELIMITERS = (",", ";", "\t", "|")
+_BASE_DATE = datetime(2020, 1, 1)
+
+
+def parse_type_mix(spec: str | None) -> dict[str, int]:
+    """Parse ``"date=2,vn_text=1"`` style weights; empty means the default mix."""
+    if not spec:
+        return dict(DEFAULT_TYPE_MIX)
+    mix: dict[str, int] = {}
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in COLUMN_TYPES:
+            raise ValueError(f"Unknown column type: {name}")
+        mix[name] = int(weight or 1)
+    if not any(mix.values()):
+        raise ValueError("Type mix needs at least one positive weight")
+    return mix
+
+
+def plan_columns(columns: int, type_mix: dict[str, int] | None = None) -> list[tuple[str, str]]:
+    """Return ``(header, column_type)`` pairs distributed by the mix weights."""
+    mix = type_mix or DEFAULT_TYPE_MIX
+    cycle = [name for name in COLUMN_TYPES for _ in range(mix.get(name, 0))]
+    return [(f"{cycle[i % len(cycle)]}_{i + 1}", cycle[i % len(cycle)]) for i in range(columns)]
+
+
+def _random_value(column_type: str, rng: random.Random):
+    if column_type == "text":
+        return f"{rng.choice(TEXT_WORDS)}-{rng.randint(1, 5000)}"
+    if column_type == "vn_text":
+        return f"{rng.choice(VN_WORDS)} {rng.randint(1, 500)}"
+    if column_type == "integer":
+        return rng.randint(0, 1_000_000)
+    if column_type == "decimal":
+        return round(rng.uniform(-10_000, 10_000), 4)
+    if column_type == "percent":
+        return round(rng.random(), 4)
+    if column_type == "currency":
+        return round(rng.uniform(0, 50_000_000), 2)
+    if column_type == "date":
+        return _BASE_DATE + timedelta(days=rng.randint(0, 2000))
+    if column_type == "datetime":
+        return _BASE_DATE + timedelta(minutes=rng.randint(0, 2000 * 24 * 60))
+    raise ValueError(f"Unknown column type: {column_type}")
+
+
+def generate_rows(
+    rows: int,
+    columns: list[tuple[str, str]],
+    blank_ratio: float = 0.05,
+    seed: int = 42,
+):
+    """Yield rows of native Python values; blanks are ``None``."""
+    rng = random.Random(seed)
+    for _ in range(rows):
+        yield [
+            None if rng.random() < blank_ratio else _random_value(column_type, rng)
+            for _, column_type in columns
+        ]
+
+
+def write_xlsx(
+    path: Path,
+    rows: int,
+    columns: int,
+    type_mix: dict[str, int] | None = None,
+    blank_ratio: float = 0.05,
+    sheets: int = 1,
+    seed: int = 42,
+) -> Path:
+    plan = plan_columns(columns, type_mix)
+    workbook = Workbook(write_only=True)
+    for sheet_idx in range(sheets):
+        worksheet = workbook.create_sheet(title=f"Sheet{sheet_idx + 1}")
+        worksheet.append([header for header, _ in plan])
+        formats = [NUMBER_FORMATS.get(column_type) for _, column_type in plan]
+        for row in generate_rows(rows, plan, blank_ratio, seed + sheet_idx):
+            worksheet.append([_styled_cell(worksheet, value, fmt) for value, fmt in zip(row, formats)])
+    workbook.save(path)
+    return path
+
+
+def _styled_cell(worksheet, value, fmt: str | None):
+    if value is None or not fmt:
+        return value
+    cell = WriteOnlyCell(worksheet, value=value)
+    cell.number_format = fmt
+    return cell
+
+
+def display_text(value, column_type: str) -> str:
+    if value is None:
+        return ""
+    if column_type == "percent":
+        return f"{value * 100:.2f}%"
+    if column_type == "currency":
+        return f"{value:,.2f}"
+    if column_type == "date":
+        return value.strftime("%d/%m/%Y")
+    if column_type == "datetime":
+        return value.strftime("%d/%m/%Y %H:%M")
+    return str(value)
+
+
+def encode_for_codepage(text: str, encoding: str) -> bytes:
+    """Encode text, recomposing Vietnamese diacritics the way cp1258 expects."""
+    try:
+        return text.encode(encoding)
+    except UnicodeEncodeError:
+        pass
+    # cp1258 only has some precomposed letters; the rest are base letter plus a
+    # combining tone mark, so compose greedily while the result stays encodable.
+    out: list[str] = []
+    for ch in unicodedata.normalize("NFD", text):
+        if out and unicodedata.combining(ch):
+            candidate = unicodedata.normalize("NFC", out[-1] + ch)
+            if len(candidate) == 1:
+                try:
+                    candidate.encode(encoding)
+                    out[-1] = candidate
+                    continue
+                except UnicodeEncodeError:
+                    pass
+        out.append(ch)
+    return "".join(out).encode(encoding, errors="replace")
+
+
+def write_csv(
+    path: Path,
+    rows: int,
+    columns: int,
+    type_mix: dict[str, int] | None = None,
+    blank_ratio: float = 0.05,
+    encoding: str = "utf-8-sig",
+    delimiter: str = ",",
+    seed: int = 42,
+) -> Path:
+    plan = plan_columns(columns, type_mix)
+    buf = _LineBuffer()
+    writer = csv.writer(buf, delimiter=delimiter, lineterminator="\n")
+    with open(path, "wb") as fh:
+        if encoding == "utf-8-sig":
+            # Write the BOM once; chunks below are plain UTF-8.
+            fh.write(codecs.BOM_UTF8)
+            encoding = "utf-8"
+        writer.writerow([header for header, _ in plan])
+        for row in generate_rows(rows, plan, blank_ratio, seed):
+            writer.writerow([display_text(value, column_type) for value, (_, column_type) in zip(row, plan)])
+            if buf.size >= 1 << 16:
+                fh.write(encode_for_codepage(buf.drain(), encoding))
+        fh.write(encode_for_codepage(buf.drain(), encoding))
+    return path
+
+
+class _LineBuffer:
+    def __init__(self) -> None:
+        self._parts: list[str] = []
+        self.size = 0
+
+    def write(self, text: str) -> None:
+        self._parts.append(text)
+        self.size += len(text)
+
+    def drain(self) -> str:
+        text = "".join(self._parts)
+        self._parts = []
+        self.size = 0
+        return text
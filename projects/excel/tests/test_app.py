@@ -1,9 +1,18 @@
-﻿from io import BytesIO
+﻿import json
+import subprocess
+import sys
+import time
+import unicodedata
+from datetime import datetime
+from io import BytesIO
 from pathlib import Path
 
+import pandas as pd
+import pytest
 from openpyxl import Workbook, load_workbook
 
-from projects.excel.app import main
+from projects.excel.app import excel_engine, main
+from projects.excel.app.excel_engine import readers, writers
 
 
 def _create_sample_workbook_bytes() -> bytes:
@@ -23,10 +32,20 @@ def _create_sample_workbook_bytes() -> bytes:
     return buf.getvalue()
 
 
-def _set_test_upload_root(tmp_path: Path) -> None:
+def _set_test_upload_root(tmp_path: Path, monkeypatch) -> None:
     upload_root = tmp_path / "uploads"
     upload_root.mkdir(parents=True, exist_ok=True)
-    main.UPLOAD_ROOT = upload_root
+    monkeypatch.setattr(main, "UPLOAD_ROOT", upload_root)
+    # One slot, so a streamed response a test leaves open shows up as a queued request.
+    monkeypatch.setattr(main, "HEAVY_REQUEST_SLOTS", 1)
+
+
+def _read_and_close(response, as_text: bool = False):
+    """Body of a (streamed) response, closed afterwards like a WSGI server does, which frees its heavy slot."""
+    try:
+        return response.get_data(as_text=as_text)
+    finally:
+        response.close()
 
 
 def _get_csrf_token(client) -> str:
@@ -36,14 +55,14 @@ def _get_csrf_token(client) -> str:
 
 
 def test_sanitize_sheet_name_trims_invalid_chars():
-    assert main._sanitize_sheet_name("  bad:/name*[]  ") == "bad  name"
+    assert writers._sanitize_sheet_name("  bad:/name*[]  ") == "bad  name"
 
 
 def test_load_sheet_dataframe_builds_excel_metadata(tmp_path):
     workbook_path = tmp_path / "sample.xlsx"
     workbook_path.write_bytes(_create_sample_workbook_bytes())
 
-    df, metadata, sheet_name = main._load_sheet_dataframe(workbook_path, workbook_path.name, "People")
+    df, metadata, sheet_name = excel_engine.load_sheet(workbook_path, "People")
 
     assert sheet_name == "People"
     assert list(df.columns) == ["Name", "Birthday", "Score"]
@@ -51,8 +70,23 @@ def test_load_sheet_dataframe_builds_excel_metadata(tmp_path):
     assert metadata[2]["source_type"] == "integer"
 
 
-def test_upload_select_render_multi_and_export_flow(tmp_path):
-    _set_test_upload_root(tmp_path)
+def test_read_csv_smart_sniffs_a_head_sample_and_reads_previews_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(readers, "CSV_SNIFF_BYTES", 64)
+    path = tmp_path / "big.csv"
+    lines = ["Id;Name"] + [f"{i};row {i}" for i in range(200)] + ["999;Café"]
+    path.write_bytes("\n".join(lines).encode("cp1252", errors="replace"))
+
+    preview, meta = readers.read_csv_smart(path, nrows=5, skiprows=2)
+    assert meta["delimiter"] == ";" and meta["encoding"].startswith("utf-8")
+    assert preview["Id"].tolist() == [2, 3, 4, 5, 6]
+
+    # The head decodes as UTF-8 but the last row does not: the next encoding wins.
+    full, meta = readers.read_csv_smart(path)
+    assert meta["encoding"] == "cp1258" and len(full) == 201 and full.iloc[-1, 1] == "Café"
+
+
+def test_upload_select_render_multi_and_export_flow(tmp_path, monkeypatch):
+    _set_test_upload_root(tmp_path, monkeypatch)
     main.app.config["TESTING"] = True
     main.app.secret_key = "test-secret"
 
@@ -87,8 +121,10 @@ def test_upload_select_render_multi_and_export_flow(tmp_path):
             },
         )
         assert render_response.status_code == 200
-        assert b"sample.xlsx - People" in render_response.data
-        assert b"sample.xlsx - Summary" in render_response.data
+        assert render_response.is_streamed
+        page = _read_and_close(render_response)
+        assert b"sample.xlsx - People" in page
+        assert b"sample.xlsx - Summary" in page
 
         csrf_token = _get_csrf_token(client)
         export_response = client.post(
@@ -132,7 +168,7 @@ def test_upload_select_render_multi_and_export_flow(tmp_path):
         assert export_response.status_code == 200
 
         output = tmp_path / "export.xlsx"
-        output.write_bytes(export_response.data)
+        output.write_bytes(_read_and_close(export_response))
         workbook = load_workbook(output)
         try:
             sheet = workbook["People"]
@@ -141,3 +177,1093 @@ def test_upload_select_render_multi_and_export_flow(tmp_path):
             assert sheet["C2"].number_format == "0"
         finally:
             workbook.close()
+
+
+def test_export_job_runs_in_background_and_serves_download(tmp_path, monkeypatch):
+    _set_test_upload_root(tmp_path, monkeypatch)
+    main.app.config["TESTING"] = True
+    main.app.secret_key = "test-secret"
+    token = "a" * 32
+    (main.UPLOAD_ROOT / token).mkdir()
+
+    with main.app.test_client() as client:
+        csrf_token = _get_csrf_token(client)
+        create_response = client.post(
+            "/export/jobs",
+            headers={"X-CSRFToken": csrf_token},
+            json={
+                "token": token,
+                "filename": "job.xlsx",
+                "sheets": [
+                    {
+                        "name": "People",
+                        "headers": ["Name", "Score"],
+                        "rows": [["Alice", "10"], ["Bob", "20"]],
+                        "column_formats": [
+                            {"source_type": "text", "original_number_format": "@", "selected_preset": "original"},
+                            {"source_type": "integer", "original_number_format": "0", "selected_preset": "original"},
+                        ],
+                    }
+                ],
+            },
+        )
+        assert create_response.status_code == 202
+        job = create_response.get_json()
+
+        deadline = time.monotonic() + 10
+        state = {}
+        while time.monotonic() < deadline:
+            state = client.get(job["progress_url"]).get_json()
+            if state["status"] in main.EXPORT_JOB_FINISHED:
+                break
+            time.sleep(0.05)
+        assert state["status"] == "done"
+        assert state["rows_written"] == state["rows_total"] == 2
+        assert state["sheets_done"] == 1
+        assert set(state["timings"]) == {"queue", "build"}
+
+        events = client.get(job["events_url"])
+        assert events.mimetype == "text/event-stream"
+        assert events.get_data(as_text=True).startswith("event: progress\ndata: ") and '"status": "done"' in events.get_data(as_text=True)
+
+        download = client.get(job["download_url"])
+        assert download.status_code == 200
+        workbook = load_workbook(BytesIO(download.data))
+        try:
+            assert workbook["People"]["B3"].value == 20
+        finally:
+            workbook.close()
+
+        assert client.get(f"/export/jobs/{token}/{'b' * 32}").status_code == 404
+        assert client.get(f"/export/jobs/../{job['job_id']}").status_code == 404
+
+
+def test_cleanup_export_jobs_drops_finished_results_after_ttl(tmp_path):
+    token_dir = tmp_path / ("c" * 32)
+    job_id = "d" * 32
+    main._write_export_job(token_dir, {"job_id": job_id, "status": "done", "finished_at": 1000.0})
+    paths = main._export_job_paths(token_dir, job_id)
+    paths["result"].write_bytes(b"PK")
+
+    main._cleanup_export_jobs(token_dir, now=1000.0 + 60)
+    assert paths["result"].exists()
+
+    main._cleanup_export_jobs(token_dir, now=1000.0 + main.EXPORT_JOB_TTL_MINUTES * 60 + 1)
+    assert not paths["state"].exists()
+    assert not paths["result"].exists()
+
+
+def test_iter_table_html_streams_escaped_rows_in_chunks():
+    df = pd.DataFrame(
+        {
+            "Name": ["<b>Alice</b>", None, "Bob & Co"],
+            "When": pd.to_datetime(["2024-03-15", None, "2024-11-05"]),
+            "Score": [10.5, float("nan"), 3.0],
+        }
+    )
+
+    chunks = list(main._iter_table_html(df, chunk_rows=2))
+
+    assert len(chunks) == 4  # header, two row chunks, footer
+    assert chunks[0].startswith('<table border="0" class="dataframe table table-striped table-sm"><thead>')
+    assert "<th>Name</th><th>When</th><th>Score</th>" in chunks[0]
+    assert chunks[1] == (
+        "<tr><td>&lt;b&gt;Alice&lt;/b&gt;</td><td>2024-03-15</td><td>10.5</td></tr>"
+        "<tr><td></td><td></td><td></td></tr>"
+    )
+    assert chunks[2] == "<tr><td>Bob &amp; Co</td><td>2024-11-05</td><td>3.0</td></tr>"
+    assert chunks[-1] == "</tbody></table>"
+
+
+def test_compact_sheet_dataframe_keeps_native_dtypes_with_null_mask():
+    df = pd.DataFrame(
+        {
+            "Qty": [1.0, None, 300.0],
+            "Price": [1.5, None, 2.0],
+            "Status": ["open", "open", None],
+            "Note": ["first", "second", "third"],
+            "When": pd.to_datetime(["2024-01-01", None, "2024-01-03"]),
+        }
+    )
+
+    compact = excel_engine.compact_frame(df)
+
+    assert str(compact["Qty"].dtype) == "Int16"
+    assert compact["Qty"].isna().tolist() == [False, True, False]
+    assert str(compact["Price"].dtype) == "float64"
+    assert str(compact["Status"].dtype) == "category"
+    assert str(compact["When"].dtype).startswith("datetime64")
+    assert excel_engine.inference._infer_series_type(compact["Qty"]) == "integer"
+    assert excel_engine.display_values(compact["Qty"]) == ["1", "", "300"]
+    assert excel_engine.display_values(compact["Note"]) == ["first", "second", "third"]
+
+
+def test_large_sheet_opens_as_preview_and_streams_remaining_rows(tmp_path, monkeypatch):
+    _set_test_upload_root(tmp_path, monkeypatch)
+    main.app.config["TESTING"] = True
+    main.app.secret_key = "test-secret"
+    monkeypatch.setattr(main, "PREVIEW_ROWS", 3)
+    monkeypatch.setattr(main, "PREVIEW_ROW_THRESHOLD", 5)
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Big"
+    sheet.append(["Id", "Label"])
+    for i in range(1, 11):
+        sheet.append([i, f"row {i}"])
+    buf = BytesIO()
+    workbook.save(buf)
+
+    with main.app.test_client() as client:
+        csrf_token = _get_csrf_token(client)
+        upload_response = client.post(
+            "/upload",
+            data={"csrf_token": csrf_token, "files": (BytesIO(buf.getvalue()), "big.xlsx")},
+            content_type="multipart/form-data",
+        )
+        token = upload_response.location.rsplit("/", 1)[-1]
+
+        render_response = client.post(
+            "/render_multi",
+            data={"csrf_token": csrf_token, "token": token, "selection": ["big.xlsx::Big"]},
+        )
+        page = _read_and_close(render_response, as_text=True)
+        assert 'data-partial="1"' in page
+        assert 'data-loaded-rows="3"' in page
+        assert 'data-total-rows="10"' in page
+        assert "row 3" in page and "row 4" not in page
+
+        rows_response = client.get(f"/rows/{token}", query_string={"selection": "big.xlsx::Big", "offset": 3})
+        assert rows_response.status_code == 200
+        assert rows_response.headers["X-Row-Count"] == "7"
+        rows_html = _read_and_close(rows_response, as_text=True)
+        assert rows_html.startswith("<tr><td>4</td><td>row 4</td></tr>")
+        assert rows_html.count("<tr>") == 7
+
+        bad = client.get(f"/rows/{token}", query_string={"selection": "../big.xlsx::Big"})
+        assert bad.status_code == 400
+
+
+def test_memory_budget_rejects_full_loads_downgrades_views_and_spills_chunks(tmp_path, monkeypatch):
+    _set_test_upload_root(tmp_path, monkeypatch)
+    main.app.config["TESTING"] = True
+    main.app.secret_key = "test-secret"
+    monkeypatch.setattr(main, "PREVIEW_ROWS", 0)
+    monkeypatch.setattr(main, "DEFAULT_PREVIEW_ROWS", 3)
+    monkeypatch.setattr(main, "DERIVED_CHUNK_ROWS", 2)
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Big"
+    sheet.append(["Id", "Label"])
+    for i in range(1, 11):
+        sheet.append([i, f"row {i % 3}"])
+
+    with main.app.test_client() as client:
+        csrf_token = _get_csrf_token(client)
+        token = _upload_workbook(client, csrf_token, workbook, "big.xlsx")
+        headers = {"X-CSRFToken": csrf_token}
+        merge = {
+            "token": token, "selection": "big.xlsx::Big", "lookup": "big.xlsx::Big",
+            "keys": [{"left": "Id", "right": "Id"}], "columns": ["Label"],
+        }
+        # Within budget the merge result is written in 2-row chunks.
+        merged = client.post("/merge", headers=headers, json=merge).get_json()
+        assert merged["row_count"] == 10 and merged["rows"][9] == ["10", "row 1", "row 1"]
+        derived = pd.read_csv(main.UPLOAD_ROOT / token / "merge_big_Big.csv", encoding="utf-8-sig")
+        assert list(derived.columns) == ["Id", "Label", "Label (Big)"] and len(derived) == 10
+
+        monkeypatch.setattr(main, "REQUEST_MEMORY_BUDGET_MB", 1)
+        monkeypatch.setattr(main, "XLSX_XML_MEMORY_FACTOR", 1024 * 1024)
+        monkeypatch.setattr(main, "MEMORY_BYTES_PER_CELL", 1024 * 1024)
+        pivot = client.post("/pivot", headers=headers, json={
+            "token": token, "selection": "big.xlsx::Big", "rows": ["Label"], "values": [{"column": "Id", "agg": "sum"}],
+        })
+        assert pivot.status_code == 413 and "1 MB" in pivot.get_json()["error"]
+        assert client.get(f"/rows/{token}", query_string={"selection": "big.xlsx::Big", "offset": 5}).status_code == 413
+
+        page = _read_and_close(client.post(
+            "/render_multi", data={"csrf_token": csrf_token, "token": token, "selection": ["big.xlsx::Big"]}
+        ), as_text=True)
+        # PREVIEW_ROWS=0 normally means "always load everything"; over budget it still previews.
+        assert 'data-partial="1"' in page and 'data-loaded-rows="3"' in page
+
+
+def test_heavy_requests_over_capacity_get_fair_queue_tickets(tmp_path, monkeypatch):
+    _set_test_upload_root(tmp_path, monkeypatch)
+    main.app.config["TESTING"] = True
+    main.app.secret_key = "test-secret"
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Data"
+    sheet.append(["Group", "Amount"])
+    sheet.append(["a", 1])
+    sheet.append(["b", 2])
+
+    alice, bob = main.app.test_client(), main.app.test_client()
+    alice_csrf, bob_csrf = _get_csrf_token(alice), _get_csrf_token(bob)
+    token = _upload_workbook(alice, alice_csrf, workbook, "book.xlsx")
+    pivot = {"token": token, "selection": "book.xlsx::Data", "rows": ["Group"], "values": [{"column": "Amount", "agg": "sum"}]}
+
+    busy = main._try_take_slot()  # another worker is parsing
+    first = alice.post("/pivot", headers={"X-CSRFToken": alice_csrf}, json=pivot)
+    assert first.status_code == 202 and first.headers["Retry-After"] == "1"
+    queued = first.get_json()
+    assert queued["queued"] and queued["position"] == 1
+    second = alice.post("/pivot", headers={"X-CSRFToken": alice_csrf}, json=pivot).get_json()
+    # Bob's first request goes ahead of Alice's second one.
+    bobs = bob.post("/pivot", headers={"X-CSRFToken": bob_csrf}, json=pivot).get_json()
+    assert (second["position"], bobs["position"]) == (2, 2)
+    assert alice.get(second["progress_url"]).get_json()["position"] == 3
+
+    # Cheap pages are not queued; page loads get a page that resubmits the form.
+    assert alice.get("/").status_code == 200
+    page = alice.post("/render_multi", data={"csrf_token": alice_csrf, "token": token, "selection": ["book.xlsx::Data"]})
+    assert page.status_code == 202
+    html = page.get_data(as_text=True)
+    assert 'name="selection" value="book.xlsx::Data"' in html and 'name="queue_ticket"' in html
+
+    assert alice.get(queued["progress_url"]).get_json()["status"] == "queued"
+    busy.release()
+    assert alice.get(queued["progress_url"]).get_json() == {"ticket": queued["ticket"], "status": "ready", "position": 1}
+    done = alice.post("/pivot", headers={"X-CSRFToken": alice_csrf, "X-Queue-Ticket": queued["ticket"]}, json=pivot)
+    assert done.status_code == 200 and done.get_json()["row_count"] == 2
+    done.close()
+    assert alice.get(queued["progress_url"]).status_code == 404
+    # Each session has one ticket at the head again: Alice's (older) goes first.
+    assert [alice.get(q["progress_url"]).get_json()["position"] for q in (second, bobs)] == [1, 2]
+
+    monkeypatch.setattr(main, "HEAVY_QUEUE_LIMIT", 3)
+    full = bob.post("/pivot", headers={"X-CSRFToken": bob_csrf}, json=pivot)
+    assert full.status_code == 503 and full.get_json()["error"]
+
+    # A stuck queue lock refuses heavy requests (fails closed) instead of running them unqueued.
+    import fcntl
+
+    monkeypatch.setattr(main, "ADMISSION_LOCK_TIMEOUT_SECONDS", 0.1)
+    with open(main.UPLOAD_ROOT / main.ADMISSION_DIR / "queue.lock", "a+b") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        stuck = bob.post("/pivot", headers={"X-CSRFToken": bob_csrf}, json=pivot)
+        assert stuck.status_code == 503 and stuck.headers["Retry-After"] == "1"
+        poll = alice.get(second["progress_url"])
+        assert poll.status_code == 503 and poll.get_json()["status"] == "busy"
+
+    # Background waits (export jobs) give up instead of looping while the queue issues no ticket.
+    monkeypatch.setattr(main, "HEAVY_QUEUE_LIMIT", 0)
+    monkeypatch.setattr(main, "HEAVY_SLOT_WAIT_SECONDS", 0)
+    busy = main._try_take_slot()
+    with pytest.raises(main._AdmissionUnavailable):
+        main._wait_for_heavy_slot("session")
+    busy.release()
+
+    # The slot goes back first when the response closes, even if a close hook of the view fails.
+    monkeypatch.setattr(main, "HEAVY_QUEUE_LIMIT", 64)
+    (main.UPLOAD_ROOT / main.ADMISSION_DIR / "queue.json").unlink()
+
+    def broken_finish(self, status="done"):
+        raise RuntimeError("close hook failed")
+
+    monkeypatch.setattr(main._ProgressReporter, "finish", broken_finish)
+    page = alice.post("/render_multi", data={"csrf_token": alice_csrf, "token": token, "selection": ["book.xlsx::Data"]})
+    assert page.status_code == 200
+    with pytest.raises(RuntimeError):
+        _read_and_close(page)
+    slot = main._try_take_slot()
+    assert slot is not None
+    slot.release()
+
+
+def test_render_multi_reports_progress_events_and_server_timing(tmp_path, monkeypatch):
+    _set_test_upload_root(tmp_path, monkeypatch)
+    main.app.config["TESTING"] = True
+    main.app.secret_key = "test-secret"
+    monkeypatch.setattr(readers, "PROGRESS_EVERY_ROWS", 2)
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Data"
+    sheet.append(["Id", "Name"])
+    for i in range(5):
+        sheet.append([i, f"name {i}"])
+    workbook.create_sheet("Empty").append(["Only"])
+
+    calls = []
+    xlsx_path = tmp_path / "book.xlsx"
+    workbook.save(xlsx_path)
+    excel_engine.load_sheet(xlsx_path, "Data", progress=lambda stage, rows: calls.append((stage, rows)))
+    assert calls == [("parse", 0), ("parse", 2), ("parse", 4), ("infer", 5)]
+
+    with main.app.test_client() as client:
+        csrf_token = _get_csrf_token(client)
+        token = _upload_workbook(client, csrf_token, workbook, "book.xlsx")
+        progress_id = "c" * 32
+        response = client.post("/render_multi", data={
+            "csrf_token": csrf_token,
+            "token": token,
+            "selection": ["book.xlsx::Data", "book.xlsx::Empty"],
+            "progress": progress_id,
+        })
+        assert response.status_code == 200
+        timing = response.headers["Server-Timing"]
+        assert "parse;dur=" in timing and "infer;dur=" in timing
+        # The request is finished once the streamed page has been sent, not when it starts.
+        state_path = main.UPLOAD_ROOT / token / main.PROGRESS_DIR / f"{progress_id}.json"
+        response.get_data()
+        assert json.loads(state_path.read_text(encoding="utf-8"))["status"] == "running"
+        response.close()
+
+        events = client.get(f"/progress/{token}/{progress_id}")
+        assert events.mimetype == "text/event-stream" and events.headers["Cache-Control"] == "no-cache"
+        state = json.loads(events.get_data(as_text=True).split("data: ", 1)[1])
+        assert state["status"] == "done" and state["stage"] == "render" and state["items_total"] == 2
+        assert set(state["timings"]) >= {"parse", "infer", "render"}
+
+        # Opening the sheet again reads it from the parse cache.
+        client.post("/render_multi", data={
+            "csrf_token": csrf_token, "token": token, "selection": ["book.xlsx::Data"], "progress": "d" * 32,
+        }).close()
+        cached = json.loads(client.get(f"/progress/{token}/{'d' * 32}").get_data(as_text=True).split("data: ", 1)[1])
+        assert "cache" in cached["timings"] and "parse" in cached["timings"]
+        assert client.get(f"/progress/{token}/not-an-id").status_code == 404
+
+
+def test_render_multi_finishes_progress_and_frees_slot_when_stream_closes_outside_context(tmp_path, monkeypatch):
+    _set_test_upload_root(tmp_path, monkeypatch)
+    main.app.config["TESTING"] = True
+    main.app.secret_key = "test-secret"
+
+    workbook = Workbook()
+    workbook.active.title = "Data"
+    workbook.active.append(["Id"])
+    workbook.active.append([1])
+
+    # No ``with client:``: the request context is gone before the body is read, as under a real server.
+    client = main.app.test_client()
+    csrf_token = _get_csrf_token(client)
+    token = _upload_workbook(client, csrf_token, workbook, "book.xlsx")
+    progress_id = "e" * 32
+    response = client.post("/render_multi", data={
+        "csrf_token": csrf_token, "token": token, "selection": ["book.xlsx::Data"], "progress": progress_id,
+    })
+    assert response.status_code == 200 and 'class="panel' in response.get_data(as_text=True)
+    response.close()
+
+    state = json.loads((main.UPLOAD_ROOT / token / main.PROGRESS_DIR / f"{progress_id}.json").read_text(encoding="utf-8"))
+    assert state["status"] == "done" and "render" in state["timings"] and state["message"]
+    slot = main._try_take_slot()
+    assert slot is not None
+    slot.release()
+
+
+def test_rows_and_view_support_etags_and_cached_compressed_bodies(tmp_path, monkeypatch):
+    import gzip
+
+    _set_test_upload_root(tmp_path, monkeypatch)
+    main.app.config["TESTING"] = True
+    main.app.secret_key = "test-secret"
+
+    with main.app.test_client() as client:
+        csrf_token = _get_csrf_token(client)
+        upload_response = client.post(
+            "/upload",
+            data={"csrf_token": csrf_token, "files": (BytesIO(_create_sample_workbook_bytes()), "sample.xlsx")},
+            content_type="multipart/form-data",
+        )
+        token = upload_response.location.rsplit("/", 1)[-1]
+        query = {"selection": "sample.xlsx::People", "offset": 1}
+        gzip_headers = {"Accept-Encoding": "gzip"}
+
+        first = client.get(f"/rows/{token}", query_string=query, headers=gzip_headers)
+        assert first.headers["Content-Encoding"] == "gzip"
+        assert first.headers["Cache-Control"] == "private, no-cache"
+        assert "Accept-Encoding" in first.headers["Vary"]
+        body = _read_and_close(first)
+        assert gzip.decompress(body).decode("utf-8").startswith("<tr><td>Bob</td>")
+
+        etag = first.headers["ETag"]
+        not_modified = client.get(f"/rows/{token}", query_string=query, headers={**gzip_headers, "If-None-Match": etag})
+        assert not_modified.status_code == 304
+
+        assert list((main.UPLOAD_ROOT / token / ".cache" / "http").glob("*.html"))
+        cached = client.get(f"/rows/{token}", query_string=query, headers=gzip_headers)
+        assert _read_and_close(cached) == body
+        assert cached.headers["X-Row-Count"] == "1" and cached.headers["ETag"] == etag
+
+        plain = client.get(f"/rows/{token}", query_string=query)
+        assert "Content-Encoding" not in plain.headers and plain.headers["ETag"] != etag
+        plain.close()
+
+        view = client.get("/render", query_string={"token": token, "selection": "sample.xlsx::People"})
+        assert view.status_code == 200 and "Alice" in _read_and_close(view, as_text=True)
+        assert client.get(
+            "/render",
+            query_string={"token": token, "selection": "sample.xlsx::People"},
+            headers={"If-None-Match": view.headers["ETag"]},
+        ).status_code == 304
+
+        multi = client.post(
+            "/render_multi",
+            data={"csrf_token": csrf_token, "token": token, "selection": ["sample.xlsx::People"]},
+            headers=gzip_headers,
+        )
+        assert multi.headers["Content-Encoding"] == "gzip"
+        assert "Alice" in gzip.decompress(_read_and_close(multi)).decode("utf-8")
+
+
+def test_workspace_assets_are_fingerprinted_and_config_is_inlined(tmp_path, monkeypatch):
+    import re
+
+    _set_test_upload_root(tmp_path, monkeypatch)
+    main.app.config["TESTING"] = True
+    main.app.secret_key = "test-secret"
+
+    with main.app.test_client() as client:
+        csrf_token = _get_csrf_token(client)
+        upload_response = client.post(
+            "/upload",
+            data={"csrf_token": csrf_token, "files": (BytesIO(_create_sample_workbook_bytes()), "sample.xlsx")},
+            content_type="multipart/form-data",
+        )
+        token = upload_response.location.rsplit("/", 1)[-1]
+        page = _read_and_close(client.post(
+            "/render_multi",
+            data={"csrf_token": csrf_token, "token": token, "selection": ["sample.xlsx::People"]},
+        ), as_text=True)
+
+        config = json.loads(re.search(r'<script id="workspace-config" type="application/json">(.*?)</script>', page).group(1))
+        assert config["token"] == token and config["csrfToken"] == csrf_token
+        assert config["i18n"]["export_failed"] == main.tr("export_failed")
+
+        script_url = re.search(r'src="(/static/workspace\.[0-9a-f]{12}\.js)"', page).group(1)
+        script = client.get(script_url)
+        assert script.status_code == 200
+        assert script.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+        assert "CONFIG.urls.createExportJob" in script.get_data(as_text=True)
+        assert "{{" not in script.get_data(as_text=True)
+
+        stale = client.get("/static/workspace.000000000000.js")
+        assert stale.status_code == 200 and stale.headers["Cache-Control"] == "no-cache"
+        assert client.get("/static/missing.000000000000.js").status_code == 404
+
+
+def test_profile_endpoint_reports_column_statistics_and_caches_them(tmp_path, monkeypatch):
+    _set_test_upload_root(tmp_path, monkeypatch)
+    main.app.config["TESTING"] = True
+    main.app.secret_key = "test-secret"
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Data"
+    sheet.append(["Key", "Amount", "Note"])
+    for i in range(1, 11):
+        sheet.append([f"K{i % 4}", i * 10, None if i % 5 == 0 else ("  " if i == 3 else f"n{i}")])
+    buf = BytesIO()
+    workbook.save(buf)
+
+    with main.app.test_client() as client:
+        csrf_token = _get_csrf_token(client)
+        upload_response = client.post(
+            "/upload",
+            data={"csrf_token": csrf_token, "files": (BytesIO(buf.getvalue()), "data.xlsx")},
+            content_type="multipart/form-data",
+        )
+        token = upload_response.location.rsplit("/", 1)[-1]
+        query = {"selection": "data.xlsx::Data"}
+
+        response = client.get(f"/profile/{token}", query_string=query)
+        assert response.status_code == 200
+        profile = response.get_json()
+        assert profile["rows"] == 10
+        key, amount, note = profile["columns"]
+        assert key["distinct"] == 4 and key["top"][0] == ["K1", 3]
+        assert amount["kind"] == "number"
+        assert (amount["min"], amount["max"], amount["mean"]) == (10, 100, 55)
+        assert sum(amount["histogram"]["counts"]) == 10
+        assert note["nulls"] == 2 and note["blanks"] == 1
+
+        assert client.get(
+            f"/profile/{token}", query_string=query, headers={"If-None-Match": response.headers["ETag"]}
+        ).status_code == 304
+
+        monkeypatch.setattr(main, "_load_sheet_view", lambda *args, **kwargs: pytest.fail("profile not cached"))
+        assert client.get(f"/profile/{token}", query_string=query).get_json() == profile
+
+    monkeypatch.setattr(main, "PROFILE_EXACT_DISTINCT_ROWS", 10)
+    estimate = main._profile_column("ids", pd.Series(range(50_000)))
+    assert estimate["distinct_estimated"] and abs(estimate["distinct"] - 50_000) < 1_500
+
+
+def _upload_workbook(client, csrf_token: str, workbook: Workbook, filename: str) -> str:
+    buf = BytesIO()
+    workbook.save(buf)
+    response = client.post(
+        "/upload",
+        data={"csrf_token": csrf_token, "files": (BytesIO(buf.getvalue()), filename)},
+        content_type="multipart/form-data",
+    )
+    return response.location.rsplit("/", 1)[-1]
+
+
+def test_pivot_aggregates_sheet_into_derived_tab(tmp_path, monkeypatch):
+    _set_test_upload_root(tmp_path, monkeypatch)
+    main.app.config["TESTING"] = True
+    main.app.secret_key = "test-secret"
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Sales"
+    sheet.append(["Region", "Year", "Amount", "Customer"])
+    for region, year, amount, customer in [
+        ("North", 2023, 10, "a"), ("North", 2024, 5, "b"), ("North", 2024, 7, "b"),
+        ("South", 2023, 3, "c"), (None, 2023, 1, "d"),
+    ]:
+        sheet.append([region, year, amount, customer])
+
+    with main.app.test_client() as client:
+        csrf_token = _get_csrf_token(client)
+        token = _upload_workbook(client, csrf_token, workbook, "sales.xlsx")
+        headers = {"X-CSRFToken": csrf_token}
+
+        response = client.post("/pivot", headers=headers, json={
+            "token": token,
+            "selection": "sales.xlsx::Sales",
+            "rows": ["Region"],
+            "columns": ["Year"],
+            "values": [{"column": "Amount", "agg": "sum"}, {"column": "Customer", "agg": "distinct"}],
+        })
+        assert response.status_code == 200
+        result = response.get_json()
+        assert result["headers"] == [
+            "Region", "2023 | Amount (sum)", "2024 | Amount (sum)", "2023 | Customer (distinct)", "2024 | Customer (distinct)",
+        ]
+        assert result["rows"][0] == ["North", "10", "12", "1", "1"]
+        assert result["rows"][-1][0] == ""
+        assert result["selection"] == "pivot_sales_Sales.csv::CSV"
+
+        page = _read_and_close(client.post("/render_multi", data={
+            "csrf_token": csrf_token, "token": token,
+            "selection": ["sales.xlsx::Sales", result["selection"]], "active": result["selection"],
+        }), as_text=True)
+        assert 'class="tab active" data-target="v_1"' in page
+
+        bad = client.post("/pivot", headers=headers, json={
+            "token": token, "selection": "sales.xlsx::Sales", "rows": ["Region"], "columns": [],
+            "values": [{"column": "Customer", "agg": "sum"}],
+        })
+        assert bad.status_code == 400 and "Customer" in bad.get_json()["error"]
+
+
+def test_merge_looks_up_columns_by_key_and_caches_index(tmp_path, monkeypatch):
+    _set_test_upload_root(tmp_path, monkeypatch)
+    main.app.config["TESTING"] = True
+    main.app.secret_key = "test-secret"
+
+    workbook = Workbook()
+    orders = workbook.active
+    orders.title = "Orders"
+    orders.append(["Order", "Customer"])
+    for row in [(1, "C1"), (2, "C2"), (3, "C9"), (4, None), (5, "C1")]:
+        orders.append(row)
+    customers = workbook.create_sheet("Customers")
+    customers.append(["Customer", "Name", "City"])
+    for row in [("C1", "Ann", "Hanoi"), ("C2", "Binh", "Hue"), ("C2", "Binh 2", "Da Nang")]:
+        customers.append(row)
+
+    with main.app.test_client() as client:
+        csrf_token = _get_csrf_token(client)
+        token = _upload_workbook(client, csrf_token, workbook, "book.xlsx")
+        headers = {"X-CSRFToken": csrf_token}
+        request_body = {
+            "token": token,
+            "selection": "book.xlsx::Orders",
+            "lookup": "book.xlsx::Customers",
+            "keys": [{"left": "Customer", "right": "Customer"}],
+        }
+
+        response = client.post("/merge", headers=headers, json=request_body)
+        assert response.status_code == 200
+        result = response.get_json()
+        assert result["selection"] == "merge_book_Orders.csv::CSV"
+        assert result["headers"] == ["Order", "Customer", "Name", "City"]
+        assert result["rows"] == [
+            ["1", "C1", "Ann", "Hanoi"], ["2", "C2", "Binh", "Hue"], ["3", "C9", "", ""],
+            ["4", "", "", ""], ["5", "C1", "Ann", "Hanoi"],
+        ]
+        cache_dir = main.UPLOAD_ROOT / token / main.SHEET_CACHE_DIR
+        indexes = sorted(cache_dir.glob("*.keys.*.npz"))
+        assert len(indexes) == 2
+        mtimes = [p.stat().st_mtime_ns for p in indexes]
+
+        response = client.post("/merge", headers=headers, json={
+            **request_body, "columns": ["City"], "join": "inner", "duplicates": "all",
+        })
+        assert response.get_json()["rows"] == [
+            ["1", "C1", "Hanoi"], ["2", "C2", "Hue"], ["2", "C2", "Da Nang"], ["5", "C1", "Hanoi"],
+        ]
+        assert [p.stat().st_mtime_ns for p in indexes] == mtimes
+
+        response = client.post("/merge", headers=headers, json={**request_body, "join": "anti"})
+        assert response.get_json()["rows"] == [["3", "C9"], ["4", ""]]
+
+        bad = client.post("/merge", headers=headers, json={**request_body, "keys": [{"left": "Nope", "right": "Customer"}]})
+        assert bad.status_code == 400 and "Nope" in bad.get_json()["error"]
+
+
+def test_dedupe_reports_groups_and_drops_by_keep_policy(tmp_path, monkeypatch):
+    _set_test_upload_root(tmp_path, monkeypatch)
+    main.app.config["TESTING"] = True
+    main.app.secret_key = "test-secret"
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Contacts"
+    sheet.append(["Email", "Name", "Phone"])
+    for row in [
+        ("a@x.vn", "An", None), ("b@x.vn", "Binh", "02"), ("a@x.vn", "An", "01"),
+        (None, "Blank", None), (None, "Blank", None), ("b@x.vn", None, None),
+    ]:
+        sheet.append(row)
+
+    with main.app.test_client() as client:
+        csrf_token = _get_csrf_token(client)
+        token = _upload_workbook(client, csrf_token, workbook, "contacts.xlsx")
+        headers = {"X-CSRFToken": csrf_token}
+        body = {"token": token, "selection": "contacts.xlsx::Contacts", "keys": ["Email"]}
+
+        report = client.post("/dedupe", headers=headers, json=body).get_json()
+        assert (report["rows"], report["groups"], report["duplicates"]) == (6, 2, 2)
+        assert report["sample"][0] == {"key": ["a@x.vn"], "count": 2, "rows": [1, 3]}
+        assert "drop" not in report
+
+        assert client.post("/dedupe", headers=headers, json={**body, "apply": "rows"}).get_json()["drop"] == [2, 5]
+        complete = client.post("/dedupe", headers=headers, json={**body, "keep": "complete", "apply": "rows"})
+        assert complete.get_json()["drop"] == [0, 5]
+
+        derived = client.post("/dedupe", headers=headers, json={**body, "keep": "last", "apply": "sheet"}).get_json()
+        assert derived["selection"] == "dedupe_contacts_Contacts.csv::CSV"
+        assert [row[0] for row in derived["rows"]] == ["a@x.vn", "", "", "b@x.vn"]
+
+        bad = client.post("/dedupe", headers=headers, json={**body, "keep": "random"})
+        assert bad.status_code == 400
+
+
+def test_diff_compares_reupload_with_previous_version_by_key_and_content(tmp_path, monkeypatch):
+    _set_test_upload_root(tmp_path, monkeypatch)
+    main.app.config["TESTING"] = True
+    main.app.secret_key = "test-secret"
+
+    def version(rows: list, extra_sheet: str) -> Workbook:
+        workbook = Workbook()
+        workbook.active.title = "Orders"
+        workbook.active.append(["Code", "Qty", "Note"])
+        for row in rows:
+            workbook.active.append(row)
+        workbook.create_sheet(extra_sheet).append(["Label"])
+        return workbook
+
+    old = version([("A1", 1, "x"), ("A2", 2, "y"), ("A3", 3, "z")], "Static")
+    new = version([("A1", 1, "x"), ("A3", 4, "z"), ("A4", 5, "w")], "Added")
+
+    with main.app.test_client() as client:
+        csrf_token = _get_csrf_token(client)
+        token = _upload_workbook(client, csrf_token, old, "book.xlsx")
+        headers = {"X-CSRFToken": csrf_token}
+        body = {"token": token, "selection": "book.xlsx::Orders", "keys": ["Code"], "all_sheets": True}
+        assert client.post("/diff", headers=headers, json=body).status_code == 404
+
+        buf = BytesIO()
+        new.save(buf)
+        client.post(
+            f"/reupload/{token}",
+            data={"csrf_token": csrf_token, "files": (BytesIO(buf.getvalue()), "book.xlsx")},
+            content_type="multipart/form-data",
+        )
+        result = client.post("/diff", headers=headers, json=body).get_json()
+        by_sheet = {entry["sheet"]: entry for entry in result["sheets"]}
+        assert {name: entry["status"] for name, entry in by_sheet.items()} == {
+            "Orders": "changed", "Added": "added", "Static": "removed",
+        }
+        orders = by_sheet["Orders"]
+        assert (orders["match"], orders["added"], orders["removed"], orders["modified"], orders["unchanged"]) == ("key", 1, 1, 1, 1)
+        assert orders["changes"] == [{"old_row": 3, "new_row": 2, "column": "Qty", "old": "3", "new": "4"}]
+        assert result["selections"] == ["diff_book_Orders.csv::CSV"]
+
+        token_dir = main.UPLOAD_ROOT / token
+        diff_sheet = pd.read_csv(token_dir / "diff_book_Orders.csv", encoding="utf-8-sig", dtype=str, keep_default_na=False)
+        assert diff_sheet.values.tolist() == [
+            ["modified", "3", "2", "A3", "3 → 4", "z"],
+            ["added", "", "3", "A4", "5", "w"],
+            ["removed", "2", "", "A2", "2", "y"],
+        ]
+
+        # Without keys rows match on content; the rows left between the same unchanged
+        # rows pair up in order and read as modified.
+        content = client.post("/diff", headers=headers, json={**body, "keys": [], "all_sheets": False}).get_json()
+        assert [entry["sheet"] for entry in content["sheets"]] == ["Orders"]
+        orders = content["sheets"][0]
+        assert (orders["match"], orders["added"], orders["removed"], orders["modified"], orders["unchanged"]) == ("content", 0, 0, 2, 1)
+        assert [(c["old_row"], c["new_row"], c["column"]) for c in orders["changes"]] == [
+            (2, 2, "Code"), (2, 2, "Qty"), (2, 2, "Note"), (3, 3, "Code"), (3, 3, "Qty"), (3, 3, "Note"),
+        ]
+
+        # Both versions plus the alignment arrays count against the request memory budget.
+        monkeypatch.setattr(main, "REQUEST_MEMORY_BUDGET_MB", 1)
+        monkeypatch.setattr(main, "DIFF_BYTES_PER_ROW", 256 * 1024)
+        over = client.post("/diff", headers=headers, json=body)
+        assert over.status_code == 413 and "1 MB" in over.get_json()["error"]
+
+
+def test_cli_converts_directory_with_formats_and_skips_unchanged(tmp_path, capsys):
+    from projects.excel.app import cli
+    from projects.excel.bench import workbook_factory
+
+    src = tmp_path / "in"
+    src.mkdir()
+    text = "Mã;Số tiền;Ngày\nA1;1.234,5;05/03/2024\nA2;10;06/03/2024\n"
+    (src / "a.csv").write_bytes(workbook_factory.encode_for_codepage(text, "cp1258"))
+    (src / "b.csv").write_text("Name,Amount\nX,7\n", encoding="utf-8-sig")
+    (src / "notes.txt").write_text("ignored", encoding="utf-8")
+    out = tmp_path / "out"
+    args = [str(src), "-o", str(out), "-j", "2", "--format", "Ngày=date_dmy", "--format", "Amount=decimal_2"]
+
+    assert cli.run(args) == 0
+    workbook = load_workbook(out / "a.xlsx")
+    sheet = workbook.active
+    assert [unicodedata.normalize("NFC", c.value) for c in sheet[1]] == ["Mã", "Số tiền", "Ngày"]
+    assert sheet["C2"].number_format == "dd-mm-yyyy" and sheet["C2"].value.day == 5
+    assert load_workbook(out / "b.xlsx").active["B2"].number_format == "0.00"
+    manifest = json.loads((out / cli.MANIFEST_NAME).read_text(encoding="utf-8"))["files"]
+    assert sorted(manifest) == ["a.csv", "b.csv"]
+
+    capsys.readouterr()
+    assert cli.run(args) == 0
+    assert "0 converted, 2 unchanged" in capsys.readouterr().err
+    (src / "b.csv").write_text("Name,Amount\nY,8\n", encoding="utf-8-sig")
+    assert cli.run(args) == 0
+    assert "1 converted, 1 unchanged" in capsys.readouterr().err
+    assert cli.run([*args, "--format", "Amount=bogus"]) == 2
+
+
+def test_cli_records_corrupt_workbook_as_failed_and_finishes_batch(tmp_path, capsys):
+    from projects.excel.app import cli
+
+    src = tmp_path / "in"
+    src.mkdir()
+    (src / "bad.xlsx").write_bytes(b"not a zip archive")
+    (src / "good.csv").write_text("Name,Amount\nX,7\n", encoding="utf-8")
+    out = tmp_path / "out"
+
+    assert cli.run([str(src), "-o", str(out), "-j", "1"]) == 1
+    assert "1 converted, 0 unchanged, 1 failed" in capsys.readouterr().err
+    assert load_workbook(out / "good.xlsx").active["A2"].value == "X"
+    manifest = json.loads((out / cli.MANIFEST_NAME).read_text(encoding="utf-8"))["files"]
+    assert manifest["bad.xlsx"]["error"] and "output" not in manifest["bad.xlsx"]
+
+    # Failed inputs are retried, never skipped as unchanged.
+    assert cli.run([str(src), "-o", str(out)]) == 1
+    assert "0 converted, 1 unchanged, 1 failed" in capsys.readouterr().err
+
+
+def test_fast_xlsx_reader_matches_openpyxl_and_falls_back(tmp_path, monkeypatch):
+    from projects.excel.bench import workbook_factory
+
+    workbook_path = workbook_factory.write_xlsx(tmp_path / "typed.xlsx", 60, 16, blank_ratio=0.2)
+    for window in ({}, {"nrows": 10}, {"nrows": 10, "skiprows": 25}):
+        monkeypatch.setattr(readers, "XLSX_READER", "fast")
+        fast = excel_engine.load_sheet(workbook_path, **window)
+        monkeypatch.setattr(readers, "XLSX_READER", "openpyxl")
+        slow = excel_engine.load_sheet(workbook_path, **window)
+        pd.testing.assert_frame_equal(fast[0], slow[0])
+        assert fast[1:] == slow[1:]
+
+    # Sheets that do not start on row 1 are left to openpyxl.
+    workbook = Workbook()
+    workbook.active["B3"] = "Header"
+    workbook.active["B4"] = 1
+    offset_path = tmp_path / "offset.xlsx"
+    workbook.save(offset_path)
+    with pytest.raises(readers._FastXlsxUnsupported):
+        readers._read_xlsx_fast(offset_path)
+    monkeypatch.setattr(readers, "XLSX_READER", "fast")
+    df, _, _ = excel_engine.load_sheet(offset_path)
+    assert "Header" in df.astype(str).to_string()
+
+
+def test_export_streams_csv_jsonl_parquet_and_zips_multiple_sheets(tmp_path, monkeypatch):
+    import io
+    import json
+    import zipfile
+
+    import pyarrow.parquet as pq
+
+    _set_test_upload_root(tmp_path, monkeypatch)
+    main.app.config["TESTING"] = True
+    main.app.secret_key = "test-secret"
+    sheet = {
+        "name": "Orders",
+        "headers": ["Id", "Amount", "Day", "Note"],
+        "rows": [["1", "1,234.50", "15/03/2024", "Hà Nội"], ["2", "", "16/03/2024", ""]],
+        "column_formats": [
+            {"source_type": "integer", "selected_preset": "original"},
+            {"source_type": "decimal", "selected_preset": "original"},
+            {"source_type": "date", "selected_preset": "original"},
+            {"source_type": "text", "selected_preset": "original"},
+        ],
+    }
+
+    with main.app.test_client() as client:
+        csrf_token = _get_csrf_token(client)
+        headers = {"X-CSRFToken": csrf_token}
+
+        csv_response = client.post("/export", headers=headers, json={"format": "csv", "sheets": [sheet]})
+        assert csv_response.status_code == 200
+        assert 'filename="export.csv"' in csv_response.headers["Content-Disposition"]
+        assert _read_and_close(csv_response).decode("utf-8-sig").splitlines() == [
+            "Id,Amount,Day,Note",
+            "1,1234.5,2024-03-15,Hà Nội",
+            "2,,2024-03-16,",
+        ]
+
+        jsonl_response = client.post("/export", headers=headers, json={"format": "jsonl", "sheets": [sheet]})
+        records = [json.loads(line) for line in _read_and_close(jsonl_response, as_text=True).splitlines()]
+        assert records[0] == {"Id": 1, "Amount": 1234.5, "Day": "2024-03-15", "Note": "Hà Nội"}
+        assert records[1]["Amount"] is None
+
+        parquet_response = client.post("/export", headers=headers, json={"format": "parquet", "sheets": [sheet]})
+        table = pq.read_table(io.BytesIO(_read_and_close(parquet_response)))
+        assert table.column("Amount").to_pylist() == [1234.5, None]
+
+        zip_response = client.post(
+            "/export", headers=headers, json={"format": "csv", "sheets": [sheet, dict(sheet, name="Orders")]}
+        )
+        assert 'filename="export.zip"' in zip_response.headers["Content-Disposition"]
+        with zipfile.ZipFile(io.BytesIO(_read_and_close(zip_response))) as zf:
+            assert zf.namelist() == ["Orders.csv", "Orders_1.csv"]
+            assert zf.read("Orders_1.csv").decode("utf-8-sig").startswith("Id,Amount")
+
+        bad = client.post("/export", headers=headers, json={"format": "ods", "sheets": [sheet]})
+        assert bad.status_code == 400
+
+    # One row group per chunk; a type that changes between chunks settles for the whole file.
+    mixed = {
+        "name": "Mixed",
+        "headers": ["Qty", "Code"],
+        "rows": [["1", "7"], ["2", "8"], ["2.5", "x"], ["", "9"], ["4", ""]],
+        "column_formats": [{"source_type": "decimal", "selected_preset": "original"}, {}],
+    }
+    buf = io.BytesIO()
+    original_chunk_rows, writers.EXPORT_CHUNK_ROWS = writers.EXPORT_CHUNK_ROWS, 2
+    try:
+        writers.write_sheets([mixed], buf, "parquet")
+    finally:
+        writers.EXPORT_CHUNK_ROWS = original_chunk_rows
+    parquet = pq.ParquetFile(io.BytesIO(buf.getvalue()))
+    assert parquet.metadata.num_row_groups == 3
+    table = parquet.read()
+    assert table.column("Qty").to_pylist() == [1.0, 2.0, 2.5, None, 4.0]
+    assert table.column("Code").to_pylist() == ["7", "8", "x", "9", None]
+
+    # Every flat format writes the same deduplicated headers.
+    repeated = {"name": "Repeated", "headers": ["Id", "Id", ""], "rows": [["1", "2", "3"]]}
+    buf = io.BytesIO()
+    writers.write_sheets([repeated], buf, "csv")
+    assert buf.getvalue().decode("utf-8-sig").splitlines()[0] == "Id,Id.1,Unnamed: 2"
+    buf = io.BytesIO()
+    writers.write_sheets([repeated], buf, "parquet")
+    assert pq.read_table(io.BytesIO(buf.getvalue())).column_names == ["Id", "Id.1", "Unnamed: 2"]
+
+
+def test_export_applies_color_runs_through_shared_styles():
+    sheet = {
+        "name": "Compare",
+        "headers": ["Key", "Amount"],
+        "rows": [["A", "1"], ["B", "2"], ["C", "3"]],
+        "column_formats": [
+            {"source_type": "text", "original_number_format": "@", "selected_preset": "original"},
+            {"source_type": "integer", "original_number_format": "0", "selected_preset": "original"},
+        ],
+        # Rows 1-2 fully orange (one run across both rows), key cell of row 3 blue.
+        "fills": {"#FFC000": [0, 4], "#9BC2E6": [4, 1], "bad": [0, 1]},
+        "fonts": {"#FF0000": [5, 1]},
+    }
+    buf = BytesIO()
+    excel_engine.build_workbook([sheet]).save(buf)
+    workbook = load_workbook(BytesIO(buf.getvalue()))
+    ws = workbook["Compare"]
+
+    assert [ws[ref].fill.fgColor.rgb for ref in ("A2", "B2", "A3", "B3", "A4")] == ["FFFFC000"] * 4 + ["FF9BC2E6"]
+    assert ws["B4"].fill.fill_type is None
+    assert ws["B4"].font.color.rgb == "FFFF0000"
+    assert ws["B2"].number_format == "0" and ws["B4"].value == 3
+    # One style per (format, fill, font) combination, not one per cell.
+    assert len(workbook._cell_styles) <= 6
+
+
+def test_reupload_reparses_only_changed_sheets(tmp_path, monkeypatch):
+    _set_test_upload_root(tmp_path, monkeypatch)
+    main.app.config["TESTING"] = True
+    main.app.secret_key = "test-secret"
+
+    def workbook_bytes(first_value: str) -> bytes:
+        workbook = Workbook()
+        workbook.active.title = "One"
+        workbook.active.append(["Name", "Qty"])
+        workbook.active.append([first_value, 1])
+        for title in ("Two", "Three"):
+            sheet = workbook.create_sheet(title)
+            sheet.append(["Label", "Value"])
+            sheet.append([title.lower(), 2])
+        buf = BytesIO()
+        workbook.save(buf)
+        return buf.getvalue()
+
+    parsed = []
+    original_load = main.load_sheet
+
+    def counting_load(path, sheet_name=None, **kwargs):
+        parsed.append(sheet_name)
+        return original_load(path, sheet_name, **kwargs)
+
+    monkeypatch.setattr(main, "load_sheet", counting_load)
+    selections = ["book.xlsx::One", "book.xlsx::Two", "book.xlsx::Three"]
+
+    with main.app.test_client() as client:
+        csrf_token = _get_csrf_token(client)
+        upload_response = client.post(
+            "/upload",
+            data={"csrf_token": csrf_token, "files": (BytesIO(workbook_bytes("alpha")), "book.xlsx")},
+            content_type="multipart/form-data",
+        )
+        token = upload_response.location.rsplit("/", 1)[-1]
+        form = {"csrf_token": csrf_token, "token": token, "selection": selections}
+        _read_and_close(client.post("/render_multi", data=form))
+        assert parsed == ["One", "Two", "Three"]
+
+        reupload = client.post(
+            f"/reupload/{token}",
+            data={"csrf_token": csrf_token, "files": (BytesIO(workbook_bytes("beta")), "book.xlsx")},
+            content_type="multipart/form-data",
+        )
+        assert reupload.status_code == 200
+        diff = reupload.get_json()["files"]["book.xlsx"]
+        assert diff["changed"] == ["One"]
+        assert sorted(diff["unchanged"]) == ["Three", "Two"]
+        assert diff["selections"] == ["book.xlsx::One"]
+
+        parsed.clear()
+        page = _read_and_close(client.post("/render_multi", data={**form, "changed": diff["selections"]}), as_text=True)
+        assert parsed == ["One"]
+        assert "beta" in page and 'class="tab active changed"' in page
+
+
+def test_concurrent_sheet_loads_parse_once(tmp_path, monkeypatch):
+    import threading
+
+    workbook_path = tmp_path / "shared.xlsx"
+    workbook_path.write_bytes(_create_sample_workbook_bytes())
+    parsed = []
+    original_load = main.load_sheet
+
+    def slow_load(*args, **kwargs):
+        parsed.append(args[1] if len(args) > 1 else None)
+        time.sleep(0.3)
+        return original_load(*args, **kwargs)
+
+    monkeypatch.setattr(main, "load_sheet", slow_load)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(main._load_sheet_view(workbook_path, workbook_path.name, "People")))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert parsed == ["People"]
+    assert len(results) == 4
+    assert all(list(df.columns) == ["Name", "Birthday", "Score"] for df, *_ in results)
+
+
+def test_sheet_cache_round_trips_arrow_files_and_evicts_unused_entries(tmp_path, monkeypatch):
+    import gc
+
+    _set_test_upload_root(tmp_path, monkeypatch)
+    token_dir = main.UPLOAD_ROOT / ("a" * 32)
+    token_dir.mkdir()
+    df = excel_engine.compact_frame(
+        pd.DataFrame({"Name": ["a", "b", None], 2024: [1, None, 3], "Note": ["x1", "x2", "x3"]})
+    )
+    fingerprint = {"crc": 1}
+    main._write_sheet_cache(token_dir, "f.xlsx", "S1", None, fingerprint, df, {"column_metadata": []})
+    data_path, _ = main._sheet_cache_paths(token_dir, "f.xlsx", "S1", None)
+    assert data_path.suffix == ".arrow" and data_path.exists()
+
+    cached, meta = main._read_sheet_cache(token_dir, "f.xlsx", "S1", None, fingerprint)
+    pd.testing.assert_frame_equal(cached, df)
+    assert main._read_sheet_cache(token_dir, "f.xlsx", "S1", None, {"crc": 2}) is None
+
+    # Over quota: entries a live frame still references survive, unreferenced ones go.
+    monkeypatch.setattr(main, "SHEET_CACHE_MAX_MB", 0)
+    main._write_sheet_cache(token_dir, "f.xlsx", "S2", None, fingerprint, df, {"column_metadata": []})
+    assert data_path.exists()
+    del cached
+    gc.collect()
+    main._write_sheet_cache(token_dir, "f.xlsx", "S3", None, fingerprint, df, {"column_metadata": []})
+    assert not data_path.exists()
+    assert main._sheet_cache_paths(token_dir, "f.xlsx", "S3", None)[0].exists()
+
+
+def test_import_defers_heavy_modules_and_side_effects(tmp_path):
+    upload_root = tmp_path / "uploads"
+    probe = (
+        "import json, sys\n"
+        "from projects.excel.app import main\n"
+        "loaded = [name for name in main.HEAVY_MODULES if name in sys.modules]\n"
+        "exists = main.UPLOAD_ROOT.exists()\n"
+        "main.init_app()\n"
+        "print(json.dumps({'loaded': loaded, 'exists': exists, 'created': main.UPLOAD_ROOT.is_dir()}))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", probe],
+        cwd=Path(__file__).resolve().parents[3],
+        env={"UPLOAD_ROOT": str(upload_root), "PATH": ""},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert json.loads(result.stdout) == {"loaded": [], "exists": False, "created": True}
+
+
+def test_engine_imports_without_flask_and_round_trips_a_sheet(tmp_path):
+    probe = (
+        "import json, sys\n"
+        "from projects.excel.app import excel_engine\n"
+        "loaded = [name for name in ('flask', *excel_engine.HEAVY_MODULES) if name in sys.modules]\n"
+        "print(json.dumps(loaded))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", probe],
+        cwd=Path(__file__).resolve().parents[3],
+        env={"PATH": ""},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert json.loads(result.stdout) == []
+
+    source = tmp_path / "orders.csv"
+    source.write_text("Name;Amount;Day\nAn;1.234,5;05/03/2024\nBình;;\n", encoding="utf-8-sig")
+    df, columns, sheet = excel_engine.load_sheet(source)
+    assert sheet is None and list(df.columns) == ["Name", "Amount", "Day"]
+    assert excel_engine.coerce_cell("12.5%", {"selected_preset": "percent_2"}) == (0.125, "0.00%")
+
+    item = excel_engine.sheet_item(df, columns, "orders", {"Day": "date_dmy"})
+    chunks = list(excel_engine.iter_rows(item))
+    assert chunks[0][0] == ["Name", "Amount", "Day"]
+    assert chunks[0][1][1] == ["Bình", None, None]
+    target = tmp_path / "orders.xlsx"
+    excel_engine.write_sheets([item], target)
+    assert load_workbook(target).active["C2"].value == datetime(2024, 3, 5)
@@ -0,0 +1,37 @@
+import json
+
+from projects.excel.app import main
+from projects.excel.bench import run_bench, workbook_factory
+
+
+def test_workbook_factory_builds_typed_xlsx_and_encoded_csv(tmp_path):
+    mix = workbook_factory.parse_type_mix("vn_text=1,date=1,percent=1,currency=1")
+    xlsx_path = workbook_factory.write_xlsx(tmp_path / "gen.xlsx", rows=25, columns=4, type_mix=mix, blank_ratio=0)
+
+    df, metadata, sheet_name = main.load_sheet(xlsx_path)
+
+    assert sheet_name == "Sheet1"
+    assert len(df) == 25
+    assert [m["source_type"] for m in metadata] == ["text", "percent", "currency", "date"]
+
+    csv_path = workbook_factory.write_csv(
+        tmp_path / "gen.csv", rows=25, columns=4, type_mix=mix, encoding="cp1258", delimiter=";"
+    )
+    csv_df, csv_meta = main.read_csv_smart(csv_path)
+    assert csv_meta == {"encoding": "cp1258", "delimiter": ";"}
+    assert csv_df.shape == (25, 4)
+
+
+def test_run_bench_appends_history_entry(tmp_path):
+    history = tmp_path / "history.jsonl"
+    argv = ["--rows", "20", "--columns", "4", "--repeat", "1", "--history", str(history)]
+    argv += ["--only", "read_csv_smart", "coerce_export_cell", "--encodings", "utf-8", "--delimiters", ","]
+
+    assert run_bench.main_cli(argv) == 0
+    assert run_bench.main_cli(argv + ["--compare"]) == 0
+
+    entries = [json.loads(line) for line in history.read_text(encoding="utf-8").splitlines()]
+    assert len(entries) == 2
+    assert entries[0]["params"]["rows"] == 20
+    assert "utf-8/," in entries[0]["results"]["read_csv_smart"]
+    assert entries[0]["results"]["coerce_export_cell"]["min_s"] >= 0